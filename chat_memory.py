@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+chat_memory.py
+Maintenance of the n8n Postgres chat memory table (`n8n_chat_histories`).
+
+The RAG agents store every turn through the Postgres Chat Memory node,
+keyed by the sessionId n8n_pipe sends. The table is created as
+(id serial, session_id varchar, message jsonb): no index on session_id,
+no timestamp, no retention, so every history lookup
+(`WHERE session_id = $1 ORDER BY id`) gets slower as it grows.
+
+    status      size, dead-tuple bloat and lookup latency, appended to a
+                history file so the trend is visible over time
+    index       add created_at (default now(), no table rewrite) and a
+                (session_id, id) index, built concurrently
+    retention   delete or archive sessions idle for more than --days, in
+                small batches with a lock timeout; on a partitioned table
+                whole monthly partitions are dropped / detached instead
+    partition   convert the table to monthly range partitions on created_at
+                (takes an exclusive lock while copying: run it when idle)
+
+Usage:
+    python3 start_services.py chat-memory status
+    python3 start_services.py chat-memory index
+    python3 start_services.py chat-memory retention --days 30 --archive
+    python3 start_services.py chat-memory retention --days 30 --every 24   # daily loop
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+
+from db_maintenance import Database, measure
+from pg_utils import PsqlError, quote_ident, quote_literal
+
+
+DEFAULT_TABLE = "n8n_chat_histories"
+HISTORY_PATH = os.path.join(".localai", "chat-memory-history.jsonl")
+
+
+# ---------------------- SCHEMA ---------------------- #
+
+def is_partitioned(db, table):
+    return db.value(f"SELECT relkind FROM pg_class WHERE oid = {quote_literal(table)}::regclass;") == "p"
+
+
+def has_column(db, table, column):
+    return db.column_type(table, column) is not None
+
+
+def created_at_statement(table):
+    # now() is stable: stored as a fast default, existing rows get the ALTER time without a rewrite
+    return (f"ALTER TABLE {quote_ident(table)} ADD COLUMN IF NOT EXISTS "
+            f"created_at timestamptz NOT NULL DEFAULT now();")
+
+
+def index_statements(db, table):
+    t = quote_ident(table)
+    statements = []
+    if not has_column(db, table, "created_at"):
+        statements.append(created_at_statement(table))
+    index = quote_ident(f"{table}_session_id_idx")
+    if is_partitioned(db, table):
+        # CONCURRENTLY is not supported on partitioned parents
+        statements.append(f"CREATE INDEX IF NOT EXISTS {index} ON {t} (session_id, id);")
+    else:
+        statements.append(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index} ON {t} (session_id, id);")
+    return statements
+
+
+# ---------------------- STATUS ---------------------- #
+
+def collect_status(db, table, runs=5):
+    t = quote_ident(table)
+    lit = quote_literal(table)
+    partitioned = is_partitioned(db, table)
+    size_expr = (f"(SELECT coalesce(sum(pg_total_relation_size(inhrelid)), 0) FROM pg_inherits "
+                 f"WHERE inhparent = {lit}::regclass)") if partitioned else f"pg_total_relation_size({lit})"
+    tuples_filter = (f"relid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = {lit}::regclass)"
+                     if partitioned else f"relid = {lit}::regclass")
+    row = db.sql(
+        f"SELECT {size_expr}, coalesce(sum(n_live_tup), 0), coalesce(sum(n_dead_tup), 0) "
+        f"FROM pg_stat_user_tables WHERE {tuples_filter};")[0]
+    total_bytes, live, dead = int(row[0]), int(row[1]), int(row[2])
+    sessions = int(db.value(f"SELECT count(DISTINCT session_id) FROM {t};", default="0"))
+    status = {
+        "time": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "rows": live,
+        "sessions": sessions,
+        "total_bytes": total_bytes,
+        "dead_ratio": dead / float(live + dead) if live + dead else 0.0,
+        "partitioned": partitioned,
+        "lookup_ms": None,
+        "lookup_plan": None,
+    }
+    # The most recent session is the one the next chat turn will look up
+    session = db.value(f"SELECT session_id FROM {t} ORDER BY id DESC LIMIT 1;")
+    if session is not None:
+        status["lookup_ms"], status["lookup_plan"] = measure(
+            db, f"SELECT message FROM {t} WHERE session_id = {quote_literal(session)} ORDER BY id", runs)
+    return status
+
+
+def append_history(status, path=HISTORY_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(status, sort_keys=True) + "\n")
+
+
+def read_history(path=HISTORY_PATH, limit=10):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        lines = f.readlines()[-limit:]
+    return [json.loads(line) for line in lines if line.strip()]
+
+
+def print_status(status, history):
+    lookup = f"{status['lookup_ms']:.2f} ms ({status['lookup_plan']})" if status["lookup_ms"] is not None else "n/a"
+    print(f"  Rows:        {status['rows']} in {status['sessions']} sessions"
+          f"{' (partitioned)' if status['partitioned'] else ''}")
+    print(f"  Size:        {status['total_bytes'] / 1048576.0:.1f} MiB (table + indexes + toast)")
+    print(f"  Bloat:       {status['dead_ratio'] * 100:.1f}% dead tuples")
+    print(f"  Lookup:      {lookup}")
+    if len(history) > 1:
+        print("\n  Trend:")
+        print(f"    {'time':<26}{'rows':>10}{'MiB':>10}{'dead %':>8}{'lookup ms':>11}")
+        for h in history:
+            ms = f"{h['lookup_ms']:.2f}" if h.get("lookup_ms") is not None else "-"
+            print(f"    {h['time']:<26}{h['rows']:>10}{h['total_bytes'] / 1048576.0:>10.1f}"
+                  f"{h['dead_ratio'] * 100:>8.1f}{ms:>11}")
+
+
+# ---------------------- RETENTION ---------------------- #
+
+def ensure_archive(db, table):
+    archive = quote_ident(table + "_archive")
+    db.sql(f"CREATE TABLE IF NOT EXISTS {archive} ("
+           "id integer, session_id varchar(255), message jsonb, created_at timestamptz, "
+           "archived_at timestamptz NOT NULL DEFAULT now());")
+
+
+def stale_sessions(db, table, days):
+    t = quote_ident(table)
+    rows = db.sql(f"SELECT session_id FROM {t} GROUP BY session_id "
+                  f"HAVING max(created_at) < now() - interval '{int(days)} days';")
+    return [r[0] for r in rows]
+
+
+def purge_sessions(db, table, sessions, days, batch_size, archive, pause, lock_timeout):
+    """Delete (or move to <table>_archive) the rows of idle sessions, batch_size rows per transaction."""
+    t = quote_ident(table)
+    removed = 0
+    for start in range(0, len(sessions), 100):
+        group = ",".join(quote_literal(s) for s in sessions[start:start + 100])
+        # Re-checked in every batch: a session that became active again is kept
+        victims = (f"SELECT h.id FROM {t} h WHERE h.session_id IN ({group}) "
+                   f"AND NOT EXISTS (SELECT 1 FROM {t} r WHERE r.session_id = h.session_id "
+                   f"AND r.created_at >= now() - interval '{int(days)} days') LIMIT {int(batch_size)}")
+        if archive:
+            statement = (f"WITH moved AS (DELETE FROM {t} WHERE id IN ({victims}) "
+                         f"RETURNING id, session_id, message, created_at), "
+                         f"done AS (INSERT INTO {quote_ident(table + '_archive')} "
+                         f"(id, session_id, message, created_at) "
+                         f"SELECT id, session_id, message, created_at FROM moved RETURNING 1) "
+                         f"SELECT count(*) FROM done;")
+        else:
+            statement = (f"WITH done AS (DELETE FROM {t} WHERE id IN ({victims}) RETURNING 1) "
+                         f"SELECT count(*) FROM done;")
+        while True:
+            count = run_batch(db, f"SET lock_timeout = {quote_literal(lock_timeout)};\n{statement}", pause)
+            removed += count
+            if count < batch_size:
+                break
+            time.sleep(pause)
+    return removed
+
+
+def run_batch(db, sql, pause, attempts=5):
+    """Run one batch; on a lock timeout back off and retry rather than wait behind n8n."""
+    for attempt in range(attempts):
+        try:
+            rows = db.sql(sql)
+            return int(rows[-1][0]) if rows else 0
+        except PsqlError as e:
+            if "lock timeout" not in str(e) or attempt == attempts - 1:
+                raise
+            time.sleep(pause * 10 * (attempt + 1))
+    return 0
+
+
+def month_start(day):
+    return datetime.date(day.year, day.month, 1)
+
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, day):
+    return f"{table}_p{day.year:04d}_{day.month:02d}"
+
+
+def list_partitions(db, table):
+    rows = db.sql(f"SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                  f"WHERE i.inhparent = {quote_literal(table)}::regclass;")
+    out = {}
+    prefix = table + "_p"
+    for (name,) in rows:
+        suffix = name[len(prefix):]
+        if name.startswith(prefix) and len(suffix) == 7 and suffix[4] == "_":
+            out[name] = datetime.date(int(suffix[:4]), int(suffix[5:]), 1)
+    return out
+
+
+def create_partition_sql(table, day):
+    upper = add_months(day, 1)
+    return (f"CREATE TABLE IF NOT EXISTS {quote_ident(partition_name(table, day))} "
+            f"PARTITION OF {quote_ident(table)} FOR VALUES FROM ('{day.isoformat()}') TO ('{upper.isoformat()}');")
+
+
+def default_partition(db, table):
+    return db.value(f"SELECT c.relname FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partdefid "
+                    f"WHERE p.partrelid = {quote_literal(table)}::regclass;")
+
+
+def month_rows(day):
+    return f"created_at >= '{day.isoformat()}' AND created_at < '{add_months(day, 1).isoformat()}'"
+
+
+def move_out_of_default_sql(table, default, day, lock_timeout):
+    """Create the month's partition with the rows the default partition took for it meanwhile."""
+    t, d = quote_ident(table), quote_ident(default)
+    rows = month_rows(day)
+    return "\n".join([
+        "BEGIN;",
+        f"SET LOCAL lock_timeout = {quote_literal(lock_timeout)};",
+        f"LOCK TABLE {t} IN ACCESS EXCLUSIVE MODE;",
+        f"ALTER TABLE {t} DETACH PARTITION {d};",
+        create_partition_sql(table, day),
+        f"INSERT INTO {t} SELECT * FROM {d} WHERE {rows};",
+        f"DELETE FROM {d} WHERE {rows};",
+        f"ALTER TABLE {t} ATTACH PARTITION {d} DEFAULT;",
+        "COMMIT;",
+    ])
+
+
+def ensure_future_partitions(db, table, ahead, lock_timeout):
+    today = month_start(datetime.date.today())
+    existing = set(list_partitions(db, table).values())
+    default = default_partition(db, table)
+    for i in range(ahead + 1):
+        day = add_months(today, i)
+        if day in existing:
+            continue
+        # Retention skipped for longer than --premake: the default partition holds this month's
+        # rows, and creating the partition over them would fail until they are moved out
+        if default and db.value(f"SELECT EXISTS (SELECT 1 FROM {quote_ident(default)} "
+                                f"WHERE {month_rows(day)});") == "t":
+            print(f"  Moving {partition_name(table, day)} rows out of {default}")
+            run_batch(db, move_out_of_default_sql(table, default, day, lock_timeout), 1.0)
+        else:
+            db.sql(create_partition_sql(table, day))
+
+
+def expire_partitions(db, table, days, archive, lock_timeout):
+    """Drop (or detach and keep as <table>_archive_YYYY_MM) partitions entirely older than the cutoff."""
+    cutoff = datetime.date.today() - datetime.timedelta(days=days)
+    expired = []
+    for name, start in sorted(list_partitions(db, table).items(), key=lambda item: item[1]):
+        if add_months(start, 1) > cutoff:
+            continue
+        # Plain DETACH: CONCURRENTLY is refused while a default partition exists
+        if archive:
+            run_batch(db, f"SET lock_timeout = {quote_literal(lock_timeout)};\n"
+                          f"ALTER TABLE {quote_ident(table)} DETACH PARTITION {quote_ident(name)};", 1.0)
+            db.sql(f"ALTER TABLE {quote_ident(name)} RENAME TO "
+                   f"{quote_ident(table + '_archive_' + name[len(table) + 2:])};")
+        else:
+            run_batch(db, f"SET lock_timeout = {quote_literal(lock_timeout)};\n"
+                          f"DROP TABLE {quote_ident(name)};", 1.0)
+        expired.append(name)
+    return expired
+
+
+def run_retention(db, args):
+    table = args.table
+    if not has_column(db, table, "created_at"):
+        print(f"{table} has no created_at column yet: run `chat-memory index` first "
+              f"(retention counts from that point on).")
+        return 1
+    start = time.monotonic()
+    if is_partitioned(db, table):
+        ensure_future_partitions(db, table, args.premake, args.lock_timeout)
+        expired = expire_partitions(db, table, args.days, args.archive, args.lock_timeout)
+        action = "archived" if args.archive else "dropped"
+        print(f"  {len(expired)} partitions {action}: {', '.join(expired) or '-'} "
+              f"({time.monotonic() - start:.1f}s)")
+    else:
+        if args.archive:
+            ensure_archive(db, table)
+        sessions = stale_sessions(db, table, args.days)
+        removed = purge_sessions(db, table, sessions, args.days, args.batch_size, args.archive,
+                                 args.pause, args.lock_timeout)
+        action = "archived" if args.archive else "deleted"
+        print(f"  {len(sessions)} sessions idle > {args.days} days, {removed} rows {action} "
+              f"in batches of {args.batch_size} ({time.monotonic() - start:.1f}s)")
+    if not args.no_vacuum:
+        db.sql(f"VACUUM (ANALYZE) {quote_ident(table)};")
+    status = collect_status(db, table)
+    append_history(status)
+    print_status(status, [])
+    return 0
+
+
+# ---------------------- PARTITIONING ---------------------- #
+
+def partition_statements(db, table, premake):
+    """One transaction converting the table to monthly partitions; the old table is kept."""
+    t = quote_ident(table)
+    old = quote_ident(table + "_unpartitioned")
+    sequence = db.value(f"SELECT pg_get_serial_sequence({quote_literal(table)}, 'id');")
+    oldest = db.value(f"SELECT min(created_at)::date FROM {t};") if has_column(db, table, "created_at") else None
+    first = month_start(datetime.date.fromisoformat(oldest) if oldest else datetime.date.today())
+    last = add_months(month_start(datetime.date.today()), premake)
+
+    statements = ["BEGIN;",
+                  f"LOCK TABLE {t} IN ACCESS EXCLUSIVE MODE;",
+                  f"ALTER TABLE {t} RENAME TO {old};",
+                  f"ALTER INDEX IF EXISTS {quote_ident(table + '_session_id_idx')} "
+                  f"RENAME TO {quote_ident(table + '_unpartitioned_session_id_idx')};",
+                  f"CREATE TABLE {t} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at);"]
+    if sequence:
+        statements.append(f"ALTER SEQUENCE {sequence} OWNED BY {t}.id;")
+    day = first
+    while day <= last:
+        statements.append(create_partition_sql(table, day))
+        day = add_months(day, 1)
+    statements += [
+        f"CREATE TABLE {quote_ident(table + '_default')} PARTITION OF {t} DEFAULT;",
+        f"INSERT INTO {t} (id, session_id, message, created_at) "
+        f"SELECT id, session_id, message, created_at FROM {old};",
+        f"CREATE INDEX {quote_ident(table + '_session_id_idx')} ON {t} (session_id, id);",
+        "COMMIT;",
+    ]
+    return statements
+
+
+def main(argv=None):
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--database", default="postgres", help="Database inside the postgres container.")
+    common.add_argument("--pg-dsn", default=None, help="Use a local psql with this DSN instead of docker exec.")
+    common.add_argument("--table", default=DEFAULT_TABLE, help="Table name set in the Postgres Chat Memory node.")
+    common.add_argument("--dry-run", action="store_true", help="Print the statements without running them.")
+
+    parser = argparse.ArgumentParser(
+        prog="start_services.py chat-memory",
+        description="Index, partition and expire the n8n Postgres chat memory table.",
+    )
+    sub = parser.add_subparsers(dest="action", required=True)
+
+    def add_action(name, help_text):
+        return sub.add_parser(name, help=help_text, parents=[common],
+                              formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    add_action("status", "Size, bloat and lookup latency (recorded over time).")
+    add_action("index", "Add created_at and the (session_id, id) index.")
+
+    retention = add_action("retention", "Delete or archive idle sessions.")
+    retention.add_argument("--days", type=int, default=30, help="Keep sessions active in the last N days.")
+    retention.add_argument("--archive", action="store_true",
+                           help="Move rows to <table>_archive (or keep detached partitions) instead of deleting.")
+    retention.add_argument("--batch-size", type=int, default=1000, help="Rows per transaction.")
+    retention.add_argument("--pause", type=float, default=0.2, help="Seconds between batches.")
+    retention.add_argument("--lock-timeout", default="2s", help="Give up a batch instead of queueing behind locks.")
+    retention.add_argument("--premake", type=int, default=2, help="Future monthly partitions to keep created.")
+    retention.add_argument("--no-vacuum", action="store_true")
+    retention.add_argument("--every", type=float, default=None, help="Repeat every N hours (scheduled job).")
+
+    partition = add_action("partition", "Convert the table to monthly range partitions.")
+    partition.add_argument("--premake", type=int, default=2, help="Future monthly partitions to create.")
+    args = parser.parse_args(argv)
+
+    db = Database(args.database, args.pg_dsn)
+    try:
+        if not db.table_exists(args.table):
+            print(f"Table {args.table} not found (created by n8n on the first chat turn).")
+            return 1
+
+        if args.action == "status":
+            status = collect_status(db, args.table)
+            append_history(status)
+            print_status(status, read_history())
+            return 0
+
+        if args.action == "index":
+            for statement in index_statements(db, args.table):
+                print(f"  {statement}")
+                if not args.dry_run:
+                    db.sql(statement)
+            return 0
+
+        if args.action == "partition":
+            if is_partitioned(db, args.table):
+                print(f"{args.table} is already partitioned.")
+                return 0
+            if not has_column(db, args.table, "created_at"):
+                print(f"  {created_at_statement(args.table)}")
+                if not args.dry_run:
+                    db.sql(created_at_statement(args.table))
+            statements = partition_statements(db, args.table, args.premake)
+            for statement in statements:
+                print(f"  {statement}")
+            if not args.dry_run:
+                db.sql("\n".join(statements))
+                print(f"Done. The original rows are kept in {args.table}_unpartitioned; "
+                      f"drop it once the agents work.")
+            return 0
+
+        if args.dry_run:
+            print("Dry-run: retention would "
+                  f"{'archive' if args.archive else 'delete'} sessions idle for more than {args.days} days.")
+            return 0
+        while True:
+            try:
+                code = run_retention(db, args)
+            except PsqlError as e:
+                if not args.every:
+                    raise
+                # A scheduled run must survive one bad pass: report it and try again next time
+                print(f"psql failed: {e} (retrying in {args.every:g}h)")
+                code = 0
+            if not args.every or code:
+                return code
+            time.sleep(args.every * 3600)
+    except PsqlError as e:
+        print(f"psql failed: {e}")
+        return 1
+    except KeyboardInterrupt:
+        print("\nStopped.")
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+compose_override.py
+Helpers to write generated docker-compose override files.
+
+The orchestrator only needs a small subset of YAML (nested mappings, lists
+and scalars), so this module renders it directly instead of depending on
+PyYAML.
+"""
+
+import os
+import re
+
+
+# Scalars matching this pattern can be written without quotes
+PLAIN_SCALAR_RE = re.compile(r"^[A-Za-z0-9_./-][A-Za-z0-9_./:=-]*$")
+
+# Words YAML would turn into booleans/null if left unquoted
+YAML_RESERVED = {"true", "false", "yes", "no", "on", "off", "null", "~"}
+
+
+def _scalar(value):
+    """Render a scalar as a YAML token."""
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return str(value)
+    text = str(value)
+    if PLAIN_SCALAR_RE.match(text) and text.lower() not in YAML_RESERVED and not _looks_numeric(text):
+        return text
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _looks_numeric(text):
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+
+def render_yaml(data, indent=0):
+    """Render nested dicts/lists/scalars as YAML text."""
+    pad = "  " * indent
+    lines = []
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if isinstance(value, (dict, list)) and value:
+                lines.append(f"{pad}{key}:")
+                lines.append(render_yaml(value, indent + 1))
+            elif isinstance(value, dict):
+                lines.append(f"{pad}{key}: {{}}")
+            elif isinstance(value, list):
+                lines.append(f"{pad}{key}: []")
+            else:
+                lines.append(f"{pad}{key}: {_scalar(value)}")
+    elif isinstance(data, list):
+        for item in data:
+            if isinstance(item, (dict, list)) and item:
+                nested = render_yaml(item, indent + 1).lstrip()
+                lines.append(f"{pad}- {nested}")
+            else:
+                lines.append(f"{pad}- {_scalar(item)}")
+    else:
+        lines.append(f"{pad}{_scalar(data)}")
+    return "\n".join(lines)
+
+
+def write_override(path, services, header_lines=None):
+    """Write a compose override file containing the given services mapping.
+
+    Returns True if the file content changed.
+    """
+    out = []
+    for line in header_lines or []:
+        out.append(f"# {line}".rstrip())
+    if out:
+        out.append("")
+    out.append(render_yaml({"services": services}))
+    content = "\n".join(out) + "\n"
+
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            if f.read() == content:
+                return False
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return True
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+db_maintenance.py
+Indexes and maintenance for the RAG tables of the V3 agentic workflow.
+
+The workflow creates `document_metadata`, `document_rows` and the PGVector
+table `documents_pg` without secondary indexes, so its own queries scan
+whole tables:
+
+    delete chunks    DELETE FROM documents_pg WHERE metadata->>'file_id' LIKE '%<id>%'
+    file contents    SELECT string_agg(text, ' ') ... WHERE metadata->>'file_id' = <id>
+    delete rows      DELETE FROM document_rows WHERE dataset_id LIKE '%<id>%'
+    vector search    ORDER BY embedding <=> <query vector> LIMIT 4
+
+This command measures those queries (EXPLAIN ANALYZE, writes rolled back),
+creates the missing indexes concurrently, runs VACUUM ANALYZE and measures
+again:
+
+    - btree + trigram (pg_trgm) expression indexes on metadata->>'file_id'
+    - btree + trigram indexes on document_rows.dataset_id
+    - an HNSW or IVFFlat index on the embedding column (pgvector only)
+
+Usage:
+    python3 start_services.py db-maintain
+    python3 start_services.py db-maintain --vector-index ivfflat --ivfflat-lists 200 --probes 10
+    python3 db_maintenance.py --report-only --pg-dsn postgresql://postgres@localhost/test
+"""
+
+import argparse
+import json
+import statistics
+import sys
+
+from pg_utils import PsqlError, query_value, quote_ident, quote_literal, run_sql
+
+
+# ---------------------- CONSTANTS ---------------------- #
+
+DEFAULT_TABLE = "documents_pg"
+METADATA_TABLE = "document_metadata"
+ROWS_TABLE = "document_rows"
+
+DISTANCE_OPS = {
+    "cosine": ("vector_cosine_ops", "<=>"),
+    "l2": ("vector_l2_ops", "<->"),
+    "ip": ("vector_ip_ops", "<#>"),
+}
+
+
+# ---------------------- INSPECTION ---------------------- #
+
+class Database:
+    """Target database (container or DSN) plus what exists in it."""
+
+    def __init__(self, database="postgres", dsn=None):
+        self.database = database
+        self.dsn = dsn
+
+    def sql(self, sql, **kwargs):
+        return run_sql(sql, database=self.database, dsn=self.dsn, **kwargs)
+
+    def value(self, sql, default=None):
+        return query_value(sql, default=default, database=self.database, dsn=self.dsn)
+
+    def table_exists(self, table):
+        return self.value(f"SELECT to_regclass({quote_literal(table)}) IS NOT NULL;") == "t"
+
+    def extension_version(self, name):
+        return self.value(f"SELECT extversion FROM pg_extension WHERE extname = {quote_literal(name)};")
+
+    def extension_available(self, name):
+        return self.value(
+            f"SELECT 1 FROM pg_available_extensions WHERE name = {quote_literal(name)};") == "1"
+
+    def column_type(self, table, column):
+        return self.value(
+            "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+            f"WHERE attrelid = {quote_literal(table)}::regclass AND attname = {quote_literal(column)} "
+            "AND NOT attisdropped;")
+
+    def indexes(self, table):
+        """{index name: definition}"""
+        rows = self.sql(
+            "SELECT indexname, indexdef FROM pg_indexes "
+            f"WHERE schemaname = 'public' AND tablename = {quote_literal(table)};")
+        return {name: definition for name, definition in rows}
+
+    def table_sizes(self, tables):
+        out = {}
+        for table in tables:
+            row = self.sql(
+                f"SELECT reltuples::bigint, pg_total_relation_size(oid) FROM pg_class "
+                f"WHERE oid = {quote_literal(table)}::regclass;")
+            if row:
+                out[table] = (max(0, int(row[0][0])), int(row[0][1]))
+        return out
+
+
+# ---------------------- MEASUREMENT ---------------------- #
+
+def workflow_queries(db, table, distance):
+    """The workflow's queries with sample arguments taken from the data.
+
+    Returns a list of (name, sql). Writes are measured inside a rolled-back
+    transaction, so nothing is deleted.
+    """
+    queries = []
+    t = quote_ident(table)
+    if db.table_exists(table):
+        file_id = db.value(f"SELECT metadata->>'file_id' FROM {t} WHERE metadata ? 'file_id' LIMIT 1;")
+        if file_id is not None:
+            lit = quote_literal(file_id)
+            queries.append(("delete chunks (LIKE)",
+                            f"DELETE FROM {t} WHERE metadata->>'file_id' LIKE '%' || {lit} || '%'"))
+            queries.append(("file contents",
+                            f"SELECT string_agg(text, ' ') AS document_text FROM {t} "
+                            f"WHERE metadata->>'file_id' = {lit} GROUP BY metadata->>'file_id'"))
+        if db.extension_version("vector"):
+            probe = db.value(f"SELECT embedding::text FROM {t} WHERE embedding IS NOT NULL LIMIT 1;")
+            if probe is not None:
+                _, operator = DISTANCE_OPS[distance]
+                cast = db.column_type(table, "embedding") or "vector"
+                queries.append(("vector search (top 4)",
+                                f"SELECT id FROM {t} ORDER BY embedding {operator} "
+                                f"{quote_literal(probe)}::{cast} LIMIT 4"))
+    if db.table_exists(ROWS_TABLE) and db.table_exists(METADATA_TABLE):
+        dataset_id = db.value(f"SELECT id FROM {METADATA_TABLE} LIMIT 1;")
+        if dataset_id is not None:
+            queries.append(("delete rows (LIKE)",
+                            f"DELETE FROM {ROWS_TABLE} WHERE dataset_id LIKE '%' || "
+                            f"{quote_literal(dataset_id)} || '%'"))
+    return queries
+
+
+def iter_json_documents(text):
+    decoder = json.JSONDecoder()
+    pos = 0
+    while True:
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        if pos >= len(text):
+            return
+        doc, pos = decoder.raw_decode(text, pos)
+        yield doc
+
+
+def plan_summary(plan):
+    """'Index Scan on x' style summary of the scan nodes in a JSON plan."""
+    scans = []
+
+    def walk(node):
+        kind = node.get("Node Type", "")
+        if "Scan" in kind:
+            index = node.get("Index Name")
+            scans.append(f"{kind} on {index}" if index else f"{kind} on {node.get('Relation Name', '?')}")
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan)
+    return ", ".join(scans) or plan.get("Node Type", "?")
+
+
+def measure(db, sql, runs=5):
+    """Median execution time (ms) over `runs` EXPLAIN ANALYZE, and the plan summary."""
+    statement = f"EXPLAIN (ANALYZE, FORMAT JSON) {sql};"
+    script = "".join(f"BEGIN;\n{statement}\nROLLBACK;\n" for _ in range(runs))
+    rows = db.sql(script)
+    text = "\n".join("\t".join(r) for r in rows)
+    timings, summary = [], "?"
+    for doc in iter_json_documents(text):
+        entry = doc[0]
+        timings.append(entry["Execution Time"] + entry.get("Planning Time", 0.0))
+        summary = plan_summary(entry["Plan"])
+    return (statistics.median(timings) if timings else float("nan")), summary
+
+
+def measure_all(db, queries, runs):
+    results = {}
+    for name, sql in queries:
+        try:
+            results[name] = measure(db, sql, runs)
+        except PsqlError as e:
+            print(f"  {name}: measurement failed: {e}")
+    return results
+
+
+# ---------------------- INDEXES ---------------------- #
+
+def index_statements(db, args):
+    """CREATE INDEX statements for what is missing, plus notes about what was skipped."""
+    statements, notes = [], []
+    table = args.table
+    t = quote_ident(table)
+    trgm = db.extension_version("pg_trgm") or db.extension_available("pg_trgm")
+    if trgm:
+        statements.append("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+    else:
+        notes.append("pg_trgm not available: LIKE '%...%' deletes keep scanning.")
+
+    if db.table_exists(table):
+        statements.append(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {quote_ident(table + '_file_id_idx')} "
+                          f"ON {t} ((metadata->>'file_id'));")
+        if trgm:
+            statements.append(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {quote_ident(table + '_file_id_trgm_idx')} "
+                              f"ON {t} USING gin ((metadata->>'file_id') gin_trgm_ops);")
+        statements += vector_index_statements(db, args, notes)
+    else:
+        notes.append(f"{table} does not exist yet (created by the workflow on first ingestion).")
+
+    if db.table_exists(ROWS_TABLE):
+        statements.append(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {ROWS_TABLE}_dataset_id_idx "
+                          f"ON {ROWS_TABLE} (dataset_id);")
+        if trgm:
+            statements.append(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {ROWS_TABLE}_dataset_id_trgm_idx "
+                              f"ON {ROWS_TABLE} USING gin (dataset_id gin_trgm_ops);")
+    else:
+        notes.append(f"{ROWS_TABLE} does not exist yet.")
+    return statements, notes
+
+
+def vector_index_statements(db, args, notes):
+    if args.vector_index == "none":
+        return []
+    if not db.extension_version("vector"):
+        notes.append("pgvector is not installed in this database: no vector index "
+                     "(the default postgres:16-alpine image does not ship it).")
+        return []
+    table = args.table
+    t = quote_ident(table)
+    column_type = db.column_type(table, "embedding")
+    if column_type is None:
+        notes.append(f"{table} has no embedding column.")
+        return []
+    statements = []
+    if column_type == "vector":
+        # HNSW / IVFFlat need a fixed dimension; n8n creates the column untyped
+        dims = [r[0] for r in db.sql(
+            f"SELECT DISTINCT vector_dims(embedding) FROM {t} WHERE embedding IS NOT NULL LIMIT 2;")]
+        if len(dims) != 1:
+            notes.append(f"{table}.embedding has no fixed dimension and holds "
+                         f"{'mixed' if dims else 'no'} vectors: vector index skipped.")
+            return []
+        alter = f"ALTER TABLE {t} ALTER COLUMN embedding TYPE vector({dims[0]});"
+        if not args.fix_dimensions:
+            notes.append(f"{table}.embedding has no fixed dimension; rerun with --fix-dimensions "
+                         f"to run `{alter}` and build the vector index.")
+            return []
+        statements.append(alter)
+
+    ops, _ = DISTANCE_OPS[args.distance]
+    name = f"{table}_embedding_{args.vector_index}_idx"
+    other = f"{table}_embedding_{'ivfflat' if args.vector_index == 'hnsw' else 'hnsw'}_idx"
+    existing = db.indexes(table)
+    if other in existing:
+        statements.append(f"DROP INDEX CONCURRENTLY IF EXISTS {quote_ident(other)};")
+    if args.rebuild and name in existing:
+        statements.append(f"DROP INDEX CONCURRENTLY IF EXISTS {quote_ident(name)};")
+    if args.vector_index == "hnsw":
+        with_clause = f"m = {args.hnsw_m}, ef_construction = {args.hnsw_ef_construction}"
+    else:
+        lists = args.ivfflat_lists or default_ivfflat_lists(db, table)
+        with_clause = f"lists = {lists}"
+    statements.append(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {quote_ident(name)} "
+                      f"ON {t} USING {args.vector_index} (embedding {ops}) WITH ({with_clause});")
+    return statements
+
+
+def default_ivfflat_lists(db, table):
+    """pgvector guidance: rows / 1000 up to 1M rows, sqrt(rows) above."""
+    rows = int(db.value(f"SELECT count(*) FROM {quote_ident(table)};", default="0"))
+    if rows > 1000000:
+        return max(1, int(rows ** 0.5))
+    return max(1, rows // 1000)
+
+
+def search_settings(db, args):
+    """Persist query-time knobs for new sessions (n8n opens its own connections)."""
+    statements = []
+    name = quote_ident(db.value("SELECT current_database();"))
+    if args.ef_search is not None:
+        statements.append(f"ALTER DATABASE {name} SET hnsw.ef_search = {args.ef_search};")
+    if args.probes is not None:
+        statements.append(f"ALTER DATABASE {name} SET ivfflat.probes = {args.probes};")
+    return statements
+
+
+# ---------------------- REPORT ---------------------- #
+
+def print_sizes(title, sizes):
+    print(f"\n{title}")
+    for table, (rows, size) in sizes.items():
+        print(f"  {table:<22} ~{rows:>10} rows  {size / 1048576.0:>9.1f} MiB")
+
+
+def print_comparison(before, after):
+    print("\n" + "=" * 78)
+    print("  WORKFLOW QUERIES (median of EXPLAIN ANALYZE, writes rolled back)")
+    print("=" * 78)
+    for name in list(before) + [n for n in after if n not in before]:
+        b = before.get(name)
+        a = after.get(name)
+        print(f"  {name}")
+        if b:
+            print(f"    before: {b[0]:9.2f} ms  {b[1]}")
+        if a:
+            speedup = f"  (x{b[0] / a[0]:.1f})" if b and a[0] > 0 else ""
+            print(f"    after:  {a[0]:9.2f} ms  {a[1]}{speedup}")
+    print("=" * 78)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="start_services.py db-maintain",
+        description="Index, vacuum and benchmark the RAG tables used by the V3 workflow.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--database", default="postgres", help="Database inside the postgres container.")
+    parser.add_argument("--pg-dsn", default=None, help="Use a local psql with this DSN instead of docker exec.")
+    parser.add_argument("--table", default=DEFAULT_TABLE, help="PGVector table of the workflow.")
+    parser.add_argument("--vector-index", choices=["hnsw", "ivfflat", "none"], default="hnsw")
+    parser.add_argument("--distance", choices=sorted(DISTANCE_OPS), default="cosine",
+                        help="Distance the vector store queries with (n8n default: cosine).")
+    parser.add_argument("--hnsw-m", type=int, default=16)
+    parser.add_argument("--hnsw-ef-construction", type=int, default=64)
+    parser.add_argument("--ivfflat-lists", type=int, default=None, help="Default: rows/1000 (sqrt above 1M).")
+    parser.add_argument("--ef-search", type=int, default=None,
+                        help="Persist hnsw.ef_search for the database (recall vs latency).")
+    parser.add_argument("--probes", type=int, default=None, help="Persist ivfflat.probes for the database.")
+    parser.add_argument("--rebuild", action="store_true", help="Drop and rebuild the vector index.")
+    parser.add_argument("--fix-dimensions", action="store_true",
+                        help="Give an untyped embedding column its fixed dimension (needed for indexes).")
+    parser.add_argument("--maintenance-work-mem", default=None,
+                        help="maintenance_work_mem for the index builds, e.g. 1GB.")
+    parser.add_argument("--runs", type=int, default=5, help="EXPLAIN ANALYZE runs per query.")
+    parser.add_argument("--no-vacuum", action="store_true", help="Skip VACUUM ANALYZE.")
+    parser.add_argument("--report-only", action="store_true", help="Only measure the queries.")
+    parser.add_argument("--dry-run", action="store_true", help="Print the statements without running them.")
+    args = parser.parse_args(argv)
+
+    db = Database(args.database, args.pg_dsn)
+    try:
+        tables = [t for t in (args.table, METADATA_TABLE, ROWS_TABLE) if db.table_exists(t)]
+        queries = workflow_queries(db, args.table, args.distance)
+        print_sizes("Tables:", db.table_sizes(tables))
+        if not queries:
+            print("\nNo data to measure yet.")
+        before = measure_all(db, queries, args.runs)
+        if args.report_only:
+            print_comparison(before, {})
+            return 0
+
+        statements, notes = index_statements(db, args)
+        statements += search_settings(db, args)
+        if not args.no_vacuum:
+            statements += [f"VACUUM (ANALYZE) {quote_ident(t)};" for t in tables]
+        for note in notes:
+            print(f"Note: {note}")
+        if args.dry_run:
+            print("\nStatements (dry-run):")
+            for statement in statements:
+                print(f"  {statement}")
+            print_comparison(before, {})
+            return 0
+
+        prefix = f"SET maintenance_work_mem = {quote_literal(args.maintenance_work_mem)};\n" \
+            if args.maintenance_work_mem else ""
+        print()
+        for statement in statements:
+            print(f"  {statement}")
+            # One session per statement: CONCURRENTLY and VACUUM cannot run in a transaction block
+            db.sql(prefix + statement)
+
+        after = measure_all(db, queries, args.runs)
+        print_sizes("Tables after maintenance:", db.table_sizes(tables))
+        print_comparison(before, after)
+    except PsqlError as e:
+        print(f"psql failed: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+deploy_journal.py
+Deployment plan, progress journal and lock used by start_services.py.
+
+A deploy interrupted halfway (Ctrl-C, a failing service, a lost SSH session)
+used to start over from `docker compose down` on the next run, and the
+per-service report was only printed. Each deploy now writes:
+
+    .localai/deploy-plan.json      options, phases and per-service config hashes
+    .localai/deploy-journal.jsonl  append-only: plan, phase, service, result, seconds
+    .localai/deploy.lock           pid of the deploy in progress (stale locks are taken over)
+
+`start_services.py --resume` reloads the last plan with its options, skips
+the phases it already finished, and skips services whose last journal entry
+is healthy (or completed, for one-shot jobs) on the same config hash, i.e.
+the same rendered `docker compose config` for that service.
+
+Usage:
+    python3 start_services.py journal            # progress of the last deploy
+    python3 start_services.py journal --all      # every record of the last deploy
+    python3 start_services.py --resume           # continue it
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+
+# ---------------------- CONSTANTS ---------------------- #
+
+STATE_DIR = ".localai"
+PLAN_PATH = os.path.join(STATE_DIR, "deploy-plan.json")
+JOURNAL_PATH = os.path.join(STATE_DIR, "deploy-journal.jsonl")
+LOCK_PATH = os.path.join(STATE_DIR, "deploy.lock")
+
+# Order of the steps of a deploy; a plan lists the ones its options enable
+PHASES = ["stop", "pull", "supabase", "services", "proxy"]
+# Started before the applications when services are (re)started one by one
+INFRA_SERVICES = ["postgres", "redis", "clickhouse", "minio"]
+# Service results that a resumed deploy does not redo
+DONE_RESULTS = ("healthy", "running", "completed")
+HEALTH_TIMEOUT = 180
+POLL_INTERVAL = 2
+
+
+def now():
+    return time.strftime("%Y-%m-%dT%H:%M:%S%z")
+
+
+# ---------------------- LOCK ---------------------- #
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except (OSError, TypeError, ValueError):
+        return False
+    return True
+
+
+def read_json(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class DeployLock:
+    """Exclusive lock file (O_EXCL) holding the owner's pid and host."""
+
+    def __init__(self, path=LOCK_PATH):
+        self.path = path
+        self.held = False
+
+    def acquire(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        for _ in range(3):
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                owner = read_json(self.path) or {}
+                other_host = owner.get("host") not in (None, socket.gethostname())
+                if other_host or pid_alive(owner.get("pid")):
+                    print(f"\nAnother deployment is running (pid {owner.get('pid')} on "
+                          f"{owner.get('host')}, since {owner.get('started')}).")
+                    print(f"Wait for it to finish, or remove {self.path} if it is stale.")
+                    sys.exit(1)
+                print(f"Removing stale deploy lock of pid {owner.get('pid')}.")
+                try:
+                    os.unlink(self.path)
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, "w") as f:
+                json.dump({"pid": os.getpid(), "host": socket.gethostname(), "started": now()}, f)
+            self.held = True
+            return self
+        print(f"\nCould not acquire {self.path}.")
+        sys.exit(1)
+
+    def release(self):
+        if self.held:
+            self.held = False
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+# ---------------------- JOURNAL ---------------------- #
+
+def append_record(record, path=JOURNAL_PATH):
+    """Append one JSON line and fsync it, so a crash never loses a finished step."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    record = dict(record, ts=now())
+    with open(path, "a") as f:
+        f.write(json.dumps(record, sort_keys=True) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_records(path=JOURNAL_PATH, plan_id=None):
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn last line after a crash
+            if plan_id is None or record.get("plan") == plan_id:
+                records.append(record)
+    return records
+
+
+def load_plan(path=PLAN_PATH):
+    return read_json(path)
+
+
+def plan_finished(plan, records=None):
+    if records is None:
+        records = read_records(plan_id=plan["id"])
+    return any(r.get("phase") == "deploy" and r.get("result") == "done" for r in records)
+
+
+def done_phases(records):
+    """Phases whose last record is ok."""
+    last = {}
+    for r in records:
+        if r.get("phase") in PHASES and not r.get("service"):
+            last[r["phase"]] = r.get("result")
+    return {phase for phase, result in last.items() if result == "ok"}
+
+
+def last_service_results(records):
+    """service -> its most recent settled record (any plan)."""
+    last = {}
+    for r in records:
+        if r.get("phase") == "services" and r.get("service") and r.get("result") != "started":
+            last[r["service"]] = r
+    return last
+
+
+# ---------------------- COMPOSE STATE ---------------------- #
+
+def compose_config(base_cmd):
+    try:
+        out = subprocess.run(base_cmd + ["config", "--format", "json"],
+                             capture_output=True, text=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired):
+        return {}
+    if out.returncode != 0:
+        return {}
+    try:
+        return json.loads(out.stdout)
+    except ValueError:
+        return {}
+
+
+def config_hashes(config):
+    """Digest of each service's rendered compose config (image, env, mounts, ...)."""
+    return {
+        name: hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+        for name, spec in config.get("services", {}).items()
+    }
+
+
+def order_services(services):
+    """Infrastructure first, then the applications in their given order."""
+    ordered = [svc for svc in INFRA_SERVICES if svc in services]
+    return ordered + [svc for svc in services if svc not in ordered]
+
+
+def service_states(base_cmd):
+    """service -> (state, health, exit code) from `docker compose ps -a`."""
+    try:
+        out = subprocess.run(base_cmd + ["ps", "-a", "--format", "json"],
+                             capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return {}
+    if out.returncode != 0:
+        return {}
+    text = out.stdout.strip()
+    try:
+        # Compose < 2.21 prints one array, newer versions one object per line
+        rows = json.loads(text) if text.startswith("[") else [json.loads(l) for l in text.splitlines() if l.strip()]
+    except ValueError:
+        return {}
+    states = {}
+    for row in rows:
+        states[row.get("Service")] = (row.get("State", ""), row.get("Health", ""), row.get("ExitCode", 0))
+    return states
+
+
+def classify(state, health, exit_code):
+    """Settled result for a container state, or None while it may still change."""
+    if state == "running":
+        if health in ("", None):
+            return "running"
+        return "healthy" if health == "healthy" else None
+    if state == "exited":
+        return "completed" if exit_code == 0 else "failed"
+    if state == "dead":
+        return "failed"
+    return None
+
+
+# ---------------------- DEPLOYMENT ---------------------- #
+
+class Deployment:
+    """One deploy: its plan file, journal records and what a resume can skip."""
+
+    def __init__(self, plan, base_cmd, done=(), skipped=()):
+        self.plan = plan
+        self.base_cmd = base_cmd
+        self.done = set(done)
+        self.skipped = list(skipped)
+        self.hashes = plan.get("hashes", {})
+
+    @property
+    def id(self):
+        return self.plan["id"]
+
+    @property
+    def pending(self):
+        return [svc for svc in self.plan["services"] if svc not in self.skipped]
+
+    @classmethod
+    def begin(cls, options, base_cmd, services, resume=None):
+        """Write a new plan (or refresh the resumed one) and return the deployment."""
+        from preflight import selected_config_services
+        config = compose_config(base_cmd)
+        hashes = config_hashes(config)
+        selected = order_services(selected_config_services(config, services)) if config else []
+        phases = [p for p in PHASES if not (
+            (p == "pull" and not options.get("update"))
+            or (p == "supabase" and options.get("no_supabase"))
+            or (p == "proxy" and options.get("proxy") != "swag" and options.get("no_caddy")))]
+
+        if resume:
+            plan = dict(resume, hashes=hashes, services=selected or resume.get("services", []))
+            done = done_phases(read_records(plan_id=plan["id"]))
+            skipped = cls.healthy_services(plan, base_cmd)
+            append_record({"plan": plan["id"], "phase": "deploy", "result": "resumed",
+                           "detail": f"skipping phases {sorted(done)} and {len(skipped)} healthy service(s)"})
+        else:
+            plan = {
+                "id": time.strftime("%Y%m%d-%H%M%S"),
+                "created": now(),
+                "options": options,
+                "phases": phases,
+                "services": selected,
+                "hashes": hashes,
+            }
+            done, skipped = (), ()
+            append_record({"plan": plan["id"], "phase": "deploy", "result": "started"})
+        os.makedirs(os.path.dirname(PLAN_PATH), exist_ok=True)
+        tmp = PLAN_PATH + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(plan, f, indent=2, sort_keys=True)
+        os.replace(tmp, PLAN_PATH)
+        deployment = cls(plan, base_cmd, done, skipped)
+        if resume:
+            deployment.print_resume()
+        return deployment
+
+    @staticmethod
+    def healthy_services(plan, base_cmd):
+        """Services already healthy on the config they are about to be deployed with."""
+        last = last_service_results(read_records())
+        states = service_states(base_cmd)
+        healthy = []
+        for svc in plan.get("services", []):
+            record = last.get(svc)
+            if not record or record.get("result") not in DONE_RESULTS:
+                continue
+            if record.get("config_hash") != plan["hashes"].get(svc):
+                continue
+            # Still true now? (one-shot jobs stay exited with code 0)
+            if classify(*states.get(svc, ("", "", 0))) in DONE_RESULTS:
+                healthy.append(svc)
+        return healthy
+
+    def print_resume(self):
+        remaining = [p for p in self.plan["phases"] if p not in self.done]
+        print(f"\nResuming deployment {self.id} at phase '{remaining[0] if remaining else 'done'}'.")
+        if self.skipped:
+            print(f"  Already healthy on the same config: {', '.join(self.skipped)}")
+
+    def record(self, phase, result, seconds=None, service=None, detail=None):
+        record = {"plan": self.id, "phase": phase, "result": result}
+        if service:
+            record["service"] = service
+            record["config_hash"] = self.hashes.get(service)
+        if seconds is not None:
+            record["seconds"] = round(seconds, 2)
+        if detail:
+            record["detail"] = detail
+        append_record(record)
+
+    def step(self, phase, func, *args, **kwargs):
+        """Run one phase unless a previous attempt finished it; func returning False leaves it incomplete."""
+        if phase in self.done:
+            print(f"\n[{phase}] done in a previous run, skipped.")
+            return None
+        self.record(phase, "started")
+        start = time.monotonic()
+        try:
+            value = func(*args, **kwargs)
+        except KeyboardInterrupt:
+            self.record(phase, "interrupted", time.monotonic() - start)
+            raise
+        except BaseException as e:
+            self.record(phase, "failed", time.monotonic() - start, detail=str(e) or type(e).__name__)
+            raise
+        self.record(phase, "incomplete" if value is False else "ok", time.monotonic() - start)
+        if value is not False:
+            self.done.add(phase)
+        return value
+
+    def finish(self):
+        incomplete = [p for p in self.plan["phases"] if p not in self.done]
+        if incomplete:
+            self.record("deploy", "incomplete", detail=", ".join(incomplete))
+            print(f"\nDeployment {self.id} incomplete ({', '.join(incomplete)}). "
+                  f"Fix the cause and run: python3 start_services.py --resume")
+        else:
+            self.record("deploy", "done")
+        return not incomplete
+
+    def settle(self, services, timeout=HEALTH_TIMEOUT):
+        """Wait until each service is healthy / running / completed (or failed); journal each result."""
+        if not services:
+            return True
+        print(f"\nWaiting up to {timeout}s for {len(services)} service(s) to become healthy...")
+        start = time.monotonic()
+        results = {}
+        while True:
+            states = service_states(self.base_cmd)
+            for svc in services:
+                if svc not in results:
+                    result = classify(*states.get(svc, ("", "", 0)))
+                    if result:
+                        results[svc] = result
+                        self.record("services", result, time.monotonic() - start, service=svc)
+            if len(results) == len(services) or time.monotonic() - start >= timeout:
+                break
+            time.sleep(POLL_INTERVAL)
+        for svc in services:
+            if svc not in results:
+                state, health, _ = states.get(svc, ("missing", "", 0))
+                results[svc] = health or state or "missing"
+                self.record("services", results[svc], time.monotonic() - start, service=svc,
+                            detail=f"not healthy after {timeout}s")
+        not_ready = [svc for svc in services if results[svc] not in DONE_RESULTS]
+        for svc in not_ready:
+            print(f"    [{results[svc].upper()}] {svc}")
+        if not not_ready:
+            print(f"  {len(services)} service(s) ready in {time.monotonic() - start:.0f}s.")
+        return not not_ready
+
+
+# ---------------------- REPORT ---------------------- #
+
+def print_progress(plan, records, history, show_all=False):
+    """records: this plan's journal; history: every record (service results carry over on resume)."""
+    print(f"Deployment {plan['id']} (created {plan['created']})")
+    options = plan.get("options", {})
+    print("  Options: " + ", ".join(f"{k}={v}" for k, v in sorted(options.items())))
+    done = done_phases(records)
+    for phase in plan.get("phases", []):
+        print(f"  [{'x' if phase in done else ' '}] {phase}")
+    last = last_service_results(history)
+    for svc in plan.get("services", []):
+        record = last.get(svc)
+        if not record:
+            print(f"      {svc:<24} not started")
+            continue
+        same = "" if record.get("config_hash") == plan.get("hashes", {}).get(svc) else "  (config changed since)"
+        print(f"      {svc:<24} {record['result']:<11} {record.get('seconds', 0):>6.1f}s{same}")
+    state = "finished" if plan_finished(plan, records) else "not finished (python3 start_services.py --resume)"
+    print(f"  Status: {state}")
+    if show_all:
+        print("")
+        for r in records:
+            where = r["phase"] + (f"/{r['service']}" if r.get("service") else "")
+            seconds = f"{r['seconds']:.1f}s" if "seconds" in r else ""
+            print(f"  {r['ts']}  {where:<30} {r['result']:<11} {seconds:>7}  {r.get('detail', '')}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="start_services.py journal",
+        description="Show the plan and progress journal of the last deployment.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--all", action="store_true", help="Print every journal record of the plan.")
+    parser.add_argument("--json", action="store_true", help="Print the plan and records as JSON.")
+    args = parser.parse_args(argv)
+
+    plan = load_plan()
+    if not plan:
+        print("No deployment recorded yet.")
+        return 1
+    records = read_records(plan_id=plan["id"])
+    if args.json:
+        print(json.dumps({"plan": plan, "records": records}, indent=2))
+        return 0
+    print_progress(plan, records, read_records(), show_all=args.all)
+    owner = read_json(LOCK_PATH)
+    if owner:
+        print(f"  Lock: held by pid {owner.get('pid')} since {owner.get('started')}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
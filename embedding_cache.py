@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+embedding_cache.py
+Content-addressed cache for chunk embeddings.
+
+Vectors are keyed by sha256(model, chunk text). Storage is compact:
+
+    <cache dir>/index.sqlite      key -> (dim, row) index
+    <cache dir>/vectors-<dim>.f32 float32 matrix, one row per vector, memory-mapped
+
+Re-ingesting a document only sends chunks that are new or edited to
+Ollama; unchanged chunks are read back from the matrix.
+
+Usage:
+    python3 start_services.py ingest ...            # cache on by default
+    python3 embedding_cache.py --stats
+"""
+
+import argparse
+import hashlib
+import math
+import mmap
+import os
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+
+
+DEFAULT_CACHE_DIR = os.path.join(".localai", "embed-cache")
+
+
+def cache_key(model, text):
+    """sha256 over the model name and the chunk text."""
+    digest = hashlib.sha256()
+    digest.update(model.encode())
+    digest.update(b"\0")
+    digest.update(text.encode("utf-8", errors="surrogatepass"))
+    return digest.digest()
+
+
+class VectorMatrix:
+    """Append-only float32 matrix file, read through mmap."""
+
+    def __init__(self, path, dim):
+        self.path = path
+        self.dim = dim
+        self.row_bytes = dim * 4
+        self.map = None
+        self.mapped_size = 0
+        open(path, "ab").close()
+
+    @property
+    def rows(self):
+        return os.path.getsize(self.path) // self.row_bytes
+
+    def append(self, vectors):
+        """Append vectors, return the index of the first new row."""
+        first = self.rows
+        data = array("f")
+        for vector in vectors:
+            if len(vector) != self.dim:
+                raise ValueError(f"expected dim {self.dim}, got {len(vector)}")
+            data.extend(vector)
+        with open(self.path, "ab") as f:
+            # Truncate a torn trailing row left by an interrupted write
+            if f.tell() != first * self.row_bytes:
+                f.truncate(first * self.row_bytes)
+            data.tofile(f)
+        return first
+
+    def read(self, row):
+        end = (row + 1) * self.row_bytes
+        if end > self.mapped_size:
+            self._remap()
+        vector = array("f")
+        vector.frombytes(self.map[row * self.row_bytes:end])
+        return vector.tolist()
+
+    def _remap(self):
+        if self.map is not None:
+            self.map.close()
+        size = os.path.getsize(self.path)
+        with open(self.path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) if size else None
+        self.mapped_size = size
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+            self.mapped_size = 0
+
+
+class EmbeddingCache:
+    """SQLite index + memory-mapped float32 matrices (one per dimension)."""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            "key BLOB PRIMARY KEY, dim INTEGER NOT NULL, row INTEGER NOT NULL, "
+            "created REAL NOT NULL) WITHOUT ROWID"
+        )
+        self.db.commit()
+        self.matrices = {}
+
+    def _matrix(self, dim):
+        matrix = self.matrices.get(dim)
+        if matrix is None:
+            matrix = VectorMatrix(os.path.join(self.directory, f"vectors-{dim}.f32"), dim)
+            self.matrices[dim] = matrix
+        return matrix
+
+    def get_many(self, keys):
+        """Return {key: vector} for the keys present in the cache."""
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self.db.execute(
+                    f"SELECT key, dim, row FROM vectors WHERE key IN ({placeholders})", part
+                ).fetchall()
+                for key, dim, row in rows:
+                    matrix = self._matrix(dim)
+                    if row < matrix.rows:
+                        found[key] = matrix.read(row)
+        return found
+
+    def put_many(self, items):
+        """Store (key, vector) pairs; existing keys are left untouched."""
+        if not items:
+            return
+        with self.lock:
+            by_dim = {}
+            for key, vector in items:
+                by_dim.setdefault(len(vector), []).append((key, vector))
+            now = time.time()
+            for dim, pairs in by_dim.items():
+                first = self._matrix(dim).append([v for _, v in pairs])
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO vectors (key, dim, row, created) VALUES (?, ?, ?, ?)",
+                    [(key, dim, first + i, now) for i, (key, _) in enumerate(pairs)]
+                )
+            self.db.commit()
+
+    def stats(self):
+        with self.lock:
+            count = self.db.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+        size = 0
+        for name in os.listdir(self.directory):
+            size += os.path.getsize(os.path.join(self.directory, name))
+        return {"entries": count, "bytes": size}
+
+    def close(self):
+        with self.lock:
+            for matrix in self.matrices.values():
+                matrix.close()
+            self.db.close()
+
+
+class CachedEmbedder:
+    """Wrap an embedder (anything with embed(texts)) with the cache.
+
+    Only cache misses are sent to the wrapped embedder; duplicates within a
+    batch are embedded once.
+    """
+
+    def __init__(self, embedder, cache, model):
+        self.embedder = embedder
+        self.cache = cache
+        self.model = model
+        self.hits = 0
+        self.misses = 0
+        self.max_batch = 0
+        self.lock = threading.Lock()
+
+    @property
+    def calls(self):
+        return self.embedder.calls
+
+    @property
+    def seconds(self):
+        return self.embedder.seconds
+
+    def embed(self, texts):
+        keys = [cache_key(self.model, t) for t in texts]
+        found = self.cache.get_many(list(set(keys)))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            miss_keys = list(missing)
+            vectors = self.embedder.embed([missing[k] for k in miss_keys])
+            new_items = list(zip(miss_keys, vectors))
+            self.cache.put_many(new_items)
+            found.update(new_items)
+
+        with self.lock:
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+            self.max_batch = max(self.max_batch, len(texts))
+        return [found[k] for k in keys]
+
+    def report(self):
+        """Hit ratio and the embedding time the hits saved.
+
+        Saved time = calls the hits would have needed at the batch size in
+        use x the observed average call duration.
+        """
+        total = self.hits + self.misses
+        calls = self.embedder.calls
+        per_call = self.embedder.seconds / calls if calls else 0.0
+        saved_calls = math.ceil(self.hits / float(self.max_batch)) if self.max_batch else 0
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / float(total) if total else 0.0,
+            "embed_seconds": self.embedder.seconds,
+            "saved_seconds": saved_calls * per_call,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or clear the embedding cache.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--stats", action="store_true", help="Print entry count and size.")
+    parser.add_argument("--clear", action="store_true", help="Delete the cache.")
+    args = parser.parse_args(argv)
+
+    if args.clear:
+        if os.path.isdir(args.cache_dir):
+            for name in os.listdir(args.cache_dir):
+                os.remove(os.path.join(args.cache_dir, name))
+            os.rmdir(args.cache_dir)
+        print(f"Cache {args.cache_dir} cleared.")
+        return 0
+
+    if not os.path.isdir(args.cache_dir):
+        print(f"No cache at {args.cache_dir}.")
+        return 0
+    cache = EmbeddingCache(args.cache_dir)
+    stats = cache.stats()
+    cache.close()
+    print(f"Cache {args.cache_dir}: {stats['entries']} vectors, {stats['bytes'] / 1048576.0:.1f} MiB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
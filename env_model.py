@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+env_model.py
+Ordered .env model with a diff API, and targeted restarts.
+
+The .env is parsed once into an EnvFile that keeps comments, blank lines and
+key order, so rewriting it (generate_env.py) changes only the values that
+actually changed. Two EnvFiles, or an EnvFile and the fingerprints recorded
+at the last deployment, give an EnvDiff of added / removed / changed keys.
+
+The compose files are scanned for ${VAR} references (following YAML
+anchors), so each changed key maps to the services that consume it and
+`env apply` recreates only those instead of bouncing the whole stack:
+
+    python3 start_services.py env diff                 # vs last deployment
+    python3 start_services.py env diff --against .env.bak
+    python3 start_services.py env apply [--dry-run]    # restart consumers only
+    python3 start_services.py env record               # mark .env as applied
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+
+# ---------------------- CONSTANTS ---------------------- #
+
+APPLIED_PATH = os.path.join(".localai", "env-applied.json")
+
+LINE_RE = re.compile(r"^\s*(?:export\s+)?([A-Za-z_][A-Za-z0-9_]*)\s*=(.*)$")
+SENSITIVE_REGEX = re.compile(r"(PASS(word)?|SECRET|KEY|TOKEN|JWT|SALT|AUTH|ACCESS)", re.IGNORECASE)
+COMPOSE_VAR_RE = re.compile(r"(?<!\$)\$\{?([A-Za-z_][A-Za-z0-9_]*)")
+# ${VAR}, ${VAR:?err}, ${VAR?err} and $VAR have no fallback value
+REQUIRED_VAR_RE = re.compile(r"(?<!\$)\$(?:\{([A-Za-z_][A-Za-z0-9_]*)(?:\}|:?\?)|([A-Za-z_][A-Za-z0-9_]*))")
+# `- NAME` in an environment list: passed through from .env / the shell
+PASSTHROUGH_RE = re.compile(r"^\s*-\s*([A-Z][A-Z0-9_]*)\s*$")
+MAPPING_KEY_RE = re.compile(r"^\s*(?:-\s*)?([A-Za-z0-9_.-]+):(?:\s|$)")
+ANCHOR_RE = re.compile(r"&([A-Za-z0-9_.-]+)")
+ALIAS_RE = re.compile(r"\*([A-Za-z0-9_.-]+)")
+SUPABASE_COMPOSE = os.path.join("supabase", "docker", "docker-compose.yml")
+
+
+# ---------------------- MODEL ---------------------- #
+
+def decode_value(raw):
+    """Value as docker compose reads it: quotes removed, inline comment and $$ escape resolved."""
+    raw = raw.strip()
+    if len(raw) >= 2 and raw[0] == raw[-1] == "'":
+        return raw[1:-1]
+    if len(raw) >= 2 and raw[0] == raw[-1] == '"':
+        return raw[1:-1].replace("$$", "$")
+    return raw.split(" #", 1)[0].rstrip().replace("$$", "$")
+
+
+def encode_value(value):
+    """Escape `$` so compose does not interpolate generated values."""
+    return "" if value is None else str(value).replace("$", "$$")
+
+
+def is_sensitive(key):
+    return SENSITIVE_REGEX.search(key) is not None
+
+
+class EnvFile:
+    """Lines of an env file; variables are addressable by key, everything else is kept verbatim."""
+
+    def __init__(self, lines=None, path=None):
+        self.path = path
+        self.lines = []  # [key or None, text without newline]
+        self.index = {}
+        for line in lines or []:
+            self._append_line(line.rstrip("\r\n"))
+
+    @classmethod
+    def load(cls, path=".env"):
+        """Parse `path`; a missing file gives an empty model."""
+        if not os.path.exists(path):
+            return cls(path=path)
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(f.readlines(), path=path)
+
+    def _append_line(self, text):
+        m = LINE_RE.match(text)
+        key = m.group(1) if m else None
+        if key is not None:
+            self.index[key] = len(self.lines)  # later duplicates win, as in compose
+        self.lines.append([key, text])
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def keys(self):
+        return sorted(self.index, key=self.index.get)
+
+    def get(self, key, default=""):
+        if key not in self.index:
+            return default
+        return decode_value(LINE_RE.match(self.lines[self.index[key]][1]).group(2))
+
+    def raw(self, key):
+        """The value as written, before decoding."""
+        return LINE_RE.match(self.lines[self.index[key]][1]).group(2) if key in self.index else None
+
+    def set(self, key, value):
+        """Replace the value in place, or append the key at the end."""
+        text = f"{key}={encode_value(value)}"
+        if key in self.index:
+            self.lines[self.index[key]][1] = text
+        else:
+            self._append_line(text)
+
+    def setdefault(self, key, value):
+        if not self.get(key):
+            self.set(key, value)
+        return self.get(key)
+
+    def remove(self, key):
+        if key not in self.index:
+            return
+        self.lines = [line for line in self.lines if line[0] != key]
+        self.index = {k: i for i, (k, _) in enumerate(self.lines) if k is not None}
+
+    def as_dict(self):
+        return {key: self.get(key) for key in self.index}
+
+    def render(self):
+        return "".join(text + "\n" for _, text in self.lines)
+
+    def save(self, path=None, backup=True):
+        """Write atomically with 0600 permissions, keeping the previous file as .bak."""
+        path = path or self.path
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        try:
+            os.chmod(tmp, 0o600)
+        except OSError:
+            pass
+        if backup and os.path.exists(path):
+            os.replace(path, path + ".bak")
+        os.replace(tmp, path)
+        self.path = path
+
+    def fingerprints(self):
+        return {key: fingerprint(value) for key, value in self.as_dict().items()}
+
+    def diff(self, newer):
+        """Changes from this file to `newer` (an EnvFile or a dict of values)."""
+        after = newer.as_dict() if isinstance(newer, EnvFile) else newer
+        return EnvDiff.between(self.as_dict(), after)
+
+
+def fingerprint(value):
+    """Stable digest stored instead of the value (no secrets in .localai)."""
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:16]
+
+
+class EnvDiff:
+    def __init__(self, added, removed, changed, before=None, after=None):
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+        self.before = before or {}
+        self.after = after or {}
+
+    @classmethod
+    def between(cls, before, after):
+        added = [k for k in after if k not in before]
+        removed = [k for k in before if k not in after]
+        changed = [k for k in after if k in before and before[k] != after[k]]
+        return cls(added, removed, changed, before, after)
+
+    def keys(self):
+        return self.added + self.removed + self.changed
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def describe(self, show_values=True):
+        """One line per key; sensitive values are never printed."""
+
+        def shown(key, values):
+            if not show_values or key not in values:
+                return ""
+            value = values[key]
+            if is_sensitive(key):
+                return "<set>" if value else "<empty>"
+            return repr(value)
+
+        lines = [f"  + {k} {shown(k, self.after)}".rstrip() for k in self.added]
+        lines += [f"  - {k}" for k in self.removed]
+        for key in self.changed:
+            if show_values:
+                lines.append(f"  ~ {key}: {shown(key, self.before)} -> {shown(key, self.after)}")
+            else:
+                lines.append(f"  ~ {key}")
+        return lines
+
+
+# ---------------------- CONSUMERS ---------------------- #
+
+def compose_consumers(paths, required_only=False):
+    """Map compose service -> set of env vars it interpolates ("*" for env_file: .env).
+
+    With required_only, variables that have a ${VAR:-default} fallback are left out.
+
+    Line-based: YAML anchors (&name) collect the variables of their block and
+    services inherit them through aliases (*name), which covers the x-n8n /
+    x-ollama style templates used by the compose files of this repo.
+    """
+    owners_vars = {}
+    owners_refs = {}
+    services = set()
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        in_services = False
+        stack = []  # (indent, owner)
+        keys = []  # (indent, mapping key) — parent of "- NAME" list items
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                body = line.split(" #", 1)[0].rstrip() if not line.lstrip().startswith("#") else ""
+                if not body.strip():
+                    continue
+                indent = len(body) - len(body.lstrip())
+                while stack and stack[-1][0] >= indent:
+                    stack.pop()
+                while keys and keys[-1][0] >= indent:
+                    keys.pop()
+                in_environment = bool(keys) and keys[-1][1] == "environment"
+                if indent == 0:
+                    in_services = body.startswith("services:")
+                for _, owner in stack:
+                    if required_only:
+                        found = {a or b for a, b in REQUIRED_VAR_RE.findall(body)}
+                    else:
+                        found = COMPOSE_VAR_RE.findall(body)
+                    owners_vars.setdefault(owner, set()).update(found)
+                    if in_environment:
+                        owners_vars[owner].update(PASSTHROUGH_RE.findall(body))
+                    owners_refs.setdefault(owner, set()).update(ALIAS_RE.findall(body))
+                    if body.strip().startswith("env_file") and not required_only:
+                        owners_vars[owner].add("*")
+                k = MAPPING_KEY_RE.match(body)
+                if k:
+                    keys.append((indent, k.group(1)))
+                m = ANCHOR_RE.search(body)
+                if m:
+                    stack.append((indent, "&" + m.group(1)))
+                if in_services and indent == 2 and body.strip().endswith(":"):
+                    name = body.strip()[:-1].strip("'\"")
+                    services.add(name)
+                    stack.append((indent, name))
+
+    def resolve(owner, seen):
+        found = set(owners_vars.get(owner, set()))
+        for ref in owners_refs.get(owner, set()):
+            anchor = "&" + ref
+            if anchor not in seen:
+                seen.add(anchor)
+                found |= resolve(anchor, seen)
+        return found
+
+    return {svc: resolve(svc, {svc}) for svc in sorted(services)}
+
+
+def services_for_keys(keys, consumers):
+    """key -> sorted list of services that read it."""
+    mapping = {}
+    for key in keys:
+        mapping[key] = sorted(svc for svc, used in consumers.items() if key in used or "*" in used)
+    return mapping
+
+
+def compose_files(base_cmd):
+    """The -f files of a docker compose command."""
+    return [base_cmd[i + 1] for i, arg in enumerate(base_cmd[:-1]) if arg == "-f"]
+
+
+# ---------------------- APPLIED STATE ---------------------- #
+
+def load_applied(path=APPLIED_PATH):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def record_applied(profile, environment, supabase_enabled, env_path=".env", path=APPLIED_PATH):
+    """Remember what the running stack was started with (fingerprints only)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = {
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "profile": profile,
+        "environment": environment,
+        "supabase": bool(supabase_enabled),
+        "keys": EnvFile.load(env_path).fingerprints(),
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    return data
+
+
+def diff_since_applied(env, applied):
+    return EnvDiff.between(applied.get("keys", {}), env.fingerprints())
+
+
+# ---------------------- COMMANDS ---------------------- #
+
+def running_services(base_cmd):
+    """Services with a running container, or None when docker cannot be asked."""
+    try:
+        out = subprocess.run(base_cmd + ["ps", "--services", "--status", "running"],
+                             capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if out.returncode != 0:
+        return None
+    return set(out.stdout.split())
+
+
+def affected_services(diff, base_cmd, supabase_enabled):
+    files = compose_files(base_cmd)
+    if supabase_enabled:
+        files.append(SUPABASE_COMPOSE)
+    mapping = services_for_keys(diff.keys(), compose_consumers(files))
+    services = sorted({svc for svcs in mapping.values() for svc in svcs})
+    return mapping, services
+
+
+def print_diff(diff, mapping, show_values):
+    lines = diff.describe(show_values=show_values)
+    for key, line in zip(diff.added + diff.removed + diff.changed, lines):
+        consumers = mapping.get(key) or []
+        print(f"{line}  -> {', '.join(consumers) if consumers else 'no compose service'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="start_services.py env",
+        description="Show .env changes since the last deployment and restart only the services that use them.",
+    )
+    sub = parser.add_subparsers(dest="action", required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--env-file", default=".env")
+    common.add_argument("--profile", choices=["cpu", "gpu-nvidia", "gpu-amd", "none"], default=None,
+                        help="Default: the profile of the last deployment.")
+    common.add_argument("--environment", choices=["private", "public"], default=None,
+                        help="Default: the environment of the last deployment.")
+    common.add_argument("--no-supabase", action="store_true", default=None)
+
+    diff_parser = sub.add_parser("diff", parents=[common], help="List changed keys and the services using them.")
+    diff_parser.add_argument("--against", default=None,
+                             help="Compare with another env file (e.g. .env.bak) instead of the last deployment.")
+    apply_parser = sub.add_parser("apply", parents=[common], help="Recreate only the services whose variables changed.")
+    apply_parser.add_argument("--dry-run", action="store_true")
+    sub.add_parser("record", parents=[common], help="Mark the current .env as applied.")
+    args = parser.parse_args(argv)
+
+    from start_services import build_compose_base, prepare_supabase_env
+
+    applied = load_applied()
+    profile = args.profile or (applied or {}).get("profile", "cpu")
+    environment = args.environment or (applied or {}).get("environment", "private")
+    supabase = (not args.no_supabase) if args.no_supabase is not None else (applied or {}).get("supabase", False)
+    env = EnvFile.load(args.env_file)
+    if not env.index:
+        print(f"{args.env_file} is missing or empty.")
+        return 1
+
+    if args.action == "record":
+        record_applied(profile, environment, supabase, args.env_file)
+        print(f"Recorded {len(env.index)} keys of {args.env_file} as applied ({profile}, {environment}).")
+        return 0
+
+    against = getattr(args, "against", None)
+    if against:
+        diff = EnvFile.load(against).diff(env)
+        label = against
+    elif applied:
+        diff = diff_since_applied(env, applied)
+        label = f"last deployment ({applied.get('recorded_at', '?')})"
+    else:
+        print("No deployment recorded yet: start the stack with start_services.py, "
+              "or run `start_services.py env record` if it is already running with this .env.")
+        return 1
+
+    base_cmd = build_compose_base(profile, environment, supabase_enabled=supabase)
+    if not diff:
+        print(f"{args.env_file}: no changes since {label}.")
+        return 0
+    mapping, services = affected_services(diff, base_cmd, supabase)
+    print(f"{args.env_file}: {len(diff.keys())} key(s) changed since {label}")
+    print_diff(diff, mapping, show_values=bool(against))
+
+    if args.action == "diff":
+        print(f"\nServices to recreate: {', '.join(services) if services else 'none'}")
+        return 0
+
+    running = running_services(base_cmd)
+    if running is not None:
+        skipped = [svc for svc in services if svc not in running]
+        services = [svc for svc in services if svc in running]
+        if skipped:
+            print(f"Not running (picked up on their next start): {', '.join(skipped)}")
+    if not services:
+        print("No running service uses these keys; nothing to restart.")
+    else:
+        cmd = base_cmd + ["up", "-d", "--no-deps"] + services
+        print("Running:", " ".join(cmd))
+        if args.dry_run:
+            print("Dry-run: nothing restarted.")
+            return 0
+        if supabase:
+            prepare_supabase_env()
+        if subprocess.run(cmd).returncode != 0:
+            print("docker compose failed; the applied state was not updated.")
+            return 1
+    if not args.dry_run:
+        record_applied(profile, environment, supabase, args.env_file)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
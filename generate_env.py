@@ -8,32 +8,31 @@ Caractéristiques :
 - Ajoute automatiquement :
     LOCAL_AI_BASE_PATH=/.../local-ai-packaged-infra
     LOCAL_AI_INFRA_PATH=/.../local-ai-packaged-infra/DATAS
-- Détection GPU (NVIDIA / AMD / CPU)
+- Détection GPU (NVIDIA / AMD / CPU) et IP via host_facts (cache, --refresh-facts)
 - Lancement Docker Compose optionnel (--docker)
 """
 
 import os
-import re
 import argparse
 import secrets
 import string
-import stat
 import subprocess
-import shutil
-import socket
 from getpass import getpass
 
+import host_facts
+from env_model import EnvFile, SENSITIVE_REGEX
+
 # -------------------------
 # Config et helpers
 # -------------------------
-SENSITIVE_REGEX = re.compile(r"(PASS(word)?|SECRET|KEY|TOKEN|JWT|SALT|AUTH|ACCESS)", re.IGNORECASE)
-# Variables that match SENSITIVE_REGEX but should NOT be treated as secrets
 # Variables that match SENSITIVE_REGEX but need special handling (not random A-Z/0-9/!?)
 SENSITIVE_EXCLUDE = {"NEO4J_AUTH", "REDIS_AUTH", "ENCRYPTION_KEY"}
 # Variables that should NEVER be regenerated once they have a value (encryption keys that
 # are baked into volumes/databases — changing them breaks existing data).
 NEVER_REGEN = {"N8N_ENCRYPTION_KEY", "ENCRYPTION_KEY"}
-VAR_LINE_RE = re.compile(r"^([A-Za-z0-9_]+)=(.*)$")
+PLACEHOLDERS = {"", "REPLACE_ME", "CHANGE_ME", "YOUR_VALUE_HERE", "PUT_YOUR_KEY_HERE"}
+# Recomputed on every run from the host
+HOST_VARS = ("LOCAL_AI_BASE_PATH", "LOCAL_AI_INFRA_PATH", "SERVER_IP")
 
 ALLOWED_SPECIAL = "!?"
 ALLOWED_SET = set(string.ascii_letters + string.digits + ALLOWED_SPECIAL)
@@ -66,30 +65,14 @@ def sanitize_secret(value: str) -> str:
     return s
 
 
-def safe_for_env_write(value: str) -> str:
-    """Protège les valeurs pour écriture dans .env."""
-    if value is None:
-        return ""
-    return str(value).replace("$", "$$")
-
-
 def detect_gpu():
-    """Détecte le type de GPU présent (NVIDIA / AMD / CPU)."""
-    if shutil.which("nvidia-smi"):
-        return "nvidia"
-    if shutil.which("rocm-smi") or os.path.isdir("/opt/rocm"):
-        return "amd"
-    return "cpu"
+    """Détecte le type de GPU présent (NVIDIA / AMD / CPU), via le cache host_facts."""
+    return host_facts.gpu_type()
 
 
 def get_server_ip():
-    """Détermine l'IP locale."""
-    try:
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-            s.connect(("8.8.8.8", 80))
-            return s.getsockname()[0]
-    except Exception:
-        return "127.0.0.1"
+    """Détermine l'IP locale (cache host_facts)."""
+    return host_facts.get_facts()["server_ip"] or "127.0.0.1"
 
 
 def run_command(cmd):
@@ -125,7 +108,13 @@ def prompt_for(varname, current_value, auto_accept=False, regen_sensitive=False,
     if sensitive:
         print(f"\nVariable sensible détectée: {varname}")
         while True:
-            choice = input("Voulez-vous (g)énérer, (t)aper manuellement, (s)auter ? [g/t/s] ").strip().lower()
+            if current_value != "" and not regen_sensitive:
+                choice = input("Voulez-vous (c)onserver la valeur actuelle, (g)énérer, (t)aper, (s)auter ? [c/g/t/s] ")
+                choice = choice.strip().lower() or "c"
+                if choice == "c":
+                    return current_value
+            else:
+                choice = input("Voulez-vous (g)énérer, (t)aper manuellement, (s)auter ? [g/t/s] ").strip().lower()
             if choice in ("g", "", "G"):
                 val = generate_secret(secret_length)
                 print(f"Généré: {val}")
@@ -166,29 +155,26 @@ SERVICE_SUBDOMAIN_DEFAULTS = {
 }
 
 
-def expand_hostnames(env_lines):
-    """If BASE_DOMAIN is set and individual hostnames are not, derive them."""
-    env_dict = {}
-    for line in env_lines:
-        m = VAR_LINE_RE.match(line.strip())
-        if m:
-            env_dict[m.group(1)] = m.group(2)
+def expand_hostnames(env, previous_domain=""):
+    """If BASE_DOMAIN is set and individual hostnames are not, derive them.
 
-    base_domain = env_dict.get("BASE_DOMAIN", "").strip()
+    Hostnames derived from the previous BASE_DOMAIN follow a domain change;
+    hand-written ones are kept.
+    """
+    base_domain = env.get("BASE_DOMAIN").strip()
+    for var, subdomain in SERVICE_SUBDOMAIN_DEFAULTS.items():
+        if previous_domain and env.get(var) == f"{subdomain}.{previous_domain}":
+            env.remove(var)
     if not base_domain:
-        return env_lines
+        return
 
     print(f"🌐 BASE_DOMAIN={base_domain} — expanding hostnames...")
-    additions = []
     for var, subdomain in SERVICE_SUBDOMAIN_DEFAULTS.items():
-        existing = env_dict.get(var, "").strip()
-        if not existing:
+        if not env.get(var).strip():
             hostname = f"{subdomain}.{base_domain}"
-            additions.append(f"{var}={hostname}\n")
+            env.set(var, hostname)
             print(f"   {var}={hostname}")
 
-    return env_lines + additions
-
 
 # -------------------------
 # Main
@@ -202,129 +188,102 @@ def main():
     parser.add_argument("--domain", type=str, default=None, help="Définir BASE_DOMAIN (ex: home.example.com)")
     parser.add_argument("--docker", action="store_true", help="Construire et démarrer Docker Compose automatiquement")
     parser.add_argument("--secret-length", type=int, default=32, help="Longueur des secrets générés")
+    parser.add_argument("--refresh-facts", action="store_true",
+                        help="Re-détecter GPU / IP au lieu d'utiliser le cache .localai/host-facts.json")
     args = parser.parse_args()
+    if args.refresh_facts:
+        host_facts.get_facts(refresh=True)
 
     if not os.path.exists(args.example):
         print(f"❌ Fichier {args.example} introuvable")
         return
 
-    with open(args.example, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-
-    output_lines = []
-    for line in lines:
-        m = VAR_LINE_RE.match(line.strip())
-        if m:
-            var = m.group(1)
-            raw_val = m.group(2)
-            val_inner = raw_val.strip().strip('"').strip("'")
-
-            if val_inner.upper() in ("", "REPLACE_ME", "CHANGE_ME", "YOUR_VALUE_HERE", "PUT_YOUR_KEY_HERE"):
-                val_inner = ""
-
-            new_val = prompt_for(
-                var,
-                val_inner,
-                auto_accept=args.yes,
-                regen_sensitive=args.regen_sensitive,
-                secret_length=args.secret_length,
-            )
-            if SENSITIVE_REGEX.search(var) and var not in SENSITIVE_EXCLUDE:
-                new_val = sanitize_secret(new_val)
-
-            safe_val = safe_for_env_write(new_val)
-            output_lines.append(f"{var}={safe_val}\n")
-        else:
-            output_lines.append(line)
-
-    # 🔐 Régénération forcée de certaines variables (sauf celles déjà présentes dans NEVER_REGEN)
-    # Lire les valeurs existantes pour préserver les clés critiques
-    existing_env = {}
-    if os.path.exists(args.output):
-        with open(args.output, "r", encoding="utf-8") as f:
-            for ln in f:
-                m = VAR_LINE_RE.match(ln.strip())
-                if m:
-                    existing_env[m.group(1)] = m.group(2).strip().strip('"').strip("'")
-
-    forced = {
-        "FLOWISE_USERNAME": "admin@localai.local",
-        "FLOWISE_PASSWORD": generate_secret(24),
-        "PG_META_CRYPTO_KEY": generate_secret(48),
-        "ENCRYPTION_KEY": secrets.token_hex(32),  # Must be 64 hex chars for Langfuse
+    # Le modèle part du gabarit (ordre et commentaires) ; les valeurs existantes du .env sont conservées
+    env = EnvFile.load(args.example)
+    previous = EnvFile.load(args.output)
+    for var in env.keys():
+        current = previous.get(var) if var in previous else env.get(var).strip()
+        if current.upper() in PLACEHOLDERS:
+            current = ""
+
+        new_val = prompt_for(
+            var,
+            current,
+            auto_accept=args.yes,
+            regen_sensitive=args.regen_sensitive,
+            secret_length=args.secret_length,
+        )
+        if SENSITIVE_REGEX.search(var) and var not in SENSITIVE_EXCLUDE:
+            new_val = sanitize_secret(new_val)
+        env.set(var, new_val)
+
+    # Variables ajoutées hors gabarit (BASE_DOMAIN, hostnames, réglages manuels) : conservées
+    for var in previous.keys():
+        if var not in env and var not in HOST_VARS:
+            env.set(var, previous.get(var))
+
+    # 🔐 Secrets hors gabarit : générés s'ils manquent, régénérés seulement avec --regen-sensitive
+    generated = {
+        "FLOWISE_PASSWORD": lambda: generate_secret(24),
+        "PG_META_CRYPTO_KEY": lambda: generate_secret(48),
+        "ENCRYPTION_KEY": lambda: secrets.token_hex(32),  # Must be 64 hex chars for Langfuse
     }
-    # Préserver les clés critiques si elles existent déjà
-    for k in list(forced.keys()):
-        if k in NEVER_REGEN and existing_env.get(k, "").strip():
-            print(f"  🔒 {k} préservée (clé existante)")
-            forced[k] = existing_env[k]
-
-    print("🔐 Régénération forcée : FLOWISE_USERNAME / FLOWISE_PASSWORD / PG_META_CRYPTO_KEY / ENCRYPTION_KEY")
-    for k in forced:
-        output_lines = [ln for ln in output_lines if not ln.startswith(f"{k}=")]
-    for k, v in forced.items():
-        output_lines.append(f"{k}={safe_for_env_write(v)}\n")
+    env.setdefault("FLOWISE_USERNAME", "admin@localai.local")
+    for k, make in generated.items():
+        existing = previous.get(k).strip()
+        if existing and (k in NEVER_REGEN or not args.regen_sensitive):
+            if k in NEVER_REGEN:
+                print(f"  🔒 {k} préservée (clé existante)")
+            env.set(k, existing)
+        else:
+            env.set(k, make())
+            print(f"  🔐 {k} générée")
+    if len(env.get("ENCRYPTION_KEY")) != 64:
+        env.set("ENCRYPTION_KEY", secrets.token_hex(32))
+        print("  🔐 ENCRYPTION_KEY générée (64 caractères hex requis par Langfuse)")
 
     # 🌐 Définition interactive ou CLI de BASE_DOMAIN
+    previous_domain = previous.get("BASE_DOMAIN").strip()
     domain = args.domain
     if domain is None and not args.yes:
-        # Chercher la valeur actuelle de BASE_DOMAIN
-        current_domain = ""
-        for ln in output_lines:
-            m = VAR_LINE_RE.match(ln.strip())
-            if m and m.group(1) == "BASE_DOMAIN":
-                current_domain = m.group(2).strip().strip('"').strip("'")
-                break
+        current_domain = env.get("BASE_DOMAIN").strip()
         prompt_msg = f"🌐 Domaine de base (BASE_DOMAIN) [{current_domain or 'vide'}] : "
         user_input = input(prompt_msg).strip()
         if user_input:
             domain = user_input
 
     if domain is not None:
-        # Remplacer ou ajouter BASE_DOMAIN
-        found = False
-        for i, ln in enumerate(output_lines):
-            m = VAR_LINE_RE.match(ln.strip())
-            if m and m.group(1) == "BASE_DOMAIN":
-                output_lines[i] = f"BASE_DOMAIN={domain}\n"
-                found = True
-                break
-        if not found:
-            output_lines.append(f"BASE_DOMAIN={domain}\n")
+        env.set("BASE_DOMAIN", domain)
         print(f"🌐 BASE_DOMAIN={domain}")
 
     # 📂 Ajout automatique des chemins dynamiques
     script_dir = os.path.dirname(os.path.abspath(__file__))
     base_path = script_dir
     infra_path = os.path.join(base_path, "DATAS")
-
-    output_lines = [
-        ln for ln in output_lines
-        if not ln.startswith("LOCAL_AI_BASE_PATH=") and not ln.startswith("LOCAL_AI_INFRA_PATH=")
-    ]
-    output_lines.append(f"LOCAL_AI_BASE_PATH={base_path}\n")
-    output_lines.append(f"LOCAL_AI_INFRA_PATH={infra_path}\n")
+    env.set("LOCAL_AI_BASE_PATH", base_path)
+    env.set("LOCAL_AI_INFRA_PATH", infra_path)
 
     # 🌐 Ajout automatique de SERVER_IP
-    output_lines = [ln for ln in output_lines if not ln.startswith("SERVER_IP=")]
-    output_lines.append(f"SERVER_IP={get_server_ip()}\n")
+    ip = get_server_ip()
+    env.set("SERVER_IP", ip)
 
     # 🌐 Expansion automatique BASE_DOMAIN → hostnames individuels
-    output_lines = expand_hostnames(output_lines)
-
-    # 💾 Sauvegarde et écriture
-    if os.path.exists(args.output):
-        os.replace(args.output, args.output + ".bak")
-    with open(args.output, "w", encoding="utf-8") as f:
-        f.writelines(output_lines)
-    try:
-        os.chmod(args.output, stat.S_IRUSR | stat.S_IWUSR)
-    except Exception:
-        pass
+    expand_hostnames(env, previous_domain)
+
+    # 💾 Sauvegarde (ancienne version en .bak) et rapport des changements
+    changes = previous.diff(env)
+    env.save(args.output)
 
     print(f"✅ Fichier .env généré : {args.output}")
     print(f"📁 LOCAL_AI_BASE_PATH={base_path}")
     print(f"📁 LOCAL_AI_INFRA_PATH={infra_path}")
+    if previous.index and changes:
+        print(f"📝 {len(changes.keys())} variable(s) modifiée(s) par rapport à l'ancien .env ({args.output}.bak) :")
+        for line in changes.describe():
+            print(line)
+        print("   Appliquer sans tout redémarrer : python3 start_services.py env apply")
+    elif previous.index:
+        print("📝 Aucune variable modifiée.")
 
     # 🚀 Docker Compose (optionnel)
     if args.docker:
@@ -337,17 +296,8 @@ def main():
             print(f"⚠️  Erreur Docker Compose : {e}")
 
     # 🌐 Affichage des services
-    # Lire le .env généré pour détecter BASE_DOMAIN et les hostnames
-    env_vars = {}
-    if os.path.exists(args.output):
-        with open(args.output, "r", encoding="utf-8") as f:
-            for ln in f:
-                m = VAR_LINE_RE.match(ln.strip())
-                if m:
-                    env_vars[m.group(1)] = m.group(2).strip().strip('"').strip("'")
-
+    env_vars = env.as_dict()
     base_domain = env_vars.get("BASE_DOMAIN", "").strip()
-    ip = get_server_ip()
 
     def svc_domain(hostname_var, subdomain):
         """Retourne l'URL domaine si BASE_DOMAIN défini, sinon None."""
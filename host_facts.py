@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+host_facts.py
+Host discovery shared by start_services.py, generate_env.py and the resource planner.
+
+GPU vendor and VRAM, primary IP, Docker / Compose versions, the SWAG
+container and its proxy-confs directory, and which of the stack's host
+ports are taken are probed once, concurrently, and cached in
+.localai/host-facts.json for --ttl seconds (LOCALAI_FACTS_TTL, default 600).
+The wizard, --dry-run and generate_env.py read the cache on repeat runs
+instead of forking nvidia-smi / docker again; --refresh-facts (or
+`facts --refresh`) probes anew.
+
+Usage:
+    python3 start_services.py facts              # cached facts (probes if stale)
+    python3 start_services.py facts --refresh    # probe now
+    python3 start_services.py facts --json
+"""
+
+import argparse
+import concurrent.futures
+import glob as globmod
+import json
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import time
+
+
+# ---------------------- CONSTANTS ---------------------- #
+
+CACHE_PATH = os.path.join(".localai", "host-facts.json")
+DEFAULT_TTL = int(os.environ.get("LOCALAI_FACTS_TTL", "600"))
+PROBE_TIMEOUT = 10
+
+SWAG_CONTAINER = "swag"
+SWAG_PROXY_CONFS = [
+    os.path.expanduser("~/swag/nginx/proxy-confs"),
+    "/etc/swag/nginx/proxy-confs",
+    "/volume1/docker/swag/nginx/proxy-confs",    # Synology
+    "/mnt/user/appdata/swag/nginx/proxy-confs",  # Unraid
+]
+# Host ports of the stack: "- 127.0.0.1:5678:5678" in the port overrides
+PORTS_OVERRIDES = ["docker-compose.override.private.yml", "docker-compose.override.public.yml"]
+PORT_LINE_RE = re.compile(r"^\s*-\s*[\"']?(?:[\d.]+:)?(\d+):\d+(?:/(tcp|udp))?[\"']?\s*$")
+
+
+# ---------------------- PROBES ---------------------- #
+
+def run(cmd, timeout=PROBE_TIMEOUT):
+    """stdout of a command, or None when it is missing, fails or hangs."""
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return proc.stdout if proc.returncode == 0 else None
+
+
+def run_all(*cmds):
+    """run() several commands at once; their outputs in order."""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(cmds)) as pool:
+        return list(pool.map(run, cmds))
+
+
+def detect_gpu_vendor():
+    """Detect GPU vendor from /proc and sysfs (falls back to vendor tools)."""
+    if os.path.isdir("/proc/driver/nvidia/gpus") or shutil.which("nvidia-smi"):
+        return "nvidia"
+    for path in globmod.glob("/sys/class/drm/card*/device/vendor"):
+        try:
+            with open(path, "r") as f:
+                if f.read().strip() == "0x1002":
+                    return "amd"
+        except OSError:
+            continue
+    if shutil.which("rocm-smi") or os.path.isdir("/opt/rocm"):
+        return "amd"
+    return "cpu"
+
+
+def read_amd_vram_mb():
+    """Sum VRAM of AMD GPUs exposed by the amdgpu driver in sysfs."""
+    total = 0
+    for path in globmod.glob("/sys/class/drm/card*/device/mem_info_vram_total"):
+        try:
+            with open(path, "r") as f:
+                total += int(f.read().strip()) // (1024 * 1024)
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+def read_nvidia_vram_mb():
+    """VRAM of the largest NVIDIA GPU.
+
+    The proprietary driver does not expose memory size in sysfs, so this
+    falls back to nvidia-smi when /proc/driver/nvidia shows a GPU.
+    """
+    if not os.path.isdir("/proc/driver/nvidia/gpus") and not shutil.which("nvidia-smi"):
+        return 0
+    out = run(["nvidia-smi", "--query-gpu=memory.total", "--format=csv,noheader,nounits"])
+    sizes = []
+    for line in (out or "").splitlines():
+        try:
+            sizes.append(int(float(line.strip())))
+        except ValueError:
+            continue
+    return max(sizes) if sizes else 0
+
+
+def probe_gpu():
+    vendor = detect_gpu_vendor()
+    if vendor == "nvidia":
+        vram_mb = read_nvidia_vram_mb()
+    elif vendor == "amd":
+        vram_mb = read_amd_vram_mb()
+    else:
+        vram_mb = 0
+    return {"vendor": vendor, "vram_mb": vram_mb}
+
+
+def probe_server_ip():
+    """Address of the interface holding the default route (no packet is sent)."""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(("8.8.8.8", 80))
+            return s.getsockname()[0]
+    except OSError:
+        return "127.0.0.1"
+
+
+def probe_docker():
+    out, compose = run_all(["docker", "version", "--format", "{{json .}}"],
+                           ["docker", "compose", "version", "--short"])
+    try:
+        version = json.loads(out) if out else {}
+    except ValueError:
+        version = {}
+    return {
+        "client": (version.get("Client") or {}).get("Version"),
+        "server": (version.get("Server") or {}).get("Version"),
+        "compose": compose.strip() if compose else None,
+    }
+
+
+def probe_swag():
+    """SWAG container state, its /config mount and the proxy-confs directory in use."""
+    # A stopped container still reports its mounts
+    names, mounts = run_all(
+        ["docker", "ps", "--filter", f"name={SWAG_CONTAINER}", "--format", "{{.Names}}"],
+        ["docker", "inspect", SWAG_CONTAINER, "--format",
+         "{{range .Mounts}}{{if eq .Destination \"/config\"}}{{.Source}}{{end}}{{end}}"])
+    running = SWAG_CONTAINER in (names or "").lower()
+    config_dir = (mounts or "").strip() or None
+    proxy_confs = next((p for p in SWAG_PROXY_CONFS if os.path.isdir(p)), None)
+    if not proxy_confs and config_dir and os.path.isdir(os.path.join(config_dir, "nginx", "proxy-confs")):
+        proxy_confs = os.path.join(config_dir, "nginx", "proxy-confs")
+    return {
+        "running": running,
+        "config_dir": config_dir,
+        "proxy_confs": proxy_confs,
+        "detected": running or proxy_confs is not None,
+    }
+
+
+def stack_ports(paths=PORTS_OVERRIDES):
+    ports = set()
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                m = PORT_LINE_RE.match(line)
+                if m:
+                    ports.add((int(m.group(1)), m.group(2) or "tcp"))
+    return sorted(ports)
+
+
+def probe_ports():
+    """Host ports of the stack that something (possibly the stack itself) already holds."""
+    from preflight import port_free
+    ports = stack_ports()
+    in_use = [f"{port}/{proto}" for port, proto in ports if not port_free("", port, proto)]
+    return {"checked": len(ports), "in_use": in_use}
+
+
+PROBES = {
+    "gpu": probe_gpu,
+    "server_ip": probe_server_ip,
+    "docker": probe_docker,
+    "swag": probe_swag,
+    "ports": probe_ports,
+}
+
+
+# ---------------------- CACHE ---------------------- #
+
+_memo = {}
+
+
+def collect():
+    """Run every probe concurrently; a failing probe yields None for its fact."""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(PROBES)) as pool:
+        futures = {name: pool.submit(probe) for name, probe in PROBES.items()}
+        facts = {}
+        for name, future in futures.items():
+            try:
+                facts[name] = future.result()
+            except Exception:
+                facts[name] = None
+    return facts
+
+
+def load_cache(path=CACHE_PATH):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def get_facts(refresh=False, ttl=DEFAULT_TTL, path=CACHE_PATH):
+    """Host facts from the cache when younger than ttl seconds, probed otherwise."""
+    if not refresh and path in _memo:
+        return _memo[path]
+    cached = None if refresh else load_cache(path)
+    if cached and time.time() - cached.get("collected_at", 0) < ttl and set(PROBES) <= set(cached["facts"]):
+        facts = cached["facts"]
+    else:
+        facts = collect()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "w") as f:
+                json.dump({"collected_at": time.time(), "facts": facts}, f, indent=2, sort_keys=True)
+            os.replace(path + ".tmp", path)
+        except OSError:
+            pass  # read-only checkout: still usable, just not cached
+    _memo[path] = facts
+    return facts
+
+
+def gpu_type(refresh=False):
+    """'nvidia', 'amd' or 'cpu'."""
+    return (get_facts(refresh)["gpu"] or {}).get("vendor", "cpu")
+
+
+def swag_proxy_dir(refresh=False):
+    """SWAG proxy-confs directory, re-probed if the cached one disappeared."""
+    path = (get_facts(refresh)["swag"] or {}).get("proxy_confs")
+    if path and not os.path.isdir(path) and not refresh:
+        return swag_proxy_dir(refresh=True)
+    return path
+
+
+# ---------------------- MAIN ---------------------- #
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="start_services.py facts",
+        description="Show the cached host facts (GPU, IP, Docker, SWAG, ports).",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--refresh", action="store_true", help="Probe the host instead of using the cache.")
+    parser.add_argument("--ttl", type=int, default=DEFAULT_TTL, help="Cache lifetime in seconds.")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    start = time.monotonic()
+    facts = get_facts(args.refresh, args.ttl)
+    seconds = time.monotonic() - start
+    if args.json:
+        print(json.dumps(facts, indent=2, sort_keys=True))
+        return 0
+    cached = load_cache() or {}
+    age = time.time() - cached.get("collected_at", time.time())
+    gpu = facts.get("gpu") or {}
+    docker = facts.get("docker") or {}
+    swag = facts.get("swag") or {}
+    ports = facts.get("ports") or {}
+    print(f"Host facts ({seconds:.2f}s, collected {age:.0f}s ago, ttl {args.ttl}s):")
+    print(f"  GPU:        {gpu.get('vendor', '?')}" + (f", {gpu['vram_mb']} MB VRAM" if gpu.get("vram_mb") else ""))
+    print(f"  Server IP:  {facts.get('server_ip')}")
+    print(f"  Docker:     client {docker.get('client') or '-'}, server {docker.get('server') or 'unreachable'}, "
+          f"compose {docker.get('compose') or '-'}")
+    print(f"  SWAG:       {'running' if swag.get('running') else 'not running'}"
+          + (f", config {swag['config_dir']}" if swag.get("config_dir") else "")
+          + (f", proxy-confs {swag['proxy_confs']}" if swag.get("proxy_confs") else ""))
+    print(f"  Ports:      {len(ports.get('in_use', []))}/{ports.get('checked', 0)} in use"
+          + (f" ({', '.join(ports['in_use'])})" if ports.get("in_use") else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,538 @@
+#!/usr/bin/env python3
+"""
+ingest.py
+Bulk document ingestion for the RAG stores (Qdrant or pgvector `documents_pg`).
+
+Replaces the one-chunk-per-call n8n path for large backfills:
+
+    files (./shared, streamed)
+      -> extract + chunk        (process pool)
+      -> batched /api/embed      (thread pool, N inputs per call)
+      -> batched upserts         (Qdrant REST or COPY into documents_pg)
+
+Every stage is bounded (in-flight files, in-flight embedding batches,
+upsert buffer) so memory stays flat whatever the corpus size. The records
+use the same layout as the n8n vector store nodes (`content`/`text` +
+`metadata.file_id` / `metadata.file_title`), so the existing agents can
+query them unchanged.
+
+Usage:
+    python3 start_services.py ingest --target qdrant --collection documents
+    python3 ingest.py --target pgvector --pg-dsn postgresql://postgres@localhost/test
+    python3 ingest.py --target none --embed-url http://127.0.0.1:18080   # stub server
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from embedding_cache import DEFAULT_CACHE_DIR, CachedEmbedder, EmbeddingCache
+from pg_utils import copy_escape, copy_in, quote_ident, quote_literal, run_sql
+from qdrant_tuning import DEFAULT_PRESET, PRESETS, RestQdrant, create_collection
+
+
+# ---------------------- CONSTANTS ---------------------- #
+
+DEFAULT_SOURCE = "./shared"
+# Path of ./shared inside the n8n container (what the workflows store as file_id)
+DEFAULT_FILE_ID_PREFIX = "/data/shared"
+DEFAULT_MODEL = "nomic-embed-text"
+DEFAULT_PG_TABLE = "documents_pg"
+DEFAULT_COLLECTION = "documents"
+
+TEXT_EXTENSIONS = {".txt", ".md", ".markdown", ".rst", ".html", ".htm", ".json", ".xml",
+                   ".yaml", ".yml", ".log", ".py", ".js", ".ts", ".sql"}
+PDF_EXTENSIONS = {".pdf"}
+
+# Stable namespace so re-ingesting a file produces the same point ids
+ID_NAMESPACE = uuid.UUID("6f1c2a8e-4d53-4c5e-9a55-1c0c2f8b7e10")
+
+# Same separators as LangChain's RecursiveCharacterTextSplitter (used by n8n)
+SEPARATORS = ["\n\n", "\n", " ", ""]
+
+
+# ---------------------- EXTRACT & CHUNK ---------------------- #
+
+def iter_files(root, extensions):
+    """Yield files under root depth-first without building the full list."""
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in sorted(entries, key=lambda e: e.name):
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in extensions:
+                        yield entry.path
+        except OSError as e:
+            print(f"  Skipping {current}: {e}", file=sys.stderr)
+
+
+def extract_text(path):
+    """Plain text of a document ('' if the format is not supported)."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in PDF_EXTENSIONS:
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            raise RuntimeError("PDF support needs `pip install pypdf`")
+        reader = PdfReader(path)
+        return "\n\n".join((page.extract_text() or "") for page in reader.pages)
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+def split_text(text, chunk_size=1000, chunk_overlap=0, separators=SEPARATORS):
+    """Recursive character splitter (same behaviour as the n8n default splitter)."""
+    separator = separators[-1]
+    rest = []
+    for i, sep in enumerate(separators):
+        if sep == "" or sep in text:
+            separator = sep
+            rest = separators[i + 1:]
+            break
+
+    pieces = text.split(separator) if separator else list(text)
+    chunks = []
+    current = []
+    current_len = 0
+    join_len = len(separator)
+
+    def flush():
+        if current:
+            chunk = separator.join(current).strip()
+            if chunk:
+                chunks.append(chunk)
+
+    for piece in pieces:
+        if len(piece) > chunk_size:
+            flush()
+            current, current_len = [], 0
+            if rest:
+                chunks.extend(split_text(piece, chunk_size, chunk_overlap, rest))
+            else:
+                chunks.extend(piece[i:i + chunk_size] for i in range(0, len(piece), chunk_size))
+            continue
+        extra = len(piece) + (join_len if current else 0)
+        if current_len + extra > chunk_size:
+            flush()
+            # Keep a tail of the previous chunk as overlap
+            while current and (current_len > chunk_overlap or current_len + len(piece) + join_len > chunk_size):
+                removed = current.pop(0)
+                current_len -= len(removed) + (join_len if current else 0)
+            extra = len(piece) + (join_len if current else 0)
+        current.append(piece)
+        current_len += extra
+    flush()
+    return chunks
+
+
+def load_chunks(task):
+    """Process-pool worker: extract and chunk one file."""
+    path, file_id, chunk_size, chunk_overlap = task
+    try:
+        text = extract_text(path)
+    except Exception as e:
+        return path, file_id, None, str(e)
+    return path, file_id, split_text(text, chunk_size, chunk_overlap), None
+
+
+# ---------------------- EMBEDDINGS ---------------------- #
+
+class OllamaEmbedder:
+    """Batched embeddings through Ollama's /api/embed."""
+
+    def __init__(self, url="http://127.0.0.1:11434", model=DEFAULT_MODEL, timeout=300):
+        self.url = url.rstrip("/") + "/api/embed"
+        self.model = model
+        self.timeout = timeout
+        self.calls = 0
+        self.seconds = 0.0
+
+    def embed(self, texts):
+        """Return one vector per input text (single HTTP call)."""
+        body = json.dumps({"model": self.model, "input": list(texts)}).encode()
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        start = time.monotonic()
+        for attempt in range(3):
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as resp:
+                    vectors = json.loads(resp.read())["embeddings"]
+                break
+            except (urllib.error.URLError, OSError) as e:
+                # A 4xx (unknown model, oversized input) fails the same way on every retry
+                if attempt == 2 or (isinstance(e, urllib.error.HTTPError) and e.code < 500):
+                    raise RuntimeError(f"embedding call failed: {e}")
+                time.sleep(1 + attempt)
+        self.calls += 1
+        self.seconds += time.monotonic() - start
+        if len(vectors) != len(texts):
+            raise RuntimeError(f"expected {len(texts)} embeddings, got {len(vectors)}")
+        return vectors
+
+
+# ---------------------- SINKS ---------------------- #
+
+def chunk_id(file_id, index):
+    return str(uuid.uuid5(ID_NAMESPACE, f"{file_id}#{index}"))
+
+
+class QdrantSink:
+    """Upsert points through the Qdrant REST API (n8n payload layout)."""
+
+    def __init__(self, url="http://127.0.0.1:6333", collection=DEFAULT_COLLECTION, api_key=None, preset=DEFAULT_PRESET):
+        self.url = url.rstrip("/")
+        self.collection = collection
+        self.api_key = api_key
+        self.preset = preset
+        self.ready = False
+        self.cleared = set()
+
+    def _request(self, method, path, payload=None):
+        data = json.dumps(payload).encode() if payload is not None else None
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["api-key"] = self.api_key
+        request = urllib.request.Request(self.url + path, data=data, headers=headers, method=method)
+        with urllib.request.urlopen(request, timeout=120) as resp:
+            return json.loads(resp.read() or b"{}")
+
+    def ensure_collection(self, dim):
+        if self.ready:
+            return
+        try:
+            self._request("GET", f"/collections/{self.collection}")
+        except urllib.error.HTTPError as e:
+            if e.code != 404:
+                raise
+            # Tuned config + metadata.file_id index; existing collections are left to `qdrant bootstrap`
+            create_collection(RestQdrant(self.url, api_key=self.api_key), self.collection, dim, self.preset)
+        self.ready = True
+
+    def delete(self, file_ids):
+        """Remove every point of the given files."""
+        if file_ids:
+            self._request("POST", f"/collections/{self.collection}/points/delete?wait=true", {
+                "filter": {"should": [{"key": "metadata.file_id", "match": {"value": f}} for f in file_ids]}
+            })
+
+    def write(self, records):
+        self.ensure_collection(len(records[0]["vector"]))
+        stale = sorted({r["file_id"] for r in records} - self.cleared)
+        if stale:
+            self.delete(stale)
+            self.cleared.update(stale)
+        self._request("PUT", f"/collections/{self.collection}/points?wait=true", {"points": [
+            {"id": r["id"], "vector": r["vector"],
+             "payload": {"content": r["text"], "metadata": r["metadata"]}}
+            for r in records
+        ]})
+
+
+class PgVectorSink:
+    """COPY rows into the n8n PGVector table, replacing each file's previous chunks."""
+
+    def __init__(self, table=DEFAULT_PG_TABLE, database="postgres", dsn=None):
+        self.table = table
+        self.database = database
+        self.dsn = dsn
+        self.ready = False
+        self.cleared = set()
+
+    def ensure_table(self, dim):
+        if self.ready:
+            return
+        run_sql(
+            "CREATE EXTENSION IF NOT EXISTS vector;\n"
+            f"CREATE TABLE IF NOT EXISTS {quote_ident(self.table)} ("
+            "id uuid PRIMARY KEY, text text, metadata jsonb, "
+            f"embedding vector({dim}));",
+            database=self.database, dsn=self.dsn,
+        )
+        self.ready = True
+
+    def delete(self, file_ids):
+        """Remove every row of the given files."""
+        if file_ids:
+            files = ",".join(quote_literal(f) for f in file_ids)
+            run_sql(f"DELETE FROM {quote_ident(self.table)} WHERE metadata->>'file_id' IN ({files});",
+                    database=self.database, dsn=self.dsn)
+
+    def write(self, records):
+        self.ensure_table(len(records[0]["vector"]))
+        table = quote_ident(self.table)
+        stale = sorted({r["file_id"] for r in records} - self.cleared)
+        ids = ",".join(quote_literal(r["id"]) for r in records)
+        before = f"DELETE FROM {table} WHERE id IN ({ids})"
+        if stale:
+            files = ",".join(quote_literal(f) for f in stale)
+            before += f"; DELETE FROM {table} WHERE metadata->>'file_id' IN ({files})"
+
+        def lines():
+            for r in records:
+                vector = "[" + ",".join(repr(float(x)) for x in r["vector"]) + "]"
+                yield "\t".join((r["id"], copy_escape(r["text"]), copy_escape(r["metadata"]), vector))
+
+        copy_in(f"COPY {table} (id, text, metadata, embedding) FROM STDIN", lines(),
+                before_sql=before, database=self.database, dsn=self.dsn)
+        self.cleared.update(stale)
+
+
+class NullSink:
+    """Discard records (benchmarking extraction + embeddings only)."""
+
+    def delete(self, file_ids):
+        pass
+
+    def write(self, records):
+        pass
+
+
+# ---------------------- PIPELINE ---------------------- #
+
+class IngestStats:
+    def __init__(self):
+        self.start = time.monotonic()
+        self.files = 0
+        self.failed = 0
+        self.failed_ids = []
+        self.empty_ids = []
+        self.chunks = 0
+        self.embedded = 0
+        self.written = 0
+        self.embed_seconds = 0.0
+        self.write_seconds = 0.0
+
+    def line(self):
+        elapsed = max(1e-6, time.monotonic() - self.start)
+        return (f"files={self.files} failed={self.failed} chunks={self.chunks} "
+                f"embedded={self.embedded} written={self.written} "
+                f"{self.chunks / elapsed:.1f} chunks/s {self.embedded / elapsed:.1f} embeddings/s")
+
+
+class IngestPipeline:
+    """Bounded extract -> embed -> upsert pipeline."""
+
+    def __init__(self, embedder, sink, embed_batch=64, upsert_batch=512, embed_concurrency=2,
+                 workers=None, chunk_size=1000, chunk_overlap=0, progress_every=5.0):
+        self.embedder = embedder
+        self.sink = sink
+        self.embed_batch = embed_batch
+        self.upsert_batch = upsert_batch
+        self.embed_concurrency = embed_concurrency
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.progress_every = progress_every
+        self.stats = IngestStats()
+        self.pending = []       # chunks waiting for an embedding batch
+        self.ready = []         # embedded records waiting for an upsert
+        self.inflight = set()   # embedding futures
+
+    def run(self, files):
+        """files: iterable of (path, file_id). Returns the stats."""
+        last_report = time.monotonic()
+        with ProcessPoolExecutor(max_workers=self.workers) as procs, \
+                ThreadPoolExecutor(max_workers=self.embed_concurrency) as threads:
+            self.threads = threads
+            loading = deque()
+            for path, file_id in files:
+                loading.append(procs.submit(load_chunks, (path, file_id, self.chunk_size, self.chunk_overlap)))
+                # Bound the number of files extracted ahead of the embedder
+                while len(loading) >= self.workers * 2:
+                    self._take_file(loading.popleft().result())
+                if time.monotonic() - last_report >= self.progress_every:
+                    print(f"  {self.stats.line()}")
+                    last_report = time.monotonic()
+            while loading:
+                self._take_file(loading.popleft().result())
+            self._submit_embeddings(final=True)
+            self._drain_embeddings(0)
+            self._flush(final=True)
+        return self.stats
+
+    def _take_file(self, result):
+        path, file_id, chunks, error = result
+        if error is not None:
+            self.stats.failed += 1
+            self.stats.failed_ids.append(file_id)
+            print(f"  FAILED {path}: {error}", file=sys.stderr)
+            return
+        self.stats.files += 1
+        if not chunks:
+            # Nothing will be written for it, so the sink never replaces its old chunks
+            self.stats.empty_ids.append(file_id)
+        title = os.path.splitext(os.path.basename(path))[0]
+        for index, text in enumerate(chunks):
+            self.pending.append({
+                "id": chunk_id(file_id, index),
+                "file_id": file_id,
+                "text": text,
+                "metadata": {"file_id": file_id, "file_title": title},
+            })
+        self.stats.chunks += len(chunks)
+        self._submit_embeddings()
+
+    def _submit_embeddings(self, final=False):
+        while len(self.pending) >= self.embed_batch or (final and self.pending):
+            batch, self.pending = self.pending[:self.embed_batch], self.pending[self.embed_batch:]
+            # Never more than embed_concurrency batches in flight
+            self._drain_embeddings(self.embed_concurrency - 1)
+            self.inflight.add(self.threads.submit(self._embed_batch, batch))
+
+    def _embed_batch(self, batch):
+        start = time.monotonic()
+        vectors = self.embedder.embed([r["text"] for r in batch])
+        for record, vector in zip(batch, vectors):
+            record["vector"] = vector
+        return batch, time.monotonic() - start
+
+    def _drain_embeddings(self, keep):
+        while len(self.inflight) > keep:
+            done, self.inflight = wait(self.inflight, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch, seconds = future.result()
+                self.stats.embedded += len(batch)
+                self.stats.embed_seconds += seconds
+                self.ready.extend(batch)
+            self._flush()
+
+    def _flush(self, final=False):
+        while len(self.ready) >= self.upsert_batch or (final and self.ready):
+            batch, self.ready = self.ready[:self.upsert_batch], self.ready[self.upsert_batch:]
+            start = time.monotonic()
+            self.sink.write(batch)
+            self.stats.write_seconds += time.monotonic() - start
+            self.stats.written += len(batch)
+
+
+def build_sink(args):
+    if args.target == "qdrant":
+        return QdrantSink(args.qdrant_url, args.collection, api_key=args.qdrant_api_key,
+                          preset=args.qdrant_preset)
+    if args.target == "pgvector":
+        return PgVectorSink(args.table, database=args.database, dsn=args.pg_dsn)
+    return NullSink()
+
+
+def build_parser(prog="start_services.py ingest",
+                 description="Bulk-ingest documents into Qdrant or pgvector with batched Ollama embeddings."):
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description=description,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--source", default=DEFAULT_SOURCE, help="Folder to ingest (recursively).")
+    parser.add_argument("--file-id-prefix", default=DEFAULT_FILE_ID_PREFIX,
+                        help="Path --source has inside the n8n container (stored as metadata.file_id).")
+    parser.add_argument("--target", choices=["qdrant", "pgvector", "none"], default="qdrant")
+    parser.add_argument("--embed-url", default="http://127.0.0.1:11434", help="Ollama base URL.")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Embedding model.")
+    parser.add_argument("--embed-batch", type=int, default=64, help="Chunks per /api/embed call.")
+    parser.add_argument("--embed-concurrency", type=int, default=2, help="Embedding calls in flight.")
+    parser.add_argument("--upsert-batch", type=int, default=512, help="Records per upsert.")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (default: cores - 1).")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=0)
+    parser.add_argument("--qdrant-url", default="http://127.0.0.1:6333")
+    parser.add_argument("--qdrant-api-key", default=os.environ.get("QDRANT_API_KEY"))
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION)
+    parser.add_argument("--qdrant-preset", choices=sorted(PRESETS), default=DEFAULT_PRESET,
+                        help="Config of a collection created by the ingest (see `qdrant presets`).")
+    parser.add_argument("--table", default=DEFAULT_PG_TABLE, help="pgvector table.")
+    parser.add_argument("--database", default="postgres", help="Database inside the postgres container.")
+    parser.add_argument("--pg-dsn", default=None, help="Use a local psql with this DSN instead of docker exec.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help="Embedding cache (reuses vectors of unchanged chunks).")
+    parser.add_argument("--no-cache", action="store_true", help="Always call Ollama.")
+    parser.add_argument("--extensions", nargs="+", default=None,
+                        help="File extensions to ingest (default: text formats + .pdf).")
+    return parser
+
+
+def source_extensions(args):
+    if args.extensions:
+        return {e.lower() if e.startswith(".") else "." + e.lower() for e in args.extensions}
+    return TEXT_EXTENSIONS | PDF_EXTENSIONS
+
+
+def file_id_for(source, prefix, path):
+    """Container path the n8n workflows use as metadata.file_id."""
+    rel = os.path.relpath(path, source).replace(os.sep, "/")
+    return prefix.rstrip("/") + "/" + rel
+
+
+def source_files(args):
+    source = os.path.abspath(args.source)
+    for path in iter_files(source, source_extensions(args)):
+        yield path, file_id_for(source, args.file_id_prefix, path)
+
+
+def make_embedder(args):
+    embedder = OllamaEmbedder(args.embed_url, args.model)
+    if args.no_cache:
+        return embedder
+    return CachedEmbedder(embedder, EmbeddingCache(args.cache_dir), args.model)
+
+
+def print_report(stats, embedder):
+    elapsed = max(1e-6, time.monotonic() - stats.start)
+    print("\n" + "=" * 50)
+    print("  INGESTION REPORT")
+    print("=" * 50)
+    print(f"  Files:         {stats.files} ok, {stats.failed} failed")
+    print(f"  Chunks:        {stats.chunks} ({stats.chunks / elapsed:.1f}/s)")
+    print(f"  Embeddings:    {stats.embedded} ({stats.embedded / elapsed:.1f}/s) "
+          f"in {embedder.calls} calls")
+    print(f"  Written:       {stats.written}")
+    print(f"  Time:          {elapsed:.1f}s total, {stats.embed_seconds:.1f}s embedding, "
+          f"{stats.write_seconds:.1f}s writing")
+    if isinstance(embedder, CachedEmbedder):
+        cache = embedder.report()
+        print(f"  Cache:         {cache['hits']} hits / {cache['misses']} misses "
+              f"({cache['hit_ratio'] * 100:.1f}% hit ratio)")
+        print(f"  Time saved:    ~{cache['saved_seconds']:.1f}s of embedding "
+              f"({cache['embed_seconds']:.1f}s spent on misses)")
+    print("=" * 50)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not os.path.isdir(args.source):
+        print(f"Source folder {args.source} not found.")
+        return 1
+
+    embedder = make_embedder(args)
+    pipeline = IngestPipeline(
+        embedder, build_sink(args), embed_batch=args.embed_batch, upsert_batch=args.upsert_batch,
+        embed_concurrency=args.embed_concurrency, workers=args.workers,
+        chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap,
+    )
+    print(f"Ingesting {args.source} -> {args.target} (model {args.model}, "
+          f"{args.embed_batch} chunks/call, {pipeline.workers} extract workers)")
+    try:
+        stats = pipeline.run(source_files(args))
+    except KeyboardInterrupt:
+        print("\nInterrupted.")
+        print_report(pipeline.stats, embedder)
+        return 130
+    except RuntimeError as e:
+        print(f"\nIngest aborted: {e}")
+        print_report(pipeline.stats, embedder)
+        return 1
+    print_report(stats, embedder)
+    return 0 if stats.failed == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
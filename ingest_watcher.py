@@ -0,0 +1,605 @@
+#!/usr/bin/env python3
+"""
+ingest_watcher.py
+Watch ./shared and feed changes to the bulk ingestion pipeline.
+
+n8n's localFileTrigger starts one workflow execution per filesystem event,
+so an editor saving five times or a `cp -r` of 2,000 files turns into an
+execution storm. This daemon sits in front of `ingest` instead:
+
+    inotify (or polling)  ->  per-path debounce  ->  batched jobs  ->  ingest pipeline
+                              (coalesce events)      (bounded queue)   (sha256 skip)
+
+- events for the same path are merged until it has been quiet for
+  --quiet seconds (--max-delay caps the wait for files that never settle)
+- ready paths are grouped into jobs of up to --batch-files files, so a
+  large copy becomes a handful of bulk jobs
+- the job queue is bounded (--max-jobs): while it is full, new events keep
+  coalescing in the debouncer instead of piling up as jobs
+- files whose sha256 did not change since the last ingestion are skipped;
+  deleted files are removed from the vector store
+
+Queue length and lag are printed periodically and served as Prometheus
+metrics on /metrics (--port).
+
+Usage:
+    python3 start_services.py ingest-watch --target qdrant
+    python3 start_services.py ingest-watch --target pgvector --once     # reconcile and exit
+"""
+
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ingest import (
+    IngestPipeline, build_parser, build_sink, file_id_for, make_embedder, source_extensions,
+)
+
+
+STATE_DIR = ".localai"
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct("iIII")
+
+# Event kinds handed to the debouncer / reconciler
+CHANGE = "change"
+DELETE = "delete"
+RESCAN = "rescan"
+
+
+# ---------------------- WATCHERS ---------------------- #
+
+class InotifyWatcher:
+    """Recursive inotify watch through ctypes (Linux only).
+
+    read() returns a list of (kind, path). New directories are watched as
+    they appear and reported as RESCAN so files copied into them before the
+    watch existed are not missed; a queue overflow rescans the whole tree.
+    """
+
+    def __init__(self, root):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self.libc = libc
+        self.root = root
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs = {}
+        self.add_tree(root)
+
+    def add_tree(self, top):
+        for current, subdirs, _ in os.walk(top):
+            subdirs[:] = [d for d in subdirs if not d.startswith(".")]
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(current), WATCH_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                if errno == 28:  # ENOSPC
+                    raise OSError(errno, "inotify watch limit reached "
+                                         "(raise fs.inotify.max_user_watches or use --poll)")
+                continue
+            self.dirs[wd] = current
+
+    def read(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                events.append((RESCAN, self.root))
+                continue
+            directory = self.dirs.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self.add_tree(path)
+                events.append((RESCAN, path))
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                events.append((DELETE, path))
+            else:
+                events.append((CHANGE, path))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback for hosts without inotify (macOS, some bind mounts): diff stat snapshots."""
+
+    def __init__(self, root, wanted, interval=2.0):
+        self.root = root
+        self.wanted = wanted
+        self.interval = interval
+        self.snapshot = self.scan()
+        self.next_scan = time.monotonic() + interval
+
+    def scan(self):
+        snapshot = {}
+        for current, subdirs, files in os.walk(self.root):
+            subdirs[:] = [d for d in subdirs if not d.startswith(".")]
+            for name in files:
+                path = os.path.join(current, name)
+                if not self.wanted(path):
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def read(self, timeout):
+        delay = self.next_scan - time.monotonic()
+        if delay > 0:
+            time.sleep(min(delay, timeout))
+            if time.monotonic() < self.next_scan:
+                return []
+        self.next_scan = time.monotonic() + self.interval
+        current = self.scan()
+        events = [(CHANGE, p) for p, sig in current.items() if self.snapshot.get(p) != sig]
+        events += [(DELETE, p) for p in self.snapshot if p not in current]
+        self.snapshot = current
+        return events
+
+    def close(self):
+        pass
+
+
+# ---------------------- DEBOUNCE & STATE ---------------------- #
+
+class Debouncer:
+    """Coalesce events per path until the path has been quiet long enough."""
+
+    def __init__(self, quiet=2.0, max_delay=30.0):
+        self.quiet = quiet
+        self.max_delay = max_delay
+        self.pending = {}   # path -> [first_seen, last_seen, kind]
+        self.last_event = 0.0
+
+    def add(self, kind, path, now):
+        entry = self.pending.get(path)
+        if entry is None:
+            self.pending[path] = [now, now, kind]
+        else:
+            entry[1] = now
+            entry[2] = kind     # the latest event wins (write then delete = delete)
+        self.last_event = now
+
+    def oldest(self):
+        return min((e[0] for e in list(self.pending.values())), default=None)
+
+    def take(self, now, limit, flush=False):
+        """Pop up to `limit` settled paths as (path, kind, first_seen), oldest first.
+
+        Settled paths are only released once a full batch is ready, the whole
+        tree has been quiet for `quiet` seconds, or something waited `max_delay`;
+        that keeps a large copy from trickling out as many tiny jobs.
+        """
+        settled = [(e[0], path) for path, e in self.pending.items()
+                   if flush or now - e[1] >= self.quiet or now - e[0] >= self.max_delay]
+        if not settled:
+            return []
+        settled.sort()
+        tree_quiet = now - self.last_event >= self.quiet
+        overdue = now - settled[0][0] >= self.max_delay
+        if not (flush or tree_quiet or overdue or len(settled) >= limit):
+            return []
+        batch = []
+        for first_seen, path in settled[:limit]:
+            _, _, kind = self.pending.pop(path)
+            batch.append((path, kind, first_seen))
+        return batch
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class HashState:
+    """file_id -> sha256 of the content last ingested, persisted as JSON."""
+
+    def __init__(self, path):
+        self.path = path
+        self.hashes = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.hashes = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"  Ignoring unreadable state {path}: {e}", file=sys.stderr)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.hashes, f, separators=(",", ":"), sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+# ---------------------- DAEMON ---------------------- #
+
+class WatchStats:
+    def __init__(self):
+        self.events = 0
+        self.jobs = 0
+        self.ingested = 0
+        self.unchanged = 0
+        self.deleted = 0
+        self.failed = 0
+        self.backpressure = 0
+        self.last_job_seconds = 0.0
+
+
+class IngestWatcher:
+    """Debounced, batched hand-off from filesystem events to IngestPipeline."""
+
+    def __init__(self, args):
+        self.args = args
+        self.source = os.path.abspath(args.source)
+        self.extensions = source_extensions(args)
+        self.embedder = make_embedder(args)
+        target_name = args.collection if args.target == "qdrant" else args.table
+        self.state = HashState(args.state_file or os.path.join(
+            STATE_DIR, f"ingest-watch-{args.target}-{target_name}.json"))
+        self.debouncer = Debouncer(args.quiet, args.max_delay)
+        self.jobs = queue.Queue(maxsize=args.max_jobs)
+        self.stats = WatchStats()
+        self.lock = threading.Lock()
+        self.queued = {}        # job id -> (file count, oldest first_seen)
+        self.running = None     # (file count, oldest first_seen) of the job being ingested
+        self.next_job = 1
+
+    # ----- paths -----
+
+    def wanted(self, path):
+        rel = os.path.relpath(path, self.source)
+        if rel.startswith("..") or any(part.startswith(".") for part in rel.split(os.sep)):
+            return False
+        return os.path.splitext(path)[1].lower() in self.extensions
+
+    def file_id(self, path):
+        return file_id_for(self.source, self.args.file_id_prefix, path)
+
+    def path_for(self, file_id):
+        prefix = self.args.file_id_prefix.rstrip("/") + "/"
+        return os.path.join(self.source, *file_id[len(prefix):].split("/"))
+
+    def reconcile(self, top, now):
+        """Queue every wanted file under `top`, and deletions for ingested files that vanished."""
+        top = os.path.abspath(top)
+        seen = set()
+        for current, subdirs, files in os.walk(top):
+            subdirs[:] = [d for d in subdirs if not d.startswith(".")]
+            for name in files:
+                path = os.path.join(current, name)
+                if self.wanted(path):
+                    seen.add(path)
+                    self.debouncer.add(CHANGE, path, now)
+        prefix = self.file_id(top).rstrip("/") + "/" if top != self.source else ""
+        for file_id in list(self.state.hashes):
+            if prefix and not file_id.startswith(prefix):
+                continue
+            path = self.path_for(file_id)
+            if path not in seen and not os.path.exists(path):
+                self.debouncer.add(DELETE, path, now)
+
+    # ----- producer side -----
+
+    def handle(self, events, now):
+        for kind, path in events:
+            self.stats.events += 1
+            if kind == RESCAN:
+                self.reconcile(path, now)
+            elif self.wanted(path):
+                self.debouncer.add(kind, path, now)
+
+    def dispatch(self, now, flush=False):
+        """Move settled paths into jobs while the queue has room."""
+        while self.debouncer.pending:
+            if self.jobs.full():
+                self.stats.backpressure += 1
+                return
+            batch = self.debouncer.take(now, self.args.batch_files, flush=flush)
+            if not batch:
+                return
+            with self.lock:
+                job_id = self.next_job
+                self.next_job += 1
+                self.queued[job_id] = (len(batch), min(b[2] for b in batch))
+            self.jobs.put((job_id, batch))
+
+    # ----- consumer side -----
+
+    def worker(self):
+        while True:
+            item = self.jobs.get()
+            if item is None:
+                return
+            job_id, batch = item
+            with self.lock:
+                self.running = self.queued.pop(job_id)
+            try:
+                self.run_job(job_id, batch)
+            except Exception as e:
+                self.stats.failed += len(batch)
+                print(f"  Job {job_id} failed: {e}", file=sys.stderr)
+            finally:
+                with self.lock:
+                    self.running = None
+                self.jobs.task_done()
+
+    def run_job(self, job_id, batch):
+        start = time.monotonic()
+        changed, hashes, deleted = [], {}, []
+        unchanged = 0
+        for path, kind, _ in batch:
+            file_id = self.file_id(path)
+            if kind == DELETE or not os.path.isfile(path):
+                if file_id in self.state.hashes:
+                    deleted.append(file_id)
+                continue
+            try:
+                digest = file_sha256(path)
+            except OSError as e:
+                self.stats.failed += 1
+                print(f"  FAILED {path}: {e}", file=sys.stderr)
+                continue
+            if self.state.hashes.get(file_id) == digest:
+                unchanged += 1
+                continue
+            changed.append((path, file_id))
+            hashes[file_id] = digest
+
+        sink = build_sink(self.args)
+        if deleted:
+            sink.delete(deleted)
+            for file_id in deleted:
+                self.state.hashes.pop(file_id, None)
+        failed = 0
+        if changed:
+            workers = self.args.workers or max(1, (os.cpu_count() or 2) - 1)
+            pipeline = IngestPipeline(
+                self.embedder, sink, embed_batch=self.args.embed_batch,
+                upsert_batch=self.args.upsert_batch, embed_concurrency=self.args.embed_concurrency,
+                workers=min(workers, len(changed)),
+                chunk_size=self.args.chunk_size, chunk_overlap=self.args.chunk_overlap,
+            )
+            stats = pipeline.run(changed)
+            failed = stats.failed
+            # A file edited down to no text: drop its old vectors like a deleted file
+            if stats.empty_ids:
+                sink.delete(stats.empty_ids)
+            # Files that failed to load keep their old hash so the next change retries them
+            failed_ids = set(stats.failed_ids)
+            for file_id, digest in hashes.items():
+                if file_id not in failed_ids:
+                    self.state.hashes[file_id] = digest
+        if deleted or changed:
+            self.state.save()
+
+        elapsed = time.monotonic() - start
+        self.stats.jobs += 1
+        self.stats.ingested += len(changed) - failed
+        self.stats.failed += failed
+        self.stats.unchanged += unchanged
+        self.stats.deleted += len(deleted)
+        self.stats.last_job_seconds = elapsed
+        print(f"  Job {job_id}: {len(changed) - failed} ingested, {unchanged} unchanged, "
+              f"{len(deleted)} deleted, {failed} failed in {elapsed:.1f}s")
+
+    # ----- observability -----
+
+    def snapshot(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            queued = list(self.queued.values())
+            running = self.running
+        oldest = [t for t in [self.debouncer.oldest()] + [q[1] for q in queued] +
+                  [running[1] if running else None] if t is not None]
+        return {
+            "pending_paths": len(self.debouncer.pending),
+            "queued_jobs": len(queued),
+            "queued_files": sum(q[0] for q in queued),
+            "running_files": running[0] if running else 0,
+            "lag_seconds": now - min(oldest) if oldest else 0.0,
+        }
+
+    def status_line(self):
+        snap = self.snapshot()
+        s = self.stats
+        return (f"pending={snap['pending_paths']} queued_jobs={snap['queued_jobs']} "
+                f"queued_files={snap['queued_files']} running={snap['running_files']} "
+                f"lag={snap['lag_seconds']:.1f}s | jobs={s.jobs} ingested={s.ingested} "
+                f"unchanged={s.unchanged} deleted={s.deleted} failed={s.failed}")
+
+    def render_metrics(self):
+        snap = self.snapshot()
+        s = self.stats
+        lines = []
+
+        def metric(name, kind, help_text, rows):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in rows:
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        metric("localai_ingest_watch_pending_paths", "gauge",
+               "Paths waiting in the debouncer.", [((), snap["pending_paths"])])
+        metric("localai_ingest_watch_queued_jobs", "gauge",
+               "Batched jobs waiting for the ingestion worker.", [((), snap["queued_jobs"])])
+        metric("localai_ingest_watch_queued_files", "gauge",
+               "Files in queued jobs.", [((), snap["queued_files"])])
+        metric("localai_ingest_watch_lag_seconds", "gauge",
+               "Age of the oldest event not yet ingested.", [((), round(snap["lag_seconds"], 3))])
+        metric("localai_ingest_watch_events_total", "counter",
+               "Filesystem events received.", [((), s.events)])
+        metric("localai_ingest_watch_jobs_total", "counter",
+               "Ingestion jobs completed.", [((), s.jobs)])
+        metric("localai_ingest_watch_files_total", "counter", "Files processed by result.", [
+            ((("result", "ingested"),), s.ingested), ((("result", "unchanged"),), s.unchanged),
+            ((("result", "deleted"),), s.deleted), ((("result", "failed"),), s.failed),
+        ])
+        metric("localai_ingest_watch_backpressure_total", "counter",
+               "Dispatch attempts deferred because the job queue was full.", [((), s.backpressure)])
+        metric("localai_ingest_watch_last_job_seconds", "gauge",
+               "Duration of the last job.", [((), round(s.last_job_seconds, 3))])
+        return "\n".join(lines) + "\n"
+
+    def serve_metrics(self, bind, port):
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/metrics"):
+                    body = daemon.render_metrics().encode()
+                    ctype = "text/plain; version=0.0.4; charset=utf-8"
+                    status = 200
+                elif self.path.startswith("/healthz"):
+                    body, ctype, status = b"ok\n", "text/plain", 200
+                else:
+                    body, ctype, status = b"not found\n", "text/plain", 404
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((bind, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    # ----- main loop -----
+
+    def open_watcher(self):
+        if not self.args.poll and sys.platform.startswith("linux"):
+            try:
+                return InotifyWatcher(self.source)
+            except OSError as e:
+                print(f"  inotify unavailable ({e}), falling back to polling.")
+        return PollingWatcher(self.source, self.wanted, self.args.poll_interval)
+
+    def run(self):
+        worker = threading.Thread(target=self.worker, daemon=True)
+        worker.start()
+        if not self.args.no_initial_scan or self.args.once:
+            self.reconcile(self.source, time.monotonic())
+
+        if self.args.once:
+            self.dispatch(time.monotonic(), flush=True)
+            while self.debouncer.pending:
+                time.sleep(0.2)
+                self.dispatch(time.monotonic(), flush=True)
+            self.jobs.put(None)
+            worker.join()
+            return
+
+        watcher = self.open_watcher()
+        print(f"Watching {self.source} ({type(watcher).__name__}, quiet {self.args.quiet}s, "
+              f"batches of {self.args.batch_files} files, {self.args.max_jobs} queued jobs max)")
+        last_status = time.monotonic()
+        try:
+            while True:
+                events = watcher.read(0.5)
+                now = time.monotonic()
+                self.handle(events, now)
+                self.dispatch(now)
+                if self.args.status_every and now - last_status >= self.args.status_every:
+                    print(f"  {self.status_line()}")
+                    last_status = now
+        finally:
+            watcher.close()
+
+
+def main(argv=None):
+    parser = build_parser(
+        prog="start_services.py ingest-watch",
+        description="Watch the shared folder and ingest changes in debounced, batched jobs.",
+    )
+    parser.add_argument("--quiet", type=float, default=2.0,
+                        help="Seconds a path must stay unchanged before it is ingested.")
+    parser.add_argument("--max-delay", type=float, default=30.0,
+                        help="Ingest a path after this many seconds even if it keeps changing.")
+    parser.add_argument("--batch-files", type=int, default=200, help="Max files per ingestion job.")
+    parser.add_argument("--max-jobs", type=int, default=2,
+                        help="Queued jobs before new events are held back in the debouncer.")
+    parser.add_argument("--state-file", default=None,
+                        help="Hash state (default: .localai/ingest-watch-<target>-<name>.json).")
+    parser.add_argument("--no-initial-scan", action="store_true",
+                        help="Do not reconcile the folder with the hash state at startup.")
+    parser.add_argument("--once", action="store_true", help="Reconcile once, ingest the changes and exit.")
+    parser.add_argument("--poll", action="store_true", help="Poll instead of using inotify.")
+    parser.add_argument("--poll-interval", type=float, default=2.0)
+    parser.add_argument("--status-every", type=float, default=30.0,
+                        help="Print queue length and lag every N seconds (0 disables).")
+    parser.add_argument("--port", type=int, default=9465, help="Metrics port (0 disables the endpoint).")
+    parser.add_argument("--bind", default="127.0.0.1", help="Metrics bind address.")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.source):
+        print(f"Source folder {args.source} not found.")
+        return 1
+
+    daemon = IngestWatcher(args)
+    if args.port and not args.once:
+        daemon.serve_metrics(args.bind, args.port)
+        print(f"Prometheus metrics on http://{args.bind}:{args.port}/metrics")
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        print("\nStopped.")
+    print(f"  {daemon.status_line()}")
+    return 0 if daemon.stats.failed == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -26,4 +26,8 @@ JSEOF
 
 echo "config.js generated (BASE_DOMAIN=${DOMAIN:-none}, IP=${IP})"
 
+# Background status poller behind /status.json (the page falls back to
+# "configured" dots if it is not running)
+python3 /status_server.py &
+
 exec nginx -g 'daemon off;'
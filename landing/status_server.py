@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+status_server.py
+Aggregated service status for the landing hub.
+
+Runs inside the landing container next to nginx. A single background
+poller checks every service's health endpoint over the compose network
+every STATUS_INTERVAL seconds (each probe bounded by STATUS_TIMEOUT) and
+caches state, HTTP code, latency and timestamps. nginx proxies
+/status.json to it, so the page polls one same-origin URL instead of
+every browser probing eleven services (which CORS would block anyway).
+
+The compact document is only re-rendered when something the page shows
+changes (a state, or latency crossing a LATENCY_STEP_MS bucket); it
+carries an ETag and answers If-None-Match with 304, so steady-state polls
+cost a header exchange.
+
+Endpoints:
+    /status.json        compact {service: {state, code, ms, since}}
+    /status/full.json   the raw cache (exact latency, checked_at, error)
+    /healthz
+
+Environment:
+    STATUS_LISTEN       127.0.0.1:8099
+    STATUS_INTERVAL     15    seconds between rounds
+    STATUS_TIMEOUT      3     seconds per probe
+    STATUS_TARGETS      extra/overriding "key=url,key=url" (empty url disables)
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import sys
+import time
+from email.utils import formatdate
+from urllib.parse import urlsplit
+
+
+# ---------------------- CONSTANTS ---------------------- #
+
+# Keys match the cards of index.html; hosts are compose service names
+DEFAULT_TARGETS = {
+    "ollama": "http://ollama:11434/api/version",
+    "openwebui": "http://open-webui:8080/health",
+    "n8n": "http://n8n:5678/healthz",
+    "flowise": "http://flowise:3001/",
+    "qdrant": "http://qdrant:6333/readyz",
+    "neo4j": "http://neo4j:7474/",
+    "langfuse": "http://langfuse-web:3000/api/public/health",
+    "searxng": "http://searxng:8080/healthz",
+    "unsloth": "http://unsloth:8888/",
+    "supabase": "http://kong:8000/",
+}
+
+LATENCY_STEP_MS = 100
+MAX_HEADER_LINES = 50
+
+# up: answered below 500 (auth walls and 404 on "/" still mean the server is alive)
+# error: answered 5xx   down: refused / timed out   absent: no such container
+STATES = ("up", "error", "down", "absent")
+
+
+def parse_targets(spec, base=DEFAULT_TARGETS):
+    targets = dict(base)
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        key, url = item.split("=", 1)
+        if url.strip():
+            targets[key.strip()] = url.strip()
+        else:
+            targets.pop(key.strip(), None)
+    return targets
+
+
+# ---------------------- PROBE ---------------------- #
+
+async def probe(url, timeout):
+    """(state, http code or None, latency ms, error) for one GET of url."""
+    parts = urlsplit(url)
+    host = parts.hostname
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    start = time.monotonic()
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=parts.scheme == "https" or None), timeout)
+        writer.write(f"GET {path} HTTP/1.0\r\nHost: {parts.netloc}\r\n"
+                     f"User-Agent: localai-status\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        line = await asyncio.wait_for(reader.readline(), max(timeout - (time.monotonic() - start), 0.1))
+        ms = round((time.monotonic() - start) * 1000)
+        fields = line.decode(errors="replace").split()
+        if len(fields) < 2 or not fields[1].isdigit():
+            return "error", None, ms, "malformed response"
+        code = int(fields[1])
+        return ("up" if code < 500 else "error"), code, ms, None
+    except socket.gaierror:
+        return "absent", None, None, "not resolvable"
+    except asyncio.TimeoutError:
+        return "down", None, None, f"timeout after {timeout}s"
+    except OSError as e:
+        return "down", None, None, e.strerror or str(e)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+# ---------------------- CACHE ---------------------- #
+
+class StatusCache:
+    """Latest probe per service plus the rendered compact document and its ETag."""
+
+    def __init__(self, targets, interval):
+        self.targets = targets
+        self.interval = interval
+        self.results = {}
+        self.rounds = 0
+        self.body = b"{}"
+        self.etag = '"0"'
+        self.modified = time.time()
+
+    def update(self, key, state, code, ms, error, now):
+        prev = self.results.get(key)
+        self.results[key] = {
+            "state": state,
+            "code": code,
+            "latency_ms": ms,
+            "checked_at": now,
+            "since": prev["since"] if prev and prev["state"] == state else now,
+            "error": error,
+        }
+
+    def compact(self):
+        services = {}
+        for key, r in sorted(self.results.items()):
+            entry = {"state": r["state"], "since": int(r["since"])}
+            if r["code"] is not None:
+                entry["code"] = r["code"]
+            if r["latency_ms"] is not None:
+                # Bucketed so jitter alone does not change the ETag
+                entry["ms"] = -(-max(r["latency_ms"], 1) // LATENCY_STEP_MS) * LATENCY_STEP_MS
+            services[key] = entry
+        return {"interval": self.interval, "services": services}
+
+    def render(self):
+        """Re-render the compact document; True when it changed."""
+        body = json.dumps(self.compact(), separators=(",", ":"), sort_keys=True).encode()
+        if body == self.body:
+            return False
+        self.body = body
+        self.etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+        self.modified = time.time()
+        return True
+
+    def full(self):
+        return json.dumps({"rounds": self.rounds, "interval": self.interval,
+                           "services": self.results}, indent=2, sort_keys=True).encode()
+
+
+async def poll(cache, timeout):
+    """The one poller: probe every target concurrently, then sleep out the interval."""
+    while True:
+        start = time.monotonic()
+        keys = list(cache.targets)
+        results = await asyncio.gather(*(probe(cache.targets[k], timeout) for k in keys))
+        now = time.time()
+        for key, result in zip(keys, results):
+            cache.update(key, *result, now)
+        cache.rounds += 1
+        if cache.render():
+            up = sum(1 for r in cache.results.values() if r["state"] == "up")
+            print(f"[status] {up}/{len(keys)} up, etag {cache.etag}", flush=True)
+        await asyncio.sleep(max(cache.interval - (time.monotonic() - start), 0))
+
+
+# ---------------------- HTTP ---------------------- #
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = [t.strip() for t in header.split(",")]
+    return etag in tags or f"W/{etag}" in tags
+
+
+def make_handler(cache):
+    async def handle(reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readline(), timeout=5)
+            headers = {}
+            for _ in range(MAX_HEADER_LINES):
+                line = await asyncio.wait_for(reader.readline(), timeout=5)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode(errors="replace").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            parts = request.decode(errors="replace").split()
+            method = parts[0] if parts else "GET"
+            path = (parts[1] if len(parts) > 1 else "/").split("?", 1)[0]
+            extra = ""
+            if path == "/status.json":
+                if etag_matches(headers.get("if-none-match"), cache.etag):
+                    status, body = "304 Not Modified", b""
+                else:
+                    status, body = "200 OK", cache.body
+                ctype = "application/json"
+                # no-cache: the browser keeps the copy but revalidates with If-None-Match
+                extra = (f"ETag: {cache.etag}\r\nCache-Control: no-cache\r\n"
+                         f"Last-Modified: {formatdate(cache.modified, usegmt=True)}\r\n")
+            elif path == "/status/full.json":
+                status, body, ctype = "200 OK", cache.full(), "application/json"
+                extra = "Cache-Control: no-store\r\n"
+            elif path == "/healthz":
+                ok = cache.rounds > 0
+                status = "200 OK" if ok else "503 Service Unavailable"
+                body, ctype = (b"ok\n" if ok else b"starting\n"), "text/plain"
+            else:
+                body, status, ctype = b"not found\n", "404 Not Found", "text/plain"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {ctype}\r\n{extra}"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                + (b"" if method == "HEAD" else body)
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+    return handle
+
+
+# ---------------------- MAIN ---------------------- #
+
+async def run(listen, interval, timeout, targets):
+    host, _, port = listen.rpartition(":")
+    cache = StatusCache(targets, interval)
+    server = await asyncio.start_server(make_handler(cache), host or "127.0.0.1", int(port))
+    print(f"[status] polling {len(targets)} services every {interval}s on {listen}", flush=True)
+    async with server:
+        await asyncio.gather(server.serve_forever(), poll(cache, timeout))
+
+
+def main():
+    listen = os.environ.get("STATUS_LISTEN", "127.0.0.1:8099")
+    interval = float(os.environ.get("STATUS_INTERVAL", "15"))
+    interval = int(interval) if interval.is_integer() else interval
+    timeout = float(os.environ.get("STATUS_TIMEOUT", "3"))
+    targets = parse_targets(os.environ.get("STATUS_TARGETS"))
+    try:
+        asyncio.run(run(listen, interval, timeout, targets))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,574 @@
+#!/usr/bin/env python3
+"""
+multi_host.py
+Deploy the stack across several Docker hosts (Docker contexts).
+
+A host inventory (hosts.json, or --inventory / LOCALAI_HOSTS) lists one
+Docker context per machine with its address and, optionally, capacities
+and labels; missing CPU / memory figures are read from `docker info`.
+
+    {
+      "hosts": {
+        "gpu-box":     {"context": "gpu-box", "address": "192.168.1.20", "gpu": "nvidia"},
+        "storage-box": {"context": "storage-box", "address": "192.168.1.21",
+                        "disk_gb": 4000, "labels": ["storage"]}
+      },
+      "pin": {"n8n": "storage-box"}
+    }
+
+Placement works on the service groups of start_services.py, with the
+shared infrastructure (postgres, redis, clickhouse, minio) as groups of
+their own: pinned groups first, then Ollama / Unsloth on GPU hosts, the
+databases and object store on "storage" hosts (or the largest disk), the
+rest wherever the most memory is left. Memory needs come from the resource
+planner's per-service minimums.
+
+Services that talk to a service placed on another host get their URLs
+rewritten to that host's address (postgres:5432 -> 192.168.1.21:5432), and
+the target publishes the port on its address. Both go into one compose
+override per host (docker-compose.override.host-<name>.yml, 0600: rendered
+values may hold passwords). Deploy then runs `up -d --no-deps --wait` on all
+hosts in parallel, wave by wave, so a database is healthy before the apps
+of any host that use it start.
+
+Usage:
+    python3 start_services.py hosts check                     # reach every context, show capacities
+    python3 start_services.py hosts plan --services n8n openwebui ollama
+    python3 start_services.py hosts deploy [--dry-run]
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+
+# ---------------------- CONSTANTS ---------------------- #
+
+INVENTORY_PATH = os.environ.get("LOCALAI_HOSTS", "hosts.json")
+PLACEMENT_PATH = os.path.join(".localai", "placement.json")
+OVERRIDE_TEMPLATE = "docker-compose.override.host-{}.yml"
+WAIT_TIMEOUT = 300
+
+# Groups placed by affinity before the others
+GPU_UNITS = ["ollama", "unsloth"]
+STORAGE_UNITS = ["postgres", "qdrant", "clickhouse", "minio", "neo4j"]
+
+PROFILE_BY_GPU = {"nvidia": "gpu-nvidia", "amd": "gpu-amd"}
+OLLAMA_PULL_BY_PROFILE = {
+    "cpu": "ollama-pull-llama-cpu",
+    "gpu-nvidia": "ollama-pull-llama-gpu",
+    "gpu-amd": "ollama-pull-llama-gpu-amd",
+}
+# Profiles a group's services exist in (others: every profile)
+UNIT_PROFILES = {"unsloth": ["gpu-nvidia"]}
+
+# Container port a bare host name refers to (DB_POSTGRESDB_HOST=postgres)
+SERVICE_PORTS = {
+    "postgres": 5432,
+    "redis": 6379,
+    "qdrant": 6333,
+    "clickhouse": 8123,
+    "minio": 9000,
+    "ollama": 11434,
+    "searxng": 8080,
+    "neo4j": 7687,
+    "flowise": 3001,
+    "n8n": 5678,
+}
+# Variables whose whole value may be a host name
+HOST_KEY_RE = re.compile(r"(HOST|ADDR|ADDRESS|SERVER|ENDPOINT|URL|URI)$")
+
+
+# ---------------------- INVENTORY ---------------------- #
+
+def docker(context, *args):
+    return ["docker", "--context", context] + list(args)
+
+
+def load_inventory(path=INVENTORY_PATH):
+    """{"hosts": {name: host}, "pin": {group: host}}; raises ValueError when unusable."""
+    if not os.path.exists(path):
+        raise ValueError(f"No host inventory at {path} (copy hosts.example.json).")
+    with open(path, "r") as f:
+        try:
+            inventory = json.load(f)
+        except ValueError as e:
+            raise ValueError(f"{path}: {e}")
+    hosts = inventory.get("hosts") or {}
+    if not hosts:
+        raise ValueError(f"{path}: no hosts.")
+    for name, host in hosts.items():
+        for key in ("context", "address"):
+            if not host.get(key):
+                raise ValueError(f"{path}: host {name} has no {key}.")
+    for unit, host in (inventory.get("pin") or {}).items():
+        if host not in hosts:
+            raise ValueError(f"{path}: {unit} is pinned to unknown host {host}.")
+    return {"hosts": hosts, "pin": inventory.get("pin") or {}}
+
+
+def probe_host(host):
+    """`docker info` of the host's context: reachability, and capacities the inventory leaves out."""
+    try:
+        proc = subprocess.run(docker(host["context"], "info", "--format", "{{json .}}"),
+                              capture_output=True, text=True, timeout=30)
+        info = json.loads(proc.stdout) if proc.returncode == 0 and proc.stdout.strip() else {}
+    except (OSError, subprocess.TimeoutExpired, ValueError):
+        info = {}
+    host = dict(host)
+    host["reachable"] = bool(info.get("ServerVersion"))
+    host["server"] = info.get("ServerVersion")
+    host.setdefault("cpus", info.get("NCPU") or 0)
+    if "memory_gb" in host:
+        host["memory_mb"] = int(host["memory_gb"] * 1024)
+    else:
+        host["memory_mb"] = (info.get("MemTotal") or 0) // (1024 * 1024)
+    if "gpu" not in host:
+        host["gpu"] = "nvidia" if "nvidia" in (info.get("Runtimes") or {}) else None
+    host["profile"] = host.get("profile") or PROFILE_BY_GPU.get(host["gpu"], "cpu")
+    return host
+
+
+def probe_hosts(hosts):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(hosts)) as pool:
+        return dict(zip(hosts, pool.map(probe_host, hosts.values())))
+
+
+# ---------------------- PLACEMENT ---------------------- #
+
+def placement_units(selected):
+    """Group -> compose services; infrastructure services are groups of their own."""
+    from deploy_journal import INFRA_SERVICES
+    from start_services import SERVICE_GROUPS, resolve_services
+    everything = not selected or "all" in selected
+    resolved = set(resolve_services(list(SERVICE_GROUPS) if everything else selected))
+    units = {svc: [svc] for svc in INFRA_SERVICES if svc in resolved}
+    for group, members in SERVICE_GROUPS.items():
+        apps = [svc for svc in members if svc in resolved and svc not in units]
+        if apps:
+            units[group] = apps
+    for svc in sorted(resolved - {s for members in units.values() for s in members}):
+        units[svc] = [svc]  # e.g. ollama-proxy
+    if everything or "ollama" in selected:
+        units["ollama"] = ["ollama"]
+    return units
+
+
+def unit_memory_mb(services):
+    from resource_planner import MODEL_FOOTPRINT_MB, SERVICE_PROFILES
+    need = sum(SERVICE_PROFILES.get(svc, {}).get("min_mb", 256) for svc in services)
+    return need + (MODEL_FOOTPRINT_MB if "ollama" in services else 0)
+
+
+def place(units, hosts, pins):
+    """Group -> host name, and the warnings of the placement."""
+    from resource_planner import HOST_RESERVE_MIN_MB, HOST_RESERVE_RATIO
+    free = {name: host["memory_mb"] - max(HOST_RESERVE_MIN_MB, int(host["memory_mb"] * HOST_RESERVE_RATIO))
+            for name, host in hosts.items()}
+    gpu_hosts = [name for name, host in hosts.items() if host.get("gpu")]
+    storage_hosts = [name for name, host in hosts.items() if "storage" in host.get("labels", [])]
+    if not storage_hosts and any(host.get("disk_gb") for host in hosts.values()):
+        storage_hosts = [max(hosts, key=lambda name: hosts[name].get("disk_gb", 0))]
+
+    def rank(unit):
+        if unit in pins:
+            return 0, 0
+        if unit in GPU_UNITS:
+            return 1, 0
+        if unit in STORAGE_UNITS:
+            return 2, 0
+        return 3, -unit_memory_mb(units[unit])
+
+    placement = {}
+    warnings = []
+    for unit in sorted(units, key=rank):
+        need = unit_memory_mb(units[unit])
+        profiles = UNIT_PROFILES.get(unit)
+        allowed = [name for name in hosts if not profiles or hosts[name]["profile"] in profiles]
+        if not allowed:
+            warnings.append(f"{unit}: no host with profile {'/'.join(profiles)}; not placed.")
+            continue
+        if unit in pins:
+            chosen = pins[unit]
+        else:
+            preferred = allowed
+            if unit in GPU_UNITS:
+                preferred = [name for name in allowed if name in gpu_hosts]
+                if not preferred:
+                    warnings.append(f"{unit}: no GPU host in the inventory, runs on CPU.")
+            elif unit in STORAGE_UNITS:
+                preferred = [name for name in allowed if name in storage_hosts]
+            fits = ([name for name in preferred if free[name] >= need]
+                    or [name for name in allowed if free[name] >= need])
+            chosen = max(fits or preferred or allowed, key=lambda name: free[name])
+        if free[chosen] < need and hosts[chosen]["memory_mb"]:
+            warnings.append(f"{unit}: needs {need} MB, {chosen} has {max(free[chosen], 0)} MB left (overcommitted).")
+        free[chosen] -= need
+        placement[unit] = chosen
+    return placement, warnings
+
+
+def host_services(units, placement, host, profile):
+    """Compose services a host runs."""
+    services = []
+    for unit, chosen in placement.items():
+        if chosen != host:
+            continue
+        for svc in units[unit]:
+            if svc == "ollama":
+                from resource_planner import OLLAMA_SERVICE_BY_PROFILE
+                services += [OLLAMA_SERVICE_BY_PROFILE[profile], OLLAMA_PULL_BY_PROFILE[profile]]
+            else:
+                services.append(svc)
+    return services
+
+
+# ---------------------- LINKS ---------------------- #
+
+def dns_names(name, spec):
+    """Names other containers reach a service by: service and container name."""
+    return {name, spec.get("container_name") or name}
+
+
+def reference_re(names):
+    """Host name in a URL (//name, @name) or as a whole value, with an optional port."""
+    alt = "|".join(re.escape(n) for n in sorted(names, key=len, reverse=True))
+    return re.compile(rf"(?:^|(?<=//)|(?<=@))({alt})(?::(\d+))?(?=$|[/?#])")
+
+
+def environment(spec):
+    env = spec.get("environment") or {}
+    if isinstance(env, list):
+        env = dict(item.split("=", 1) for item in env if "=" in item)
+    return {key: "" if value is None else str(value) for key, value in env.items()}
+
+
+def find_references(configs, where):
+    """(host, service, key, target service, matched name, port) for every reference between services."""
+    owner = {}
+    for host, config in configs.items():
+        for name, spec in config.get("services", {}).items():
+            if where.get(name) == host:
+                for dns in dns_names(name, spec):
+                    owner[dns] = name
+    pattern = reference_re(owner)
+    refs = []
+    for host, config in configs.items():
+        for name, spec in config.get("services", {}).items():
+            if where.get(name) != host:
+                continue
+            for key, value in environment(spec).items():
+                for m in pattern.finditer(value):
+                    target = owner[m.group(1)]
+                    whole = m.start() == 0 and m.end() == len(value)
+                    if target == name or (whole and not HOST_KEY_RE.search(key.upper())):
+                        continue  # POSTGRES_USER=postgres is not a host
+                    port = int(m.group(2)) if m.group(2) else SERVICE_PORTS.get(m.group(1)) \
+                        or SERVICE_PORTS.get(target)
+                    refs.append((host, name, key, target, m.group(1), port))
+    return refs
+
+
+def allocate_ports(refs, configs, where, hosts):
+    """(target, container port) -> host port published on the target host's address."""
+    published = {}
+    taken = {host: set() for host in hosts}
+    for host, config in configs.items():
+        address = hosts[host]["address"]
+        for name, spec in config.get("services", {}).items():
+            if where.get(name) != host:
+                continue
+            for port in spec.get("ports") or []:
+                if isinstance(port, dict) and port.get("published"):
+                    if port.get("host_ip", "") in ("", "0.0.0.0", "::", address):
+                        taken[host].add(int(port["published"]))
+                        published[(name, port["target"])] = int(port["published"])
+    ports = {}
+    for host, _, _, target, _, port in sorted(refs, key=lambda r: (r[3], r[5] or 0)):
+        if host == where[target] or not port or (target, port) in ports:
+            continue
+        if (target, port) in published:
+            ports[(target, port)] = (published[(target, port)], False)
+            continue
+        host_port = port
+        while host_port in taken[where[target]]:
+            host_port += 10000
+        taken[where[target]].add(host_port)
+        ports[(target, port)] = (host_port, True)
+    return ports
+
+
+def build_links(configs, where, hosts):
+    """Per-host override services (rewritten environment, published ports), link list and warnings."""
+    refs = find_references(configs, where)
+    ports = allocate_ports(refs, configs, where, hosts)
+    overrides = {host: {} for host in hosts}
+    rewritten = {}
+    links = []
+    warnings = []
+    for host, name, key, target, dns, port in refs:
+        target_host = where[target]
+        if host == target_host:
+            continue
+        host_port, _ = ports[(target, port)]
+        value = rewritten.get((host, name, key), environment(configs[host]["services"][name])[key])
+        address = hosts[target_host]["address"]
+        explicit = re.compile(rf"(?:^|(?<=//)|(?<=@)){re.escape(dns)}:{port}(?=$|[/?#])")
+        if explicit.search(value):
+            value = explicit.sub(f"{address}:{host_port}", value)
+        else:
+            value = reference_re([dns]).sub(address, value)
+            if host_port != port:
+                warnings.append(f"{name} {key}: {target} is published on port {host_port}, "
+                                f"not {port}; set the matching port variable.")
+        rewritten[(host, name, key)] = value
+        links.append({"host": host, "service": name, "key": key, "target": target,
+                      "from": f"{dns}:{port}", "to": f"{address}:{host_port}"})
+    for (host, name, key), value in rewritten.items():
+        # Rendered values: keep compose from interpolating a "$" in a password again
+        env = overrides[host].setdefault(name, {}).setdefault("environment", {})
+        env[key] = value.replace("$", "$$")
+    for (target, port), (host_port, new) in sorted(ports.items()):
+        if new:
+            spec = overrides[where[target]].setdefault(target, {})
+            spec.setdefault("ports", []).append(f"{hosts[where[target]]['address']}:{host_port}:{port}")
+    return overrides, links, warnings
+
+
+def deploy_waves(configs, where, links):
+    """Services in start order: each wave only depends on earlier ones."""
+    deps = {name: set() for name in where}
+    for host, config in configs.items():
+        for name, spec in config.get("services", {}).items():
+            if where.get(name) == host:
+                deps[name].update(d for d in (spec.get("depends_on") or {}) if d in where)
+    for link in links:
+        deps[link["service"]].add(link["target"])
+    waves = []
+    done = set()
+    while len(done) < len(deps):
+        wave = sorted(name for name in deps if name not in done and deps[name] <= done)
+        if not wave:  # dependency cycle: start the rest together
+            wave = sorted(name for name in deps if name not in done)
+        waves.append(wave)
+        done.update(wave)
+    return waves
+
+
+# ---------------------- PLAN ---------------------- #
+
+def compose_base(host, environment_name):
+    from start_services import build_compose_base
+    return build_compose_base(host["profile"], environment_name, context=host["context"])
+
+
+def make_plan(inventory, selected, environment_name="private"):
+    """Probe the hosts, place the groups, compute links and waves; nothing is written."""
+    from deploy_journal import compose_config
+    hosts = probe_hosts(inventory["hosts"])
+    units = placement_units(selected)
+    placement, warnings = place(units, hosts, inventory["pin"])
+    services = {name: host_services(units, placement, name, host["profile"]) for name, host in hosts.items()}
+    where = {svc: host for host, names in services.items() for svc in names}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(hosts)) as pool:
+        configs = dict(zip(hosts, pool.map(lambda h: compose_config(compose_base(h, environment_name)),
+                                           hosts.values())))
+    for name, config in configs.items():
+        if not config.get("services"):
+            warnings.append(f"{name}: `docker compose config` failed for context {hosts[name]['context']}.")
+    overrides, links, link_warnings = build_links(configs, where, hosts)
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": environment_name,
+        "selected": selected,
+        "hosts": {
+            name: {
+                "context": host["context"],
+                "address": host["address"],
+                "profile": host["profile"],
+                "reachable": host["reachable"],
+                "memory_mb": host["memory_mb"],
+                "planned_mb": sum(unit_memory_mb(units[u]) for u, h in placement.items() if h == name),
+                "groups": sorted(u for u, h in placement.items() if h == name),
+                "services": services[name],
+                "override": OVERRIDE_TEMPLATE.format(name),
+                "override_services": overrides[name],
+            }
+            for name, host in hosts.items()
+        },
+        "links": links,
+        "waves": deploy_waves(configs, where, links),
+        "warnings": warnings + link_warnings,
+    }
+
+
+def write_plan(plan, path=PLACEMENT_PATH):
+    """Write the per-host overrides and the placement record."""
+    from compose_override import write_override
+    for name, host in plan["hosts"].items():
+        header = [f"Generated by `start_services.py hosts` for {name} ({host['context']}).",
+                  "Cross-host addresses and published ports; rewritten on every plan."]
+        write_override(host["override"], host["override_services"], header)
+        os.chmod(host["override"], 0o600)  # rendered values include passwords
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    saved = dict(plan, hosts={name: {k: v for k, v in host.items() if k != "override_services"}
+                              for name, host in plan["hosts"].items()})
+    with open(path + ".tmp", "w") as f:
+        json.dump(saved, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def print_plan(plan):
+    print("Placement:")
+    for name, host in plan["hosts"].items():
+        state = "" if host["reachable"] else "  [UNREACHABLE]"
+        print(f"  {name} ({host['context']}, {host['address']}, {host['profile']}, "
+              f"{host['planned_mb']}/{host['memory_mb']} MB planned){state}")
+        print(f"      groups:   {', '.join(host['groups']) or '-'}")
+        print(f"      services: {', '.join(host['services']) or '-'}")
+    if plan["links"]:
+        print("Cross-host links:")
+        for link in plan["links"]:
+            print(f"  {link['service']:<16} {link['key']:<34} {link['from']} -> {link['to']}")
+    print("Start order (each wave on all hosts in parallel):")
+    for i, wave in enumerate(plan["waves"], 1):
+        print(f"  {i}. {', '.join(wave)}")
+    for warning in plan["warnings"]:
+        print(f"WARNING: {warning}")
+
+
+# ---------------------- DEPLOY ---------------------- #
+
+def run_timed(cmd):
+    start = time.monotonic()
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        code, err = proc.returncode, proc.stderr.strip()
+    except OSError as e:
+        code, err = 1, str(e)
+    return code, (err.splitlines() or [""])[-1], time.monotonic() - start
+
+
+def parallel(jobs):
+    """Run {label: cmd} at once; {label: (code, last stderr line, seconds)}."""
+    if not jobs:
+        return {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        return dict(zip(jobs, pool.map(run_timed, jobs.values())))
+
+
+def deploy(plan, wait_timeout=WAIT_TIMEOUT, dry_run=False):
+    """Retire moved services, then start the waves on every host in parallel; True when all succeeded."""
+    bases = {name: compose_base(host, plan["environment"]) + ["-f", host["override"]]
+             for name, host in plan["hosts"].items()}
+    where = {svc: name for name, host in plan["hosts"].items() for svc in host["services"]}
+
+    # Containers of services that now live on another host
+    steps = []
+    if not dry_run:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(bases)) as pool:
+            outputs = dict(zip(bases, pool.map(
+                lambda base: subprocess.run(base + ["ps", "--services"], capture_output=True, text=True),
+                bases.values())))
+        retire = {}
+        for name, out in outputs.items():
+            moved = [svc for svc in out.stdout.split() if where.get(svc, name) != name]
+            if out.returncode == 0 and moved:
+                retire[name] = (moved, bases[name] + ["rm", "--stop", "--force"] + moved)
+        steps.append(("Retiring moved services", retire))
+    for i, wave in enumerate(plan["waves"], 1):
+        jobs = {}
+        for name, base in bases.items():
+            svcs = [svc for svc in wave if where.get(svc) == name]
+            if svcs:
+                jobs[name] = (svcs, base + ["up", "-d", "--no-deps", "--wait",
+                                            "--wait-timeout", str(wait_timeout)] + svcs)
+        steps.append((f"Wave {i}/{len(plan['waves'])}", jobs))
+
+    ok = True
+    for label, jobs in steps:
+        if not jobs:
+            continue
+        if dry_run:
+            for name, (_, cmd) in jobs.items():
+                print(f"  [{label}] {name}: {' '.join(cmd)}")
+            continue
+        print(f"\n{label}:")
+        results = parallel({name: cmd for name, (_, cmd) in jobs.items()})
+        for name, (code, err, seconds) in results.items():
+            svcs = ", ".join(jobs[name][0])
+            if code == 0:
+                print(f"  [OK]   {name:<14} {svcs} ({seconds:.1f}s)")
+            else:
+                ok = False
+                print(f"  [FAIL] {name:<14} {svcs} ({seconds:.1f}s): {err or 'exit ' + str(code)}")
+    return ok
+
+
+# ---------------------- MAIN ---------------------- #
+
+def main(argv=None):
+    from start_services import ALL_SELECTABLE
+    parser = argparse.ArgumentParser(
+        prog="start_services.py hosts",
+        description="Place the stack across several Docker contexts and deploy it.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("action", choices=["check", "plan", "deploy"])
+    parser.add_argument("--inventory", default=INVENTORY_PATH, help="Host inventory (JSON).")
+    parser.add_argument("--services", nargs="+", default=["all"], choices=["all"] + ALL_SELECTABLE)
+    parser.add_argument("--environment", choices=["private", "public"], default="private")
+    parser.add_argument("--wait-timeout", type=int, default=WAIT_TIMEOUT,
+                        help="Seconds each wave may take to become healthy.")
+    parser.add_argument("--dry-run", action="store_true", help="deploy: print the commands only.")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    try:
+        inventory = load_inventory(args.inventory)
+    except ValueError as e:
+        print(e)
+        return 1
+
+    if args.action == "check":
+        hosts = probe_hosts(inventory["hosts"])
+        if args.json:
+            print(json.dumps(hosts, indent=2))
+        else:
+            for name, host in hosts.items():
+                print(f"  [{'OK' if host['reachable'] else 'DOWN':<4}] {name:<14} context {host['context']}, "
+                      f"{host['address']}, docker {host['server'] or '-'}, {host['cpus']} CPU, "
+                      f"{host['memory_mb']} MB, GPU {host['gpu'] or 'none'} ({host['profile']})")
+        return 0 if all(host["reachable"] for host in hosts.values()) else 1
+
+    plan = make_plan(inventory, args.services, args.environment)
+    if args.json:
+        print(json.dumps(plan, indent=2))
+    else:
+        print_plan(plan)
+    unreachable = [name for name, host in plan["hosts"].items() if not host["reachable"]]
+    if args.action == "plan" or args.dry_run:
+        if args.action == "plan":
+            write_plan(plan)
+            print(f"\nOverrides written; placement saved to {PLACEMENT_PATH}.")
+        else:
+            print("\nDry run: commands that deploy would run:")
+            deploy(plan, args.wait_timeout, dry_run=True)
+        return 0
+    if unreachable:
+        print(f"\nNot deploying: unreachable host(s) {', '.join(unreachable)}.")
+        return 1
+    write_plan(plan)
+    ok = deploy(plan, args.wait_timeout)
+    print("\nMulti-host deployment " + ("finished." if ok else "finished with failures."))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+n8n_autoscaler.py
+Queue-depth-driven autoscaler for n8n workers (queue mode).
+
+Watches the Bull queue n8n keeps in Valkey/Redis (waiting + active jobs)
+and scales the `n8n-worker` compose service between --min and --max
+replicas. Scale-up happens as soon as the backlog needs it (after the
+up-cooldown); scale-down only when the load stayed under the low watermark
+for several samples and the down-cooldown expired, one worker at a time.
+Workers being removed are stopped with a drain timeout so running
+executions can finish.
+
+Usage:
+    python3 start_services.py autoscale --min 1 --max 4
+    python3 n8n_autoscaler.py --dry-run --once --redis-port 6379
+"""
+
+import argparse
+import math
+import socket
+import subprocess
+import sys
+import time
+
+from start_services import build_compose_base, read_env_file
+
+
+# ---------------------- CONSTANTS ---------------------- #
+
+WORKER_SERVICE = "n8n-worker"
+PROJECT_LABEL = "com.docker.compose.project=localai"
+
+# n8n defaults: QUEUE_BULL_PREFIX=bull, queue name "jobs", worker --concurrency=10
+DEFAULT_BULL_PREFIX = "bull"
+DEFAULT_QUEUE_NAME = "jobs"
+DEFAULT_WORKER_CONCURRENCY = 10
+
+
+# ---------------------- REDIS (RESP) ---------------------- #
+
+class RedisError(Exception):
+    """Error reply or protocol failure from Valkey/Redis."""
+
+
+class RespClient:
+    """Minimal blocking RESP2 client (enough for LLEN/ZCARD/RPUSH/AUTH)."""
+
+    def __init__(self, host="127.0.0.1", port=6379, password=None, timeout=5.0):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        self.sock = None
+        self.reader = None
+
+    def connect(self):
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.reader = self.sock.makefile("rb")
+        if self.password:
+            self.command("AUTH", self.password)
+
+    def close(self):
+        if self.sock:
+            try:
+                self.reader.close()
+                self.sock.close()
+            finally:
+                self.sock = None
+                self.reader = None
+
+    def command(self, *args):
+        """Send one command and return the decoded reply."""
+        if self.sock is None:
+            self.connect()
+        payload = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            payload.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        try:
+            self.sock.sendall(b"".join(payload))
+            return self._read_reply()
+        except (OSError, RedisError):
+            self.close()
+            raise
+
+    def pipeline(self, commands):
+        """Send several commands in one round trip and return all replies."""
+        if self.sock is None:
+            self.connect()
+        payload = []
+        for args in commands:
+            payload.append(f"*{len(args)}\r\n".encode())
+            for arg in args:
+                data = arg if isinstance(arg, bytes) else str(arg).encode()
+                payload.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        try:
+            self.sock.sendall(b"".join(payload))
+            return [self._read_reply() for _ in commands]
+        except (OSError, RedisError):
+            # Unread replies would answer the next commands: start over on a new connection
+            self.close()
+            raise
+
+    def _read_reply(self):
+        line = self.reader.readline()
+        if not line:
+            raise RedisError("connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length == -1:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(rest)
+            if count == -1:
+                return None
+            return [self._read_reply() for _ in range(count)]
+        raise RedisError(f"unexpected reply type: {line!r}")
+
+
+def read_queue_depth(client, prefix=DEFAULT_BULL_PREFIX, queue=DEFAULT_QUEUE_NAME):
+    """Return waiting/active/delayed job counts of the n8n Bull queue."""
+    base = f"{prefix}:{queue}"
+    wait, paused, active, delayed = client.pipeline([
+        ("LLEN", f"{base}:wait"),
+        ("LLEN", f"{base}:paused"),
+        ("LLEN", f"{base}:active"),
+        ("ZCARD", f"{base}:delayed"),
+    ])
+    return {"waiting": wait + paused, "active": active, "delayed": delayed}
+
+
+def seed_synthetic_jobs(client, waiting=0, active=0, prefix=DEFAULT_BULL_PREFIX, queue=DEFAULT_QUEUE_NAME):
+    """Replace the queue lists with synthetic job ids (for local testing only)."""
+    base = f"{prefix}:{queue}"
+    client.command("DEL", f"{base}:wait", f"{base}:active")
+    if waiting:
+        client.command("RPUSH", f"{base}:wait", *[f"synthetic-w{i}" for i in range(waiting)])
+    if active:
+        client.command("RPUSH", f"{base}:active", *[f"synthetic-a{i}" for i in range(active)])
+
+
+# ---------------------- SCALING POLICY ---------------------- #
+
+class ScalingPolicy:
+    """Decide the worker count from the queue depth, with hysteresis and cooldowns.
+
+    - target = ceil((waiting + active) / jobs_per_worker), clamped to [min, max]
+    - scale up to target once up_cooldown has passed since the last change
+    - scale down by one worker only when the load fits in (current - 1) workers
+      at low_watermark utilisation for down_samples consecutive polls and
+      down_cooldown has passed since the last change
+    """
+
+    def __init__(self, min_workers=1, max_workers=4, jobs_per_worker=DEFAULT_WORKER_CONCURRENCY,
+                 up_cooldown=30.0, down_cooldown=300.0, low_watermark=0.5, down_samples=3):
+        if min_workers < 0 or max_workers < min_workers:
+            raise ValueError("expected 0 <= min_workers <= max_workers")
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.jobs_per_worker = max(1, jobs_per_worker)
+        self.up_cooldown = up_cooldown
+        self.down_cooldown = down_cooldown
+        self.low_watermark = low_watermark
+        self.down_samples = down_samples
+        self.last_change = None
+        self.low_streak = 0
+
+    def clamp(self, count):
+        return max(self.min_workers, min(self.max_workers, count))
+
+    def decide(self, current, waiting, active, now):
+        """Return (desired worker count, reason)."""
+        load = waiting + active
+        target = self.clamp(math.ceil(load / float(self.jobs_per_worker)))
+        since = None if self.last_change is None else now - self.last_change
+
+        if current < self.min_workers or current > self.max_workers:
+            self.low_streak = 0
+            return self.clamp(current), "outside min/max bounds"
+
+        if target > current:
+            self.low_streak = 0
+            if since is not None and since < self.up_cooldown:
+                return current, f"scale-up cooling down ({self.up_cooldown - since:.0f}s left)"
+            return target, f"backlog {load} needs {target} worker(s)"
+
+        low_capacity = (current - 1) * self.jobs_per_worker * self.low_watermark
+        if current > self.min_workers and load <= low_capacity:
+            self.low_streak += 1
+            if self.low_streak < self.down_samples:
+                return current, f"low load {self.low_streak}/{self.down_samples} samples"
+            if since is not None and since < self.down_cooldown:
+                return current, f"scale-down cooling down ({self.down_cooldown - since:.0f}s left)"
+            self.low_streak = 0
+            return current - 1, f"load {load} fits in {current - 1} worker(s)"
+
+        self.low_streak = 0
+        return current, "steady"
+
+    def record_change(self, now):
+        self.last_change = now
+        self.low_streak = 0
+
+
+# ---------------------- DOCKER ---------------------- #
+
+def list_workers():
+    """Running n8n-worker containers, highest replica number first."""
+    result = subprocess.run(
+        ["docker", "ps", "--filter", f"label={PROJECT_LABEL}",
+         "--filter", f"label=com.docker.compose.service={WORKER_SERVICE}",
+         "--format", '{{.Names}}\t{{.Label "com.docker.compose.container-number"}}'],
+        capture_output=True, text=True, check=True
+    )
+    workers = []
+    for line in result.stdout.splitlines():
+        name, _, number = line.partition("\t")
+        if name:
+            workers.append((int(number) if number.isdigit() else 0, name))
+    return [name for _, name in sorted(workers, reverse=True)]
+
+
+def scale_up(base_cmd, count):
+    """Bring the worker service to `count` replicas without touching the others."""
+    cmd = base_cmd + ["up", "-d", "--no-deps", "--no-recreate",
+                      "--scale", f"{WORKER_SERVICE}={count}", WORKER_SERVICE]
+    print("Running:", " ".join(cmd))
+    subprocess.run(cmd, check=True, capture_output=True, text=True)
+
+
+def drain_workers(names, drain_timeout):
+    """Stop workers gracefully (SIGTERM, wait for running executions) then remove them."""
+    for name in names:
+        print(f"  Draining {name} (up to {drain_timeout}s)...")
+        subprocess.run(["docker", "stop", "--time", str(drain_timeout), name],
+                       check=True, capture_output=True, text=True)
+        subprocess.run(["docker", "rm", name], check=True, capture_output=True, text=True)
+
+
+# ---------------------- LOOP ---------------------- #
+
+def default_max_workers():
+    """Use the resource plan's worker count as the default ceiling."""
+    try:
+        from resource_planner import load_plan
+        plan = load_plan()
+    except ImportError:
+        plan = None
+    if plan and plan.get("n8n_workers"):
+        return plan["n8n_workers"]
+    return 4
+
+
+def default_concurrency():
+    """Worker concurrency from the resource plan (n8n default otherwise)."""
+    try:
+        from resource_planner import load_plan
+        plan = load_plan()
+    except ImportError:
+        plan = None
+    command = ((plan or {}).get("services", {}).get(WORKER_SERVICE, {}) or {}).get("command") or []
+    for arg in command:
+        if arg.startswith("--concurrency="):
+            return int(arg.split("=", 1)[1])
+    return DEFAULT_WORKER_CONCURRENCY
+
+
+def run_loop(args, client, policy, base_cmd):
+    """Poll the queue and apply the policy until interrupted (or once)."""
+    simulated = args.min if args.dry_run else None
+    while True:
+        now = time.monotonic()
+        try:
+            depth = read_queue_depth(client, args.bull_prefix, args.queue)
+        except (OSError, RedisError) as e:
+            print(f"[autoscale] queue unreachable: {e}")
+            if args.once:
+                return 1
+            time.sleep(args.interval)
+            continue
+
+        if args.dry_run:
+            current = simulated
+        else:
+            workers = list_workers()
+            current = len(workers)
+
+        desired, reason = policy.decide(current, depth["waiting"], depth["active"], now)
+        print(f"[autoscale] waiting={depth['waiting']} active={depth['active']} "
+              f"delayed={depth['delayed']} workers={current} -> {desired} ({reason})")
+
+        if desired != current:
+            # A failed attempt starts no cooldown: it is retried on the next poll
+            if args.dry_run:
+                simulated = desired
+                policy.record_change(now)
+            elif desired > current:
+                try:
+                    scale_up(base_cmd, desired)
+                    policy.record_change(now)
+                except subprocess.CalledProcessError as e:
+                    print(f"  Scale-up failed: {(e.stderr or '').strip().splitlines()[-1:]}")
+            else:
+                try:
+                    drain_workers(workers[:current - desired], args.drain_timeout)
+                    policy.record_change(now)
+                except subprocess.CalledProcessError as e:
+                    print(f"  Drain failed: {(e.stderr or '').strip().splitlines()[-1:]}")
+
+        if args.once:
+            return 0
+        time.sleep(args.interval)
+
+
+def main(argv=None):
+    env = read_env_file()
+    parser = argparse.ArgumentParser(
+        prog="start_services.py autoscale",
+        description="Scale n8n queue-mode workers from the Bull queue depth in Valkey.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--min", type=int, default=1, help="Minimum worker replicas.")
+    parser.add_argument("--max", type=int, default=None,
+                        help="Maximum worker replicas (default: resource plan, else 4).")
+    parser.add_argument("--jobs-per-worker", type=int, default=None,
+                        help="Executions one worker handles at once (default: plan concurrency, else 10).")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between queue polls.")
+    parser.add_argument("--up-cooldown", type=float, default=30.0, help="Seconds between scale-ups.")
+    parser.add_argument("--down-cooldown", type=float, default=300.0,
+                        help="Seconds after any change before scaling down.")
+    parser.add_argument("--low-watermark", type=float, default=0.5,
+                        help="Scale down when load fits in one fewer worker at this utilisation.")
+    parser.add_argument("--down-samples", type=int, default=3,
+                        help="Consecutive low-load polls required before scaling down.")
+    parser.add_argument("--drain-timeout", type=int,
+                        default=int(env.get("N8N_WORKER_DRAIN_TIMEOUT", "120") or 120),
+                        help="Seconds a worker gets to finish running executions when removed.")
+    parser.add_argument("--redis-host", default="127.0.0.1", help="Valkey host (private mode binds 127.0.0.1).")
+    parser.add_argument("--redis-port", type=int, default=int(env.get("N8N_QUEUE_BULL_REDIS_PORT", "6379") or 6379))
+    parser.add_argument("--redis-password", default=env.get("REDIS_AUTH", "LOCALONLYREDIS"))
+    parser.add_argument("--bull-prefix", default=env.get("QUEUE_BULL_PREFIX", DEFAULT_BULL_PREFIX))
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_NAME, help="Bull queue name used by n8n.")
+    parser.add_argument("--profile", choices=["cpu", "gpu-nvidia", "gpu-amd", "none"], default="cpu")
+    parser.add_argument("--environment", choices=["private", "public"], default="private")
+    parser.add_argument("--seed-waiting", type=int, default=None,
+                        help="Testing: replace the wait list with N synthetic jobs first.")
+    parser.add_argument("--seed-active", type=int, default=0,
+                        help="Testing: replace the active list with N synthetic jobs first.")
+    parser.add_argument("--once", action="store_true", help="Run a single poll and exit.")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Print decisions against a simulated worker count, no docker calls.")
+    args = parser.parse_args(argv)
+
+    if args.max is None:
+        args.max = max(args.min, default_max_workers())
+    if args.jobs_per_worker is None:
+        args.jobs_per_worker = default_concurrency()
+
+    if env.get("N8N_EXECUTIONS_MODE", "regular") != "queue" and not args.dry_run:
+        print("Warning: N8N_EXECUTIONS_MODE is not 'queue' in .env; workers will not receive jobs.")
+
+    policy = ScalingPolicy(
+        min_workers=args.min, max_workers=args.max, jobs_per_worker=args.jobs_per_worker,
+        up_cooldown=args.up_cooldown, down_cooldown=args.down_cooldown,
+        low_watermark=args.low_watermark, down_samples=args.down_samples,
+    )
+    client = RespClient(args.redis_host, args.redis_port, password=args.redis_password or None)
+    base_cmd = build_compose_base(args.profile, args.environment, extra_profiles=[WORKER_SERVICE])
+
+    print(f"Autoscaling {WORKER_SERVICE}: {args.min}..{args.max} replicas, "
+          f"{args.jobs_per_worker} jobs/worker, poll every {args.interval}s"
+          f"{' (dry-run)' if args.dry_run else ''}")
+
+    try:
+        if args.seed_waiting is not None:
+            seed_synthetic_jobs(client, args.seed_waiting, args.seed_active, args.bull_prefix, args.queue)
+        return run_loop(args, client, policy, base_cmd)
+    except KeyboardInterrupt:
+        print("\nAutoscaler stopped.")
+        return 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
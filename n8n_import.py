@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+n8n_import.py
+Hash manifest for n8n/backup, so n8n only imports what changed.
+
+`n8n-import` used to run `n8n import:credentials` and `n8n import:workflow`
+over the whole backup directory on every start, with n8n waiting on it:
+each restart paid the full import and re-imported workflows over the ones
+edited in the UI. Now the orchestrator hashes every file under
+n8n/backup/{credentials,workflows} and compares them with the manifest of
+the last successful import (.localai/n8n-import.json):
+
+  nothing changed  n8n-import stays off (it sits behind the "n8n-import"
+                   profile and n8n's dependency on it is not required), so
+                   n8n starts without waiting for an import
+  some changed     only those files are staged in n8n/backup/.pending and
+                   the container imports that directory
+  database new     a recreated Postgres volume or a new N8N_ENCRYPTION_KEY
+                   invalidates the manifest: everything is imported again
+
+The manifest is recorded once the container exited with status 0.
+Started by hand (`docker compose --profile n8n-import up n8n-import`),
+without a staged directory, the container imports the whole backup as before.
+
+Usage:
+    python3 start_services.py n8n-import status     # files that would be imported
+    python3 start_services.py n8n-import reset      # forget the manifest: next deploy imports all
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+
+# ---------------------- CONSTANTS ---------------------- #
+
+BACKUP_DIR = os.path.join("n8n", "backup")
+KINDS = ("credentials", "workflows")
+PENDING_DIR = os.path.join(BACKUP_DIR, ".pending")
+STATE_PATH = os.path.join(".localai", "n8n-import.json")
+SERVICE = "n8n-import"
+PROFILE = "n8n-import"
+# n8n's tables live in this volume (the shared postgres); recreating it empties them
+DATABASE_VOLUME = "localai_langfuse_postgres_data"
+
+
+# ---------------------- MANIFEST ---------------------- #
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def scan(backup_dir=BACKUP_DIR):
+    """{"workflows/x.json": sha256} for every importable file of the backup directory."""
+    files = {}
+    for kind in KINDS:
+        root = os.path.join(backup_dir, kind)
+        if not os.path.isdir(root):
+            continue
+        for name in sorted(os.listdir(root)):
+            path = os.path.join(root, name)
+            if name.endswith(".json") and os.path.isfile(path):
+                files[f"{kind}/{name}"] = file_hash(path)
+    return files
+
+
+def database_fingerprint(env=None):
+    """Identity of the database n8n imports into: volume creation time + encryption key hash.
+
+    None when the volume does not exist (or docker is unreachable), which
+    never matches a recorded fingerprint.
+    """
+    try:
+        proc = subprocess.run(["docker", "volume", "inspect", "--format", "{{.CreatedAt}}", DATABASE_VOLUME],
+                              capture_output=True, text=True, timeout=15)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if proc.returncode != 0 or not proc.stdout.strip():
+        return None
+    if env is None:
+        from start_services import read_env_file
+        env = read_env_file() if os.path.exists(".env") else {}
+    key = env.get("N8N_ENCRYPTION_KEY", "")
+    return hashlib.sha256(f"{proc.stdout.strip()}\0{key}".encode()).hexdigest()[:16]
+
+
+def load_state(path=STATE_PATH):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def changed_files(files, state, fingerprint):
+    """Files to import: new or changed ones, or all when the database is not the recorded one."""
+    if not fingerprint or state.get("database") != fingerprint:
+        return sorted(files)
+    imported = state.get("files", {})
+    return sorted(name for name, digest in files.items() if imported.get(name) != digest)
+
+
+# ---------------------- ORCHESTRATOR HOOKS ---------------------- #
+
+class ImportPlan:
+    """What the next n8n start imports; built before `up`, recorded after it."""
+
+    def __init__(self, files, changed, fingerprint):
+        self.files = files
+        self.changed = changed
+        self.fingerprint = fingerprint
+
+    @property
+    def needed(self):
+        return bool(self.changed)
+
+    def stage(self, pending_dir=PENDING_DIR, backup_dir=BACKUP_DIR):
+        """Copy the changed files into the directory the container imports from."""
+        shutil.rmtree(pending_dir, ignore_errors=True)
+        for name in self.changed:
+            dst = os.path.join(pending_dir, name)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            shutil.copyfile(os.path.join(backup_dir, name), dst)
+
+    def record(self, state_path=STATE_PATH, pending_dir=PENDING_DIR):
+        """Store the manifest if the import container finished cleanly; True when recorded."""
+        if not self.needed:
+            return True
+        try:
+            out = subprocess.run(["docker", "inspect", "--format", "{{.State.Status}} {{.State.ExitCode}}",
+                                  SERVICE], capture_output=True, text=True, timeout=15).stdout.split()
+        except (OSError, subprocess.TimeoutExpired):
+            out = []
+        if out != ["exited", "0"]:
+            print(f"  n8n import did not complete ({' '.join(out) or 'no container'}); "
+                  f"the {len(self.changed)} file(s) will be imported again on the next deploy.")
+            return False
+        save_state({
+            "database": self.fingerprint or database_fingerprint(),
+            "files": self.files,
+            "imported_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }, state_path)
+        shutil.rmtree(pending_dir, ignore_errors=True)
+        print(f"  n8n import recorded ({len(self.changed)} file(s)).")
+        return True
+
+
+def plan_import(backup_dir=BACKUP_DIR, state_path=STATE_PATH):
+    files = scan(backup_dir)
+    fingerprint = database_fingerprint()
+    return ImportPlan(files, changed_files(files, load_state(state_path), fingerprint), fingerprint)
+
+
+def prepare(selected_services):
+    """Plan and stage the import for a deploy; None when n8n is not deployed."""
+    if selected_services and "all" not in selected_services and "n8n" not in selected_services:
+        return None
+    plan = plan_import()
+    if plan.needed:
+        plan.stage()
+        print(f"n8n import: {len(plan.changed)} new or changed file(s) staged.")
+    else:
+        print(f"n8n import: {len(plan.files)} backup file(s) unchanged since the last import, skipped.")
+    return plan
+
+
+# ---------------------- MAIN ---------------------- #
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="start_services.py n8n-import",
+        description="Show or reset the manifest of n8n backup files already imported.",
+    )
+    sub = parser.add_subparsers(dest="action", required=True)
+    sub.add_parser("status", help="List the backup files the next deploy would import.")
+    sub.add_parser("reset", help="Forget the manifest so the next deploy imports everything.")
+    args = parser.parse_args(argv)
+
+    if args.action == "reset":
+        try:
+            os.remove(STATE_PATH)
+            print(f"Removed {STATE_PATH}; the next deploy imports every backup file.")
+        except FileNotFoundError:
+            print("No import manifest recorded yet.")
+        return 0
+
+    state = load_state()
+    plan = plan_import()
+    if not state:
+        print("No import recorded yet.")
+    else:
+        same_db = plan.fingerprint and state.get("database") == plan.fingerprint
+        print(f"Last import: {state.get('imported_at', '?')}, {len(state.get('files', {}))} file(s)"
+              + ("" if same_db else " (database recreated, key changed or unreachable)"))
+    if not plan.changed:
+        print(f"All {len(plan.files)} backup file(s) imported; n8n starts without the import step.")
+        return 0
+    imported = state.get("files", {})
+    print(f"{len(plan.changed)} of {len(plan.files)} file(s) to import:")
+    for name in plan.changed:
+        print(f"  {'changed' if name in imported else 'new':8} {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
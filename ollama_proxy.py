@@ -0,0 +1,872 @@
+#!/usr/bin/env python3
+"""
+ollama_proxy.py
+Front proxy for Ollama: embedding batching and per-class scheduling.
+
+All clients share one Ollama. Without a proxy, a long n8n batch job fills
+every OLLAMA_NUM_PARALLEL slot and Open WebUI chats wait behind it, while
+embedding nodes send one text per call and pay the per-call overhead each
+time. The proxy handles requests by route:
+
+    POST /api/embed, /v1/embeddings   batched per model for up to --max-wait-ms
+                                      or --max-batch texts, then split back to
+                                      each caller (same normalised vectors)
+    POST /api/chat, /api/generate,    scheduled: classified interactive or batch,
+         /v1/chat/completions,        queued per model and class, at most
+         /v1/completions              --num-parallel in flight per model, and
+                                      streamed back without buffering
+    anything else                     streamed through untouched (pulls, tags,
+                                      the legacy /api/embeddings, whose vectors
+                                      are not normalised)
+    GET  /proxy/metrics               batch sizes, queue wait and time to
+                                      first token per class
+    GET  /proxy/health
+
+Classification, first match wins: an `X-Ollama-Priority: interactive|batch`
+header, --batch-models / --interactive-models patterns, the caller's
+address (--interactive-hosts, resolved in the compose network), then
+--default-class. Interactive requests always go first, the last
+--interactive-reserve slots of a model are kept for them, and a batch
+request waiting longer than --batch-max-wait jumps the line.
+
+The proxy is a single stdlib-only file so it runs in a plain python image.
+`enable` renames the Ollama container to ollama-backend and gives the
+proxy the `ollama` name, so every existing http://ollama:11434 URL goes
+through it without touching workflows or credentials.
+
+Usage:
+    python3 start_services.py ollama-proxy enable
+    python3 start_services.py ollama-proxy bench --direct http://127.0.0.1:11434 --proxy http://127.0.0.1:11435
+    python3 ollama_proxy.py serve --listen 127.0.0.1:11435 --upstream http://127.0.0.1:11434
+"""
+
+import argparse
+import asyncio
+import collections
+import fnmatch
+import json
+import os
+import socket
+import sys
+import time
+from urllib.parse import urlsplit
+
+
+# ---------------------- CONSTANTS ---------------------- #
+
+PROXY_OVERRIDE = "docker-compose.override.ollama-proxy.yml"
+BACKEND_CONTAINER = "ollama-backend"
+OLLAMA_SERVICES = ["ollama-cpu", "ollama-gpu", "ollama-gpu-amd"]
+
+HOP_BY_HOP = {"connection", "keep-alive", "proxy-connection", "transfer-encoding", "te",
+              "trailer", "upgrade", "host", "content-length"}
+BATCH_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128]
+LATENCY_BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+CLASSES = ("interactive", "batch")
+SCHEDULED_PATHS = {"/api/chat", "/api/generate", "/v1/chat/completions", "/v1/completions"}
+
+
+# ---------------------- HTTP ---------------------- #
+
+class HttpError(Exception):
+    """Malformed request or upstream failure."""
+
+
+async def read_head(reader):
+    """Return (first line, [(name, value)]) of a request or response head."""
+    first = await reader.readline()
+    if not first:
+        raise HttpError("connection closed")
+    headers = []
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers.append((name.strip(), value.strip()))
+    return first.decode("latin-1").rstrip("\r\n"), headers
+
+
+def header(headers, name, default=None):
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return default
+
+
+async def read_body(reader, headers, until_eof=False):
+    if (header(headers, "transfer-encoding") or "").lower() == "chunked":
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+    length = header(headers, "content-length")
+    if length is not None:
+        return await reader.readexactly(int(length))
+    return await reader.read() if until_eof else b""
+
+
+class Request:
+    def __init__(self, method, target, headers, body):
+        self.method = method
+        self.target = target
+        self.path = target.split("?", 1)[0]
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body or b"{}")
+
+
+async def read_request(reader):
+    first, headers = await read_head(reader)
+    parts = first.split()
+    if len(parts) != 3:
+        raise HttpError(f"bad request line: {first!r}")
+    return Request(parts[0], parts[1], headers, await read_body(reader, headers))
+
+
+def encode_request(method, target, host, headers, body):
+    lines = [f"{method} {target} HTTP/1.1", f"Host: {host}"]
+    lines += [f"{k}: {v}" for k, v in headers if k.lower() not in HOP_BY_HOP]
+    lines += [f"Content-Length: {len(body)}", "Connection: close", "", ""]
+    return "\r\n".join(lines).encode("latin-1") + body
+
+
+def encode_response(status, body, content_type="application/json", reason="OK"):
+    head = (f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n")
+    return head.encode("latin-1") + body
+
+
+class Upstream:
+    """One connection per request to Ollama (Connection: close)."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 11434
+        self.host_header = f"{self.host}:{self.port}"
+
+    async def open(self, method, target, headers, body):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        writer.write(encode_request(method, target, self.host_header, headers, body))
+        await writer.drain()
+        return reader, writer
+
+    async def call_json(self, path, payload):
+        """POST JSON and return (status, parsed body or raw bytes)."""
+        body = json.dumps(payload).encode()
+        reader, writer = await self.open("POST", path, [("Content-Type", "application/json")], body)
+        try:
+            first, headers = await read_head(reader)
+            status = int(first.split()[1])
+            raw = await read_body(reader, headers, until_eof=True)
+        finally:
+            writer.close()
+        try:
+            return status, json.loads(raw)
+        except ValueError:
+            return status, raw
+
+
+async def pipe(reader, writer):
+    """Copy bytes as they arrive (no buffering of streamed responses)."""
+    while True:
+        data = await reader.read(65536)
+        if not data:
+            return
+        writer.write(data)
+        await writer.drain()
+
+
+# ---------------------- STATS ---------------------- #
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus layout."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def render(self, name, labels=()):
+        prefix = "".join(f'{k}="{v}",' for k, v in labels)
+        lines, cumulative = [], 0
+        for bound, count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        suffix = "{" + prefix.rstrip(",") + "}" if prefix else ""
+        lines.append(f"{name}_sum{suffix} {round(self.sum, 6)}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+class BatchStats:
+    def __init__(self):
+        self.requests = 0
+        self.texts = 0
+        self.upstream_calls = 0
+        self.upstream_seconds = 0.0
+        self.failed_batches = 0
+        self.batch_size = Histogram(BATCH_BUCKETS)
+
+    def record_batch(self, size, seconds):
+        self.upstream_calls += 1
+        self.upstream_seconds += seconds
+        self.batch_size.observe(size)
+
+
+class ClassStats:
+    def __init__(self):
+        self.requests = 0
+        self.abandoned = 0
+        self.queue_wait = Histogram(LATENCY_BUCKETS)
+        self.ttft = Histogram(LATENCY_BUCKETS)
+
+
+# ---------------------- SCHEDULING ---------------------- #
+
+class ModelSlots:
+    """OLLAMA_NUM_PARALLEL slots of one model, handed out interactive first.
+
+    Batch requests never hold the last `reserve` slots, and the oldest
+    batch request goes before interactive ones once it has waited
+    `batch_max_wait` seconds, so neither class starves the other.
+    """
+
+    def __init__(self, slots, reserve=1, batch_max_wait=30.0):
+        self.slots = max(1, slots)
+        self.reserve = max(0, min(reserve, self.slots - 1))
+        self.batch_max_wait = batch_max_wait
+        self.active = dict.fromkeys(CLASSES, 0)
+        self.waiting = {cls: collections.deque() for cls in CLASSES}
+
+    def _allowed(self, cls):
+        if sum(self.active.values()) >= self.slots:
+            return False
+        return cls == "interactive" or self.active["batch"] < self.slots - self.reserve
+
+    async def acquire(self, cls):
+        ahead = self.waiting[cls] or (cls == "batch" and self.waiting["interactive"])
+        if not ahead and self._allowed(cls):
+            self.active[cls] += 1
+            return
+        entry = (time.monotonic(), asyncio.get_running_loop().create_future())
+        self.waiting[cls].append(entry)
+        try:
+            await entry[1]
+        except asyncio.CancelledError:
+            if entry[1].done() and not entry[1].cancelled():
+                self.release(cls)  # granted just before the caller gave up
+            elif entry in self.waiting[cls]:
+                self.waiting[cls].remove(entry)
+            raise
+
+    def release(self, cls):
+        self.active[cls] -= 1
+        self._wake()
+
+    def _wake(self):
+        while True:
+            batch = self.waiting["batch"]
+            aged = batch and time.monotonic() - batch[0][0] >= self.batch_max_wait
+            for cls in (("batch", "interactive") if aged else CLASSES):
+                if self.waiting[cls] and self._allowed(cls):
+                    _, future = self.waiting[cls].popleft()
+                    if future.done():
+                        break  # cancelled, look again
+                    self.active[cls] += 1
+                    future.set_result(None)
+                    break
+            else:
+                return
+
+
+class Scheduler:
+    def __init__(self, slots, reserve=1, batch_max_wait=30.0):
+        self.settings = (slots, reserve, batch_max_wait)
+        self.models = {}
+
+    def model(self, name):
+        if name not in self.models:
+            self.models[name] = ModelSlots(*self.settings)
+        return self.models[name]
+
+
+class Classifier:
+    """Decide whether a request is interactive or batch."""
+
+    RESOLVE_EVERY = 30.0
+
+    def __init__(self, interactive_hosts=(), interactive_models=(), batch_models=(), default="batch"):
+        self.hosts = [h for h in interactive_hosts if h]
+        self.interactive_models = [m for m in interactive_models if m]
+        self.batch_models = [m for m in batch_models if m]
+        self.default = default
+        self.addresses = set()
+        self.resolved_at = None
+
+    async def refresh(self):
+        """Resolve the interactive hosts (container IPs change on recreate)."""
+        now = time.monotonic()
+        if self.resolved_at is not None and now - self.resolved_at < self.RESOLVE_EVERY:
+            return
+        self.resolved_at = now
+        addresses = set()
+        loop = asyncio.get_running_loop()
+        for host in self.hosts:
+            try:
+                infos = await loop.getaddrinfo(host, None)
+            except socket.gaierror:
+                continue  # service not deployed
+            addresses.update(info[4][0] for info in infos)
+        self.addresses = addresses
+
+    async def classify(self, request, model, peer):
+        wanted = (header(request.headers, "X-Ollama-Priority") or "").strip().lower()
+        if wanted in CLASSES:
+            return wanted
+        if any(fnmatch.fnmatch(model, pattern) for pattern in self.batch_models):
+            return "batch"
+        if any(fnmatch.fnmatch(model, pattern) for pattern in self.interactive_models):
+            return "interactive"
+        await self.refresh()
+        if peer in self.addresses:
+            return "interactive"
+        return self.default
+
+
+# ---------------------- BATCHING ---------------------- #
+
+class EmbedBatcher:
+    """Coalesce concurrent /api/embed inputs per (model, options) into one upstream call."""
+
+    def __init__(self, upstream, scheduler, max_batch=64, max_wait=0.005, max_inflight=2):
+        self.upstream = upstream
+        self.scheduler = scheduler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.semaphore = asyncio.Semaphore(max_inflight)
+        self.groups = {}
+        self.tasks = set()  # the loop only keeps weak references to running tasks
+        self.stats = BatchStats()
+
+    async def embed(self, model, texts, extra, cls="batch"):
+        """Return (status, {"embeddings": [...], ...}) for these texts."""
+        key = (model, json.dumps(extra, sort_keys=True))
+        future = asyncio.get_running_loop().create_future()
+        group = self.groups.get(key)
+        if group is None:
+            group = {"model": model, "extra": extra, "entries": [], "count": 0, "class": "batch"}
+            self.groups[key] = group
+            asyncio.get_running_loop().call_later(self.max_wait, self._flush, key, group)
+        group["entries"].append((texts, future))
+        group["count"] += len(texts)
+        if cls == "interactive":
+            group["class"] = cls  # the batch runs at its most urgent member's priority
+        self.stats.requests += 1
+        self.stats.texts += len(texts)
+        if group["count"] >= self.max_batch:
+            self._flush(key, group)
+        return await future
+
+    def _flush(self, key, group):
+        if self.groups.get(key) is not group:
+            return  # already flushed by size
+        del self.groups[key]
+        task = asyncio.ensure_future(self._send(group))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _send(self, group):
+        entries = group["entries"]
+        try:
+            status, body = await self._call(group, [t for texts, _ in entries for t in texts])
+            if status != 200 and len(entries) > 1:
+                # One bad input (e.g. too long) must not fail its neighbours: retry alone
+                self.stats.failed_batches += 1
+                await asyncio.gather(*(self._send_alone(group, texts, fut) for texts, fut in entries))
+                return
+            self._resolve(entries, status, body)
+        except Exception as e:
+            for _, fut in entries:
+                if not fut.done():
+                    fut.set_exception(e)
+
+    async def _send_alone(self, group, texts, future):
+        try:
+            status, body = await self._call(group, texts)
+            self._resolve([(texts, future)], status, body)
+        except Exception as e:
+            future.set_exception(e)
+
+    async def _call(self, group, inputs):
+        slots = self.scheduler.model(group["model"])
+        async with self.semaphore:
+            await slots.acquire(group["class"])
+            try:
+                start = time.monotonic()
+                status, body = await self.upstream.call_json(
+                    "/api/embed", dict(group["extra"], model=group["model"], input=inputs))
+                self.stats.record_batch(len(inputs), time.monotonic() - start)
+                return status, body
+            finally:
+                slots.release(group["class"])
+
+    @staticmethod
+    def _resolve(entries, status, body):
+        if status != 200 or not isinstance(body, dict):
+            for _, fut in entries:
+                fut.set_result((status, body))
+            return
+        vectors = body.get("embeddings", [])
+        tokens = body.get("prompt_eval_count", 0)
+        offset = 0
+        for texts, fut in entries:
+            # Token count is only known for the whole batch: split it by share of texts
+            part = dict(body, embeddings=vectors[offset:offset + len(texts)],
+                        prompt_eval_count=tokens * len(texts) // max(len(vectors), 1))
+            offset += len(texts)
+            fut.set_result((200, part))
+
+
+# ---------------------- PROXY ---------------------- #
+
+class OllamaProxy:
+    def __init__(self, args):
+        self.upstream = Upstream(args.upstream)
+        self.scheduler = Scheduler(args.num_parallel, args.interactive_reserve, args.batch_max_wait)
+        self.classifier = Classifier(split_list(args.interactive_hosts), split_list(args.interactive_models),
+                                     split_list(args.batch_models), args.default_class)
+        self.batcher = EmbedBatcher(self.upstream, self.scheduler, args.max_batch,
+                                    args.max_wait_ms / 1000.0, args.max_inflight)
+        self.classes = {cls: ClassStats() for cls in CLASSES}
+        self.passthrough = 0
+
+    async def handle(self, reader, writer):
+        peer = (writer.get_extra_info("peername") or ("",))[0]
+        try:
+            request = await read_request(reader)
+            if request.path.startswith("/proxy/"):
+                writer.write(self.local_endpoint(request))
+            elif request.method == "POST" and request.path == "/api/embed":
+                writer.write(await self.embed_native(request, peer))
+            elif request.method == "POST" and request.path == "/v1/embeddings":
+                writer.write(await self.embed_openai(request, peer))
+            elif request.method == "POST" and request.path in SCHEDULED_PATHS:
+                await self.scheduled(request, reader, writer, peer)
+            else:
+                await self.forward(request, writer)
+            await writer.drain()
+        except (HttpError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            try:
+                writer.write(encode_response(502, json.dumps({"error": f"proxy: {e}"}).encode(),
+                                             reason="Bad Gateway"))
+                await writer.drain()
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    async def forward(self, request, writer):
+        """Pass the request through and stream the response back as it arrives."""
+        self.passthrough += 1
+        up_reader, up_writer = await self.upstream.open(request.method, request.target,
+                                                        request.headers, request.body)
+        try:
+            await pipe(up_reader, writer)
+        finally:
+            up_writer.close()
+
+    async def scheduled(self, request, reader, writer, peer):
+        """Queue a generation request for a slot of its model, then stream it through."""
+        try:
+            model = str(request.json().get("model", ""))
+        except (ValueError, AttributeError):
+            model = ""
+        cls = await self.classifier.classify(request, model, peer)
+        stats = self.classes[cls]
+        stats.requests += 1
+        arrived = time.monotonic()
+        slots = self.scheduler.model(model)
+        if not await self.wait_for_slot(slots, cls, reader):
+            stats.abandoned += 1
+            return
+        stats.queue_wait.observe(time.monotonic() - arrived)
+        try:
+            up_reader, up_writer = await self.upstream.open(request.method, request.target,
+                                                            request.headers, request.body)
+            try:
+                head = b""  # until the first body bytes, which carry the first token
+                while True:
+                    data = await up_reader.read(65536)
+                    if not data:
+                        break
+                    if head is not None:
+                        head += data
+                        end = head.find(b"\r\n\r\n")
+                        if end != -1 and len(head) > end + 4:
+                            stats.ttft.observe(time.monotonic() - arrived)
+                            head = None
+                    writer.write(data)
+                    await writer.drain()
+            finally:
+                up_writer.close()
+        finally:
+            slots.release(cls)
+
+    @staticmethod
+    async def wait_for_slot(slots, cls, reader):
+        """Wait for a slot; give up if the client disconnects (or resets) while queued."""
+        acquire = asyncio.ensure_future(slots.acquire(cls))
+        gone = asyncio.ensure_future(reader.read(1))
+        granted = False
+        try:
+            await asyncio.wait({acquire, gone}, return_when=asyncio.FIRST_COMPLETED)
+            if not acquire.done():
+                try:
+                    extra = gone.result()
+                except (ConnectionError, OSError):
+                    extra = b""  # reset while queued: a disconnect
+                if extra != b"":
+                    await acquire  # unexpected extra bytes, not a disconnect
+            if acquire.done():
+                acquire.result()
+                granted = True
+            return granted
+        finally:
+            gone.cancel()
+            if gone.done() and not gone.cancelled():
+                gone.exception()  # retrieved, so asyncio does not log it
+            if not granted:
+                if not acquire.done():
+                    # acquire() gives the slot back itself if it was granted meanwhile
+                    acquire.cancel()
+                    try:
+                        await acquire
+                    except asyncio.CancelledError:
+                        pass
+                elif not acquire.cancelled() and acquire.exception() is None:
+                    slots.release(cls)
+
+    async def embed_native(self, request, peer):
+        try:
+            payload = request.json()
+        except ValueError:
+            return encode_response(400, b'{"error":"invalid JSON"}', reason="Bad Request")
+        texts = payload.pop("input", [])
+        single = isinstance(texts, str)
+        model = payload.pop("model", "")
+        cls = await self.classifier.classify(request, model, peer)
+        status, body = await self.batcher.embed(model, [texts] if single else list(texts), payload, cls)
+        if status != 200:
+            return encode_response(status, body if isinstance(body, bytes) else json.dumps(body).encode(),
+                                   reason="Upstream Error")
+        return encode_response(200, json.dumps(body).encode())
+
+    async def embed_openai(self, request, peer):
+        try:
+            payload = request.json()
+        except ValueError:
+            return encode_response(400, b'{"error":"invalid JSON"}', reason="Bad Request")
+        texts = payload.get("input", [])
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        extra = {}
+        if payload.get("dimensions"):
+            extra["dimensions"] = payload["dimensions"]
+        model = payload.get("model", "")
+        cls = await self.classifier.classify(request, model, peer)
+        status, body = await self.batcher.embed(model, texts, extra, cls)
+        if status != 200:
+            return encode_response(status, body if isinstance(body, bytes) else json.dumps(body).encode(),
+                                   reason="Upstream Error")
+        tokens = body.get("prompt_eval_count", 0)
+        out = {
+            "object": "list",
+            "model": model,
+            "data": [{"object": "embedding", "index": i, "embedding": v}
+                     for i, v in enumerate(body["embeddings"])],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+        return encode_response(200, json.dumps(out).encode())
+
+    def local_endpoint(self, request):
+        if request.path == "/proxy/health":
+            return encode_response(200, b"ok\n", "text/plain")
+        if request.path == "/proxy/metrics":
+            return encode_response(200, self.render_metrics().encode(), "text/plain; version=0.0.4; charset=utf-8")
+        return encode_response(404, b"not found\n", "text/plain", reason="Not Found")
+
+    def render_metrics(self):
+        s = self.batcher.stats
+        lines = []
+
+        def metric(name, kind, help_text, rows):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in rows:
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        def histogram(name, help_text, series):
+            metric(name, "histogram", help_text, [])
+            for labels, hist in series:
+                lines.extend(hist.render(name, labels))
+
+        metric("localai_ollama_proxy_embed_requests_total", "counter",
+               "Embedding requests received.", [((), s.requests)])
+        metric("localai_ollama_proxy_embed_texts_total", "counter",
+               "Texts embedded.", [((), s.texts)])
+        metric("localai_ollama_proxy_embed_upstream_calls_total", "counter",
+               "Batched /api/embed calls sent to Ollama.", [((), s.upstream_calls)])
+        metric("localai_ollama_proxy_embed_upstream_seconds_total", "counter",
+               "Time spent in upstream embedding calls.", [((), round(s.upstream_seconds, 3))])
+        metric("localai_ollama_proxy_embed_failed_batches_total", "counter",
+               "Batches retried request by request after an upstream error.", [((), s.failed_batches)])
+        histogram("localai_ollama_proxy_embed_batch_size", "Texts per upstream call.", [((), s.batch_size)])
+
+        by_class = sorted(self.classes.items())
+        metric("localai_ollama_proxy_requests_total", "counter", "Scheduled generation requests.",
+               [((("class", c),), st.requests) for c, st in by_class])
+        metric("localai_ollama_proxy_abandoned_total", "counter", "Clients that disconnected while queued.",
+               [((("class", c),), st.abandoned) for c, st in by_class])
+        histogram("localai_ollama_proxy_queue_wait_seconds", "Time spent waiting for an Ollama slot.",
+                  [((("class", c),), st.queue_wait) for c, st in by_class])
+        histogram("localai_ollama_proxy_ttft_seconds", "Time from request to the first streamed body bytes.",
+                  [((("class", c),), st.ttft) for c, st in by_class])
+
+        models = sorted(self.scheduler.models.items())
+        metric("localai_ollama_proxy_slots", "gauge", "Concurrent requests allowed per model.",
+               [((("model", m),), slots.slots) for m, slots in models])
+        metric("localai_ollama_proxy_active", "gauge", "Requests running in Ollama.",
+               [((("model", m), ("class", c)), slots.active[c]) for m, slots in models for c in CLASSES])
+        metric("localai_ollama_proxy_queued", "gauge", "Requests waiting for a slot.",
+               [((("model", m), ("class", c)), len(slots.waiting[c])) for m, slots in models for c in CLASSES])
+        metric("localai_ollama_proxy_passthrough_requests_total", "counter",
+               "Requests forwarded unchanged.", [((), self.passthrough)])
+        return "\n".join(lines) + "\n"
+
+
+def split_list(value):
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+def parse_listen(value):
+    host, _, port = value.rpartition(":")
+    return host or "0.0.0.0", int(port)
+
+
+async def serve(args):
+    proxy = OllamaProxy(args)
+    host, port = parse_listen(args.listen)
+    server = await asyncio.start_server(proxy.handle, host, port, limit=1 << 20)
+    print(f"Ollama proxy on {host}:{port} -> {args.upstream} "
+          f"(batches of up to {args.max_batch} texts, {args.max_wait_ms}ms window; "
+          f"{args.num_parallel} slot(s) per model, interactive: {args.interactive_hosts or '-'})", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+# ---------------------- BENCHMARK ---------------------- #
+
+async def _embed_once(upstream, model):
+    status, body = await upstream.call_json("/api/embed", {"model": model, "input": "benchmark text"})
+    if status != 200:
+        raise HttpError(f"HTTP {status}: {body!r:.200}")
+
+
+async def run_load(url, model, requests, concurrency):
+    """Fire `requests` single-text /api/embed calls with `concurrency` in flight; return seconds."""
+    upstream = Upstream(url)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await _embed_once(upstream, model)
+
+    start = time.monotonic()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return time.monotonic() - start
+
+
+def fetch_metrics(url):
+    import urllib.request
+    with urllib.request.urlopen(url.rstrip("/") + "/proxy/metrics", timeout=5) as resp:
+        values = {}
+        for line in resp.read().decode().splitlines():
+            if line and not line.startswith("#") and "{" not in line:
+                name, _, value = line.partition(" ")
+                values[name] = float(value)
+        return values
+
+
+def bench(args):
+    print(f"{args.requests} single-text /api/embed requests, {args.concurrency} in flight, model {args.model}")
+    results = {}
+    for label, url in (("direct", args.direct), ("proxy", args.proxy)):
+        try:
+            before = fetch_metrics(url) if label == "proxy" else None
+            seconds = asyncio.run(run_load(url, args.model, args.requests, args.concurrency))
+            after = fetch_metrics(url) if label == "proxy" else None
+        except (OSError, HttpError) as e:
+            print(f"  {label}: failed ({e})")
+            continue
+        results[label] = seconds
+        line = f"  {label:<7} {seconds:7.2f}s  {args.requests / seconds:8.1f} embeddings/s"
+        if before is not None:
+            calls = after["localai_ollama_proxy_embed_upstream_calls_total"] - \
+                before["localai_ollama_proxy_embed_upstream_calls_total"]
+            texts = after["localai_ollama_proxy_embed_texts_total"] - before["localai_ollama_proxy_embed_texts_total"]
+            if calls:
+                line += f"  ({int(calls)} upstream calls, {texts / calls:.1f} texts/batch)"
+        print(line)
+    if "direct" in results and "proxy" in results:
+        print(f"  Throughput gain: x{results['direct'] / results['proxy']:.2f}")
+    return 0 if results else 1
+
+
+# ---------------------- PROVISIONING ---------------------- #
+
+def planned_num_parallel():
+    """OLLAMA_NUM_PARALLEL from the resource plan, if there is one."""
+    from resource_planner import load_plan
+    plan = load_plan()
+    if plan:
+        return plan["services"].get("ollama", {}).get("env", {}).get("OLLAMA_NUM_PARALLEL")
+    return None
+
+
+def build_override(args):
+    from compose_override import write_override
+    command = ["python", "/app/ollama_proxy.py", "serve", "--listen", "0.0.0.0:11434",
+               "--upstream", f"http://{BACKEND_CONTAINER}:11434",
+               "--max-batch", str(args.max_batch), "--max-wait-ms", str(args.max_wait_ms),
+               "--max-inflight", str(args.max_inflight),
+               "--num-parallel", str(args.num_parallel),
+               "--interactive-reserve", str(args.interactive_reserve),
+               "--batch-max-wait", str(args.batch_max_wait),
+               "--interactive-hosts", args.interactive_hosts,
+               "--interactive-models", args.interactive_models,
+               "--batch-models", args.batch_models,
+               "--default-class", args.default_class]
+    services = {}
+    for name in OLLAMA_SERVICES:
+        # Same slot count on both sides, so the proxy queue is the only queue
+        services[name] = {"container_name": BACKEND_CONTAINER,
+                          "environment": {"OLLAMA_NUM_PARALLEL": str(args.num_parallel)}}
+        # Model pulls target ollama:11434, which is now the proxy
+        services[name.replace("ollama-", "ollama-pull-llama-", 1)] = {"depends_on": ["ollama-proxy"]}
+    services["ollama-proxy"] = {
+        "image": "python:3.12-alpine",
+        # Takes over the `ollama` name so http://ollama:11434 goes through the proxy
+        "container_name": "ollama",
+        "restart": "unless-stopped",
+        "command": command,
+        "expose": ["11434/tcp"],
+        "volumes": ["./ollama_proxy.py:/app/ollama_proxy.py:ro"],
+        "healthcheck": {
+            "test": ["CMD", "python", "-c",
+                     "import urllib.request; urllib.request.urlopen('http://127.0.0.1:11434/proxy/health')"],
+            "interval": "30s",
+            "timeout": "5s",
+            "retries": 3,
+        },
+    }
+    header = [
+        "Generated by ollama_proxy.py — do not edit by hand.",
+        "Re-run: python3 start_services.py ollama-proxy enable / disable",
+    ]
+    return write_override(PROXY_OVERRIDE, services, header)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="start_services.py ollama-proxy",
+        description="Embedding-batching, priority-scheduling front proxy for Ollama.",
+    )
+    sub = parser.add_subparsers(dest="action", required=True)
+
+    def add_tuning(p, num_parallel_default):
+        p.add_argument("--max-batch", type=int, default=64, help="Texts per upstream /api/embed call.")
+        p.add_argument("--max-wait-ms", type=float, default=5.0,
+                       help="How long the first request of a batch waits for others.")
+        p.add_argument("--max-inflight", type=int, default=2, help="Concurrent upstream embedding calls.")
+        p.add_argument("--num-parallel", type=int, default=num_parallel_default,
+                       help="Requests in flight per model (OLLAMA_NUM_PARALLEL).")
+        p.add_argument("--interactive-reserve", type=int, default=1,
+                       help="Slots per model that batch requests never take.")
+        p.add_argument("--batch-max-wait", type=float, default=30.0,
+                       help="Seconds after which a queued batch request goes before interactive ones.")
+        p.add_argument("--interactive-hosts", default="open-webui,flowise",
+                       help="Comma-separated callers (hostnames or IPs) treated as interactive.")
+        p.add_argument("--interactive-models", default="", help="Comma-separated model patterns, e.g. 'qwen*'.")
+        p.add_argument("--batch-models", default="", help="Comma-separated model patterns.")
+        p.add_argument("--default-class", choices=CLASSES, default="batch")
+
+    serve_parser = sub.add_parser("serve", help="Run the proxy.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    serve_parser.add_argument("--listen", default="127.0.0.1:11435")
+    serve_parser.add_argument("--upstream", default="http://127.0.0.1:11434")
+    add_tuning(serve_parser, int(os.environ.get("OLLAMA_NUM_PARALLEL") or 1))
+
+    enable_parser = sub.add_parser("enable", help="Put the proxy in front of the stack's Ollama.",
+                                   formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    add_tuning(enable_parser, None)
+    sub.add_parser("disable", help="Remove the proxy override.")
+
+    bench_parser = sub.add_parser("bench", help="Compare embedding throughput direct vs through the proxy.",
+                                  formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    bench_parser.add_argument("--direct", default="http://127.0.0.1:11434")
+    bench_parser.add_argument("--proxy", default="http://127.0.0.1:11435")
+    bench_parser.add_argument("--model", default="nomic-embed-text")
+    bench_parser.add_argument("--requests", type=int, default=500)
+    bench_parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args(argv)
+
+    if args.action == "serve":
+        try:
+            asyncio.run(serve(args))
+        except KeyboardInterrupt:
+            pass
+        return 0
+    if args.action == "bench":
+        return bench(args)
+    if args.action == "enable":
+        if args.num_parallel is None:
+            planned = planned_num_parallel()
+            args.num_parallel = int(planned) if planned else 2
+            print(f"Slots per model: {args.num_parallel} "
+                  f"({'resource plan' if planned else 'default; run `start_services.py plan` to size from the hardware'})")
+        changed = build_override(args)
+        print(f"{'Wrote' if changed else 'Unchanged:'} {PROXY_OVERRIDE}")
+        print("Apply with: python3 start_services.py (the override is picked up automatically)")
+        return 0
+    if os.path.exists(PROXY_OVERRIDE):
+        os.remove(PROXY_OVERRIDE)
+        print(f"Removed {PROXY_OVERRIDE}. Apply with: python3 start_services.py")
+    else:
+        print("Ollama proxy is not enabled.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,580 @@
+#!/usr/bin/env python3
+"""
+orchestrator_bench.py
+Benchmark start_services.py against a simulated docker CLI.
+
+Each scenario copies the repository into a sandbox, puts a fake `docker`
+on PATH and runs the orchestrator there. The fake answers the compose and
+docker commands the launcher issues (config, down, pull, up, ps, info,
+image ls...) with per-command latencies, per-service start failures,
+health transitions and one-shot exits taken from the scenario, and logs
+every call.
+
+Built-in scenarios:
+    deploy      bulk `up -d` of n8n and its dependencies
+    update      same with --update (image pull first)
+    fallback    one selected service fails to start: bulk up fails, then
+                the per-service retry path of start_local_ai
+    multihost   `hosts deploy` over two fake Docker contexts (each context
+                keeps its own containers)
+    restart     deploy of n8n again after an unmeasured first one (unchanged
+                n8n backup: no import container)
+
+Per scenario (median of --repeat runs): wall time, the orchestrator's own
+CPU time, time blocked (wall - CPU: subprocesses, health polling, sleeps),
+time inside docker calls, and the number of docker spawns. Results can be
+saved as a baseline; a later run exits 1 when a metric grows beyond
+--threshold (plus --slack seconds for times).
+
+Usage:
+    python3 start_services.py bench                        # all scenarios
+    python3 start_services.py bench deploy fallback --repeat 3
+    python3 start_services.py bench --save-baseline        # record .localai/bench-baseline.json
+    python3 start_services.py bench --threshold 0.15       # compare with it, exit 1 on regression
+    python3 start_services.py bench --scenario-file my-scenarios.json --keep
+"""
+
+import argparse
+import copy
+import json
+import os
+import re
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# ---------------------- CONSTANTS ---------------------- #
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(".localai", "bench-baseline.json")
+# Not needed by the orchestrator, or runtime data
+SANDBOX_IGNORE = shutil.ignore_patterns(
+    ".git", ".localai", "__pycache__", "supabase", "shared", "backups", "neo4j", "assets", ".env")
+
+# Seconds per call, keyed by "compose <command>" or the docker command
+DEFAULT_LATENCY = {
+    "default": 0.05,
+    "compose config": 0.3,
+    "compose down": 1.0,
+    "compose pull": 3.0,
+    "compose up": 0.5,
+    "compose ps": 0.1,
+    "info": 0.1,
+    "start": 0.3,        # added to `compose up` per container started
+}
+
+N8N_ENV = {"DB_POSTGRESDB_HOST": "postgres", "DB_POSTGRESDB_USER": "postgres", "QUEUE_BULL_REDIS_HOST": "redis"}
+
+DEFAULT_SERVICES = {
+    "postgres":   {"image": "postgres:16-alpine", "health": [[0, "starting"], [1.5, "healthy"]]},
+    "redis":      {"image": "valkey/valkey:8-alpine"},
+    "n8n-import": {"image": "n8nio/n8n:latest", "depends_on": ["postgres"], "exit_after": 2,
+                   "environment": N8N_ENV, "profiles": ["n8n-import"]},
+    "n8n":        {"image": "n8nio/n8n:latest", "depends_on": ["postgres", "redis", "n8n-import"],
+                   "health": [[0, "starting"], [4, "healthy"]], "environment": N8N_ENV},
+    "flowise":    {"image": "flowiseai/flowise:latest", "health": [[0, "starting"], [3, "healthy"]]},
+    "qdrant":     {"image": "qdrant/qdrant:latest"},
+    "searxng":    {"image": "searxng/searxng:latest", "depends_on": ["redis"]},
+    "open-webui": {"image": "ghcr.io/open-webui/open-webui:main", "depends_on": ["searxng"],
+                   "health": [[0, "starting"], [5, "healthy"]],
+                   "environment": {"OLLAMA_API_BASE_URL": "http://ollama:11434",
+                                   "SEARXNG_QUERY_URL": "http://searxng:8080/search?q=<query>"}},
+    "ollama-gpu": {"image": "ollama/ollama:latest", "container_name": "ollama",
+                   "health": [[0, "starting"], [2, "healthy"]]},
+    "ollama-pull-llama-gpu": {"image": "ollama/ollama:latest", "depends_on": ["ollama-gpu"], "exit_after": 3},
+}
+
+BASE_ARGS = ["--no-supabase", "--proxy", "none", "--profile", "cpu", "--health-timeout", "60"]
+
+SCENARIOS = {
+    "deploy": {"args": ["--services", "n8n"]},
+    "restart": {"args": ["--services", "n8n"], "setup": BASE_ARGS + ["--services", "n8n"]},
+    "update": {"args": ["--services", "n8n", "--update"]},
+    "fallback": {"args": ["--services", "n8n", "flowise"],
+                 "services": {"flowise": {"fail_up": "port 3001 is already allocated"}}},
+    "multihost": {"command": ["hosts", "deploy", "--inventory", "hosts.json",
+                              "--services", "n8n", "openwebui", "qdrant", "ollama"],
+                  "files": {"hosts.json": {"hosts": {
+                      "gpu-box": {"context": "gpu-box", "address": "10.0.0.20", "gpu": "nvidia"},
+                      "storage-box": {"context": "storage-box", "address": "10.0.0.21",
+                                      "labels": ["storage"]}}}},
+                  "contexts": {"gpu-box": {"NCPU": 16, "MemTotal": 64 << 30},
+                               "storage-box": {"NCPU": 8, "MemTotal": 32 << 30}}},
+}
+
+METRICS = ["wall", "cpu", "blocked", "docker", "spawns"]
+# Compared against the baseline (docker time follows the scenario, not the code)
+COMPARED = ["wall", "cpu", "blocked", "spawns"]
+
+# compose options that take a value (before the compose command)
+COMPOSE_VALUE_OPTS = {"-p", "--project-name", "-f", "--file", "--profile", "--env-file",
+                      "--project-directory", "--ansi", "--progress"}
+
+
+# ---------------------- FAKE DOCKER ---------------------- #
+
+def load_state(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(path, state):
+    tmp = f"{path}.{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def container_state(spec, started, now):
+    """(state, health, exit code) of a container started at `started`."""
+    elapsed = now - started
+    if "exit_after" in spec and elapsed >= spec["exit_after"]:
+        return "exited", "", spec.get("exit_code", 0)
+    health = ""
+    for at, status in spec.get("health", []):
+        if elapsed >= at:
+            health = status
+    return "running", health, 0
+
+
+def compose_command(args):
+    """(command, its arguments, active profiles) of a `docker compose ...` call."""
+    i = 0
+    profiles = set()
+    while i < len(args) and args[i].startswith("-"):
+        if args[i] == "--profile" and i + 1 < len(args):
+            profiles.add(args[i + 1])
+        i += 2 if args[i] in COMPOSE_VALUE_OPTS else 1
+    return (args[i], args[i + 1:], profiles) if i < len(args) else ("", [], profiles)
+
+
+def enabled(services, profiles):
+    """Services without profiles, or with one of the active profiles."""
+    return {name: spec for name, spec in services.items()
+            if not spec.get("profiles") or profiles & set(spec["profiles"])}
+
+
+def with_deps(names, services, active=None):
+    """names plus their dependencies; dependencies outside `active` are skipped (required: false)."""
+    wanted = []
+    for name in names:
+        deps = [d for d in services.get(name, {}).get("depends_on", []) if active is None or d in active]
+        for dep in with_deps(deps, services, active) + [name]:
+            if dep not in wanted:
+                wanted.append(dep)
+    return wanted
+
+
+def ready_after(spec):
+    """Seconds after start at which `up --wait` returns for a container."""
+    if "exit_after" in spec:
+        return spec["exit_after"]
+    return next((at for at, status in spec.get("health", []) if status == "healthy"), 0)
+
+
+def simulate(argv, scenario, state, context=None):
+    """Answer one docker call: (operation, exit code, stdout, stderr, extra latency)."""
+    services = scenario["services"]
+    now = time.time()
+    if argv[:1] == ["compose"]:
+        command, args, profiles = compose_command(argv[1:])
+        op = f"compose {command}"
+        active = enabled(services, profiles)
+        if command == "config":
+            if "--services" in args:
+                return op, 0, "".join(f"{name}\n" for name in active), "", 0
+            config = {"name": "localai", "services": {
+                name: {"image": spec["image"],
+                       "container_name": spec.get("container_name", name),
+                       "environment": spec.get("environment", {}),
+                       "ports": spec.get("ports", []),
+                       "depends_on": {d: {"condition": "service_started"}
+                                      for d in spec.get("depends_on", []) if d in active}}
+                for name, spec in active.items()}}
+            return op, 0, json.dumps(config), "", 0
+        if command == "down":
+            state.clear()
+            return op, 0, "", "", 0
+        if command == "up":
+            # Named services start whatever their profile; the others need an active one
+            names = [a for a in args if not a.startswith("-")] or list(active)
+            if "--no-deps" not in args:
+                names = with_deps(names, services, set(active) | set(names))
+            failed = [n for n in names if services.get(n, {}).get("fail_up")]
+            started = [n for n in names if n not in failed and n not in state]
+            # A one-shot dependency (n8n-import) must exit before its dependents start, and `up` waits for it
+            gate = {n: max([services[d]["exit_after"] for d in services.get(n, {}).get("depends_on", [])
+                            if d in started and "exit_after" in services.get(d, {})] + [0]) for n in started}
+            for name in started:
+                state[name] = now + gate[name]
+            extra = len(started) * scenario["latency"].get("start", 0) + max(gate.values(), default=0)
+            if "--wait" in args:
+                # Until the slowest container is healthy (or, for one-shot jobs, has exited)
+                extra += max([ready_after(services.get(n, {})) - (now - state[n]) for n in names if n in state]
+                             + [0])
+            if failed:
+                err = "".join(f"Error response from daemon: {n}: {services[n]['fail_up']}\n" for n in failed)
+                return op, 1, "", err, extra
+            return op, 0, "", "", extra
+        if command == "ps":
+            rows = []
+            for name, started in state.items():
+                status, health, code = container_state(services.get(name, {}), started, now)
+                if "-a" in args or status == "running":
+                    rows.append({"Service": name, "Name": name, "State": status,
+                                 "Health": health, "ExitCode": code})
+            if "--services" in args:
+                return op, 0, "".join(row["Service"] + "\n" for row in rows), "", 0
+            return op, 0, "".join(json.dumps(row) + "\n" for row in rows), "", 0
+        if command == "rm":
+            for name in args:
+                state.pop(name, None)
+            return op, 0, "", "", 0
+        if command == "version":
+            return op, 0, "2.29.0\n", "", 0
+        return op, 0, "", "", 0
+
+    op = argv[0] if argv else ""
+    if op == "info":
+        info = dict({"ServerVersion": "27.1.0", "DockerRootDir": REPO_DIR},
+                    **scenario.get("contexts", {}).get(context, {}))
+        return op, 0, json.dumps(info) + "\n", "", 0
+    if op == "version":
+        return op, 0, json.dumps({"Client": {"Version": "27.1.0"}, "Server": {"Version": "27.1.0"}}) + "\n", "", 0
+    if op == "image":
+        return op, 0, "".join(sorted({spec["image"] + "\n" for spec in services.values()})), "", 0
+    if op == "ps":
+        filters = [argv[i + 1] for i, a in enumerate(argv[:-1]) if a == "--filter"]
+        fmt = argv[argv.index("--format") + 1] if "--format" in argv else ""
+        lines = []
+        for name, started in state.items():
+            status, health, _ = container_state(services.get(name, {}), started, now)
+            if status != "running":
+                continue
+            if any(f.startswith("name=") and not re.search(f[5:], name) for f in filters):
+                continue
+            if "Ports" in fmt:
+                lines.append("")
+            elif fmt.startswith("table"):
+                lines.append(f"{name}\tUp {now - started:.0f} seconds" + (f" ({health})" if health else ""))
+            else:
+                lines.append(name)
+        if fmt.startswith("table"):
+            lines.insert(0, "NAMES\tSTATUS")
+        return op, 0, "".join(line + "\n" for line in lines), "", 0
+    if op == "volume":
+        # Volumes outlive `down`: one fixed creation time
+        return "volume inspect", 0, "2026-01-01T00:00:00Z\n", "", 0
+    if op == "inspect":
+        name = argv[-1] if len(argv) > 1 else ""
+        fmt = argv[argv.index("--format") + 1] if "--format" in argv else ""
+        if name in state and fmt:
+            status, _, code = container_state(services.get(name, {}), state[name], now)
+            out = (fmt.replace("{{.State.Status}}", status).replace("{{.State.ExitCode}}", str(code))
+                   .replace("{{.State.Running}}", str(status == "running").lower()))
+            return op, 0, out + "\n", "", 0
+        return op, 1, "", f"Error: No such object: {name}\n", 0
+    return op, 0, "", "", 0
+
+
+def fake_docker(argv):
+    """Entry point of the fake `docker` executable written into the sandbox."""
+    start = time.time()
+    with open(os.environ["FAKE_DOCKER_SCENARIO"], "r") as f:
+        scenario = json.load(f)
+    # `docker --context X ...`: every context is a separate daemon with its own containers
+    context = None
+    if argv[:1] in (["--context"], ["-c"]):
+        context, argv = argv[1], argv[2:]
+    state_path = os.environ["FAKE_DOCKER_STATE"] + (f".{context}" if context else "")
+    state = load_state(state_path)
+    before = dict(state)
+    op, code, out, err, extra = simulate(argv, scenario, state, context)
+    latency = scenario["latency"]
+    time.sleep(latency.get(op, latency["default"]) + extra)
+    if state != before:
+        save_state(state_path, state)
+    sys.stdout.write(out)
+    sys.stderr.write(err)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    record = {"op": op, "context": context, "argv": argv, "code": code, "start": start, "end": time.time(),
+              "cpu": usage.ru_utime + usage.ru_stime}
+    with open(os.environ["FAKE_DOCKER_LOG"], "a") as f:
+        f.write(json.dumps(record) + "\n")
+    return code
+
+
+# ---------------------- SCENARIOS ---------------------- #
+
+def build_scenario(name, spec, scale=1.0):
+    """Scenario spec merged over the defaults, latencies and timings multiplied by scale."""
+    latency = dict(DEFAULT_LATENCY, **spec.get("latency", {}))
+    services = copy.deepcopy(DEFAULT_SERVICES)
+    for svc, overrides in spec.get("services", {}).items():
+        services.setdefault(svc, {"image": f"{svc}:latest"}).update(overrides)
+    for svc in services.values():
+        if "exit_after" in svc:
+            svc["exit_after"] *= scale
+        svc["health"] = [[at * scale, status] for at, status in svc.get("health", [])]
+    return {
+        "name": name,
+        "args": spec.get("args", []),
+        "command": spec.get("command"),
+        "setup": spec.get("setup"),
+        "files": spec.get("files", {}),
+        "contexts": spec.get("contexts", {}),
+        "expect_exit": spec.get("expect_exit", 0),
+        "latency": {op: seconds * scale for op, seconds in latency.items()},
+        "services": services,
+    }
+
+
+def make_sandbox(scenario):
+    """Copy of the repo with a filled-in .env and the fake docker first on PATH."""
+    from env_model import EnvFile, compose_consumers
+    sandbox = tempfile.mkdtemp(prefix="localai-bench-")
+    tree = os.path.join(sandbox, "repo")
+    shutil.copytree(REPO_DIR, tree, ignore=SANDBOX_IGNORE)
+    env = EnvFile.load(os.path.join(REPO_DIR, ".env.example"))
+    # Every key the compose files require, so the preflight .env check passes
+    required = set().union(*compose_consumers([os.path.join(tree, "docker-compose.yml")], required_only=True).values())
+    for key in sorted(set(env.keys()) | required - {"*"}):
+        if not env.get(key):
+            env.set(key, "bench")
+    env.save(os.path.join(tree, ".env"), backup=False)
+    # Compile outside the measured runs
+    subprocess.run([sys.executable, "-m", "compileall", "-q", tree], check=False)
+
+    bindir = os.path.join(sandbox, "bin")
+    os.makedirs(bindir)
+    docker = os.path.join(bindir, "docker")
+    with open(docker, "w") as f:
+        f.write(f"#!{sys.executable} -S\n"
+                f"import sys\n"
+                f"sys.path.insert(0, {REPO_DIR!r})\n"
+                f"from orchestrator_bench import fake_docker\n"
+                f"sys.exit(fake_docker(sys.argv[1:]))\n")
+    os.chmod(docker, 0o755)
+    with open(os.path.join(sandbox, "scenario.json"), "w") as f:
+        json.dump(scenario, f, indent=2)
+    return sandbox
+
+
+def docker_time(records):
+    """Wall time covered by at least one docker call (concurrent calls counted once)."""
+    total = 0.0
+    end = None
+    for rec in sorted(records, key=lambda r: r["start"]):
+        if end is None or rec["start"] > end:
+            total += rec["end"] - rec["start"]
+            end = rec["end"]
+        elif rec["end"] > end:
+            total += rec["end"] - end
+            end = rec["end"]
+    return total
+
+
+def run_once(scenario, keep=False):
+    """Run the orchestrator once in a fresh sandbox; metrics and per-operation totals."""
+    sandbox = make_sandbox(scenario)
+    tree = os.path.join(sandbox, "repo")
+    log_path = os.path.join(sandbox, "docker.jsonl")
+    env = dict(os.environ,
+               PATH=os.path.join(sandbox, "bin") + os.pathsep + os.environ.get("PATH", ""),
+               FAKE_DOCKER_SCENARIO=os.path.join(sandbox, "scenario.json"),
+               FAKE_DOCKER_STATE=os.path.join(sandbox, "containers.json"),
+               FAKE_DOCKER_LOG=log_path)
+    for path, content in scenario["files"].items():
+        with open(os.path.join(tree, path), "w") as f:
+            json.dump(content, f, indent=2)
+    if scenario["setup"]:
+        # Unmeasured: state the measured run starts from (containers, .localai)
+        subprocess.run([sys.executable, "start_services.py"] + scenario["setup"], cwd=tree, env=env,
+                       input="ok\n", stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, text=True)
+        open(log_path, "w").close()
+    cmd = [sys.executable, "start_services.py"] + (scenario["command"] or BASE_ARGS + scenario["args"])
+    with open(os.path.join(sandbox, "orchestrator.log"), "w") as out:
+        start = time.monotonic()
+        proc = subprocess.Popen(cmd, cwd=tree, env=env, stdin=subprocess.PIPE,
+                                stdout=out, stderr=subprocess.STDOUT, text=True)
+        proc.stdin.write("ok\n")
+        proc.stdin.close()
+        # wait4: CPU of the orchestrator and of every process it waited for
+        _, status, usage = os.wait4(proc.pid, 0)
+        wall = time.monotonic() - start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+
+    records = []
+    if os.path.exists(log_path):
+        with open(log_path, "r") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    cpu = max(0.0, usage.ru_utime + usage.ru_stime - sum(r["cpu"] for r in records))
+    ops = {}
+    for rec in records:
+        count, seconds = ops.get(rec["op"], (0, 0.0))
+        ops[rec["op"]] = (count + 1, seconds + rec["end"] - rec["start"])
+    result = {
+        "exit": proc.returncode,
+        "wall": wall,
+        "cpu": cpu,
+        "blocked": max(0.0, wall - cpu),
+        "docker": docker_time(records),
+        "spawns": len(records),
+        "ops": ops,
+    }
+    if keep:
+        result["sandbox"] = sandbox
+    else:
+        shutil.rmtree(sandbox, ignore_errors=True)
+    return result
+
+
+def run_scenario(scenario, repeat=1, keep=False):
+    """Median of each metric over `repeat` runs."""
+    runs = [run_once(scenario, keep) for _ in range(repeat)]
+    summary = {metric: statistics.median(run[metric] for run in runs) for metric in METRICS}
+    summary["exit"] = next((run["exit"] for run in runs if run["exit"] != scenario["expect_exit"]), runs[0]["exit"])
+    summary["ok"] = all(run["exit"] == scenario["expect_exit"] for run in runs)
+    summary["ops"] = runs[-1]["ops"]
+    if keep:
+        summary["sandboxes"] = [run["sandbox"] for run in runs]
+    return summary
+
+
+# ---------------------- BASELINE ---------------------- #
+
+def load_baseline(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_baseline(path, results, scale):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    data = {"saved_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "scale": scale,
+            "scenarios": {name: {m: r[m] for m in METRICS} for name, r in results.items()}}
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def regressions(results, baseline, threshold, slack):
+    """(scenario, metric, baseline, current) for every metric beyond the allowed growth."""
+    found = []
+    for name, result in results.items():
+        base = (baseline.get("scenarios") or {}).get(name)
+        if not base:
+            continue
+        for metric in COMPARED:
+            if metric not in base:
+                continue
+            allowed = base[metric] * (1 + threshold) + (0 if metric == "spawns" else slack)
+            if result[metric] > allowed:
+                found.append((name, metric, base[metric], result[metric]))
+    return found
+
+
+# ---------------------- REPORT ---------------------- #
+
+def fmt_metric(metric, value):
+    return str(int(value)) if metric == "spawns" else f"{value:.2f}s"
+
+
+def print_report(results, repeat, scale, baseline=None):
+    print(f"Orchestrator benchmark ({repeat} run(s) per scenario, median; latency scale {scale:g})")
+    print(f"  {'scenario':<10} {'result':<8}" + "".join(f" {m:>9}" for m in METRICS))
+    for name, result in results.items():
+        status = "ok" if result["ok"] else f"exit {result['exit']}"
+        print(f"  {name:<10} {status:<8}" + "".join(f" {fmt_metric(m, result[m]):>9}" for m in METRICS))
+        base = (baseline or {}).get("scenarios", {}).get(name)
+        if base:
+            deltas = []
+            for metric in COMPARED:
+                if base.get(metric):
+                    deltas.append(f"{metric} {(result[metric] - base[metric]) / base[metric]:+.0%}")
+            print(f"  {'':<10} {'vs base':<8} " + ", ".join(deltas))
+        busiest = sorted(result["ops"].items(), key=lambda item: -item[1][1])[:5]
+        print(f"  {'':<10} {'docker':<8} " + ", ".join(f"{op or '?'} x{count} {secs:.1f}s"
+                                                      for op, (count, secs) in busiest))
+        for sandbox in result.get("sandboxes", []):
+            print(f"  {'':<10} {'kept':<8} {sandbox}")
+
+
+# ---------------------- MAIN ---------------------- #
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="start_services.py bench",
+        description="Benchmark the deploy orchestrator against a simulated docker CLI.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("scenarios", nargs="*", help="Scenarios to run (default: all).")
+    parser.add_argument("--scenario-file", default=None,
+                        help="JSON {name: {args | command, latency, services, files, contexts}} "
+                             "adding or replacing scenarios.")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per scenario (the median is reported).")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Multiply every simulated latency and health delay.")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline file to compare with.")
+    parser.add_argument("--save-baseline", action="store_true", help="Record these results as the baseline.")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed relative growth of each metric over the baseline.")
+    parser.add_argument("--slack", type=float, default=0.25,
+                        help="Extra seconds allowed on time metrics (timer noise).")
+    parser.add_argument("--keep", action="store_true", help="Keep the sandboxes (orchestrator.log, docker.jsonl).")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    specs = dict(SCENARIOS)
+    if args.scenario_file:
+        with open(args.scenario_file, "r") as f:
+            specs.update(json.load(f))
+    names = args.scenarios or list(specs)
+    unknown = [name for name in names if name not in specs]
+    if unknown:
+        print(f"Unknown scenario(s): {', '.join(unknown)} (available: {', '.join(specs)})")
+        return 2
+
+    results = {}
+    for name in names:
+        scenario = build_scenario(name, specs[name], args.scale)
+        if not args.json:
+            print(f"Running {name}: start_services.py "
+                  f"{' '.join(scenario['command'] or BASE_ARGS + scenario['args'])}", flush=True)
+        results[name] = run_scenario(scenario, max(1, args.repeat), args.keep)
+
+    baseline = None if args.save_baseline else load_baseline(args.baseline)
+    if baseline and baseline.get("scale") != args.scale:
+        print(f"Baseline {args.baseline} was recorded with --scale {baseline.get('scale')}; not comparing.")
+        baseline = None
+    found = regressions(results, baseline, args.threshold, args.slack) if baseline else []
+
+    if args.json:
+        print(json.dumps({"results": results, "regressions": found}, indent=2))
+    else:
+        print()
+        print_report(results, max(1, args.repeat), args.scale, baseline)
+        for name, metric, base, current in found:
+            print(f"REGRESSION {name} {metric}: {fmt_metric(metric, base)} -> {fmt_metric(metric, current)} "
+                  f"(over +{args.threshold:.0%})")
+    if args.save_baseline:
+        save_baseline(args.baseline, results, args.scale)
+        print(f"Baseline saved to {args.baseline}.")
+
+    if not all(result["ok"] for result in results.values()):
+        return 1
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
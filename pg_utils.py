@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+pg_utils.py
+Thin psql wrapper shared by the database tools.
+
+By default commands run inside the stack's `postgres` container with
+`docker exec` (local socket, no password needed). Pass a DSN to use a
+local `psql` binary instead, e.g. against a test database.
+"""
+
+import json
+import subprocess
+
+
+DEFAULT_CONTAINER = "postgres"
+DEFAULT_DATABASE = "postgres"
+
+
+class PsqlError(Exception):
+    """psql exited with an error."""
+
+
+def psql_argv(database=DEFAULT_DATABASE, dsn=None, container=DEFAULT_CONTAINER, interactive=False):
+    """Build the psql command line for the container or a DSN."""
+    common = ["-X", "-q", "-v", "ON_ERROR_STOP=1"]
+    if dsn:
+        return ["psql", dsn] + common
+    cmd = ["docker", "exec"]
+    if interactive:
+        cmd.append("-i")
+    return cmd + [container, "psql", "-U", "postgres", "-d", database] + common
+
+
+def run_sql(sql, database=DEFAULT_DATABASE, dsn=None, container=DEFAULT_CONTAINER,
+            single_transaction=False, timeout=None):
+    """Run SQL and return stdout rows as lists of fields (tab separated, unaligned)."""
+    cmd = psql_argv(database, dsn, container, interactive=True) + ["-A", "-t", "-F", "\t"]
+    if single_transaction:
+        cmd.append("-1")
+    try:
+        proc = subprocess.run(cmd, input=sql, capture_output=True, text=True, timeout=timeout)
+    except FileNotFoundError:
+        raise PsqlError(f"{cmd[0]} not found in PATH")
+    if proc.returncode != 0:
+        raise PsqlError(proc.stderr.strip() or f"psql exited with {proc.returncode}")
+    return [line.split("\t") for line in proc.stdout.splitlines() if line != ""]
+
+
+def query_value(sql, default=None, **kwargs):
+    """First column of the first row, or default."""
+    rows = run_sql(sql, **kwargs)
+    if rows and rows[0]:
+        return rows[0][0]
+    return default
+
+
+def copy_in(copy_sql, rows, before_sql="", after_sql="", database=DEFAULT_DATABASE, dsn=None,
+            container=DEFAULT_CONTAINER):
+    """Stream rows into `COPY ... FROM STDIN` inside one transaction.
+
+    `rows` is an iterable of already-encoded COPY text lines (no newline).
+    before_sql / after_sql run in the same transaction. after_sql may be a
+    callable, evaluated once the rows are consumed (e.g. to store something
+    computed while streaming); the whole script then goes through stdin.
+    Returns the row count.
+    """
+    script = []
+    if before_sql:
+        script.append(before_sql.rstrip().rstrip(";") + ";")
+    script.append(copy_sql.rstrip().rstrip(";") + ";")
+    deferred = callable(after_sql)
+    cmd = psql_argv(database, dsn, container, interactive=True)
+    if deferred:
+        # psql reads the COPY data from its command stream, then the statements after it
+        head = "BEGIN;\n" + "\n".join(script) + "\n"
+    else:
+        head = ""
+        cmd.append("-1")
+        for statement in script:
+            cmd.extend(["-c", statement])
+        if after_sql:
+            cmd.extend(["-c", after_sql])
+
+    try:
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, text=True)
+    except FileNotFoundError:
+        raise PsqlError(f"{cmd[0]} not found in PATH")
+    count = 0
+    try:
+        proc.stdin.write(head)
+        for line in rows:
+            proc.stdin.write(line)
+            proc.stdin.write("\n")
+            count += 1
+        proc.stdin.write("\\.\n")
+        if deferred:
+            tail = after_sql()
+            proc.stdin.write((tail.rstrip().rstrip(";") + ";\n" if tail else "") + "COMMIT;\n")
+        proc.stdin.flush()  # communicate() closes it; it fails on an already closed stdin
+    except BrokenPipeError:
+        pass
+    except BaseException:
+        # The rows failed to produce: end psql before it commits anything
+        proc.kill()
+        proc.wait()
+        raise
+    stdout, stderr = proc.communicate()
+    if proc.returncode != 0:
+        raise PsqlError(stderr.strip() or f"psql exited with {proc.returncode}")
+    return count
+
+
+def copy_escape(value):
+    """Escape one field for COPY text format (NULL for None)."""
+    if value is None:
+        return "\\N"
+    if not isinstance(value, str):
+        value = json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+    return (value.replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+def quote_ident(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def quote_literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+preflight.py
+Read-only checks run before start_services.py touches the running stack.
+
+Port conflicts, a full disk, a missing .env key or a stopped Docker daemon
+used to surface only after `docker compose down` had taken the stack
+offline. The checks below run concurrently in a thread pool and share one
+`docker compose config` / `docker info` / `docker ps` call each, so the
+whole preflight takes about as long as the slowest docker command:
+
+    daemon    docker info answers
+    compose   docker compose config parses (with the selected profile/overrides)
+    env       variables used without a default by the selected services are set
+    ports     published host ports are free, or held by this stack itself
+    disk      free space on the Docker data root and every bind-mount source
+    images    images not present locally (warning: they will be pulled)
+
+Usage:
+    python3 start_services.py preflight --profile cpu --services n8n openwebui
+    (also run automatically by start_services.py; --skip-preflight to bypass)
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from env_model import EnvFile, compose_consumers
+
+
+# ---------------------- CONSTANTS ---------------------- #
+
+PROJECT_LABEL = "com.docker.compose.project=localai"
+DOCKER_TIMEOUT = 10
+OK, WARN, FAIL = "OK", "WARN", "FAIL"
+
+
+# ---------------------- FACTS ---------------------- #
+
+def run(cmd, timeout=DOCKER_TIMEOUT):
+    """(returncode, stdout, stderr); a missing binary or a timeout is a failure, not an exception."""
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        return proc.returncode, proc.stdout, proc.stderr
+    except FileNotFoundError:
+        return 127, "", f"{cmd[0]}: command not found"
+    except subprocess.TimeoutExpired:
+        return 124, "", f"{' '.join(cmd[:3])}: no answer within {timeout}s"
+
+
+class Facts:
+    """Docker queries shared by the checks, each computed once on the pool."""
+
+    def __init__(self, pool, base_cmd, env_file=".env"):
+        self.pool = pool
+        self.base_cmd = base_cmd
+        self.env_file = env_file
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            if name not in self._futures:
+                self._futures[name] = self.pool.submit(getattr(self, "_" + name))
+        return self._futures[name].result()
+
+    def _docker_info(self):
+        code, out, err = run(["docker", "info", "--format", "{{json .}}"])
+        if code != 0:
+            return None, (err or out).strip().splitlines()[-1:] or ["docker info failed"]
+        info = json.loads(out or "{}")
+        if info.get("ServerErrors"):
+            return None, info["ServerErrors"]
+        return info, []
+
+    def _config(self):
+        code, out, err = run(self.base_cmd + ["config", "--format", "json"])
+        if code != 0:
+            return None, [line for line in err.strip().splitlines() if line.strip()][-3:]
+        return json.loads(out), []
+
+    def _own_ports(self):
+        """Host ports published by containers of this stack (freed by `down`)."""
+        code, out, _ = run(["docker", "ps", "--filter", f"label={PROJECT_LABEL}", "--format", "{{.Ports}}"])
+        ports = set()
+        if code == 0:
+            for entry in out.replace("\n", ",").split(","):
+                # 127.0.0.1:5678->5678/tcp
+                host, _, rest = entry.strip().partition("->")
+                if rest:
+                    port = host.rsplit(":", 1)[-1]
+                    if port.isdigit():
+                        ports.add((int(port), rest.rsplit("/", 1)[-1]))
+        return ports
+
+    def _local_images(self):
+        code, out, _ = run(["docker", "image", "ls", "--format", "{{.Repository}}:{{.Tag}}"])
+        return set(out.split()) if code == 0 else None
+
+    def _env(self):
+        values = EnvFile.load(self.env_file).as_dict()
+        values.update({k: v for k, v in os.environ.items() if v})
+        return values
+
+
+def selected_config_services(config, services):
+    """Compose services of the rendered config that the selection deploys."""
+    available = config.get("services", {})
+    if not services or "all" in services:
+        return sorted(available)
+    from start_services import resolve_services
+    wanted = set(resolve_services(services))
+    if "ollama" in services:
+        wanted.update(name for name in available if name.startswith("ollama"))
+    return sorted(name for name in available if name in wanted)
+
+
+# ---------------------- CHECKS ---------------------- #
+
+def check_daemon(facts, ctx):
+    info, errors = facts.get("docker_info")
+    if info is None:
+        return [(FAIL, "Docker daemon", "; ".join(errors) + " (is the daemon running?)")]
+    return [(OK, "Docker daemon", f"{info.get('ServerVersion', '?')}, {info.get('ContainersRunning', 0)} running")]
+
+
+def check_compose(facts, ctx):
+    config, errors = facts.get("config")
+    if config is None:
+        return [(FAIL, "Compose config", " | ".join(errors) or "docker compose config failed")]
+    services = selected_config_services(config, ctx["services"])
+    return [(OK, "Compose config", f"{len(services)} service(s) selected")]
+
+
+def check_env(facts, ctx):
+    if not os.path.exists(facts.env_file):
+        return [(FAIL, ".env", f"{facts.env_file} not found (run generate_env.py)")]
+    env = facts.get("env")
+    required = compose_consumers(ctx["compose_files"], required_only=True)
+    missing = {}
+    for service in ctx["service_names"]:
+        for var in required.get(service, ()):
+            if not env.get(var):
+                missing.setdefault(var, []).append(service)
+    if missing:
+        detail = ", ".join(f"{var} ({'/'.join(svcs)})" for var, svcs in sorted(missing.items()))
+        return [(FAIL, ".env keys", f"missing or empty: {detail}")]
+    return [(OK, ".env keys", f"required keys set for {len(ctx['service_names'])} service(s)")]
+
+
+def port_free(host_ip, port, proto):
+    family = socket.AF_INET6 if ":" in (host_ip or "") else socket.AF_INET
+    kind = socket.SOCK_DGRAM if proto == "udp" else socket.SOCK_STREAM
+    with socket.socket(family, kind) as sock:
+        # Lets TIME_WAIT leftovers through, still fails on a listening socket
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind((host_ip or ("::" if family == socket.AF_INET6 else "0.0.0.0"), port))
+            return True
+        except PermissionError:
+            return True  # privileged port: docker-proxy binds it, not us
+        except OSError:
+            return False
+
+
+def check_ports(facts, ctx):
+    config, _ = facts.get("config")
+    if config is None:
+        return [(WARN, "Ports", "skipped (compose config failed)")]
+    own = facts.get("own_ports")
+    published = []
+    for name in selected_config_services(config, ctx["services"]):
+        for port in config["services"][name].get("ports") or []:
+            if isinstance(port, dict) and port.get("published"):
+                published.append((name, port.get("host_ip", ""), int(port["published"]), port.get("protocol", "tcp")))
+    conflicts = []
+    for name, host_ip, port, proto in published:
+        if (port, proto) in own:
+            continue
+        if not port_free(host_ip, port, proto):
+            conflicts.append(f"{port}/{proto} ({name})")
+    if conflicts:
+        return [(FAIL, "Ports", "in use by another process: " + ", ".join(conflicts))]
+    return [(OK, "Ports", f"{len(published)} published port(s) available")]
+
+
+def check_disk(facts, ctx):
+    config, _ = facts.get("config")
+    info, _ = facts.get("docker_info")
+    paths = {}
+    if info and info.get("DockerRootDir"):
+        paths[info["DockerRootDir"]] = "docker volumes/images"
+    if config:
+        for name in selected_config_services(config, ctx["services"]):
+            for volume in config["services"][name].get("volumes") or []:
+                if isinstance(volume, dict) and volume.get("type") == "bind":
+                    paths.setdefault(volume["source"], name)
+    # One result per filesystem
+    by_device = {}
+    for path, owner in paths.items():
+        probe = path
+        while probe and not os.path.exists(probe):
+            probe = os.path.dirname(probe.rstrip("/")) or "/"
+        try:
+            device = os.stat(probe).st_dev
+        except OSError:
+            continue  # e.g. Docker root not readable from here
+        by_device.setdefault(device, (probe, []))[1].append(owner)
+    results = []
+    min_free = ctx["min_free_gb"]
+    for probe, owners in by_device.values():
+        free_gb = shutil.disk_usage(probe).free / 1024 ** 3
+        label = f"Disk {probe}"
+        detail = f"{free_gb:.1f} GB free ({', '.join(sorted(set(owners))[:4])}{'…' if len(set(owners)) > 4 else ''})"
+        if free_gb < min_free:
+            results.append((FAIL, label, f"{detail}, need {min_free} GB"))
+        elif free_gb < 2 * min_free:
+            results.append((WARN, label, detail))
+        else:
+            results.append((OK, label, detail))
+    return results or [(WARN, "Disk", "no path to check")]
+
+
+def check_images(facts, ctx):
+    config, _ = facts.get("config")
+    local = facts.get("local_images")
+    if config is None or local is None:
+        return [(WARN, "Images", "skipped (docker unavailable)")]
+    missing = set()
+    for name in selected_config_services(config, ctx["services"]):
+        service = config["services"][name]
+        image = service.get("image")
+        if not image or service.get("build"):
+            continue
+        ref = image if ":" in image.rsplit("/", 1)[-1] else image + ":latest"
+        if ref not in local:
+            missing.add(image)
+    if missing:
+        return [(WARN, "Images", f"{len(missing)} to pull: " + ", ".join(sorted(missing)))]
+    return [(OK, "Images", "all present locally")]
+
+
+CHECKS = [check_daemon, check_compose, check_env, check_ports, check_disk, check_images]
+
+
+# ---------------------- RUNNER ---------------------- #
+
+def run_preflight(base_cmd, services, env_file=".env", min_free_gb=5, supabase_enabled=False):
+    """Run every check concurrently; return (ok, results, seconds)."""
+    from env_model import SUPABASE_COMPOSE, compose_files
+    start = time.monotonic()
+    files = compose_files(base_cmd)
+    if supabase_enabled:
+        files.append(SUPABASE_COMPOSE)
+    ctx = {"services": services, "compose_files": files, "min_free_gb": min_free_gb}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=16) as pool:
+        facts = Facts(pool, base_cmd, env_file)
+        # Names for the env check without waiting for docker (config may be broken)
+        if not services or "all" in services:
+            ctx["service_names"] = sorted(compose_consumers(files))
+        else:
+            from start_services import resolve_services
+            ctx["service_names"] = resolve_services(services)
+        futures = [pool.submit(check, facts, ctx) for check in CHECKS]
+        results = []
+        for check, future in zip(CHECKS, futures):
+            try:
+                results.extend(future.result())
+            except Exception as e:
+                results.append((FAIL, check.__name__.replace("check_", "").capitalize(), f"check crashed: {e}"))
+    ok = not any(status == FAIL for status, _, _ in results)
+    return ok, results, time.monotonic() - start
+
+
+def print_results(results, seconds):
+    print(f"\nPreflight ({seconds:.1f}s):")
+    for status, label, detail in results:
+        print(f"  [{status:^4}] {label:<22} {detail}")
+
+
+def preflight_or_exit(base_cmd, services, supabase_enabled=False, min_free_gb=5):
+    """Used by start_services.py: print results, exit before any destructive step on failure."""
+    ok, results, seconds = run_preflight(base_cmd, services, min_free_gb=min_free_gb,
+                                         supabase_enabled=supabase_enabled)
+    print_results(results, seconds)
+    if not ok:
+        print("\nPreflight failed: nothing was stopped. Fix the items above or use --skip-preflight.")
+        sys.exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="start_services.py preflight",
+        description="Check ports, disk, .env, images, daemon and compose config before a deployment.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--profile", choices=["cpu", "gpu-nvidia", "gpu-amd", "none"], default="cpu")
+    parser.add_argument("--environment", choices=["private", "public"], default="private")
+    parser.add_argument("--services", nargs="+", default=["all"])
+    parser.add_argument("--no-supabase", action="store_true")
+    parser.add_argument("--env-file", default=".env")
+    parser.add_argument("--min-free-gb", type=float, default=5, help="Fail below this much free disk.")
+    args = parser.parse_args(argv)
+
+    from start_services import build_compose_base
+    base_cmd = build_compose_base(args.profile, args.environment, supabase_enabled=not args.no_supabase)
+    ok, results, seconds = run_preflight(base_cmd, args.services, args.env_file, args.min_free_gb,
+                                         supabase_enabled=not args.no_supabase)
+    print_results(results, seconds)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""
+proxy_config.py
+SWAG and Caddy configuration rendered from one description of the services.
+
+PROXY_SERVICES lists, per service, the subdomain, the upstream and how it
+is used: paths that stream (Open WebUI chat completions, Ollama generation,
+n8n webhooks / push, Flowise predictions) get proxy buffering off, and every
+service gets a read timeout sized for it. From that:
+
+  SWAG   one <name>.subdomain.conf per service plus _localai.subdomain.conf
+         holding the upstream keepalive pools and the Connection map (an
+         empty Connection header keeps upstream connections open, Upgrade
+         still switches to websocket). Pools re-resolve container names
+         through Docker's DNS, which needs nginx >= 1.27.3 in the SWAG
+         image; older images get the previous per-request resolution
+         without pools. Static assets are gzipped.
+  Caddy  the Caddyfile (HTTP transport keepalive, flush_interval -1 on
+         streaming paths, zstd/gzip for static assets).
+
+Applying writes only files whose content changed and reloads the proxy
+gracefully (`nginx -t && nginx -s reload`, `caddy reload` through its admin
+API) only when the digest of the rendered config differs from the last
+one applied (.localai/proxy-state.json), instead of restarting SWAG and
+dropping in-flight connections on every deploy. A config nginx rejects is
+rolled back before anything is reloaded.
+
+Usage:
+    python3 start_services.py proxy apply                 # SWAG if detected, else Caddy
+    python3 start_services.py proxy apply --proxy swag --swag-dir /path/to/proxy-confs
+    python3 start_services.py proxy show caddy
+    python3 start_services.py proxy render                # refresh swag/ and Caddyfile in the repo
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+
+
+# ---------------------- CONSTANTS ---------------------- #
+
+STATE_PATH = os.path.join(".localai", "proxy-state.json")
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+SWAG_TEMPLATES_DIR = os.path.join(REPO_DIR, "swag")
+CADDYFILE = os.path.join(REPO_DIR, "Caddyfile")
+SWAG_CONTAINER = "swag"
+CADDY_CONTAINER = "caddy"
+SWAG_SHARED_CONF = "_localai.subdomain.conf"  # sorts before the server blocks using its map
+GENERATED_MARK = "Generated by proxy_config.py"
+
+# nginx gained `resolve` on upstream servers (and `resolver` in upstream) in 1.27.3
+NGINX_RESOLVE_VERSION = (1, 27, 3)
+DOCKER_DNS = "127.0.0.11"
+
+DEFAULT_READ_TIMEOUT = 60
+DEFAULT_KEEPALIVE = 16
+STATIC_TYPES = [
+    "text/css", "text/javascript", "application/javascript", "application/json",
+    "image/svg+xml", "application/wasm", "font/ttf", "font/otf",
+]
+# Streamed types (text/event-stream, application/x-ndjson) are deliberately not compressed
+STATIC_MIN_LENGTH = 1024
+
+# The single description both proxies are rendered from:
+#   conf          SWAG file stem
+#   subdomain     server_name prefix (the generate_env.py default hostname)
+#   env           Caddy site address placeholder (None: no Caddy site)
+#   streaming     path prefixes served unbuffered ("/" for the whole service)
+#   read_timeout  seconds allowed between two reads from the upstream
+#   keepalive     idle upstream connections kept per proxy worker
+PROXY_SERVICES = [
+    {"conf": "n8n", "subdomain": "n8n", "env": "N8N_HOSTNAME", "upstream": "n8n", "port": 5678,
+     "streaming": ["/webhook/", "/webhook-test/", "/webhook-waiting/", "/rest/push"], "read_timeout": 3600},
+    {"conf": "open-webui", "subdomain": "open-webui", "env": "WEBUI_HOSTNAME", "upstream": "open-webui",
+     "port": 8080, "streaming": ["/api/", "/ollama/", "/openai/", "/ws/"], "read_timeout": 600},
+    {"conf": "flowise", "subdomain": "flowise", "env": "FLOWISE_HOSTNAME", "upstream": "flowise", "port": 3001,
+     "streaming": ["/api/v1/prediction/"], "read_timeout": 600},
+    {"conf": "langfuse", "subdomain": "langfuse", "env": "LANGFUSE_HOSTNAME", "upstream": "langfuse-web",
+     "port": 3000},
+    # Unauthenticated model API: no Caddy site, as before
+    {"conf": "ollama", "subdomain": "ollama", "env": None, "upstream": "ollama", "port": 11434,
+     "streaming": ["/"], "read_timeout": 600, "keepalive": 32},
+    {"conf": "supabase", "subdomain": "supabase", "env": "SUPABASE_HOSTNAME", "upstream": "kong", "port": 8000,
+     "streaming": ["/realtime/"], "read_timeout": 300},
+    {"conf": "neo4j", "subdomain": "neo4j", "env": "NEO4J_HOSTNAME", "upstream": "neo4j", "port": 7474},
+    {"conf": "qdrant", "subdomain": "qdrant", "env": None, "upstream": "qdrant", "port": 6333,
+     "read_timeout": 300},
+    {"conf": "searxng", "subdomain": "searxng", "env": None, "upstream": "searxng", "port": 8080},
+    {"conf": "unsloth", "subdomain": "unsloth", "env": None, "upstream": "unsloth", "port": 8888,
+     "streaming": ["/"], "read_timeout": 3600},
+    {"conf": "hub", "subdomain": "hub", "env": "HUB_HOSTNAME", "upstream": "landing", "port": 80},
+]
+
+
+# ---------------------- SWAG (nginx) ---------------------- #
+
+def pool_name(service):
+    return "localai_" + re.sub(r"\W", "_", service["conf"])
+
+
+def render_swag_shared(resolve=True):
+    lines = [
+        f"## {GENERATED_MARK} (swag/ and Caddyfile share one description) — edit it there, not here",
+        "## Shared by the Local AI Packaged proxy confs: Connection map and upstream keepalive pools.",
+        "",
+        "# Empty Connection header keeps the upstream connection alive; websocket requests still upgrade",
+        "map $http_upgrade $localai_connection {",
+        "    default upgrade;",
+        "    ''      '';",
+        "}",
+    ]
+    if resolve:
+        for service in PROXY_SERVICES:
+            lines += [
+                "",
+                f"upstream {pool_name(service)} {{",
+                f"    zone {pool_name(service)} 64k;",
+                f"    resolver {DOCKER_DNS} valid=30s ipv6=off;",
+                f"    server {service['upstream']}:{service['port']} resolve;",
+                f"    keepalive {service.get('keepalive', DEFAULT_KEEPALIVE)};",
+                "    keepalive_timeout 60s;",
+                "}",
+            ]
+    return "\n".join(lines) + "\n"
+
+
+def swag_location(service, path, streaming, resolve):
+    timeout = service.get("read_timeout", DEFAULT_READ_TIMEOUT)
+    lines = [f"    location {path} {{"]
+    if resolve:
+        lines.append(f"        proxy_pass http://{pool_name(service)};")
+    else:
+        lines += [
+            "        include /config/nginx/resolver.conf;",
+            f"        set $upstream_app {service['upstream']};",
+            f"        set $upstream_port {service['port']};",
+            "        proxy_pass http://$upstream_app:$upstream_port;",
+        ]
+    lines += [
+        "        proxy_http_version 1.1;",
+        "        proxy_set_header Host $host;",
+        "        proxy_set_header X-Real-IP $remote_addr;",
+        "        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;",
+        "        proxy_set_header X-Forwarded-Proto $scheme;",
+        "        proxy_set_header X-Forwarded-Host $host;",
+        "        proxy_set_header Upgrade $http_upgrade;",
+        "        proxy_set_header Connection $localai_connection;",
+        f"        proxy_read_timeout {timeout}s;",
+        f"        proxy_send_timeout {timeout}s;",
+    ]
+    if streaming:
+        lines += [
+            "        proxy_buffering off;",
+            "        proxy_request_buffering off;",
+            "        proxy_cache off;",
+            "        gzip off;",
+        ]
+    lines.append("    }")
+    return lines
+
+
+def render_swag_conf(service, resolve=True):
+    streaming = service.get("streaming", [])
+    lines = [
+        f"## {GENERATED_MARK} — edit PROXY_SERVICES there, not this file",
+        f"## Local AI Packaged — {service['conf']} reverse proxy config for SWAG",
+        "server {",
+    ]
+    # `listen ... http2` is deprecated from nginx 1.25.1; every resolve-capable nginx has `http2 on`
+    if resolve:
+        lines += ["    listen 443 ssl;", "    listen [::]:443 ssl;", "    http2 on;", ""]
+    else:
+        lines += ["    listen 443 ssl http2;", "    listen [::]:443 ssl http2;", ""]
+    lines += [
+        f"    server_name {service['subdomain']}.*;",
+        "",
+        "    include /config/nginx/ssl.conf;",
+        "    client_max_body_size 0;",
+        "",
+        "    gzip on;",
+        "    gzip_vary on;",
+        "    gzip_proxied any;",
+        f"    gzip_min_length {STATIC_MIN_LENGTH};",
+        f"    gzip_types {' '.join(t for t in STATIC_TYPES)};",
+        "",
+    ]
+    lines += swag_location(service, "/", "/" in streaming, resolve)
+    for path in streaming:
+        if path != "/":
+            lines.append("")
+            lines += swag_location(service, path, True, resolve)
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def render_swag(resolve=True):
+    """{file name: content} for the SWAG proxy-confs directory."""
+    files = {SWAG_SHARED_CONF: render_swag_shared(resolve)}
+    for service in PROXY_SERVICES:
+        files[f"{service['conf']}.subdomain.conf"] = render_swag_conf(service, resolve)
+    return files
+
+
+# ---------------------- CADDY ---------------------- #
+
+def caddy_proxy(service, streaming):
+    pad = "    "
+    timeout = service.get("read_timeout", DEFAULT_READ_TIMEOUT)
+    lines = [f"{pad}reverse_proxy {service['upstream']}:{service['port']} {{"]
+    if streaming:
+        lines.append(f"{pad}    flush_interval -1")
+    lines += [
+        f"{pad}    transport http {{",
+        f"{pad}        keepalive 90s",
+        f"{pad}        keepalive_idle_conns_per_host {service.get('keepalive', DEFAULT_KEEPALIVE)}",
+        f"{pad}        read_timeout {timeout}s",
+        f"{pad}        write_timeout {timeout}s",
+        f"{pad}    }}",
+        f"{pad}}}",
+    ]
+    return lines
+
+
+def render_caddy():
+    lines = [
+        f"# {GENERATED_MARK} (swag/ and this file share one description).",
+        "# Edit PROXY_SERVICES there and run `python3 start_services.py proxy render`.",
+        "{",
+        "    # Global options - works for both environments",
+        "    email {$LETSENCRYPT_EMAIL}",
+        "}",
+        "",
+        "(localai_static) {",
+        "    encode zstd gzip {",
+        f"        minimum_length {STATIC_MIN_LENGTH}",
+        "        match {",
+    ]
+    lines += [f"            header Content-Type {t}*" for t in STATIC_TYPES]
+    lines += [
+        "        }",
+        "    }",
+        "}",
+    ]
+    for service in PROXY_SERVICES:
+        if not service["env"]:
+            continue
+        lines += [
+            "",
+            f"# {service['conf']}",
+            f"{{${service['env']}}} {{",
+            "    import localai_static",
+        ]
+        # Caddy buffers neither requests nor responses; -1 also flushes every streamed write at once
+        lines += caddy_proxy(service, bool(service.get("streaming")))
+        lines.append("}")
+    lines += ["", "import /etc/caddy/addons/*.conf"]
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------- APPLY ---------------------- #
+
+def digest(files):
+    h = hashlib.sha256()
+    for name in sorted(files):
+        h.update(name.encode() + b"\0" + files[name].encode() + b"\0")
+    return h.hexdigest()[:16]
+
+
+def load_state(path=STATE_PATH):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def read_file(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def write_changed(directory, files):
+    """Write the files whose content differs; {name: previous content or None} of those written."""
+    previous = {}
+    for name, content in sorted(files.items()):
+        path = os.path.join(directory, name)
+        old = read_file(path)
+        if old == content:
+            continue
+        previous[name] = old
+        # In place, not os.replace: the Caddyfile is a single-file bind mount, which keeps the old inode
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+    return previous
+
+
+def restore(directory, previous):
+    for name, content in previous.items():
+        path = os.path.join(directory, name)
+        if content is None:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content)
+
+
+def docker_exec(container, *cmd):
+    try:
+        proc = subprocess.run(["docker", "exec", container] + list(cmd),
+                              capture_output=True, text=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return False, str(e)
+    return proc.returncode == 0, (proc.stdout + proc.stderr).strip()
+
+
+def container_running(name):
+    try:
+        out = subprocess.run(["docker", "inspect", "-f", "{{.State.Running}}", name],
+                             capture_output=True, text=True, timeout=15).stdout
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    return out.strip() == "true"
+
+
+def swag_nginx_version():
+    """(major, minor, patch) of nginx in the SWAG container, None when unknown."""
+    ok, out = docker_exec(SWAG_CONTAINER, "nginx", "-v")
+    m = re.search(r"nginx/(\d+)\.(\d+)\.(\d+)", out)
+    return tuple(int(x) for x in m.groups()) if ok and m else None
+
+
+def apply_swag(proxy_dir, reload=True, force=False, resolve=None):
+    """Render the SWAG confs into proxy_dir; test and reload nginx only when they changed."""
+    if resolve is None:
+        version = swag_nginx_version()
+        resolve = version is not None and version >= NGINX_RESOLVE_VERSION
+        if version and not resolve:
+            print(f"  SWAG nginx {'.'.join(map(str, version))} < 1.27.3: per-request resolution, "
+                  "no upstream keepalive pools (update the SWAG image to get them).")
+    files = render_swag(resolve)
+    state = load_state()
+    applied = state.get("swag") or {}
+    current = digest(files)
+
+    previous = write_changed(proxy_dir, files)
+    # Confs generated earlier for services no longer described (left alone if edited since)
+    for name in sorted(set(applied.get("files", {})) - set(files)):
+        path = os.path.join(proxy_dir, name)
+        old = read_file(path)
+        if old is not None and hashlib.sha256(old.encode()).hexdigest() == applied["files"][name]:
+            previous[name] = old
+            os.remove(path)
+    for name in sorted(previous):
+        print(f"  {'Updated' if previous[name] is not None else 'Installed'} {name}"
+              if name in files else f"  Removed {name}")
+
+    if not previous and applied.get("digest") == current and applied.get("dir") == proxy_dir and not force:
+        print(f"  SWAG config unchanged ({current}), no reload.")
+        return True
+    if not reload:
+        print(f"  SWAG config {current} written to {proxy_dir} (not reloaded).")
+        return True
+    if not container_running(SWAG_CONTAINER):
+        print(f"  SWAG config {current} written; SWAG is not running, it loads it on start.")
+    else:
+        ok, out = docker_exec(SWAG_CONTAINER, "nginx", "-t")
+        if not ok:
+            restore(proxy_dir, previous)
+            print("  nginx rejected the new config, previous files restored:\n    "
+                  + out.replace("\n", "\n    "))
+            return False
+        ok, out = docker_exec(SWAG_CONTAINER, "nginx", "-s", "reload")
+        if not ok:
+            print(f"  Could not reload nginx in SWAG ({out}). Reload it manually.")
+            return False
+        print(f"  SWAG reloaded gracefully with config {current}.")
+    state["swag"] = {
+        "dir": proxy_dir,
+        "digest": current,
+        "resolve": resolve,
+        "files": {name: hashlib.sha256(content.encode()).hexdigest() for name, content in files.items()},
+    }
+    save_state(state)
+    return True
+
+
+def apply_caddy(reload=True, force=False, path=CADDYFILE):
+    """Render the Caddyfile; reload Caddy through its admin API only when it changed."""
+    content = render_caddy()
+    state = load_state()
+    applied = state.get("caddy") or {}
+    current = digest({"Caddyfile": content})
+    written = write_changed(os.path.dirname(path), {os.path.basename(path): content})
+    if written:
+        print(f"  Updated {os.path.basename(path)}")
+    if applied.get("digest") == current and not force:
+        print(f"  Caddy config unchanged ({current}), no reload.")
+        return True
+    if not reload or not container_running(CADDY_CONTAINER):
+        # A container that starts (or restarts) reads the file itself
+        print(f"  Caddy config {current} written" + ("." if not reload else "; Caddy is not running."))
+        if reload:
+            state["caddy"] = {"digest": current}
+            save_state(state)
+        return True
+    ok, out = docker_exec(CADDY_CONTAINER, "caddy", "reload", "--config", "/etc/caddy/Caddyfile",
+                          "--adapter", "caddyfile")
+    if not ok:
+        restore(os.path.dirname(path), written)
+        print("  Caddy rejected the new config, previous Caddyfile restored:\n    " + out.replace("\n", "\n    "))
+        return False
+    print(f"  Caddy reloaded gracefully with config {current}.")
+    state["caddy"] = {"digest": current}
+    save_state(state)
+    return True
+
+
+def render_repo():
+    """Refresh the checked-in swag/ templates and Caddyfile from PROXY_SERVICES."""
+    files = render_swag(resolve=True)
+    written = write_changed(SWAG_TEMPLATES_DIR, files)
+    for name in sorted(os.listdir(SWAG_TEMPLATES_DIR)):
+        if name.endswith(".conf") and name not in files:
+            content = read_file(os.path.join(SWAG_TEMPLATES_DIR, name)) or ""
+            if GENERATED_MARK in content:
+                os.remove(os.path.join(SWAG_TEMPLATES_DIR, name))
+                written[name] = content
+    written.update(write_changed(REPO_DIR, {"Caddyfile": render_caddy()}))
+    for name in sorted(written):
+        print(f"  {name}")
+    print(f"{len(written)} file(s) refreshed." if written else "Repo copies already up to date.")
+    return 0
+
+
+# ---------------------- MAIN ---------------------- #
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="start_services.py proxy",
+        description="Render the SWAG / Caddy reverse-proxy config and reload the proxy when it changed.",
+    )
+    sub = parser.add_subparsers(dest="action", required=True)
+    apply_parser = sub.add_parser("apply", help="Write the config and reload the proxy if its hash changed.")
+    apply_parser.add_argument("--proxy", choices=["swag", "caddy", "auto"], default="auto",
+                              help="Proxy to configure; auto picks SWAG when detected.")
+    apply_parser.add_argument("--swag-dir", help="SWAG proxy-confs directory (detected by default).")
+    apply_parser.add_argument("--no-reload", action="store_true", help="Write files only.")
+    apply_parser.add_argument("--force", action="store_true", help="Reload even if the hash is unchanged.")
+    apply_parser.add_argument("--no-pools", action="store_true",
+                              help="SWAG: per-request resolution without keepalive pools (nginx < 1.27.3).")
+    show_parser = sub.add_parser("show", help="Print the rendered config.")
+    show_parser.add_argument("proxy", choices=["swag", "caddy"])
+    show_parser.add_argument("service", nargs="?", help="SWAG: only this service's conf.")
+    show_parser.add_argument("--no-pools", action="store_true")
+    sub.add_parser("render", help="Refresh the swag/ templates and the Caddyfile in the repo.")
+    args = parser.parse_args(argv)
+
+    if args.action == "render":
+        return render_repo()
+    if args.action == "show":
+        if args.proxy == "caddy":
+            sys.stdout.write(render_caddy())
+            return 0
+        files = render_swag(resolve=not args.no_pools)
+        for name, content in files.items():
+            if not args.service or name == f"{args.service}.subdomain.conf":
+                sys.stdout.write(f"# ---- {name}\n{content}\n")
+        return 0
+
+    import host_facts
+    proxy = args.proxy
+    if proxy == "auto":
+        proxy = "swag" if args.swag_dir or (host_facts.get_facts()["swag"] or {}).get("detected") else "caddy"
+    if proxy == "caddy":
+        return 0 if apply_caddy(reload=not args.no_reload, force=args.force) else 1
+    swag_dir = args.swag_dir or host_facts.swag_proxy_dir()
+    if not swag_dir or not os.path.isdir(swag_dir):
+        print("Could not find the SWAG proxy-confs directory; pass --swag-dir.")
+        return 1
+    ok = apply_swag(swag_dir, reload=not args.no_reload, force=args.force,
+                    resolve=False if args.no_pools else None)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
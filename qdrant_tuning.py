@@ -0,0 +1,603 @@
+#!/usr/bin/env python3
+"""
+qdrant_tuning.py
+Explicit Qdrant collection configs, and a benchmark to choose one.
+
+The n8n `vectorStoreQdrant` node creates its collection implicitly with
+Qdrant's defaults: float32 vectors and payloads in RAM, default HNSW, no
+payload index, so RAM grows with the corpus and every `metadata.file_id`
+filter (the RAG workflows delete and look up chunks by file) scans.
+
+`bootstrap` creates a collection from a preset, or migrates an existing one
+in place: HNSW m / ef_construct, scalar or binary quantization, on-disk
+vectors and payload (one PATCH, Qdrant re-optimizes in the background) and
+the keyword index on `metadata.file_id`. Vector size or distance cannot
+change in place; those need a re-ingest.
+
+`bench` loads the same vectors (synthetic clusters, or a sample scrolled
+from an existing collection) into one scratch collection per preset and
+reports recall@k against exact search, with the preset's search params and
+with none (what n8n sends), p50 / p99 search latency, and the estimated
+RAM and disk per million vectors.
+
+Both talk to a Qdrant server over REST (stdlib only), or to qdrant-client's
+local mode (`--location :memory:` or a directory; `pip install
+qdrant-client`), which runs without a server. Local mode searches by brute
+force and ignores HNSW / quantization, so it checks the commands, not the
+numbers.
+
+Usage:
+    python3 start_services.py qdrant presets
+    python3 start_services.py qdrant bootstrap --collection documents --preset scalar --dry-run
+    python3 start_services.py qdrant bench --vectors 20000 --queries 200 --k 10
+    python3 start_services.py qdrant bench --from-collection documents --presets default scalar binary
+    python3 start_services.py qdrant bench --location :memory: --vectors 2000
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+import warnings
+from array import array
+
+
+# ---------------------- CONSTANTS ---------------------- #
+
+DEFAULT_URL = os.environ.get("QDRANT_URL", "http://127.0.0.1:6333")
+DEFAULT_COLLECTION = "documents"
+DEFAULT_DIM = 768  # nomic-embed-text
+DEFAULT_PRESET = "scalar"
+FILE_ID_FIELD = "metadata.file_id"
+BENCH_PREFIX = "bench_tuning"
+UPSERT_BATCH = 256
+INDEX_TIMEOUT = 300
+# Bytes of payload per point when estimating (chunk text of ~1000 chars + metadata)
+PAYLOAD_BYTES = 1200
+
+# search: params the preset is meant to be queried with (n8n sends none:
+# ef = ef_construct, rescore on, oversampling 1)
+PRESETS = {
+    "default": {
+        "description": "what n8n creates: float32 vectors and payload in RAM, no quantization",
+        "hnsw": {"m": 16, "ef_construct": 100},
+        "quantization": None,
+        "on_disk": False,
+        "on_disk_payload": False,
+        "search": {},
+    },
+    "scalar": {
+        "description": "int8 vectors in RAM, float32 originals and payload on disk (~4x less RAM)",
+        "hnsw": {"m": 16, "ef_construct": 128},
+        "quantization": {"scalar": {"type": "int8", "quantile": 0.99, "always_ram": True}},
+        "on_disk": True,
+        "on_disk_payload": True,
+        "search": {"hnsw_ef": 128, "quantization": {"rescore": True, "oversampling": 2.0}},
+    },
+    "binary": {
+        "description": "1-bit vectors in RAM, rescored from disk (~32x less RAM; best with >= 768 dims)",
+        "hnsw": {"m": 16, "ef_construct": 128},
+        "quantization": {"binary": {"always_ram": True}},
+        "on_disk": True,
+        "on_disk_payload": True,
+        "search": {"hnsw_ef": 128, "quantization": {"rescore": True, "oversampling": 3.0}},
+    },
+    "lowmem": {
+        "description": "int8 vectors in RAM, sparser HNSW graph on disk: smallest RAM, slower build and search",
+        "hnsw": {"m": 8, "ef_construct": 64, "on_disk": True},
+        "quantization": {"scalar": {"type": "int8", "quantile": 0.99, "always_ram": True}},
+        "on_disk": True,
+        "on_disk_payload": True,
+        "search": {"hnsw_ef": 96, "quantization": {"rescore": True, "oversampling": 2.0}},
+    },
+}
+
+
+class QdrantError(Exception):
+    pass
+
+
+# ---------------------- BACKENDS ---------------------- #
+
+class RestQdrant:
+    """Qdrant server over its REST API (urllib only)."""
+
+    local = False
+
+    def __init__(self, url=DEFAULT_URL, api_key=None, timeout=120):
+        self.url = url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+
+    def request(self, method, path, payload=None):
+        data = json.dumps(payload).encode() if payload is not None else None
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["api-key"] = self.api_key
+        req = urllib.request.Request(self.url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return json.loads(resp.read() or b"{}").get("result")
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            detail = e.read().decode(errors="replace")[:300]
+            raise QdrantError(f"{method} {path}: HTTP {e.code} {detail}")
+        except (urllib.error.URLError, OSError) as e:
+            raise QdrantError(f"{self.url} unreachable: {getattr(e, 'reason', e)}")
+
+    def info(self, name):
+        return self.request("GET", f"/collections/{name}")
+
+    def create(self, name, body):
+        self.request("PUT", f"/collections/{name}", body)
+
+    def update(self, name, body):
+        self.request("PATCH", f"/collections/{name}", body)
+
+    def delete(self, name):
+        self.request("DELETE", f"/collections/{name}")
+
+    def create_index(self, name, field, schema):
+        self.request("PUT", f"/collections/{name}/index?wait=true", {"field_name": field, "field_schema": schema})
+
+    def upsert(self, name, points):
+        self.request("PUT", f"/collections/{name}/points?wait=true", {"points": points})
+
+    def search(self, name, vector, limit, params=None):
+        body = {"query": vector, "limit": limit, "with_payload": False}
+        if params:
+            body["params"] = params
+        result = self.request("POST", f"/collections/{name}/points/query", body) or {}
+        return [p["id"] for p in result.get("points", [])]
+
+    def scroll(self, name, limit, offset=None):
+        body = {"limit": limit, "with_vector": True, "with_payload": False}
+        if offset is not None:
+            body["offset"] = offset
+        result = self.request("POST", f"/collections/{name}/points/scroll", body) or {}
+        return [p["vector"] for p in result.get("points", [])], result.get("next_page_offset")
+
+
+class LocalQdrant:
+    """qdrant-client local mode (in memory or a directory): same calls, no server."""
+
+    local = True
+
+    def __init__(self, location):
+        try:
+            from qdrant_client import QdrantClient, models
+        except ImportError:
+            raise QdrantError("local mode needs `pip install qdrant-client`")
+        self.models = models
+        self.client = QdrantClient(location=location) if location == ":memory:" else QdrantClient(path=location)
+
+    def info(self, name):
+        if not self.client.collection_exists(name):
+            return None
+        return self.client.get_collection(name).model_dump(mode="json")
+
+    def _quantization(self, config):
+        if config is None:
+            return None
+        if config == "Disabled":
+            return self.models.Disabled.DISABLED
+        if "binary" in config:
+            return self.models.BinaryQuantization(**config)
+        return self.models.ScalarQuantization(**config)
+
+    def create(self, name, body):
+        m = self.models
+        self.client.create_collection(
+            name,
+            vectors_config=m.VectorParams(**body["vectors"]),
+            hnsw_config=m.HnswConfigDiff(**body.get("hnsw_config", {})),
+            quantization_config=self._quantization(body.get("quantization_config")),
+            on_disk_payload=body.get("on_disk_payload"),
+            optimizers_config=m.OptimizersConfigDiff(**body.get("optimizers_config", {})),
+        )
+
+    def update(self, name, body):
+        m = self.models
+        self.client.update_collection(
+            name,
+            hnsw_config=m.HnswConfigDiff(**body["hnsw_config"]) if "hnsw_config" in body else None,
+            quantization_config=self._quantization(body.get("quantization_config")),
+            vectors_config={"": m.VectorParamsDiff(**body["vectors"][""])} if "vectors" in body else None,
+            collection_params=m.CollectionParamsDiff(**body["params"]) if "params" in body else None,
+        )
+
+    def delete(self, name):
+        self.client.delete_collection(name)
+
+    def create_index(self, name, field, schema):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # "payload indexes have no effect in the local Qdrant"
+            self.client.create_payload_index(name, field_name=field, field_schema=schema)
+
+    def upsert(self, name, points):
+        self.client.upsert(name, points=[self.models.PointStruct(**p) for p in points], wait=True)
+
+    def search(self, name, vector, limit, params=None):
+        search_params = self.models.SearchParams(**params) if params else None
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # "local mode performs exact search"
+            result = self.client.query_points(name, query=vector, limit=limit, search_params=search_params,
+                                              with_payload=False)
+        return [p.id for p in result.points]
+
+    def scroll(self, name, limit, offset=None):
+        points, next_offset = self.client.scroll(name, limit=limit, offset=offset, with_vectors=True,
+                                                 with_payload=False)
+        return [p.vector for p in points], next_offset
+
+
+def connect(args):
+    if args.location:
+        return LocalQdrant(args.location)
+    return RestQdrant(args.url, api_key=args.api_key)
+
+
+# ---------------------- BOOTSTRAP ---------------------- #
+
+def collection_body(preset, dim, distance="Cosine"):
+    """PUT /collections body of a preset."""
+    spec = PRESETS[preset]
+    body = {
+        "vectors": {"size": dim, "distance": distance, "on_disk": spec["on_disk"]},
+        "hnsw_config": dict(spec["hnsw"]),
+        "on_disk_payload": spec["on_disk_payload"],
+    }
+    if spec["quantization"]:
+        body["quantization_config"] = spec["quantization"]
+    return body
+
+
+def create_collection(backend, name, dim, preset=DEFAULT_PRESET, distance="Cosine", optimizers=None):
+    body = collection_body(preset, dim, distance)
+    if optimizers:
+        body["optimizers_config"] = optimizers
+    backend.create(name, body)
+    backend.create_index(name, FILE_ID_FIELD, "keyword")
+
+
+def plan_migration(info, preset, dim=None, distance="Cosine"):
+    """(PATCH body, [changes], [blockers]) turning an existing collection into the preset."""
+    spec = PRESETS[preset]
+    config = info.get("config") or {}
+    params = config.get("params") or {}
+    vectors = params.get("vectors") or {}
+    if "size" not in vectors:
+        return {}, [], ["named vectors: only the single unnamed vector n8n uses is handled"]
+    blockers = []
+    if dim and vectors["size"] != dim:
+        blockers.append(f"vector size {vectors['size']} != {dim}: recreate the collection and re-ingest")
+    if vectors.get("distance", distance).lower() != distance.lower():
+        blockers.append(f"distance {vectors['distance']} != {distance}: recreate the collection and re-ingest")
+
+    patch, changes = {}, []
+    hnsw = config.get("hnsw_config") or {}
+    wanted_hnsw = {k: v for k, v in spec["hnsw"].items() if hnsw.get(k) != v}
+    if "on_disk" not in spec["hnsw"] and hnsw.get("on_disk"):
+        wanted_hnsw["on_disk"] = False
+    if wanted_hnsw:
+        patch["hnsw_config"] = wanted_hnsw
+        changes += [f"hnsw {k}: {hnsw.get(k)} -> {v}" for k, v in sorted(wanted_hnsw.items())]
+
+    current_q = config.get("quantization_config")
+    wanted_q = spec["quantization"]
+    if not quantization_matches(current_q, wanted_q):
+        patch["quantization_config"] = wanted_q or "Disabled"
+        changes.append(f"quantization: {quantization_label(current_q)} -> {quantization_label(wanted_q)}")
+
+    if bool(vectors.get("on_disk")) != spec["on_disk"]:
+        patch["vectors"] = {"": {"on_disk": spec["on_disk"]}}
+        changes.append(f"vectors on_disk: {bool(vectors.get('on_disk'))} -> {spec['on_disk']}")
+    if bool(params.get("on_disk_payload")) != spec["on_disk_payload"]:
+        patch["params"] = {"on_disk_payload": spec["on_disk_payload"]}
+        changes.append(f"payload on_disk: {bool(params.get('on_disk_payload'))} -> {spec['on_disk_payload']}")
+    return patch, changes, blockers
+
+
+def quantization_label(config):
+    if not config:
+        return "none"
+    kind = next(iter(config))
+    inner = config[kind] or {}
+    return f"{kind}" + (f" {inner['type']}" if inner.get("type") else "")
+
+
+def quantization_matches(current, wanted):
+    if not current or not wanted:
+        return not current and not wanted
+    kind = next(iter(wanted))
+    have = current.get(kind)
+    # Fields left out of the preset keep whatever Qdrant defaulted them to
+    return have is not None and all(have.get(k) == v for k, v in wanted[kind].items())
+
+
+def bootstrap(backend, name, dim, preset=DEFAULT_PRESET, distance="Cosine", dry_run=False):
+    """Create or migrate one collection; False when it cannot be brought to the preset."""
+    info = backend.info(name)
+    if info is None:
+        print(f"{name}: missing, creating it with preset {preset} ({dim} dims, {distance}).")
+        if not dry_run:
+            create_collection(backend, name, dim, preset, distance)
+        print(f"  + payload index {FILE_ID_FIELD} (keyword)")
+        return True
+
+    patch, changes, blockers = plan_migration(info, preset, dim, distance)
+    has_index = FILE_ID_FIELD in (info.get("payload_schema") or {})
+    points = info.get("points_count")
+    print(f"{name}: {points if points is not None else '?'} point(s), status {info.get('status', '?')}")
+    for blocker in blockers:
+        print(f"  ! {blocker}")
+    if blockers:
+        return False
+    for change in changes:
+        print(f"  ~ {change}")
+    if not has_index:
+        print(f"  + payload index {FILE_ID_FIELD} (keyword)")
+    if not changes and has_index:
+        print(f"  already matches preset {preset}.")
+        return True
+    if dry_run:
+        print("Dry-run: nothing changed.")
+        return True
+    if patch:
+        backend.update(name, patch)
+    if not has_index:
+        backend.create_index(name, FILE_ID_FIELD, "keyword")
+    if changes:
+        print("  Qdrant rebuilds the index / quantized vectors in the background (status yellow until done).")
+    return True
+
+
+# ---------------------- ESTIMATES ---------------------- #
+
+def estimate_bytes(preset, dim, payload_bytes=PAYLOAD_BYTES):
+    """(RAM, disk) bytes per point of a preset: vectors, quantized vectors, HNSW links, payload."""
+    spec = PRESETS[preset]
+    raw = dim * 4
+    quant = spec["quantization"] or {}
+    quantized = dim if "scalar" in quant else math.ceil(dim / 8) if "binary" in quant else 0
+    # Level 0 holds 2*m links of 4 bytes; upper levels add ~1/m of that
+    m = spec["hnsw"]["m"]
+    graph = 2 * m * 4 * (1 + 1 / m)
+    ram = 0 if spec["on_disk"] else raw
+    if quantized and (next(iter(quant.values())) or {}).get("always_ram"):
+        ram += quantized
+    ram += 0 if spec["hnsw"].get("on_disk") else graph
+    ram += 0 if spec["on_disk_payload"] else payload_bytes
+    disk = raw + quantized + graph + payload_bytes
+    return ram, disk
+
+
+def human(n):
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if abs(n) < 1024 or unit == "TB":
+            return f"{n:.1f} {unit}" if unit != "B" else f"{n:.0f} B"
+        n /= 1024.0
+
+
+# ---------------------- BENCHMARK ---------------------- #
+
+def normalize(vec):
+    norm = math.sqrt(sum(x * x for x in vec)) or 1.0
+    return array("f", (x / norm for x in vec))
+
+
+def synthetic_vectors(count, dim, clusters=64, spread=0.35, seed=42):
+    """Unit vectors around `clusters` random centres (embeddings are clustered, not uniform)."""
+    rng = random.Random(seed)
+    centres = [[rng.gauss(0, 1) for _ in range(dim)] for _ in range(clusters)]
+    vectors = []
+    for _ in range(count):
+        centre = centres[rng.randrange(clusters)]
+        vectors.append(normalize([c + rng.gauss(0, spread) for c in centre]))
+    return vectors
+
+
+def sample_collection(backend, name, count):
+    vectors, offset = [], None
+    while len(vectors) < count:
+        batch, offset = backend.scroll(name, min(UPSERT_BATCH, count - len(vectors)), offset)
+        vectors += [array("f", v) for v in batch if isinstance(v, list)]
+        if not batch or offset is None:
+            break
+    return vectors
+
+
+def make_queries(vectors, count, noise=0.1, seed=7):
+    """Perturbed copies of dataset vectors, so every query has true near neighbours."""
+    rng = random.Random(seed)
+    return [normalize([x + rng.gauss(0, noise / math.sqrt(len(base))) for x in base])
+            for base in (vectors[rng.randrange(len(vectors))] for _ in range(count))]
+
+
+def point_id(i):
+    return str(uuid.UUID(int=i + 1))
+
+
+def load_points(backend, name, vectors):
+    for start in range(0, len(vectors), UPSERT_BATCH):
+        backend.upsert(name, [
+            {"id": point_id(start + i), "vector": list(v), "payload": {"metadata": {"file_id": f"bench/{(start + i) // 20}"}}}
+            for i, v in enumerate(vectors[start:start + UPSERT_BATCH])
+        ])
+
+
+def wait_indexed(backend, name, points, timeout=INDEX_TIMEOUT):
+    """Seconds until the optimizer finished (green, HNSW built over the points); None on timeout."""
+    if backend.local:
+        return 0.0
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        info = backend.info(name) or {}
+        if info.get("status") == "green" and (info.get("indexed_vectors_count") or 0) >= points * 0.99:
+            return time.monotonic() - start
+        time.sleep(0.5)
+    return None
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))]
+
+
+def measure(backend, name, queries, truth, k, params):
+    """(recall@k, latencies ms) over the queries."""
+    for q in queries[:10]:  # warm caches / page in on-disk data
+        backend.search(name, list(q), k, params)
+    hits, latencies = 0, []
+    for q, expected in zip(queries, truth):
+        vector = list(q)
+        start = time.perf_counter()
+        found = backend.search(name, vector, k, params)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(found) & expected)
+    return hits / (k * len(queries)), latencies
+
+
+def run_bench(backend, presets, vectors, queries, k, keep=False, payload_bytes=PAYLOAD_BYTES):
+    dim = len(vectors[0])
+    results = []
+    truth = None
+    for preset in presets:
+        name = f"{BENCH_PREFIX}_{preset}"
+        if backend.info(name) is not None:
+            backend.delete(name)
+        # Low indexing threshold: build HNSW even for a small benchmark set
+        create_collection(backend, name, dim, preset, optimizers={"indexing_threshold": 1000})
+        start = time.monotonic()
+        load_points(backend, name, vectors)
+        upload = time.monotonic() - start
+        indexing = wait_indexed(backend, name, len(vectors))
+        if truth is None:
+            truth = [set(backend.search(name, list(q), k, {"exact": True})) for q in queries]
+        recall, latencies = measure(backend, name, queries, truth, k, PRESETS[preset]["search"])
+        recall_plain = recall
+        if PRESETS[preset]["search"]:
+            recall_plain, _ = measure(backend, name, queries, truth, k, None)
+        ram, disk = estimate_bytes(preset, dim, payload_bytes)
+        results.append({
+            "preset": preset,
+            "upload_s": upload,
+            "index_s": indexing,
+            "recall": recall,
+            "recall_no_params": recall_plain,
+            "p50_ms": statistics.median(latencies),
+            "p99_ms": percentile(latencies, 99),
+            "qps": len(latencies) / (sum(latencies) / 1000),
+            "ram_per_million": ram * 1_000_000,
+            "disk_per_million": disk * 1_000_000,
+        })
+        r = results[-1]
+        print(f"  {preset:<8} loaded in {upload:.1f}s, "
+              + (f"indexed in {indexing:.1f}s" if indexing is not None else "index not finished")
+              + f", recall@{k} {recall:.3f}, p99 {r['p99_ms']:.1f} ms")
+        if not keep:
+            backend.delete(name)
+    return results
+
+
+def print_results(results, k, count, dim):
+    print(f"\nQdrant presets: {count} vectors x {dim} dims, recall@{k} vs exact search "
+          f"(RAM / disk per 1M vectors are estimates)")
+    print(f"  {'preset':<9}{'recall':>8}{'no-params':>11}{'p50 ms':>9}{'p99 ms':>9}{'qps':>8}"
+          f"{'RAM/1M':>11}{'disk/1M':>11}")
+    for r in results:
+        print(f"  {r['preset']:<9}{r['recall']:>8.3f}{r['recall_no_params']:>11.3f}{r['p50_ms']:>9.2f}"
+              f"{r['p99_ms']:>9.2f}{r['qps']:>8.0f}{human(r['ram_per_million']):>11}{human(r['disk_per_million']):>11}")
+    print("  no-params: recall when queried without search params, as the n8n node does.")
+
+
+# ---------------------- MAIN ---------------------- #
+
+def add_connection_args(parser):
+    parser.add_argument("--url", default=DEFAULT_URL, help="Qdrant REST URL (QDRANT_URL).")
+    parser.add_argument("--api-key", default=os.environ.get("QDRANT_API_KEY"))
+    parser.add_argument("--location", default=None,
+                        help="qdrant-client local mode instead of a server: ':memory:' or a directory.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="start_services.py qdrant",
+        description="Create / migrate tuned Qdrant collections and benchmark the presets.",
+    )
+    sub = parser.add_subparsers(dest="action", required=True)
+    sub.add_parser("presets", help="List the presets and their estimated footprint.")
+
+    boot = sub.add_parser("bootstrap", help="Create or migrate collections to a preset.",
+                          formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    add_connection_args(boot)
+    boot.add_argument("--collection", nargs="+", default=[DEFAULT_COLLECTION])
+    boot.add_argument("--preset", choices=sorted(PRESETS), default=DEFAULT_PRESET)
+    boot.add_argument("--dim", type=int, default=DEFAULT_DIM, help="Vector size (new collections; checked on existing).")
+    boot.add_argument("--distance", default="Cosine", choices=["Cosine", "Dot", "Euclid", "Manhattan"])
+    boot.add_argument("--dry-run", action="store_true", help="Show the changes without applying them.")
+
+    bench = sub.add_parser("bench", help="Recall@k, latency and memory of each preset on the same data.",
+                           formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    add_connection_args(bench)
+    bench.add_argument("--presets", nargs="+", choices=sorted(PRESETS), default=list(PRESETS))
+    bench.add_argument("--vectors", type=int, default=20000)
+    bench.add_argument("--dim", type=int, default=DEFAULT_DIM, help="Synthetic vector size.")
+    bench.add_argument("--from-collection", help="Sample the vectors from this collection instead.")
+    bench.add_argument("--queries", type=int, default=200)
+    bench.add_argument("--k", type=int, default=10)
+    bench.add_argument("--payload-bytes", type=int, default=PAYLOAD_BYTES,
+                       help="Payload size per point used in the memory estimate.")
+    bench.add_argument("--keep", action="store_true", help=f"Keep the {BENCH_PREFIX}_* collections.")
+    bench.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.action == "presets":
+        for name, spec in PRESETS.items():
+            ram, disk = estimate_bytes(name, DEFAULT_DIM)
+            print(f"{name:<8} {spec['description']}")
+            print(f"         hnsw {spec['hnsw']}, quantization {quantization_label(spec['quantization'])}, "
+                  f"~{human(ram * 1_000_000)} RAM / {human(disk * 1_000_000)} disk per 1M x {DEFAULT_DIM}d")
+        return 0
+
+    try:
+        backend = connect(args)
+        if args.action == "bootstrap":
+            ok = True
+            for name in args.collection:
+                ok = bootstrap(backend, name, args.dim, args.preset, args.distance, args.dry_run) and ok
+            return 0 if ok else 1
+
+        if args.from_collection:
+            vectors = sample_collection(backend, args.from_collection, args.vectors)
+            if not vectors:
+                print(f"No vectors in {args.from_collection}.")
+                return 1
+        else:
+            print(f"Generating {args.vectors} synthetic {args.dim}-dim vectors...")
+            vectors = synthetic_vectors(args.vectors, args.dim)
+        queries = make_queries(vectors, args.queries)
+        if backend.local:
+            print("Local mode: brute-force search, HNSW and quantization are not applied "
+                  "(recall and latency only exercise the benchmark).")
+        results = run_bench(backend, args.presets, vectors, queries, args.k, args.keep, args.payload_bytes)
+    except QdrantError as e:
+        print(f"Qdrant: {e}")
+        return 1
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results, args.k, len(vectors), len(vectors[0]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,610 @@
+#!/usr/bin/env python3
+"""
+reindex.py
+Blue/green re-indexing of the RAG vector stores.
+
+Changing the embedding model or the chunking used to mean deleting the
+collection the agents query and rebuilding it in place. Instead, `build`
+ingests ./shared into a new generation next to the live one:
+
+    Qdrant     collection documents__<id>; `documents` becomes an alias
+    pgvector   table documents_pg__<id>, with the live table's indexes
+
+at a bounded rate (--max-rate chunks/s, so chat traffic keeps its share of
+Ollama), then catches up with files changed or deleted during the build.
+It is validated against the live index:
+
+    counts      points / rows and the files they cover (--min-coverage)
+    recall      --sample random chunks of the live index are searched in both,
+                each with its own model: how often the chunk's file is in the
+                top --k (--max-recall-drop), and how much the top files agree
+
+and switched in one step: one atomic alias update in Qdrant, two table
+renames in one transaction in Postgres (queries wait on the lock for the
+duration of the rename, they never see a missing table). The previous
+generation is kept, so `rollback` is the same switch in reverse; `drop`
+deletes a generation once it is no longer needed.
+
+The first switch of a plain Qdrant collection copies it to
+`<name>__initial` (vectors and payloads, no re-embedding), then replaces it
+with the alias: queries fail during the few milliseconds between the
+delete and the alias creation. Every later switch is atomic.
+
+Points written to the live index during a build by something other than
+./shared (e.g. a Google Drive workflow) are not in the new generation: the
+coverage check reports them.
+
+Usage:
+    python3 start_services.py reindex status --target qdrant
+    python3 start_services.py reindex build --target qdrant --model mxbai-embed-large --max-rate 50
+    python3 start_services.py reindex build --target pgvector --chunk-size 800 --no-switch
+    python3 start_services.py reindex switch --target pgvector --generation 20261019143000
+    python3 start_services.py reindex rollback --target qdrant
+    python3 start_services.py reindex drop --target qdrant --generation initial
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+from ingest import (
+    DEFAULT_MODEL, IngestPipeline, PgVectorSink, QdrantSink, build_parser, make_embedder, print_report,
+    source_files,
+)
+from pg_utils import PsqlError, quote_ident, quote_literal, run_sql
+from qdrant_tuning import QdrantError, RestQdrant
+
+
+# ---------------------- CONSTANTS ---------------------- #
+
+STATE_PATH = os.path.join(".localai", "reindex.json")
+SEPARATOR = "__"
+# Generation id of an index that existed before the first reindex
+INITIAL = "initial"
+COPY_BATCH = 256
+LOCK_TIMEOUT = "5s"
+
+
+# ---------------------- STATE ---------------------- #
+
+def load_state(path=STATE_PATH):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def new_generation_id():
+    return time.strftime("%Y%m%d%H%M%S")
+
+
+# ---------------------- STORES ---------------------- #
+
+class QdrantStore:
+    """Generations are collections <base>__<id>; <base> is an alias to the live one."""
+
+    kind = "qdrant"
+
+    def __init__(self, args):
+        self.args = args
+        self.base = args.collection
+        self.backend = RestQdrant(args.qdrant_url, api_key=args.qdrant_api_key)
+
+    def name(self, generation, live=None):
+        return f"{self.base}{SEPARATOR}{generation}"
+
+    def aliases(self):
+        result = self.backend.request("GET", "/aliases") or {}
+        return {a["alias_name"]: a["collection_name"] for a in result.get("aliases", [])}
+
+    def live_name(self):
+        """Collection queries of <base> reach now (None if there is none)."""
+        target = self.aliases().get(self.base)
+        if target:
+            return target
+        return self.base if self.backend.info(self.base) is not None else None
+
+    def live_generation(self):
+        name = self.live_name()
+        if name is None:
+            return None
+        prefix = self.base + SEPARATOR
+        return name[len(prefix):] if name.startswith(prefix) else INITIAL
+
+    def exists(self, name):
+        return self.backend.info(name) is not None
+
+    def sink(self, name):
+        return QdrantSink(self.args.qdrant_url, name, api_key=self.args.qdrant_api_key,
+                          preset=self.args.qdrant_preset)
+
+    def count(self, name):
+        result = self.backend.request("POST", f"/collections/{name}/points/count", {"exact": True}) or {}
+        return result.get("count", 0)
+
+    def file_ids(self, name):
+        files, offset = set(), None
+        while True:
+            body = {"limit": 1000, "with_vector": False, "with_payload": {"include": ["metadata.file_id"]}}
+            if offset is not None:
+                body["offset"] = offset
+            result = self.backend.request("POST", f"/collections/{name}/points/scroll", body) or {}
+            for point in result.get("points", []):
+                files.add(((point.get("payload") or {}).get("metadata") or {}).get("file_id"))
+            offset = result.get("next_page_offset")
+            if offset is None:
+                return files
+
+    def compare(self, old, new):
+        old_files, new_files = self.file_ids(old), self.file_ids(new)
+        missing = sorted(str(f) for f in old_files - new_files)
+        return {"old_points": self.count(old), "new_points": self.count(new),
+                "old_files": len(old_files), "new_files": len(new_files),
+                "missing_files": len(missing), "missing_examples": missing[:5]}
+
+    def sample(self, name, count):
+        """(chunk text, file_id) of random points."""
+        result = self.backend.request("POST", f"/collections/{name}/points/query", {
+            "query": {"sample": "random"}, "limit": count, "with_payload": True,
+        }) or {}
+        samples = []
+        for point in result.get("points", []):
+            payload = point.get("payload") or {}
+            text = payload.get("content") or payload.get("text")
+            if text:
+                samples.append((text, (payload.get("metadata") or {}).get("file_id")))
+        return samples
+
+    def search(self, name, vectors, k):
+        """Top-k file_ids per query vector."""
+        results = []
+        for vector in vectors:
+            result = self.backend.request("POST", f"/collections/{name}/points/query", {
+                "query": vector, "limit": k, "with_payload": {"include": ["metadata.file_id"]},
+            }) or {}
+            results.append([((p.get("payload") or {}).get("metadata") or {}).get("file_id")
+                            for p in result.get("points", [])])
+        return results
+
+    def prepare_live(self):
+        """Copy a plain <base> collection to <base>__initial so it survives the first switch."""
+        if self.base in self.aliases() or not self.exists(self.base):
+            return
+        copy = self.name(INITIAL)
+        source_count = self.count(self.base)
+        if self.exists(copy) and self.count(copy) == source_count:
+            return
+        print(f"  Copying {self.base} ({source_count} points) to {copy} to keep it for rollback...")
+        info = self.backend.info(self.base)
+        config = info.get("config") or {}
+        params = config.get("params") or {}
+        body = {"vectors": params["vectors"], "on_disk_payload": params.get("on_disk_payload", False)}
+        for key in ("hnsw_config", "quantization_config"):
+            if config.get(key):
+                body[key] = config[key]
+        if self.exists(copy):
+            self.backend.delete(copy)
+        self.backend.create(copy, body)
+        offset = None
+        while True:
+            scroll = {"limit": COPY_BATCH, "with_vector": True, "with_payload": True}
+            if offset is not None:
+                scroll["offset"] = offset
+            result = self.backend.request("POST", f"/collections/{self.base}/points/scroll", scroll) or {}
+            points = [{"id": p["id"], "vector": p["vector"], "payload": p.get("payload") or {}}
+                      for p in result.get("points", [])]
+            if points:
+                self.backend.upsert(copy, points)
+            offset = result.get("next_page_offset")
+            if offset is None:
+                break
+        self.backend.create_index(copy, "metadata.file_id", "keyword")
+        copied = self.count(copy)
+        if copied != source_count:
+            raise QdrantError(f"copy of {self.base} has {copied} points, expected {source_count}")
+
+    def switch(self, generation, live=None):
+        target = self.name(generation)
+        actions = []
+        if self.base in self.aliases():
+            actions.append({"delete_alias": {"alias_name": self.base}})
+        elif self.exists(self.base):
+            # Plain collection: its copy (prepare_live) is kept, the name becomes the alias
+            self.prepare_live()
+            print(f"  Replacing collection {self.base} with an alias (one-time, queries fail for a moment)...")
+            self.backend.delete(self.base)
+        actions.append({"create_alias": {"collection_name": target, "alias_name": self.base}})
+        self.backend.request("POST", "/collections/aliases", {"actions": actions})
+
+    def drop(self, name):
+        self.backend.delete(name)
+
+
+class PgStore:
+    """Generations are tables <base>__<id>; the live one is renamed to <base>."""
+
+    kind = "pgvector"
+
+    def __init__(self, args):
+        self.args = args
+        self.base = args.table
+
+    def sql(self, sql, **kwargs):
+        return run_sql(sql, database=self.args.database, dsn=self.args.pg_dsn, **kwargs)
+
+    def name(self, generation, live=None):
+        return self.base if generation == live else f"{self.base}{SEPARATOR}{generation}"
+
+    def exists(self, name):
+        return bool(self.sql("SELECT 1 FROM pg_tables WHERE schemaname = current_schema() "
+                             f"AND tablename = {quote_literal(name)};"))
+
+    def live_name(self):
+        return self.base if self.exists(self.base) else None
+
+    def live_generation(self):
+        return None
+
+    def sink(self, name):
+        return PgVectorSink(name, database=self.args.database, dsn=self.args.pg_dsn)
+
+    def indexes(self, table):
+        return self.sql("SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = current_schema() "
+                        f"AND tablename = {quote_literal(table)} ORDER BY indexname;")
+
+    def count(self, name):
+        return int(self.sql(f"SELECT count(*) FROM {quote_ident(name)};")[0][0])
+
+    def compare(self, old, new):
+        o, n = quote_ident(old), quote_ident(new)
+        missing = (f"SELECT DISTINCT coalesce(metadata->>'file_id', '') FROM {o} "
+                   f"EXCEPT SELECT DISTINCT coalesce(metadata->>'file_id', '') FROM {n}")
+        row = self.sql(
+            f"SELECT (SELECT count(*) FROM {o}), (SELECT count(*) FROM {n}), "
+            f"(SELECT count(DISTINCT metadata->>'file_id') FROM {o}), "
+            f"(SELECT count(DISTINCT metadata->>'file_id') FROM {n}), "
+            f"(SELECT count(*) FROM ({missing}) m);")[0]
+        examples = [r[0] for r in self.sql(f"SELECT * FROM ({missing}) m ORDER BY 1 LIMIT 5;")]
+        keys = ("old_points", "new_points", "old_files", "new_files", "missing_files")
+        return dict(zip(keys, (int(v) for v in row)), missing_examples=examples)
+
+    def sample(self, name, count):
+        rows = self.sql(f"SELECT json_build_array(text, metadata->>'file_id') FROM {quote_ident(name)} "
+                        f"WHERE text IS NOT NULL AND text <> '' ORDER BY random() LIMIT {int(count)};")
+        return [tuple(json.loads(r[0])) for r in rows]
+
+    def search(self, name, vectors, k):
+        """Top-k file_ids per query vector, all queries in one psql call."""
+        if not vectors:
+            return []
+        statements = []
+        for i, vector in enumerate(vectors):
+            literal = "[" + ",".join(repr(float(x)) for x in vector) + "]"
+            statements.append(
+                f"SELECT {i}, coalesce(metadata->>'file_id', '') FROM (SELECT metadata FROM {quote_ident(name)} "
+                f"ORDER BY embedding <=> '{literal}'::vector LIMIT {int(k)}) s;")
+        results = [[] for _ in vectors]
+        for row in self.sql("\n".join(statements)):
+            results[int(row[0])].append(row[1])
+        return results
+
+    def copy_indexes(self, source, target):
+        """Create source's secondary indexes (vector, file_id...) on target, names rebased."""
+        pattern = re.compile(r"^CREATE (UNIQUE )?INDEX (\S+) ON (?:ONLY )?\S+ (USING .*)$")
+        statements = []
+        for index, definition in self.indexes(source):
+            match = pattern.match(definition)
+            if not match or index.endswith("_pkey"):
+                continue
+            name = target + index[len(source):] if index.startswith(source) else f"{target}_{index}"
+            statements.append(f"CREATE {match.group(1) or ''}INDEX IF NOT EXISTS {quote_ident(name)} "
+                              f"ON {quote_ident(target)} {match.group(3)};")
+        for statement in statements:
+            print(f"  {statement}")
+            self.sql(statement)
+
+    def rename_statements(self, old, new):
+        statements = [f"ALTER TABLE {quote_ident(old)} RENAME TO {quote_ident(new)};"]
+        for index, _ in self.indexes(old):
+            if index.startswith(old):
+                statements.append(f"ALTER INDEX {quote_ident(index)} RENAME TO {quote_ident(new + index[len(old):])};")
+        return statements
+
+    def prepare_live(self):
+        pass
+
+    def switch(self, generation, live=None):
+        """Rename the live table away and the generation to <base> in one transaction."""
+        statements = [f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}';"]
+        if self.exists(self.base):
+            statements += self.rename_statements(self.base, self.name(live or INITIAL))
+        statements += self.rename_statements(self.name(generation), self.base)
+        self.sql("\n".join(statements), single_transaction=True)
+
+    def drop(self, name):
+        self.sql(f"DROP TABLE IF EXISTS {quote_ident(name)};")
+
+
+def open_store(args):
+    return QdrantStore(args) if args.target == "qdrant" else PgStore(args)
+
+
+# ---------------------- BUILD ---------------------- #
+
+class ThrottledSink:
+    """Hold writes back to `rate` records/s; the pipeline stops feeding Ollama while it waits."""
+
+    def __init__(self, sink, rate):
+        self.sink = sink
+        self.rate = rate
+        self.start = None
+        self.written = 0
+
+    def delete(self, file_ids):
+        self.sink.delete(file_ids)
+
+    def write(self, records):
+        if self.start is None:
+            self.start = time.monotonic()
+        self.sink.write(records)
+        self.written += len(records)
+        if self.rate:
+            ahead = self.written / self.rate - (time.monotonic() - self.start)
+            if ahead > 0:
+                time.sleep(ahead)
+
+
+def run_pipeline(args, embedder, sink, files):
+    pipeline = IngestPipeline(
+        embedder, sink, embed_batch=args.embed_batch, upsert_batch=args.upsert_batch,
+        embed_concurrency=args.embed_concurrency, workers=args.workers,
+        chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap, progress_every=10.0,
+    )
+    return pipeline.run(files)
+
+
+def build(store, args, generation, embedder):
+    """Ingest ./shared into the new generation, then catch up with changes made meanwhile."""
+    name = store.name(generation)
+    sink = ThrottledSink(store.sink(name), args.max_rate)
+    started = time.time()
+    print(f"Building {name} from {args.source} (model {args.model}, chunk size {args.chunk_size}, "
+          + (f"max {args.max_rate:g} chunks/s)" if args.max_rate else "unthrottled)"))
+    built = dict((file_id, path) for path, file_id in source_files(args))
+    stats = run_pipeline(args, embedder, sink, sorted((p, f) for f, p in built.items()))
+    print_report(stats, embedder)
+    if stats.written == 0:
+        raise RuntimeError(f"nothing was ingested from {args.source}")
+
+    # Files edited, added or removed while the build ran
+    current = dict((file_id, path) for path, file_id in source_files(args))
+    changed = sorted((p, f) for f, p in current.items()
+                     if f not in built or os.path.getmtime(p) >= started)
+    removed = sorted(set(built) - set(current))
+    if changed:
+        print(f"  Catching up with {len(changed)} file(s) changed during the build...")
+        run_pipeline(args, embedder, store.sink(name), changed)
+    if removed:
+        print(f"  Removing {len(removed)} file(s) deleted during the build...")
+        store.sink(name).delete(removed)
+    if isinstance(store, PgStore) and store.exists(store.base):
+        store.copy_indexes(store.base, name)
+    return stats
+
+
+# ---------------------- VALIDATE ---------------------- #
+
+def hit_rate(samples, results):
+    hits = sum(1 for (_, file_id), files in zip(samples, results) if file_id in files)
+    return hits / len(samples) if samples else 0.0
+
+
+def validate(store, args, old, new, old_embedder, new_embedder):
+    """(report, [problems]) comparing the new generation with the live index."""
+    report = store.compare(old, new)
+    samples = store.sample(old, args.sample)
+    report["samples"] = len(samples)
+    if samples:
+        texts = [text for text, _ in samples]
+        old_results = store.search(old, old_embedder.embed(texts), args.k)
+        new_results = store.search(new, new_embedder.embed(texts), args.k)
+        report["old_recall"] = hit_rate(samples, old_results)
+        report["new_recall"] = hit_rate(samples, new_results)
+        overlaps = [len(set(a) & set(b)) / len(set(a)) for a, b in zip(old_results, new_results) if a]
+        report["top_file_overlap"] = sum(overlaps) / len(overlaps) if overlaps else 0.0
+
+    problems = []
+    if report["new_points"] == 0:
+        problems.append("the new generation is empty")
+    coverage = 1 - report["missing_files"] / report["old_files"] if report["old_files"] else 1.0
+    report["coverage"] = coverage
+    if coverage < args.min_coverage:
+        problems.append(f"it covers {coverage:.1%} of the live index's files (< {args.min_coverage:.0%})")
+    if samples and report["new_recall"] < report["old_recall"] - args.max_recall_drop:
+        problems.append(f"recall@{args.k} dropped from {report['old_recall']:.2f} to {report['new_recall']:.2f}")
+    return report, problems
+
+
+def print_validation(report, k):
+    print(f"  Points:     {report['old_points']} live -> {report['new_points']} new")
+    print(f"  Files:      {report['old_files']} live -> {report['new_files']} new "
+          f"({report['coverage']:.1%} of the live files covered)")
+    if report["missing_files"]:
+        print(f"  Missing:    {report['missing_files']} file(s), e.g. {', '.join(report['missing_examples'])}")
+    if report["samples"]:
+        print(f"  Recall@{k}:  {report['old_recall']:.2f} live -> {report['new_recall']:.2f} new "
+              f"over {report['samples']} sampled chunks (top files agree {report['top_file_overlap']:.0%})")
+
+
+def model_embedder(args, model):
+    return make_embedder(argparse.Namespace(**dict(vars(args), model=model)))
+
+
+# ---------------------- ACTIONS ---------------------- #
+
+def do_switch(store, entry, generation, previous):
+    """Point <base> at generation and record it; previous stays for rollback."""
+    store.switch(generation, previous)
+    generations = entry.setdefault("generations", {})
+    if previous:
+        generations.setdefault(previous, {})["status"] = "previous"
+    generations.setdefault(generation, {})["status"] = "live"
+    entry["previous"] = previous
+    entry["live"] = generation
+    entry["switched_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    print(f"{store.base} now serves generation {generation}"
+          + (f"; {previous} kept for `reindex rollback`." if previous else "."))
+
+
+def live_generation(store, entry):
+    """Generation id of what <base> serves now (recorded, or derived from the store)."""
+    if store.live_name() is None:
+        return None
+    return store.live_generation() or entry.get("live") or INITIAL
+
+
+def print_status(store, entry):
+    live = live_generation(store, entry)
+    print(f"{store.kind} {store.base}: live generation {live or '(none)'}"
+          + (f", previous {entry['previous']}" if entry.get("previous") else ""))
+    generations = dict(entry.get("generations", {}))
+    if live and live not in generations:
+        generations[live] = {}
+    for generation, meta in sorted(generations.items()):
+        name = store.live_name() if generation == live else store.name(generation, live)
+        exists = store.exists(name)
+        points = store.count(name) if exists else None
+        marker = "*" if generation == live else " "
+        details = ", ".join(f"{k} {meta[k]}" for k in ("model", "chunk_size", "status") if k in meta)
+        print(f"  {marker} {generation:<16} {name:<36} "
+              f"{points if exists else 'missing':>9}{' points' if exists else ''}  {details}")
+
+
+def main(argv=None):
+    parser = build_parser(
+        prog="start_services.py reindex",
+        description="Rebuild a vector store into a new generation, validate it and switch atomically.",
+    )
+    parser.add_argument("action", choices=["status", "build", "switch", "rollback", "drop"])
+    parser.add_argument("--generation", default=None, help="Generation id for switch / drop.")
+    parser.add_argument("--old-model", default=None,
+                        help="Model of the live index (default: recorded by the last build, else --model's default).")
+    parser.add_argument("--max-rate", type=float, default=100.0, help="Chunks/s written while building (0: no limit).")
+    parser.add_argument("--sample", type=int, default=50, help="Chunks sampled for the recall check.")
+    parser.add_argument("--k", type=int, default=4, help="Top-k of the recall check (n8n retrieves 4).")
+    parser.add_argument("--min-coverage", type=float, default=0.98,
+                        help="Share of the live index's files the new generation must contain.")
+    parser.add_argument("--max-recall-drop", type=float, default=0.05, help="Tolerated recall@k drop.")
+    parser.add_argument("--no-switch", action="store_true", help="Build and validate only.")
+    parser.add_argument("--force", action="store_true", help="Switch even if the validation fails.")
+    args = parser.parse_args(argv)
+    if args.target == "none":
+        parser.error("reindex needs --target qdrant or pgvector")
+
+    store = open_store(args)
+    state = load_state()
+    key = f"{store.kind}:{store.base}"
+    entry = state.setdefault(key, {"generations": {}})
+    try:
+        current = live_generation(store, entry)
+        if args.action == "status":
+            print_status(store, entry)
+            return 0
+
+        if args.action == "drop":
+            if not args.generation:
+                parser.error("drop needs --generation")
+            if args.generation == current:
+                print(f"{args.generation} is live; switch or roll back first.")
+                return 1
+            name = store.name(args.generation, current)
+            store.drop(name)
+            entry["generations"].pop(args.generation, None)
+            if entry.get("previous") == args.generation:
+                entry["previous"] = None
+            save_state(state)
+            print(f"Dropped {name}.")
+            return 0
+
+        if args.action == "rollback":
+            previous = entry.get("previous")
+            if not previous or not store.exists(store.name(previous, current)):
+                print("No previous generation to roll back to.")
+                return 1
+            do_switch(store, entry, previous, current)
+            save_state(state)
+            return 0
+
+        old_model = args.old_model or (entry.get("generations", {}).get(current) or {}).get("model") or DEFAULT_MODEL
+        if args.action == "build":
+            generation = new_generation_id()
+            entry["generations"][generation] = {
+                "model": args.model, "chunk_size": args.chunk_size, "chunk_overlap": args.chunk_overlap,
+                "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "status": "building",
+            }
+            if current:
+                entry["generations"].setdefault(current, {"model": old_model, "status": "live"})
+            save_state(state)
+            new_embedder = model_embedder(args, args.model)
+            build(store, args, generation, new_embedder)
+            entry["generations"][generation]["status"] = "built"
+            save_state(state)
+        else:
+            generation = args.generation
+            if not generation or not store.exists(store.name(generation, current)):
+                parser.error("switch needs the --generation of a built, non-live generation")
+            if generation == current:
+                print(f"{generation} is already live.")
+                return 0
+            meta = entry["generations"].get(generation) or {}
+            new_embedder = model_embedder(args, meta.get("model", args.model))
+
+        store.prepare_live()
+        new_name = store.name(generation)
+        problems = []
+        if current:
+            print(f"Validating {new_name} against the live index ({store.live_name()}, model {old_model})...")
+            report, problems = validate(store, args, store.live_name(), new_name,
+                                        model_embedder(args, old_model), new_embedder)
+            print_validation(report, args.k)
+            entry["generations"].setdefault(generation, {})["validation"] = {
+                k: v for k, v in report.items() if k != "missing_examples"}
+            for problem in problems:
+                print(f"  ! {problem}")
+            save_state(state)
+
+        if args.no_switch:
+            print(f"Generation {generation} ready; switch with `reindex switch --generation {generation}`.")
+            return 0 if not problems else 2
+        if problems and not args.force:
+            print(f"Not switching: validation failed (inspect {new_name}, then `reindex switch --force` "
+                  f"or `reindex drop --generation {generation}`).")
+            entry["generations"].setdefault(generation, {})["status"] = "rejected"
+            save_state(state)
+            return 2
+        do_switch(store, entry, generation, current)
+        save_state(state)
+        return 0
+    except (QdrantError, PsqlError, RuntimeError) as e:
+        print(f"reindex {args.action} failed: {e}")
+        save_state(state)
+        return 1
+    except KeyboardInterrupt:
+        print("\nInterrupted; the live index was not touched.")
+        save_state(state)
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
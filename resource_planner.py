@@ -0,0 +1,517 @@
+#!/usr/bin/env python3
+"""
+resource_planner.py
+Hardware-aware resource planner for Local AI Packaged.
+
+Reads the host capacity (cores, RAM, free disk, GPU VRAM) from /proc and
+sysfs, splits it between the selected services and writes a compose
+override with per-service CPU/memory limits and tuned settings for Ollama,
+Neo4j, ClickHouse, Postgres and the n8n workers.
+
+Every computed value comes with a short explanation so the plan can be
+reviewed before it is applied.
+
+Usage:
+    python3 start_services.py plan [--services ...] [--profile ...]
+    python3 resource_planner.py --dry-run
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+
+from compose_override import write_override
+from host_facts import get_facts, probe_gpu
+
+
+# ---------------------- CONSTANTS ---------------------- #
+
+OVERRIDE_PATH = "docker-compose.override.resources.yml"
+PLAN_PATH = os.path.join(".localai", "resource-plan.json")
+CLICKHOUSE_CONF_DIR = os.path.join("clickhouse", "config.d")
+CLICKHOUSE_USERS_DIR = os.path.join("clickhouse", "users.d")
+
+# Memory kept for the host OS, the Docker daemon and page cache
+HOST_RESERVE_MIN_MB = 1024
+HOST_RESERVE_RATIO = 0.10
+
+# Per-service sizing: weight for sharing the spare memory, min/max memory in MB
+# (None = uncapped) and the fraction of host cores the service may burst to.
+SERVICE_PROFILES = {
+    "ollama":          {"weight": 40, "min_mb": 2048, "max_mb": None,  "cpu": 1.0},
+    "open-webui":      {"weight": 6,  "min_mb": 512,  "max_mb": 2048,  "cpu": 0.5},
+    "n8n":             {"weight": 6,  "min_mb": 512,  "max_mb": 2048,  "cpu": 0.5},
+    "n8n-worker":      {"weight": 5,  "min_mb": 384,  "max_mb": 2048,  "cpu": 0.5},
+    "n8n-import":      {"weight": 0,  "min_mb": 256,  "max_mb": 512,   "cpu": 0.5},
+    "flowise":         {"weight": 4,  "min_mb": 512,  "max_mb": 2048,  "cpu": 0.5},
+    "postgres":        {"weight": 8,  "min_mb": 256,  "max_mb": 8192,  "cpu": 0.5},
+    "redis":           {"weight": 2,  "min_mb": 128,  "max_mb": 1024,  "cpu": 0.25},
+    "qdrant":          {"weight": 10, "min_mb": 512,  "max_mb": None,  "cpu": 0.5},
+    "neo4j":           {"weight": 8,  "min_mb": 1024, "max_mb": 8192,  "cpu": 0.5},
+    "clickhouse":      {"weight": 8,  "min_mb": 1024, "max_mb": 8192,  "cpu": 0.5},
+    "langfuse-web":    {"weight": 4,  "min_mb": 512,  "max_mb": 2048,  "cpu": 0.25},
+    "langfuse-worker": {"weight": 4,  "min_mb": 512,  "max_mb": 2048,  "cpu": 0.25},
+    "minio":           {"weight": 2,  "min_mb": 256,  "max_mb": 1024,  "cpu": 0.25},
+    "searxng":         {"weight": 2,  "min_mb": 256,  "max_mb": 1024,  "cpu": 0.25},
+    "unsloth":         {"weight": 15, "min_mb": 4096, "max_mb": None,  "cpu": 1.0},
+    "landing":         {"weight": 0,  "min_mb": 32,   "max_mb": 64,    "cpu": 0.1},
+}
+
+# Compose service that runs Ollama for each hardware profile
+OLLAMA_SERVICE_BY_PROFILE = {
+    "cpu": "ollama-cpu",
+    "gpu-nvidia": "ollama-gpu",
+    "gpu-amd": "ollama-gpu-amd",
+}
+
+# Rough memory footprint of one loaded 7-8B q4 model with an 8k context
+MODEL_FOOTPRINT_MB = 6144
+# Extra KV cache needed per additional parallel request slot
+PARALLEL_SLOT_MB = 1024
+
+
+# ---------------------- HOST PROBING ---------------------- #
+
+def read_cpu_count():
+    """Number of usable cores (cpuset-aware)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        pass
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            count = sum(1 for line in f if line.startswith("processor"))
+        if count:
+            return count
+    except OSError:
+        pass
+    return os.cpu_count() or 1
+
+
+def read_meminfo():
+    """Return (total_mb, available_mb) from /proc/meminfo."""
+    values = {}
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                parts = rest.split()
+                if parts:
+                    values[key] = int(parts[0])
+    except OSError:
+        return 0, 0
+    total = values.get("MemTotal", 0) // 1024
+    available = values.get("MemAvailable", values.get("MemFree", 0)) // 1024
+    return total, available
+
+
+def read_free_disk_mb(paths):
+    """Free space in MB for the first existing path (Docker data root first)."""
+    for path in paths:
+        if os.path.isdir(path):
+            try:
+                usage = shutil.disk_usage(path)
+                return usage.free // (1024 * 1024), path
+            except OSError:
+                continue
+    return 0, None
+
+
+def probe_host(refresh=False):
+    """Collect the host capacity used by the planner.
+
+    Memory and disk are read live; GPU vendor and VRAM come from the host
+    facts cache (nvidia-smi is slow to start).
+    """
+    total_mb, available_mb = read_meminfo()
+    free_disk_mb, disk_path = read_free_disk_mb(["/var/lib/docker", os.getcwd()])
+    gpu = get_facts(refresh)["gpu"] or probe_gpu()
+    vendor, vram_mb = gpu["vendor"], gpu["vram_mb"]
+    return {
+        "cpus": read_cpu_count(),
+        "mem_total_mb": total_mb,
+        "mem_available_mb": available_mb,
+        "disk_free_mb": free_disk_mb,
+        "disk_path": disk_path,
+        "gpu_vendor": vendor,
+        "vram_mb": vram_mb,
+    }
+
+
+# ---------------------- PLANNING ---------------------- #
+
+def _clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+def allocate_memory(services, budget_mb, gpu_offload=False):
+    """Split budget_mb between services by weight, honouring min/max.
+
+    Returns (allocation dict, overcommitted flag).
+    """
+    profiles = {}
+    for svc in services:
+        # Replicated services are passed as "name#index", one unit per replica
+        base = svc.split("#")[0]
+        profile = dict(SERVICE_PROFILES.get(base, {"weight": 2, "min_mb": 256, "max_mb": 1024, "cpu": 0.25}))
+        if base == "ollama" and gpu_offload:
+            # Weights live in VRAM, the container only needs room for the runner
+            profile["weight"] = 10
+        profiles[svc] = profile
+
+    alloc = {svc: p["min_mb"] for svc, p in profiles.items()}
+    spare = budget_mb - sum(alloc.values())
+    if spare < 0:
+        # Not even the minimums fit: shrink everything proportionally
+        ratio = budget_mb / float(sum(alloc.values())) if alloc else 1.0
+        return {svc: max(32, int(mb * ratio)) for svc, mb in alloc.items()}, True
+
+    # Water-filling: hand out spare memory by weight, re-distributing what
+    # capped services cannot take.
+    open_set = {svc for svc, p in profiles.items() if p["weight"] > 0}
+    while spare > 0 and open_set:
+        total_weight = sum(profiles[s]["weight"] for s in open_set)
+        handed = 0
+        for svc in sorted(open_set):
+            share = spare * profiles[svc]["weight"] // total_weight
+            cap = profiles[svc]["max_mb"]
+            if cap is not None and alloc[svc] + share >= cap:
+                share = cap - alloc[svc]
+                open_set.discard(svc)
+            alloc[svc] += share
+            handed += share
+        spare -= handed
+        if handed == 0:
+            break
+    return alloc, False
+
+
+def plan_resources(host, services, profile="cpu", n8n_workers=None):
+    """Compute the resource plan for the given compose services.
+
+    Returns a dict with the host facts, per-service settings and the
+    list of explanations.
+    """
+    reasons = []
+
+    def explain(target, key, value, why):
+        reasons.append({"service": target, "setting": key, "value": value, "reason": why})
+
+    cpus = host["cpus"]
+    total_mb = host["mem_total_mb"]
+    gpu_offload = profile in ("gpu-nvidia", "gpu-amd") and host["vram_mb"] > 0
+
+    reserve_mb = max(HOST_RESERVE_MIN_MB, int(total_mb * HOST_RESERVE_RATIO))
+    budget_mb = max(0, total_mb - reserve_mb)
+    explain("host", "reserve", f"{reserve_mb}M",
+            f"max({HOST_RESERVE_MIN_MB}M, {int(HOST_RESERVE_RATIO * 100)}% of {total_mb}M RAM) "
+            "kept for the OS, Docker and page cache")
+
+    planned = list(services)
+    if "ollama" not in planned:
+        planned.append("ollama")
+
+    workers = 0
+    if "n8n-worker" in planned:
+        if n8n_workers is None:
+            workers = _clamp(cpus // 2, 1, 4)
+            explain("n8n-worker", "replicas", workers,
+                    f"half of {cpus} cores, clamped to 1..4")
+        else:
+            workers = n8n_workers
+            explain("n8n-worker", "replicas", workers, "set explicitly")
+        # Budget one allocation unit per worker
+        planned.remove("n8n-worker")
+        planned.extend(f"n8n-worker#{i}" for i in range(workers))
+
+    alloc_input = [s.split("#")[0] for s in planned]
+    alloc_units, overcommitted = allocate_memory(planned, budget_mb, gpu_offload=gpu_offload)
+    if overcommitted:
+        explain("host", "overcommit", True,
+                f"minimum footprints exceed the {budget_mb}M budget; all limits scaled down")
+
+    memory = {}
+    for unit, mb in alloc_units.items():
+        name = unit.split("#")[0]
+        memory[name] = mb  # identical for every worker unit
+
+    settings = {}
+    for svc in sorted(set(alloc_input)):
+        mb = memory[svc]
+        frac = SERVICE_PROFILES.get(svc, {}).get("cpu", 0.25)
+        svc_cpus = round(_clamp(cpus * frac, 0.1, float(cpus)), 2)
+        if svc == "ollama" and not gpu_offload and cpus > 2:
+            # Leave one core for the rest of the stack
+            svc_cpus = float(cpus - 1)
+        entry = {"memory_mb": mb, "cpus": svc_cpus, "env": {}, "command": None}
+        settings[svc] = entry
+        min_mb = SERVICE_PROFILES.get(svc, {}).get("min_mb", 256)
+        if overcommitted:
+            explain(svc, "memory", f"{mb}M", f"min {min_mb}M scaled down to fit the {budget_mb}M budget")
+        else:
+            explain(svc, "memory", f"{mb}M", f"min {min_mb}M + weighted share of the {budget_mb}M budget")
+        if svc == "ollama" and not gpu_offload and cpus > 2:
+            explain(svc, "cpus", svc_cpus, f"{cpus} cores minus one for the other services")
+        else:
+            explain(svc, "cpus", svc_cpus, f"{int(frac * 100)}% of {cpus} cores")
+
+    # ---- Ollama ----
+    ollama = settings["ollama"]
+    if gpu_offload:
+        vram = host["vram_mb"]
+        max_loaded = _clamp(vram // MODEL_FOOTPRINT_MB, 1, 3)
+        spare_vram = max(0, vram - max_loaded * MODEL_FOOTPRINT_MB)
+        parallel = _clamp(1 + spare_vram // PARALLEL_SLOT_MB, 1, 4)
+        basis = f"{vram}M VRAM"
+    else:
+        mem = ollama["memory_mb"]
+        max_loaded = _clamp(mem // MODEL_FOOTPRINT_MB, 1, 3)
+        spare_mem = max(0, mem - max_loaded * MODEL_FOOTPRINT_MB)
+        parallel = _clamp(min(cpus // 4 or 1, 1 + spare_mem // PARALLEL_SLOT_MB), 1, 4)
+        basis = f"{mem}M container memory and {cpus} cores"
+    ollama["env"]["OLLAMA_MAX_LOADED_MODELS"] = max_loaded
+    ollama["env"]["OLLAMA_NUM_PARALLEL"] = parallel
+    explain("ollama", "OLLAMA_MAX_LOADED_MODELS", max_loaded,
+            f"{basis} / ~{MODEL_FOOTPRINT_MB}M per 7-8B q4 model, clamped to 1..3")
+    explain("ollama", "OLLAMA_NUM_PARALLEL", parallel,
+            f"one slot plus one per spare {PARALLEL_SLOT_MB}M of KV cache ({basis}), clamped to 1..4")
+
+    # ---- Neo4j ----
+    if "neo4j" in settings:
+        mem = settings["neo4j"]["memory_mb"]
+        heap = max(256, int(mem * 0.4))
+        pagecache = max(128, int(mem * 0.3))
+        env = settings["neo4j"]["env"]
+        env["NEO4J_server_memory_heap_initial__size"] = f"{heap}m"
+        env["NEO4J_server_memory_heap_max__size"] = f"{heap}m"
+        env["NEO4J_server_memory_pagecache_size"] = f"{pagecache}m"
+        explain("neo4j", "heap", f"{heap}m", f"40% of the {mem}M limit, fixed initial=max to avoid resizing")
+        explain("neo4j", "pagecache", f"{pagecache}m", f"30% of the {mem}M limit, rest left for off-heap and the JVM")
+
+    # ---- ClickHouse ----
+    if "clickhouse" in settings:
+        mem = settings["clickhouse"]["memory_mb"]
+        server_cap = int(mem * 0.8)
+        query_cap = int(mem * 0.5)
+        settings["clickhouse"]["clickhouse"] = {
+            "max_server_memory_usage": server_cap * 1024 * 1024,
+            "max_memory_usage": query_cap * 1024 * 1024,
+        }
+        explain("clickhouse", "max_server_memory_usage", f"{server_cap}M",
+                f"80% of the {mem}M limit so ClickHouse throttles before the OOM killer")
+        explain("clickhouse", "max_memory_usage", f"{query_cap}M", f"50% of the {mem}M limit per query")
+
+    # ---- Postgres ----
+    if "postgres" in settings:
+        mem = settings["postgres"]["memory_mb"]
+        max_conn = 100 + 20 * workers
+        shared_buffers = max(32, int(mem * 0.25))
+        work_mem = _clamp((mem - shared_buffers) // (max_conn * 2), 4, 64)
+        effective_cache = max(64, int(mem * 0.75))
+        maintenance = _clamp(mem // 16, 16, 1024)
+        settings["postgres"]["pg"] = {
+            "max_connections": max_conn,
+            "shared_buffers": f"{shared_buffers}MB",
+            "work_mem": f"{work_mem}MB",
+            "effective_cache_size": f"{effective_cache}MB",
+            "maintenance_work_mem": f"{maintenance}MB",
+        }
+        settings["postgres"]["command"] = ["postgres"] + [
+            arg for k, v in settings["postgres"]["pg"].items() for arg in ("-c", f"{k}={v}")
+        ]
+        explain("postgres", "max_connections", max_conn, f"100 base + 20 per n8n worker ({workers})")
+        explain("postgres", "shared_buffers", f"{shared_buffers}MB", f"25% of the {mem}M limit")
+        explain("postgres", "work_mem", f"{work_mem}MB",
+                f"remaining {mem - shared_buffers}M / (2 x {max_conn} connections), clamped to 4..64MB")
+        explain("postgres", "effective_cache_size", f"{effective_cache}MB", f"75% of the {mem}M limit")
+        explain("postgres", "maintenance_work_mem", f"{maintenance}MB", f"1/16 of the {mem}M limit, clamped to 16..1024MB")
+
+    # ---- n8n workers ----
+    if workers:
+        concurrency = _clamp(settings["n8n-worker"]["memory_mb"] // 128, 2, 10)
+        settings["n8n-worker"]["replicas"] = workers
+        settings["n8n-worker"]["command"] = ["worker", f"--concurrency={concurrency}"]
+        explain("n8n-worker", "concurrency", concurrency,
+                f"{settings['n8n-worker']['memory_mb']}M per worker / ~128M per execution, clamped to 2..10")
+
+    return {
+        "host": host,
+        "profile": profile,
+        "budget_mb": budget_mb,
+        "n8n_workers": workers,
+        "services": settings,
+        "reasons": reasons,
+    }
+
+
+def build_override(plan):
+    """Translate a plan into a compose services mapping."""
+    services = {}
+    for svc, entry in plan["services"].items():
+        target = OLLAMA_SERVICE_BY_PROFILE.get(plan["profile"], "ollama-cpu") if svc == "ollama" else svc
+        body = {
+            "deploy": {"resources": {"limits": {
+                "cpus": str(entry["cpus"]),
+                "memory": f"{entry['memory_mb']}M",
+            }}},
+            # Same value as the memory limit: the container may not use swap
+            "memswap_limit": f"{entry['memory_mb']}M",
+        }
+        if entry.get("replicas"):
+            body["deploy"]["replicas"] = entry["replicas"]
+        if entry["env"]:
+            body["environment"] = {k: str(v) for k, v in entry["env"].items()}
+        if entry.get("command"):
+            body["command"] = entry["command"]
+        if svc == "clickhouse" and entry.get("clickhouse"):
+            body["volumes"] = [
+                f"./{CLICKHOUSE_CONF_DIR}/memory.xml:/etc/clickhouse-server/config.d/zz-memory.xml:ro",
+                f"./{CLICKHOUSE_USERS_DIR}/memory.xml:/etc/clickhouse-server/users.d/zz-memory.xml:ro",
+            ]
+        services[target] = body
+    return services
+
+
+def write_clickhouse_configs(plan):
+    """Write the ClickHouse memory caps mounted by the override."""
+    caps = plan["services"].get("clickhouse", {}).get("clickhouse")
+    if not caps:
+        return
+    os.makedirs(CLICKHOUSE_CONF_DIR, exist_ok=True)
+    os.makedirs(CLICKHOUSE_USERS_DIR, exist_ok=True)
+    with open(os.path.join(CLICKHOUSE_CONF_DIR, "memory.xml"), "w") as f:
+        f.write(
+            "<clickhouse>\n"
+            f"    <max_server_memory_usage>{caps['max_server_memory_usage']}</max_server_memory_usage>\n"
+            "</clickhouse>\n"
+        )
+    with open(os.path.join(CLICKHOUSE_USERS_DIR, "memory.xml"), "w") as f:
+        f.write(
+            "<clickhouse>\n"
+            "    <profiles>\n"
+            "        <default>\n"
+            f"            <max_memory_usage>{caps['max_memory_usage']}</max_memory_usage>\n"
+            "        </default>\n"
+            "    </profiles>\n"
+            "</clickhouse>\n"
+        )
+
+
+def save_plan(plan, override_path=OVERRIDE_PATH):
+    """Persist the plan (JSON) and write the compose override + side files."""
+    os.makedirs(os.path.dirname(PLAN_PATH), exist_ok=True)
+    with open(PLAN_PATH, "w") as f:
+        json.dump(plan, f, indent=2)
+    write_clickhouse_configs(plan)
+    host = plan["host"]
+    header = [
+        "Generated by resource_planner.py — do not edit by hand.",
+        f"Host: {host['cpus']} cores, {host['mem_total_mb']}M RAM, "
+        f"GPU {host['gpu_vendor']} ({host['vram_mb']}M VRAM), profile {plan['profile']}.",
+        "Re-run: python3 start_services.py plan",
+    ]
+    return write_override(override_path, build_override(plan), header)
+
+
+def load_plan():
+    """Return the last saved plan, or None."""
+    if not os.path.exists(PLAN_PATH):
+        return None
+    try:
+        with open(PLAN_PATH, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def print_plan(plan):
+    """Print the host facts, the per-service limits and how each value was derived."""
+    host = plan["host"]
+    print("\n" + "=" * 60)
+    print("  RESOURCE PLAN")
+    print("=" * 60)
+    print(f"  Cores:      {host['cpus']}")
+    print(f"  RAM:        {host['mem_total_mb']}M total, {host['mem_available_mb']}M available")
+    print(f"  Disk free:  {host['disk_free_mb']}M ({host['disk_path'] or 'unknown'})")
+    print(f"  GPU:        {host['gpu_vendor']} ({host['vram_mb']}M VRAM)")
+    print(f"  Budget:     {plan['budget_mb']}M for containers")
+    print("-" * 60)
+    print(f"  {'Service':<18}{'Memory':>10}{'CPUs':>8}")
+    for svc, entry in sorted(plan["services"].items()):
+        print(f"  {svc:<18}{str(entry['memory_mb']) + 'M':>10}{entry['cpus']:>8}")
+    print("-" * 60)
+    print("  How each value was chosen:")
+    for r in plan["reasons"]:
+        print(f"    [{r['service']}] {r['setting']} = {r['value']}")
+        print(f"        {r['reason']}")
+    print("=" * 60)
+
+
+# ---------------------- MAIN ---------------------- #
+
+def read_queue_mode(env_path=".env"):
+    """True when .env enables n8n queue mode."""
+    from start_services import read_env_file
+    return read_env_file(env_path).get("N8N_EXECUTIONS_MODE") == "queue"
+
+
+def selected_compose_services(selected):
+    """Map friendly service names to compose services (all when 'all')."""
+    from start_services import SERVICE_DEPS, resolve_services
+    if not selected or "all" in selected:
+        return sorted(SERVICE_DEPS.keys())
+    return resolve_services(selected)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="start_services.py plan",
+        description="Size the stack for this host and write a tuned compose override.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--profile", choices=["cpu", "gpu-nvidia", "gpu-amd"], default=None,
+                        help="Hardware profile (auto-detected if not set).")
+    parser.add_argument("--services", nargs="+", default=["all"], help="Service groups to plan for.")
+    parser.add_argument("--n8n-workers", type=int, default=None,
+                        help="Number of n8n queue workers (auto when queue mode is enabled).")
+    parser.add_argument("--output", default=OVERRIDE_PATH, help="Override file to write.")
+    parser.add_argument("--json", action="store_true", help="Print the plan as JSON.")
+    parser.add_argument("--dry-run", action="store_true", help="Print the plan without writing files.")
+    parser.add_argument("--refresh-facts", action="store_true",
+                        help="Probe the GPU again instead of using the cached host facts.")
+    args = parser.parse_args(argv)
+
+    host = probe_host(refresh=args.refresh_facts)
+    profile = args.profile
+    if profile is None:
+        profile = {"nvidia": "gpu-nvidia", "amd": "gpu-amd"}.get(host["gpu_vendor"], "cpu")
+
+    services = selected_compose_services(args.services)
+    if "unsloth" in services and profile != "gpu-nvidia":
+        services.remove("unsloth")
+    if (args.n8n_workers or read_queue_mode()) and "n8n" in services:
+        services.append("n8n-worker")
+    if args.n8n_workers == 0 and "n8n-worker" in services:
+        services.remove("n8n-worker")
+
+    plan = plan_resources(host, services, profile=profile, n8n_workers=args.n8n_workers)
+
+    if args.json:
+        print(json.dumps(plan, indent=2))
+    else:
+        print_plan(plan)
+
+    if args.dry_run:
+        print("\nDry-run mode: no files written.")
+        return 0
+
+    changed = save_plan(plan, args.output)
+    print(f"\nOverride {'written' if changed else 'unchanged'}: {args.output}")
+    print(f"Plan saved to {PLAN_PATH}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+stack_logs.py
+One multiplexed log stream for the `localai` compose project.
+
+Every running container of the project gets a `docker logs --follow
+--timestamps` reader; lines are filtered in-process (--grep / --exclude
+regexes, --level from level=..., "level":"...", [ERROR], <Error>, ERROR
+tokens) and queued per service. A single writer merges the queues by
+timestamp and prints them with a colored service prefix.
+
+Memory is bounded: each service keeps at most --backlog pending lines. When
+the terminal cannot keep up with a chatty service (ClickHouse, the Langfuse
+worker...), its oldest pending lines are dropped and a "[N lines dropped]"
+marker is printed instead of the stream falling behind. Output is written
+from a worker thread so readers never wait on the terminal.
+
+Containers that restart are picked up again from their last timestamp.
+
+Usage:
+    python3 start_services.py logs                        # all services, follow
+    python3 start_services.py logs n8n langfuse --level warn
+    python3 start_services.py logs clickhouse --grep 'Exception|timeout' -i
+    python3 start_services.py logs --since 2025-01-01T10:00:00 --no-follow
+"""
+
+import argparse
+import asyncio
+import heapq
+import json
+import os
+import re
+import sys
+import time
+import zlib
+from collections import deque
+
+
+# ---------------------- CONSTANTS ---------------------- #
+
+PROJECT = "localai"
+PROJECT_LABEL = f"com.docker.compose.project={PROJECT}"
+
+LEVELS = ["trace", "debug", "info", "warn", "error", "fatal"]
+LEVEL_ALIASES = {
+    "trc": "trace", "dbg": "debug", "debu": "debug",
+    "information": "info", "notice": "info", "inf": "info",
+    "warning": "warn", "wrn": "warn",
+    "err": "error", "eror": "error", "exception": "error",
+    "critical": "fatal", "crit": "fatal", "panic": "fatal", "emerg": "fatal", "alert": "fatal",
+    # pino / bunyan numeric levels
+    "10": "trace", "20": "debug", "30": "info", "40": "warn", "50": "error", "60": "fatal",
+}
+_LEVEL_WORDS = "trace|debug|info|information|notice|warn|warning|error|err|fatal|critical|crit|panic"
+# level=error, "level":"warn", "level":50, [ERROR], <Error> (ClickHouse), a bare WARN token, Error:
+LEVEL_RE = re.compile(
+    r"(?i:level|lvl|severity)[\"']?\s*[=:]\s*[\"']?(\w+)"
+    rf"|[\[<]((?i:{_LEVEL_WORDS}))[\]>]"
+    r"|\b(TRACE|DEBUG|INFO|NOTICE|WARN|WARNING|ERROR|FATAL|CRITICAL|PANIC)\b"
+    r"|\b(Error|Warning|Fatal|Exception)(?=:)"
+)
+# Only the head of a line is searched for its level
+LEVEL_SCAN_CHARS = 200
+
+COLORS = [31, 32, 33, 34, 35, 36, 91, 92, 93, 94, 95, 96]
+LEVEL_COLORS = {"warn": 33, "error": 31, "fatal": 31}
+
+READ_LIMIT = 1024 * 1024       # longest line read as one (docker json-file splits at 16K anyway)
+MAX_LINE_CHARS = 8192          # longer lines are cut when printed
+MEMBERS_INTERVAL = 5.0
+WRITE_COALESCE = 0.05          # seconds of lines gathered into one terminal write
+
+
+# ---------------------- PARSING ---------------------- #
+
+def line_level(text):
+    """Normalized level of a log line, or None when it does not say."""
+    m = LEVEL_RE.search(text, 0, LEVEL_SCAN_CHARS)
+    if not m:
+        return None
+    word = next(g for g in m.groups() if g).lower()
+    word = LEVEL_ALIASES.get(word, word)
+    return word if word in LEVELS else None
+
+
+def split_timestamp(raw):
+    """(sortable timestamp, text) of a `docker logs --timestamps` line."""
+    ts, _, text = raw.partition(" ")
+    if not ts.endswith("Z") or "T" not in ts:
+        return "", raw
+    # RFC3339Nano drops trailing zeros: pad so timestamps compare as strings
+    head, _, frac = ts[:-1].partition(".")
+    return f"{head}.{frac.ljust(9, '0')}", text
+
+
+def service_color(service):
+    return COLORS[zlib.crc32(service.encode()) % len(COLORS)]
+
+
+# ---------------------- MULTIPLEXER ---------------------- #
+
+class ServiceStream:
+    """Pending lines and counters of one service."""
+
+    def __init__(self, service, backlog):
+        self.service = service
+        self.pending = deque(maxlen=backlog)
+        self.read = 0
+        self.shown = 0
+        self.dropped = 0
+        self.unreported = 0     # dropped since the last marker
+
+
+class LogMux:
+    def __init__(self, backlog=2000, grep=None, exclude=None, min_level=None, color=True,
+                 timestamps=False, as_json=False):
+        self.backlog = backlog
+        self.grep = grep
+        self.exclude = exclude
+        self.min_level = LEVELS.index(min_level) if min_level else None
+        self.color = color
+        self.timestamps = timestamps
+        self.as_json = as_json
+        self.streams = {}
+        self.last_ts = {}           # container -> last timestamp seen (re-attach point)
+        self.width = 12
+        self.wakeup = asyncio.Event()
+        self.started = time.monotonic()
+
+    def stream(self, service):
+        if service not in self.streams:
+            self.streams[service] = ServiceStream(service, self.backlog)
+            self.width = max(self.width, len(service))
+        return self.streams[service]
+
+    def add(self, container, service, raw):
+        """Filter one raw line and queue it; called by the readers."""
+        ts, text = split_timestamp(raw)
+        if ts and ts <= self.last_ts.get(container, ""):
+            return  # already shown before the container restarted
+        if ts:
+            self.last_ts[container] = ts
+        stream = self.stream(service)
+        stream.read += 1
+        if self.grep and not self.grep.search(text):
+            return
+        if self.exclude and self.exclude.search(text):
+            return
+        level = line_level(text)
+        if self.min_level is not None and LEVELS.index(level or "info") < self.min_level:
+            return
+        if len(stream.pending) == stream.pending.maxlen:
+            stream.dropped += 1
+            stream.unreported += 1
+        stream.pending.append((ts, service, level, text))
+        self.wakeup.set()
+
+    def drain(self):
+        """Everything pending, merged by timestamp, rendered as one string."""
+        batches = []
+        out = []
+        for stream in self.streams.values():
+            if stream.unreported:
+                out.append(self.render_marker(stream.service, stream.unreported))
+                stream.unreported = 0
+            if stream.pending:
+                batch = list(stream.pending)
+                stream.pending.clear()
+                stream.shown += len(batch)
+                batches.append(batch)
+        for ts, service, level, text in heapq.merge(*batches, key=lambda item: item[0]):
+            out.append(self.render(ts, service, level, text))
+        return "".join(out)
+
+    def render(self, ts, service, level, text):
+        text = text.rstrip("\r\n")
+        if len(text) > MAX_LINE_CHARS:
+            text = text[:MAX_LINE_CHARS] + " …"
+        if self.as_json:
+            return json.dumps({"ts": ts, "service": service, "level": level, "line": text}) + "\n"
+        stamp = f"{ts[11:23]} " if self.timestamps and ts else ""
+        if not self.color:
+            return f"{service:<{self.width}} | {stamp}{text}\n"
+        prefix = f"\x1b[{service_color(service)}m{service:<{self.width}} |\x1b[0m {stamp}"
+        if level in LEVEL_COLORS:
+            return f"{prefix}\x1b[{LEVEL_COLORS[level]}m{text}\x1b[0m\n"
+        return f"{prefix}{text}\n"
+
+    def render_marker(self, service, count):
+        if self.as_json:
+            return json.dumps({"service": service, "dropped": count}) + "\n"
+        return f"{service:<{self.width}} | [{count} lines dropped: output could not keep up]\n"
+
+    def render_stats(self):
+        seconds = max(time.monotonic() - self.started, 1e-6)
+        lines = [f"{'service':<{self.width}}  {'read':>9} {'lines/s':>8} {'shown':>9} {'dropped':>8}"]
+        for service in sorted(self.streams):
+            s = self.streams[service]
+            lines.append(f"{service:<{self.width}}  {s.read:>9} {s.read / seconds:>8.1f} {s.shown:>9} {s.dropped:>8}")
+        return "\n".join(lines)
+
+
+# ---------------------- DOCKER STREAMS ---------------------- #
+
+async def list_containers(all_states=False):
+    """container name -> compose service for the project."""
+    cmd = ["docker", "ps", "--filter", f"label={PROJECT_LABEL}",
+           "--format", '{{.Names}}\t{{.Label "com.docker.compose.service"}}']
+    if all_states:
+        cmd.insert(2, "-a")
+    proc = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE,
+                                                stderr=asyncio.subprocess.DEVNULL)
+    out, _ = await proc.communicate()
+    members = {}
+    for line in out.decode(errors="replace").splitlines():
+        name, _, service = line.partition("\t")
+        if name:
+            members[name] = service or name
+    return members
+
+
+async def follow_container(mux, container, service, since, tail, follow):
+    """Feed one container's log stream (stdout and stderr) into the multiplexer until it ends."""
+    cmd = ["docker", "logs", "--timestamps"]
+    if follow:
+        cmd.append("--follow")
+    if since:
+        cmd += ["--since", since]
+    if tail is not None:
+        cmd += ["--tail", str(tail)]
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, container, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT, limit=READ_LIMIT
+    )
+    try:
+        while True:
+            try:
+                raw = await proc.stdout.readline()
+            except ValueError:
+                # Longer than READ_LIMIT: take what is buffered as one line
+                raw = await proc.stdout.read(READ_LIMIT)
+            if not raw:
+                break
+            mux.add(container, service, raw.decode(errors="replace"))
+    finally:
+        if proc.returncode is None:
+            proc.kill()
+        await proc.wait()
+
+
+async def writer(mux, out=sys.stdout):
+    """Print what the readers queued, in batches, from a worker thread."""
+    loop = asyncio.get_running_loop()
+
+    def write(text):
+        out.write(text)
+        out.flush()
+
+    while True:
+        await mux.wakeup.wait()
+        await asyncio.sleep(WRITE_COALESCE)
+        mux.wakeup.clear()
+        text = mux.drain()
+        if text:
+            await loop.run_in_executor(None, write, text)
+
+
+def selected(service, wanted):
+    return not wanted or service in wanted or any(w.endswith("*") and service.startswith(w[:-1]) for w in wanted)
+
+
+def expand_services(names):
+    """Friendly group names (n8n, langfuse, ollama...) to compose services; others kept as-is."""
+    from start_services import SERVICE_GROUPS
+    wanted = set()
+    for name in names:
+        if name == "all":
+            return set()
+        if name in SERVICE_GROUPS:
+            wanted.update(SERVICE_GROUPS[name])
+        elif name == "ollama":
+            wanted.add("ollama*")
+        else:
+            wanted.add(name)
+    return wanted
+
+
+async def run_logs(mux, wanted, since, tail, follow):
+    readers = {}
+    writer_task = asyncio.create_task(writer(mux))
+    first = True
+    try:
+        while True:
+            members = await list_containers(all_states=not follow)
+            for container, service in members.items():
+                task = readers.get(container)
+                if not selected(service, wanted) or (task and not task.done()):
+                    continue
+                if first or container not in mux.last_ts:
+                    start, lines = since, tail
+                else:
+                    # Restarted: continue where the previous stream stopped
+                    start, lines = mux.last_ts[container][:19] + "Z", None
+                readers[container] = asyncio.create_task(
+                    follow_container(mux, container, service, start, lines, follow))
+            if first and not readers:
+                print("No matching containers of the localai project are running.")
+                return False
+            first = False
+            if not follow:
+                await asyncio.gather(*readers.values())
+                return True
+            # Sleep until the next membership poll, unless the writer failed (closed pipe)
+            await asyncio.wait([writer_task], timeout=MEMBERS_INTERVAL)
+            if writer_task.done():
+                writer_task.result()
+    finally:
+        for task in readers.values():
+            task.cancel()
+        await asyncio.gather(*readers.values(), return_exceptions=True)
+        if not writer_task.done():
+            writer_task.cancel()
+            await asyncio.gather(writer_task, return_exceptions=True)
+            text = mux.drain()
+            if text:
+                sys.stdout.write(text)
+                sys.stdout.flush()
+
+
+# ---------------------- MAIN ---------------------- #
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="start_services.py logs",
+        description="Follow the logs of the localai services in one filtered, multiplexed stream.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("services", nargs="*",
+                        help="Service groups (n8n, langfuse, ollama...) or compose services; default all.")
+    parser.add_argument("--since", default=None,
+                        help="Start at this time: RFC 3339 timestamp or relative (10m, 2h).")
+    parser.add_argument("--tail", default="50", help="Lines of history per container ('all' for everything).")
+    parser.add_argument("--no-follow", action="store_true", help="Print the existing logs and exit.")
+    parser.add_argument("--grep", default=None, help="Only lines matching this regex.")
+    parser.add_argument("--exclude", default=None, help="Drop lines matching this regex.")
+    parser.add_argument("-i", "--ignore-case", action="store_true", help="Case-insensitive --grep / --exclude.")
+    parser.add_argument("--level", choices=LEVELS, default=None,
+                        help="Minimum level; lines without a level count as info.")
+    parser.add_argument("--backlog", type=int, default=2000,
+                        help="Pending lines kept per service before the oldest are dropped.")
+    parser.add_argument("--timestamps", action="store_true", help="Show the time of each line.")
+    parser.add_argument("--no-color", action="store_true")
+    parser.add_argument("--json", action="store_true", help="One JSON object per line.")
+    parser.add_argument("--stats", action="store_true", help="Print per-service line counts at exit.")
+    args = parser.parse_args(argv)
+
+    flags = re.IGNORECASE if args.ignore_case else 0
+    try:
+        grep = re.compile(args.grep, flags) if args.grep else None
+        exclude = re.compile(args.exclude, flags) if args.exclude else None
+    except re.error as e:
+        print(f"Invalid regex: {e}")
+        return 2
+    if args.since and args.tail == "50":
+        args.tail = "all"  # --since decides where to start
+    color = not args.no_color and sys.stdout.isatty() and "NO_COLOR" not in os.environ
+
+    mux = LogMux(max(1, args.backlog), grep, exclude, args.level, color, args.timestamps, args.json)
+    ok = True
+    try:
+        ok = asyncio.run(run_logs(mux, expand_services(args.services), args.since, args.tail,
+                                  not args.no_follow))
+    except KeyboardInterrupt:
+        pass
+    except BrokenPipeError:
+        # Reader of the pipe (head, less) went away: no more output to give
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    if args.stats:
+        print(mux.render_stats(), file=sys.stderr)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
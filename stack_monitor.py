@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+stack_monitor.py
+Live monitor for the `localai` compose project.
+
+One `docker stats` stream (all containers, filtered to the project) and one
+`docker events` stream feed fixed-size ring buffers per container. A
+periodic `docker inspect` over the whole project adds restart counts,
+health and OOM state. The data is served as Prometheus text on /metrics
+and shown as a compact terminal table. Alerts are raised for crash loops,
+OOM kills and unhealthy containers.
+
+Memory is bounded: --history samples per container, --max-containers
+containers tracked, and a fixed-size alert log.
+
+Usage:
+    python3 start_services.py watch [--port 9464] [--history 120]
+    python3 start_services.py --watch          # monitor after deploying
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import sys
+import time
+from collections import deque
+
+
+# ---------------------- CONSTANTS ---------------------- #
+
+PROJECT = "localai"
+PROJECT_LABEL = f"com.docker.compose.project={PROJECT}"
+
+# `docker stats` redraws the screen between refreshes with these sequences
+ANSI_RE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+
+SIZE_UNITS = {
+    "b": 1, "kb": 1000, "mb": 1000 ** 2, "gb": 1000 ** 3, "tb": 1000 ** 4,
+    "kib": 1024, "mib": 1024 ** 2, "gib": 1024 ** 3, "tib": 1024 ** 4,
+}
+SIZE_RE = re.compile(r"^\s*([0-9.]+)\s*([A-Za-z]*)\s*$")
+
+# Container states refreshed from `docker inspect` every N seconds
+INSPECT_INTERVAL = 10.0
+
+
+# ---------------------- PARSING ---------------------- #
+
+def parse_size(text):
+    """'12.5MiB' -> bytes (0 when unparsable)."""
+    m = SIZE_RE.match(text or "")
+    if not m:
+        return 0
+    return int(float(m.group(1)) * SIZE_UNITS.get(m.group(2).lower() or "b", 1))
+
+
+def parse_pair(text):
+    """'1.2kB / 3MB' -> (bytes, bytes)."""
+    left, _, right = (text or "").partition("/")
+    return parse_size(left), parse_size(right)
+
+
+def parse_stats_line(line):
+    """Decode one `docker stats --format '{{json .}}'` line into a sample dict."""
+    line = ANSI_RE.sub("", line).strip()
+    if not line.startswith("{"):
+        return None
+    try:
+        raw = json.loads(line)
+    except ValueError:
+        return None
+    mem_used, mem_limit = parse_pair(raw.get("MemUsage"))
+    net_rx, net_tx = parse_pair(raw.get("NetIO"))
+    blk_read, blk_write = parse_pair(raw.get("BlockIO"))
+    try:
+        cpu = float((raw.get("CPUPerc") or "0").rstrip("%") or 0)
+    except ValueError:
+        cpu = 0.0
+    return {
+        "name": raw.get("Name", "").lstrip("/"),
+        "cpu_percent": cpu,
+        "mem_bytes": mem_used,
+        "mem_limit_bytes": mem_limit,
+        "net_rx_bytes": net_rx,
+        "net_tx_bytes": net_tx,
+        "block_read_bytes": blk_read,
+        "block_write_bytes": blk_write,
+    }
+
+
+# ---------------------- STATE ---------------------- #
+
+class ContainerState:
+    """Ring buffer of samples plus the latest inspect/event state for one container."""
+
+    __slots__ = ("name", "service", "samples", "restart_count", "health", "status",
+                 "oom_kills", "die_times", "last_seen")
+
+    def __init__(self, name, service, history, crash_window_events):
+        self.name = name
+        self.service = service
+        self.samples = deque(maxlen=history)
+        self.restart_count = None
+        self.health = ""
+        self.status = ""
+        self.oom_kills = 0
+        self.die_times = deque(maxlen=crash_window_events)
+        self.last_seen = time.time()
+
+    def latest(self):
+        return self.samples[-1] if self.samples else None
+
+
+class StackMonitor:
+    """Holds bounded per-container history and derives alerts."""
+
+    def __init__(self, history=120, max_containers=200, crash_restarts=3, crash_window=300.0,
+                 alert_log=100):
+        self.history = history
+        self.max_containers = max_containers
+        self.crash_restarts = crash_restarts
+        self.crash_window = crash_window
+        self.containers = {}
+        self.services = {}        # container name -> compose service
+        self.alerts = deque(maxlen=alert_log)
+        self.alert_counts = {}    # (kind, service) -> total
+        self.active_alerts = {}   # (kind, container) -> message
+        self.started = time.time()
+
+    # ---- membership ----
+
+    def set_members(self, members):
+        """Replace the known project containers (name -> service)."""
+        self.services = dict(members)
+        now = time.time()
+        for name in list(self.containers):
+            if name not in self.services and now - self.containers[name].last_seen > self.crash_window:
+                del self.containers[name]
+
+    def _state(self, name):
+        state = self.containers.get(name)
+        if state is None:
+            if name not in self.services or len(self.containers) >= self.max_containers:
+                return None
+            state = ContainerState(name, self.services[name], self.history, self.crash_restarts)
+            self.containers[name] = state
+        return state
+
+    # ---- inputs ----
+
+    def add_sample(self, sample):
+        state = self._state(sample["name"])
+        if state is None:
+            return
+        sample["ts"] = time.time()
+        state.samples.append(sample)
+        state.last_seen = sample["ts"]
+
+    def update_inspect(self, name, restart_count, oom_killed, health, status):
+        state = self._state(name)
+        if state is None:
+            return
+        if oom_killed and not state.oom_kills:
+            state.oom_kills = 1
+            self.raise_alert("oom", state, "OOM-killed (State.OOMKilled)")
+        if state.restart_count is not None and restart_count > state.restart_count:
+            self.raise_alert("restart", state, f"restarted ({restart_count} restarts)")
+        state.restart_count = restart_count
+        self._set_health(state, health)
+        state.status = status
+
+    def handle_event(self, event):
+        """Apply one `docker events` JSON record."""
+        attrs = (event.get("Actor") or {}).get("Attributes") or {}
+        name = attrs.get("name", "")
+        state = self._state(name)
+        if state is None:
+            return
+        action = event.get("Action") or event.get("status") or ""
+        now = event.get("time") or time.time()
+        if action == "oom":
+            state.oom_kills += 1
+            self.raise_alert("oom", state, f"OOM kill #{state.oom_kills}")
+        elif action == "die":
+            state.die_times.append(now)
+            recent = [t for t in state.die_times if now - t <= self.crash_window]
+            if len(recent) >= self.crash_restarts:
+                self.raise_alert("crashloop", state,
+                                 f"{len(recent)} exits in {int(self.crash_window)}s "
+                                 f"(exit code {attrs.get('exitCode', '?')})")
+        elif action.startswith("health_status"):
+            self._set_health(state, action.split(":", 1)[-1].strip())
+
+    def _set_health(self, state, health):
+        if health == "unhealthy" and state.health != "unhealthy":
+            self.raise_alert("unhealthy", state, "healthcheck failing")
+        elif health == "healthy":
+            self.active_alerts.pop(("unhealthy", state.name), None)
+        state.health = health
+
+    def raise_alert(self, kind, state, message):
+        key = (kind, state.service)
+        self.alert_counts[key] = self.alert_counts.get(key, 0) + 1
+        self.active_alerts[(kind, state.name)] = message
+        entry = (time.time(), kind, state.name, message)
+        self.alerts.append(entry)
+        print(f"\a[ALERT] {time.strftime('%H:%M:%S')} {kind.upper()} {state.name}: {message}",
+              file=sys.stderr)
+
+    # ---- outputs ----
+
+    def render_metrics(self):
+        """Prometheus text exposition of the latest values."""
+        lines = []
+
+        def metric(name, kind, help_text, rows):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in rows:
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{name}{{{label_text}}} {value}")
+
+        states = sorted(self.containers.values(), key=lambda s: s.name)
+
+        def rows(field):
+            out = []
+            for s in states:
+                latest = s.latest()
+                if latest is not None:
+                    out.append(((("service", s.service), ("container", s.name)), latest[field]))
+            return out
+
+        metric("localai_container_cpu_percent", "gauge", "CPU usage in percent of one core.", rows("cpu_percent"))
+        metric("localai_container_memory_bytes", "gauge", "Memory usage.", rows("mem_bytes"))
+        metric("localai_container_memory_limit_bytes", "gauge", "Memory limit.", rows("mem_limit_bytes"))
+        metric("localai_container_network_receive_bytes", "counter", "Network bytes received.", rows("net_rx_bytes"))
+        metric("localai_container_network_transmit_bytes", "counter", "Network bytes sent.", rows("net_tx_bytes"))
+        metric("localai_container_block_read_bytes", "counter", "Block IO bytes read.", rows("block_read_bytes"))
+        metric("localai_container_block_write_bytes", "counter", "Block IO bytes written.", rows("block_write_bytes"))
+        metric("localai_container_restarts", "counter", "Container restart count.",
+               [((("service", s.service), ("container", s.name)), s.restart_count or 0) for s in states])
+        metric("localai_container_healthy", "gauge", "1 healthy, 0 unhealthy, -1 no healthcheck.",
+               [((("service", s.service), ("container", s.name)),
+                 1 if s.health == "healthy" else 0 if s.health == "unhealthy" else -1) for s in states])
+        metric("localai_container_oom_kills", "counter", "OOM kills observed.",
+               [((("service", s.service), ("container", s.name)), s.oom_kills) for s in states])
+        metric("localai_alerts_total", "counter", "Alerts raised by kind and service.",
+               [((("kind", k), ("service", svc)), n) for (k, svc), n in sorted(self.alert_counts.items())])
+        metric("localai_monitor_samples", "gauge", "Samples held in the ring buffers.",
+               [((("scope", "all"),), sum(len(s.samples) for s in states))])
+        return "\n".join(lines) + "\n"
+
+    def render_table(self):
+        """Compact terminal view: latest sample + short CPU trend per container."""
+        out = [f"localai monitor — {len(self.containers)} containers — "
+               f"{time.strftime('%H:%M:%S')}   (Ctrl+C to quit)", ""]
+        out.append(f"{'CONTAINER':<24}{'CPU%':>7}{'MEM':>10}{'MEM%':>6}{'NET rx/tx':>18}"
+                   f"{'BLOCK r/w':>18}{'RST':>5}  {'HEALTH':<10}TREND")
+        for s in sorted(self.containers.values(), key=lambda c: c.name):
+            latest = s.latest()
+            if latest is None:
+                continue
+            limit = latest["mem_limit_bytes"] or 1
+            trend = sparkline([x["cpu_percent"] for x in list(s.samples)[-20:]])
+            out.append(
+                f"{s.name[:23]:<24}{latest['cpu_percent']:>7.1f}{human(latest['mem_bytes']):>10}"
+                f"{100.0 * latest['mem_bytes'] / limit:>6.0f}"
+                f"{human(latest['net_rx_bytes']) + '/' + human(latest['net_tx_bytes']):>18}"
+                f"{human(latest['block_read_bytes']) + '/' + human(latest['block_write_bytes']):>18}"
+                f"{s.restart_count or 0:>5}  {(s.health or s.status or '-')[:9]:<10}{trend}"
+            )
+        if self.active_alerts:
+            out.append("")
+            out.append("ALERTS:")
+            for (kind, name), message in sorted(self.active_alerts.items()):
+                out.append(f"  {kind.upper():<10} {name}: {message}")
+        return "\n".join(out)
+
+
+def human(num):
+    for unit in ("B", "K", "M", "G", "T"):
+        if abs(num) < 1024 or unit == "T":
+            return f"{num:.0f}{unit}" if unit == "B" else f"{num:.1f}{unit}"
+        num /= 1024.0
+
+
+def sparkline(values):
+    bars = " ▁▂▃▄▅▆▇█"
+    if not values:
+        return ""
+    top = max(max(values), 1.0)
+    return "".join(bars[min(8, int(v / top * 8))] for v in values)
+
+
+# ---------------------- DOCKER STREAMS ---------------------- #
+
+async def read_lines(cmd, on_line, restart_delay=2.0):
+    """Run a streaming docker command forever, passing each stdout line on."""
+    while True:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+        )
+        try:
+            while True:
+                raw = await proc.stdout.readline()
+                if not raw:
+                    break
+                # docker stats packs several JSON records between screen-clear codes
+                for part in ANSI_RE.sub("\n", raw.decode(errors="replace")).splitlines():
+                    if part.strip():
+                        on_line(part)
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+            await proc.wait()
+        await asyncio.sleep(restart_delay)
+
+
+async def run_capture(*cmd):
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+    )
+    out, _ = await proc.communicate()
+    return out.decode(errors="replace") if proc.returncode == 0 else ""
+
+
+async def poll_inspect(monitor, interval=INSPECT_INTERVAL):
+    """Refresh membership, restart counts and health with one ps + one inspect call."""
+    while True:
+        listing = await run_capture(
+            "docker", "ps", "-a", "--filter", f"label={PROJECT_LABEL}",
+            "--format", '{{.Names}}\t{{.Label "com.docker.compose.service"}}'
+        )
+        members = {}
+        for line in listing.splitlines():
+            name, _, service = line.partition("\t")
+            if name:
+                members[name] = service or name
+        monitor.set_members(members)
+        if members:
+            inspected = await run_capture(
+                "docker", "inspect", "--format",
+                "{{.Name}}\t{{.RestartCount}}\t{{.State.OOMKilled}}\t"
+                "{{if .State.Health}}{{.State.Health.Status}}{{end}}\t{{.State.Status}}",
+                *sorted(members)
+            )
+            for line in inspected.splitlines():
+                parts = line.split("\t")
+                if len(parts) != 5:
+                    continue
+                name, restarts, oom, health, status = parts
+                monitor.update_inspect(name.lstrip("/"), int(restarts or 0), oom == "true", health, status)
+        await asyncio.sleep(interval)
+
+
+def stats_consumer(monitor):
+    def on_line(line):
+        sample = parse_stats_line(line)
+        if sample:
+            monitor.add_sample(sample)
+    return on_line
+
+
+def events_consumer(monitor):
+    def on_line(line):
+        try:
+            monitor.handle_event(json.loads(line))
+        except ValueError:
+            pass
+    return on_line
+
+
+# ---------------------- HTTP ---------------------- #
+
+def make_metrics_handler(monitor):
+    async def handle(reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readline(), timeout=5)
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request.decode(errors="replace").split()
+            path = parts[1] if len(parts) > 1 else "/"
+            if path.startswith("/metrics"):
+                body = monitor.render_metrics().encode()
+                status = "200 OK"
+                ctype = "text/plain; version=0.0.4; charset=utf-8"
+            elif path.startswith("/healthz"):
+                body, status, ctype = b"ok\n", "200 OK", "text/plain"
+            else:
+                body, status, ctype = b"not found\n", "404 Not Found", "text/plain"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {ctype}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+    return handle
+
+
+# ---------------------- MAIN ---------------------- #
+
+async def render_loop(monitor, interval):
+    while True:
+        await asyncio.sleep(interval)
+        sys.stdout.write("\x1b[2J\x1b[H" + monitor.render_table() + "\n")
+        sys.stdout.flush()
+
+
+async def run_monitor(args):
+    monitor = StackMonitor(history=args.history, max_containers=args.max_containers,
+                           crash_restarts=args.crash_restarts, crash_window=args.crash_window)
+    tasks = [
+        poll_inspect(monitor),
+        read_lines(["docker", "stats", "--format", "{{json .}}"], stats_consumer(monitor)),
+        read_lines(["docker", "events", "--format", "{{json .}}",
+                    "--filter", f"label={PROJECT_LABEL}", "--filter", "type=container"],
+                   events_consumer(monitor)),
+    ]
+    if args.port:
+        server = await asyncio.start_server(make_metrics_handler(monitor), args.bind, args.port)
+        print(f"Prometheus metrics on http://{args.bind}:{args.port}/metrics")
+        tasks.append(server.serve_forever())
+    if not args.no_tui:
+        tasks.append(render_loop(monitor, args.refresh))
+    await asyncio.gather(*tasks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="start_services.py watch",
+        description="Stream container stats for the localai project, serve /metrics and raise alerts.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--port", type=int, default=9464, help="Metrics port (0 disables the endpoint).")
+    parser.add_argument("--bind", default="127.0.0.1", help="Metrics bind address.")
+    parser.add_argument("--history", type=int, default=120, help="Samples kept per container.")
+    parser.add_argument("--max-containers", type=int, default=200, help="Containers tracked at most.")
+    parser.add_argument("--refresh", type=float, default=2.0, help="Terminal refresh interval (s).")
+    parser.add_argument("--crash-restarts", type=int, default=3,
+                        help="Exits within --crash-window that count as a crash loop.")
+    parser.add_argument("--crash-window", type=float, default=300.0, help="Crash-loop window (s).")
+    parser.add_argument("--no-tui", action="store_true", help="Only serve metrics and print alerts.")
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(run_monitor(args))
+    except KeyboardInterrupt:
+        print("\nMonitor stopped.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,9 +7,31 @@ Features:
 - Interactive setup wizard (--setup)
 - Selective service deployment (--services)
 - SWAG reverse proxy auto-detection (--proxy)
+- SWAG / Caddy config rendered from one service description, reloaded only when it changed (proxy subcommand)
 - Supabase and Caddy management in docker-compose.yml
 - .env validation / auto-generation
+- n8n backup imports limited to new or changed files, skipped when none (n8n-import subcommand)
+- Targeted restarts of the services using changed .env keys (env subcommand)
+- Concurrent preflight checks before anything is stopped (preflight subcommand)
+- Deployment plan, progress journal and lock; --resume continues an interrupted deploy (journal subcommand)
 - Dry-run mode, image update, profile selection
+- Host facts (GPU, IP, Docker, SWAG, ports) probed concurrently and cached (facts subcommand, --refresh-facts)
+- Hardware-aware resource plan (plan subcommand, --tune)
+- Queue-depth autoscaling of n8n workers (autoscale subcommand)
+- Live stack monitor with Prometheus /metrics (watch subcommand, --watch)
+- Multiplexed, filtered log stream over all services (logs subcommand)
+- Bulk document ingestion into Qdrant / pgvector (ingest subcommand)
+- Debounced watcher that ingests ./shared changes in batches (ingest-watch subcommand)
+- Tuned Qdrant collections (HNSW, quantization, on-disk, file_id index) and a recall / latency benchmark (qdrant subcommand)
+- Blue/green re-indexing with validation, atomic alias / table switch and rollback (reindex subcommand)
+- Index / VACUUM maintenance for the RAG tables (db-maintain subcommand)
+- Streaming CSV / XLSX loader into document_rows with COPY (tables subcommand)
+- Chat memory index, retention and partitioning (chat-memory subcommand)
+- Optional PgBouncer in front of postgres (pooler subcommand)
+- Embedding-batching, priority-scheduling proxy in front of Ollama (ollama-proxy subcommand)
+- Deduplicating, compressed volume snapshots with parallel restore and verify (backup subcommand)
+- Placement across several Docker hosts with cross-host links and parallel deploy (hosts subcommand)
+- Benchmark of the deploy / update / fallback paths against a simulated docker CLI (bench subcommand)
 """
 
 import os
@@ -17,8 +39,15 @@ import subprocess
 import shutil
 import time
 import argparse
+import atexit
 import sys
 import glob as globmod
+import importlib
+
+import host_facts
+import n8n_import
+from deploy_journal import HEALTH_TIMEOUT, DeployLock, Deployment, load_plan, order_services, plan_finished
+from env_model import EnvFile, record_applied
 
 
 # ---------------------- CONSTANTS ---------------------- #
@@ -57,6 +86,39 @@ SERVICE_GROUPS = {
 
 ALL_SELECTABLE = list(SERVICE_GROUPS.keys()) + ["ollama"]
 
+# Subcommand -> module implementing it (each module exposes main(argv))
+SUBCOMMANDS = {
+    "plan": "resource_planner",
+    "autoscale": "n8n_autoscaler",
+    "watch": "stack_monitor",
+    "ingest": "ingest",
+    "ingest-watch": "ingest_watcher",
+    "qdrant": "qdrant_tuning",
+    "reindex": "reindex",
+    "db-maintain": "db_maintenance",
+    "tables": "tabular_loader",
+    "chat-memory": "chat_memory",
+    "pooler": "pg_pooler",
+    "ollama-proxy": "ollama_proxy",
+    "env": "env_model",
+    "preflight": "preflight",
+    "journal": "deploy_journal",
+    "backup": "volume_backup",
+    "facts": "host_facts",
+    "bench": "orchestrator_bench",
+    "hosts": "multi_host",
+    "logs": "stack_logs",
+    "proxy": "proxy_config",
+    "n8n-import": "n8n_import",
+}
+
+# Generated by the resource planner, included automatically when present
+RESOURCES_OVERRIDE = "docker-compose.override.resources.yml"
+# Generated by `pooler enable` (PgBouncer in front of postgres)
+POOLER_OVERRIDE = "docker-compose.override.pooler.yml"
+# Generated by `ollama-proxy enable` (embedding batcher in front of Ollama)
+OLLAMA_PROXY_OVERRIDE = "docker-compose.override.ollama-proxy.yml"
+
 
 # ---------------------- UTILS ---------------------- #
 
@@ -66,6 +128,11 @@ def run_command(cmd, cwd=None):
     subprocess.run(cmd, cwd=cwd, check=True)
 
 
+def read_env_file(path=".env"):
+    """Return KEY=value pairs from an env file as a dict (values as compose reads them)."""
+    return EnvFile.load(path).as_dict()
+
+
 def confirm(prompt):
     """Ask the user to confirm with OK or cancel."""
     while True:
@@ -80,71 +147,20 @@ def confirm(prompt):
 
 
 def detect_gpu_type():
-    """Detect GPU hardware."""
-    if shutil.which("nvidia-smi"):
-        return "nvidia"
-    if shutil.which("rocm-smi") or os.path.isdir("/opt/rocm"):
-        return "amd"
-    return "cpu"
+    """Detect GPU hardware (cached host facts)."""
+    return host_facts.gpu_type()
 
 
 # ---------------------- PROXY DETECTION ---------------------- #
 
 def detect_swag():
-    """Detect if SWAG reverse proxy is running or installed."""
-    # Check running containers
-    try:
-        result = subprocess.run(
-            ["docker", "ps", "--filter", "name=swag", "--format", "{{.Names}}"],
-            capture_output=True, text=True, check=True
-        )
-        if "swag" in result.stdout.lower():
-            return True
-    except Exception:
-        pass
-
-    # Check common SWAG config paths
-    swag_paths = [
-        os.path.expanduser("~/swag/nginx/proxy-confs"),
-        "/etc/swag/nginx/proxy-confs",
-        "/volume1/docker/swag/nginx/proxy-confs",   # Synology
-        "/mnt/user/appdata/swag/nginx/proxy-confs",  # Unraid
-    ]
-    for p in swag_paths:
-        if os.path.isdir(p):
-            return True
-
-    return False
+    """Detect if SWAG reverse proxy is running or installed (cached host facts)."""
+    return bool((host_facts.get_facts()["swag"] or {}).get("detected"))
 
 
 def find_swag_proxy_dir():
-    """Find the SWAG proxy-confs directory."""
-    candidates = [
-        os.path.expanduser("~/swag/nginx/proxy-confs"),
-        "/etc/swag/nginx/proxy-confs",
-        "/volume1/docker/swag/nginx/proxy-confs",
-        "/mnt/user/appdata/swag/nginx/proxy-confs",
-    ]
-    for p in candidates:
-        if os.path.isdir(p):
-            return p
-
-    # Try to find via docker inspect
-    try:
-        result = subprocess.run(
-            ["docker", "inspect", "swag", "--format",
-             "{{range .Mounts}}{{if eq .Destination \"/config\"}}{{.Source}}{{end}}{{end}}"],
-            capture_output=True, text=True, check=True
-        )
-        config_path = result.stdout.strip()
-        if config_path:
-            proxy_dir = os.path.join(config_path, "nginx", "proxy-confs")
-            if os.path.isdir(proxy_dir):
-                return proxy_dir
-    except Exception:
-        pass
-
-    return None
+    """Find the SWAG proxy-confs directory (cached host facts)."""
+    return host_facts.swag_proxy_dir()
 
 
 def connect_swag_to_localai():
@@ -177,30 +193,16 @@ def connect_swag_to_localai():
 
 
 def install_swag_confs(swag_proxy_dir):
-    """Copy SWAG proxy-conf templates to the SWAG proxy-confs directory."""
-    templates_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "swag")
-    if not os.path.isdir(templates_dir):
-        print("  swag/ templates directory not found, skipping.")
-        return
+    """Render the SWAG proxy confs into swag_proxy_dir; nginx is reloaded only if they changed."""
+    from proxy_config import apply_swag
+    return apply_swag(swag_proxy_dir)
 
-    installed = 0
-    for conf_file in sorted(os.listdir(templates_dir)):
-        if not conf_file.endswith(".conf"):
-            continue
-        src = os.path.join(templates_dir, conf_file)
-        dst = os.path.join(swag_proxy_dir, conf_file)
-        shutil.copyfile(src, dst)
-        print(f"  Installed {conf_file}")
-        installed += 1
 
-    if installed > 0:
-        print(f"  {installed} proxy configs installed to {swag_proxy_dir}")
-        # Restart SWAG to pick up new configs
-        try:
-            run_command(["docker", "restart", "swag"])
-            print("  SWAG restarted to apply new configs.")
-        except Exception:
-            print("  Could not restart SWAG container. Restart it manually.")
+def configure_caddy():
+    """Render the Caddyfile; a running Caddy is reloaded only if it changed."""
+    print("\nConfiguring Caddy reverse proxy...")
+    from proxy_config import apply_caddy
+    return apply_caddy()
 
 
 # ---------------------- ENV MANAGEMENT ---------------------- #
@@ -384,7 +386,10 @@ def resolve_services(selected_services):
 
     for svc in selected_services:
         if svc == "ollama":
-            continue  # handled via profiles
+            # Ollama itself is handled via profiles; its proxy is a regular service
+            if os.path.exists(OLLAMA_PROXY_OVERRIDE):
+                compose_services.add("ollama-proxy")
+            continue
         if svc in SERVICE_GROUPS:
             for s in SERVICE_GROUPS[svc]:
                 compose_services.add(s)
@@ -410,11 +415,18 @@ def stop_existing_containers(profile=None):
         print("Docker compose down returned a non-zero exit code. Continuing.")
 
 
-def build_compose_base(profile=None, environment=None, supabase_enabled=False):
-    """Build the base docker compose command with profile and environment."""
-    cmd = ["docker", "compose", "-p", "localai"]
+def build_compose_base(profile=None, environment=None, supabase_enabled=False, extra_profiles=None,
+                       context=None):
+    """Build the base docker compose command with profile and environment.
+
+    With a Docker context the command targets that daemon; the resources
+    override, sized for this machine, is then left out.
+    """
+    cmd = ["docker"] + (["--context", context] if context else []) + ["compose", "-p", "localai"]
     if profile and profile != "none":
         cmd.extend(["--profile", profile])
+    for extra in extra_profiles or []:
+        cmd.extend(["--profile", extra])
     cmd.extend(["-f", "docker-compose.yml"])
     if environment == "private":
         cmd.extend(["-f", "docker-compose.override.private.yml"])
@@ -422,20 +434,43 @@ def build_compose_base(profile=None, environment=None, supabase_enabled=False):
         cmd.extend(["-f", "docker-compose.override.public.yml"])
         if supabase_enabled and os.path.exists("docker-compose.override.public.supabase.yml"):
             cmd.extend(["-f", "docker-compose.override.public.supabase.yml"])
+    if os.path.exists(RESOURCES_OVERRIDE) and not context:
+        cmd.extend(["-f", RESOURCES_OVERRIDE])
+    if os.path.exists(POOLER_OVERRIDE):
+        cmd.extend(["-f", POOLER_OVERRIDE])
+    if os.path.exists(OLLAMA_PROXY_OVERRIDE):
+        cmd.extend(["-f", OLLAMA_PROXY_OVERRIDE])
     return cmd
 
 
-def start_local_ai(profile=None, environment=None, services=None, supabase_enabled=False):
-    """Start local AI stack service by service, collecting results."""
+def start_local_ai(profile=None, environment=None, services=None, supabase_enabled=False,
+                   deploy=None, health_timeout=HEALTH_TIMEOUT, import_plan=None):
+    """Start local AI stack service by service, collecting results.
+
+    With a Deployment, services it found healthy on the same config are left
+    alone, the others are journaled and waited for; returns False if any of
+    them failed or did not become healthy. n8n-import only runs when the
+    import plan has new or changed backup files.
+    """
     print("\nStarting Local AI stack...")
 
-    base_cmd = build_compose_base(profile, environment, supabase_enabled=supabase_enabled)
+    importing = bool(import_plan and import_plan.needed)
+    base_cmd = build_compose_base(profile, environment, supabase_enabled=supabase_enabled,
+                                  extra_profiles=[n8n_import.PROFILE] if importing else None)
 
     # If "all", launch everything at once first (fast path)
     if not services or "all" in services:
         service_list = None
     else:
         service_list = resolve_services(services)
+    if deploy and deploy.skipped:
+        service_list = deploy.pending
+        if not service_list:
+            print("All selected services are already healthy on this configuration.")
+            return True
+    if service_list and not importing:
+        # Naming a service starts it whatever its profile
+        service_list = [svc for svc in service_list if svc != n8n_import.SERVICE]
 
     # Try launching everything at once (output streamed in real-time)
     cmd = base_cmd + ["up", "-d"]
@@ -447,7 +482,7 @@ def start_local_ai(profile=None, environment=None, services=None, supabase_enabl
 
     if result.returncode == 0:
         print_deployment_summary(base_cmd)
-        return
+        return deploy.settle(deploy.pending, health_timeout) if deploy else True
 
     print("\nSome services failed to start. Retrying individually...\n")
 
@@ -460,17 +495,10 @@ def start_local_ai(profile=None, environment=None, services=None, supabase_enabl
             service_list = [s.strip() for s in config_result.stdout.strip().split("\n") if s.strip()]
         except subprocess.CalledProcessError:
             print("Could not list services from compose config.")
-            return
+            return False
 
     # Infrastructure first, then apps
-    infra_services = ["postgres", "redis", "clickhouse", "minio"]
-    ordered = []
-    for svc in infra_services:
-        if svc in service_list:
-            ordered.append(svc)
-    for svc in service_list:
-        if svc not in ordered:
-            ordered.append(svc)
+    ordered = order_services(service_list)
 
     succeeded = []
     failed = []
@@ -489,6 +517,7 @@ def start_local_ai(profile=None, environment=None, services=None, supabase_enabl
         # Try to start
         svc_cmd = base_cmd + ["up", "-d", "--no-deps", svc]
         print(f"  Starting {svc}...")
+        svc_start = time.monotonic()
         svc_result = subprocess.run(svc_cmd, capture_output=True, text=True)
 
         if svc_result.returncode == 0:
@@ -498,6 +527,8 @@ def start_local_ai(profile=None, environment=None, services=None, supabase_enabl
             err = svc_result.stderr.strip().split("\n")[-1] if svc_result.stderr else "unknown error"
             failed.append((svc, err))
             print(f"    FAILED: {err}")
+            if deploy:
+                deploy.record("services", "failed", time.monotonic() - svc_start, service=svc, detail=err)
 
     # Print summary
     print("\n" + "=" * 50)
@@ -522,11 +553,16 @@ def start_local_ai(profile=None, environment=None, services=None, supabase_enabl
     print("\n" + "=" * 50)
 
     if failed:
-        print(f"\n  {len(failed)} service(s) failed. Check logs with: docker logs <service_name>")
+        print(f"\n  {len(failed)} service(s) failed. Check logs with: "
+              f"python3 start_services.py logs {' '.join(svc for svc, _ in failed)} --no-follow")
     else:
         print("\n  All services deployed successfully!")
 
     print("")
+    if deploy:
+        settled = deploy.settle(skipped + succeeded, health_timeout)
+        return settled and not failed
+    return not failed
 
 
 def print_deployment_summary(base_cmd):
@@ -553,6 +589,51 @@ def print_deployment_summary(base_cmd):
     print("=" * 50)
 
 
+def pull_images(profile):
+    """Pull the latest images for the profile (failures keep the current images)."""
+    print("\nPulling latest container images...")
+    try:
+        cmd = [
+            "docker", "compose", "-p", "localai",
+            "--profile", profile,
+            "-f", "docker-compose.yml", "pull"
+        ]
+        run_command(cmd)
+        print("All container images updated successfully.")
+    except subprocess.CalledProcessError:
+        print("Failed to pull one or more images, continuing with existing ones.")
+
+
+def start_supabase():
+    """Start the Supabase stack and give it time to initialize."""
+    print("\nStarting Supabase stack first...")
+    try:
+        cmd = [
+            "docker", "compose", "-p", "localai",
+            "-f", "supabase/docker/docker-compose.yml", "up", "-d"
+        ]
+        run_command(cmd)
+        print("Supabase started successfully.")
+    except subprocess.CalledProcessError:
+        print("Could not start Supabase stack, continuing with Local AI services only.")
+
+    print("Waiting 10 seconds for Supabase to initialize...")
+    time.sleep(10)
+
+
+def configure_swag(swag_dir=None):
+    """Install the SWAG proxy confs and attach SWAG to the localai network."""
+    print("\nConfiguring SWAG reverse proxy...")
+    swag_dir = swag_dir or find_swag_proxy_dir()
+    if swag_dir:
+        # Attach first so the new upstreams resolve when nginx tests the config
+        connect_swag_to_localai()
+        return install_swag_confs(swag_dir)
+    print("Could not find SWAG proxy-confs directory.")
+    print("Use --swag-dir to specify the path manually.")
+    return False
+
+
 def clone_supabase_repo():
     """Clone the Supabase repository using sparse checkout if not already present."""
     if not os.path.exists("supabase"):
@@ -599,6 +680,9 @@ def interactive_setup():
     profile_map = {"nvidia": "gpu-nvidia", "amd": "gpu-amd", "cpu": "cpu"}
     detected_profile = profile_map[gpu]
     print(f"Detected hardware: {gpu.upper()} -> profile '{detected_profile}'")
+    busy = (host_facts.get_facts()["ports"] or {}).get("in_use")
+    if busy:
+        print(f"Note: host ports already in use: {', '.join(busy)} (an earlier deploy, or another program)")
     override = input(f"Use this profile? (Enter = yes, or type cpu/gpu-nvidia/gpu-amd): ").strip()
     if override in profile_map.values():
         detected_profile = override
@@ -682,9 +766,36 @@ def interactive_setup():
     }
 
 
+# ---------------------- DEPLOYMENT JOURNAL ---------------------- #
+
+def deploy_options(args):
+    """Resolved options saved in the deployment plan and restored by --resume."""
+    return {
+        "profile": args.profile,
+        "environment": args.environment,
+        "services": args.services,
+        "no_supabase": args.no_supabase,
+        "no_caddy": args.no_caddy,
+        "proxy": args.proxy,
+        "swag_dir": args.swag_dir,
+        "update": args.update,
+    }
+
+
+# ---------------------- SUBCOMMANDS ---------------------- #
+
+def run_subcommand(argv):
+    """Dispatch `start_services.py <subcommand> ...` to its module."""
+    module = importlib.import_module(SUBCOMMANDS[argv[0]])
+    return module.main(argv[1:])
+
+
 # ---------------------- MAIN ---------------------- #
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        sys.exit(run_subcommand(sys.argv[1:]))
+
     parser = argparse.ArgumentParser(
         description="Deploy the Local AI Packaged stack with flexible service selection.",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
@@ -706,6 +817,19 @@ def main():
     parser.add_argument("--dry-run", action="store_true", help="Preview configuration without executing.")
     parser.add_argument("--update", action="store_true", help="Pull latest container images before starting.")
     parser.add_argument("--setup", action="store_true", help="Run interactive setup wizard.")
+    parser.add_argument("--tune", action="store_true",
+                        help="Regenerate the hardware resource plan before deploying.")
+    parser.add_argument("--watch", action="store_true",
+                        help="Stay in live monitor mode after deployment (stats, /metrics, alerts).")
+    parser.add_argument("--skip-preflight", action="store_true",
+                        help="Do not check ports, disk, .env, images and compose config before deploying.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the last unfinished deployment with its options, skipping finished "
+                             "steps and services already healthy on the same config.")
+    parser.add_argument("--health-timeout", type=int, default=HEALTH_TIMEOUT,
+                        help="Seconds to wait for deployed services to become healthy.")
+    parser.add_argument("--refresh-facts", action="store_true",
+                        help="Probe GPU, IP, Docker, SWAG and ports again instead of using the cache.")
     parser.add_argument("?", nargs="?", help=argparse.SUPPRESS)
 
     if "?" in sys.argv:
@@ -714,6 +838,24 @@ def main():
 
     args = parser.parse_args()
 
+    # One concurrent probe (or a cache read) for everything the steps below ask about the host
+    host_facts.get_facts(refresh=args.refresh_facts)
+
+    # Resume: the options come from the saved plan, not from this command line
+    resume_plan = None
+    last_plan = load_plan()
+    if args.resume:
+        if not last_plan:
+            print("No deployment to resume (no plan in .localai/).")
+            sys.exit(1)
+        if plan_finished(last_plan):
+            print(f"Deployment {last_plan['id']} finished; nothing to resume.")
+            sys.exit(0)
+        resume_plan = last_plan
+        for key, value in resume_plan.get("options", {}).items():
+            setattr(args, key, value)
+        args.setup = False
+
     # Interactive setup overrides CLI flags
     if args.setup:
         config = interactive_setup()
@@ -768,82 +910,112 @@ def main():
     print(f"  Proxy:        {args.proxy}")
     print(f"  .env file:    {'Present' if env_exists else 'Missing'}")
     print(f"  Update:       {'Yes' if args.update else 'No'}")
+    if args.tune:
+        resources_display = "Re-plan for this host"
+    elif os.path.exists(RESOURCES_OVERRIDE):
+        resources_display = RESOURCES_OVERRIDE
+    else:
+        resources_display = "Unlimited"
+    print(f"  Resources:    {resources_display}")
+    print(f"  DB pooler:    {'PgBouncer (' + POOLER_OVERRIDE + ')' if os.path.exists(POOLER_OVERRIDE) else 'Off'}")
+    print(f"  Ollama proxy: {'Embedding batcher (' + OLLAMA_PROXY_OVERRIDE + ')' if os.path.exists(OLLAMA_PROXY_OVERRIDE) else 'Off'}")
+    if resume_plan:
+        print(f"  Resume:       deployment {resume_plan['id']}")
     print("=" * 40)
+    if last_plan and not resume_plan and not plan_finished(last_plan):
+        print(f"\nNote: deployment {last_plan['id']} did not finish; --resume would continue it "
+              f"instead of starting over.")
 
     if args.dry_run:
         print("\nDry-run mode: No containers will be started.")
         if "all" not in args.services:
             resolved = resolve_services(args.services)
             print(f"Resolved compose services: {', '.join(resolved)}")
+        if not args.skip_preflight:
+            from preflight import print_results, run_preflight
+            ok, results, seconds = run_preflight(
+                build_compose_base(args.profile, args.environment, supabase_enabled=not args.no_supabase),
+                args.services, supabase_enabled=not args.no_supabase)
+            print_results(results, seconds)
+            sys.exit(0 if ok else 1)
         sys.exit(0)
 
+    # One deploy at a time (released at exit, stale locks of dead processes are taken over)
+    lock = DeployLock().acquire()
+    atexit.register(lock.release)
+
     if not env_exists:
         check_or_generate_env()
 
+    # Size the stack for this host (writes the resources override)
+    if args.tune:
+        plan_args = ["plan", "--profile", args.profile if args.profile != "none" else "cpu",
+                     "--services"] + args.services
+        run_subcommand(plan_args)
+
     # 3. Modify docker-compose.yml
     toggle_supabase_include(disable_supabase=args.no_supabase)
     toggle_caddy_service(disable_caddy=args.no_caddy)
 
-    # 4. Confirm
+    # n8n backup files new or changed since the last import (none: n8n-import stays off)
+    import_plan = n8n_import.prepare(args.services)
+    import_profiles = [n8n_import.PROFILE] if import_plan and import_plan.needed else None
+
+    # 4. Preflight (read-only; aborts before anything is stopped) and confirm
+    base_cmd = build_compose_base(args.profile, args.environment, supabase_enabled=not args.no_supabase,
+                                  extra_profiles=import_profiles)
+    if not args.skip_preflight:
+        from preflight import preflight_or_exit
+        preflight_or_exit(base_cmd, args.services, supabase_enabled=not args.no_supabase)
     confirm("Proceed with deployment?")
 
     # 5. SearXNG secret
     if "all" in args.services or "searxng" in args.services:
         generate_searxng_secret_key()
 
+    # Plan + journal: every phase below is recorded and skipped by --resume once done
+    deploy = Deployment.begin(deploy_options(args), base_cmd, args.services, resume=resume_plan)
+
     # 6. Stop existing containers
-    stop_existing_containers(args.profile)
+    deploy.step("stop", stop_existing_containers, args.profile)
 
     # 7. Update images
     if args.update:
-        print("\nPulling latest container images...")
-        try:
-            cmd = [
-                "docker", "compose", "-p", "localai",
-                "--profile", args.profile,
-                "-f", "docker-compose.yml", "pull"
-            ]
-            run_command(cmd)
-            print("All container images updated successfully.")
-        except subprocess.CalledProcessError:
-            print("Failed to pull one or more images, continuing with existing ones.")
+        deploy.step("pull", pull_images, args.profile)
 
     # 8. Start Supabase
     if not args.no_supabase:
-        print("\nStarting Supabase stack first...")
-        try:
-            cmd = [
-                "docker", "compose", "-p", "localai",
-                "-f", "supabase/docker/docker-compose.yml", "up", "-d"
-            ]
-            run_command(cmd)
-            print("Supabase started successfully.")
-        except subprocess.CalledProcessError:
-            print("Could not start Supabase stack, continuing with Local AI services only.")
-
-        print("Waiting 10 seconds for Supabase to initialize...")
-        time.sleep(10)
+        deploy.step("supabase", start_supabase)
 
     # 9. Start Local AI stack
     try:
-        start_local_ai(args.profile, args.environment, args.services, supabase_enabled=not args.no_supabase)
+        started = deploy.step("services", start_local_ai, args.profile, args.environment, args.services,
+                              supabase_enabled=not args.no_supabase, deploy=deploy,
+                              health_timeout=args.health_timeout, import_plan=import_plan)
+        # Only a successful start becomes the new baseline: a failed one is retried next run
+        if started:
+            if import_plan:
+                import_plan.record()
+            # Baseline for `env diff` / `env apply` (key fingerprints only)
+            record_applied(args.profile, args.environment, not args.no_supabase)
     except Exception as e:
         print(f"\nDeployment encountered an error: {e}")
         print("Check the deployment report above for details.")
 
-    # 10. SWAG proxy configuration
+    # 10. Reverse proxy configuration (reloaded only when the rendered config changed)
     if args.proxy == "swag":
-        print("\nConfiguring SWAG reverse proxy...")
-        swag_dir = args.swag_dir or find_swag_proxy_dir()
-        if swag_dir:
-            install_swag_confs(swag_dir)
-            connect_swag_to_localai()
-        else:
-            print("Could not find SWAG proxy-confs directory.")
-            print("Use --swag-dir to specify the path manually.")
+        deploy.step("proxy", configure_swag, args.swag_dir)
+    elif not args.no_caddy:
+        deploy.step("proxy", configure_caddy)
 
+    deploy.finish()
+    lock.release()
     print("\nDeployment finished.")
 
+    # 11. Live monitor
+    if args.watch:
+        run_subcommand(["watch"])
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""
+tabular_loader.py
+Streaming CSV / XLSX loader for `document_rows` (V3 agentic RAG workflow).
+
+For tabular files the workflow extracts the whole sheet into n8n items and
+inserts them one row at a time through a Postgres node: a 200k-row sheet
+takes many minutes and n8n holds every row in memory meanwhile. This loader
+does the same job in one pass:
+
+    CSV / XLSX (streamed)  ->  header + rows as JSON  ->  COPY document_rows FROM STDIN
+                               schema inferred on the way
+
+Each file is one transaction: its old rows are deleted (exact dataset_id),
+the new ones COPYed, and document_metadata (title, schema) upserted once the
+stream ends, so the agent sees either the old or the new dataset, never a
+mix. Only the current row is held in memory; XLSX is read with zipfile +
+iterparse (first sheet, as the workflow), no extra package needed.
+
+Rows keep the workflow's layout: row_data is {header: value}, CSV values
+stay strings, XLSX numbers / booleans are JSON values and dates ISO
+strings. document_metadata.schema lists the headers with the type inferred
+from the values ({"revenue": "numeric", "date": "date", ...}), which the
+agent's SQL can cast with.
+
+--compare measures the per-row path on the first --compare-rows rows of the
+first file (one INSERT per row, each committed, into a scratch table) and
+reports both rates.
+
+Usage:
+    python3 start_services.py tables                                  # ./shared/**/*.csv|xlsx
+    python3 start_services.py tables shared/sales.xlsx --compare
+    python3 start_services.py tables --dry-run shared/big.csv         # parse + schema only
+    python3 tabular_loader.py --pg-dsn postgresql://postgres@localhost/test data.csv
+"""
+
+import argparse
+import csv
+import datetime
+import json
+import math
+import os
+import re
+import sys
+import time
+import zipfile
+from xml.etree import ElementTree
+
+from ingest import DEFAULT_FILE_ID_PREFIX, DEFAULT_SOURCE, file_id_for, iter_files
+from pg_utils import PsqlError, copy_escape, copy_in, quote_literal, run_sql
+
+
+# ---------------------- CONSTANTS ---------------------- #
+
+TABULAR_EXTENSIONS = {".csv", ".xlsx"}
+METADATA_TABLE = "document_metadata"
+ROWS_TABLE = "document_rows"
+BENCH_TABLE = "document_rows_loader_bench"
+PROGRESS_ROWS = 50000
+SNIFF_BYTES = 64 * 1024
+
+# Same DDL as the workflow's "Create ... Table" nodes
+CREATE_TABLES = (
+    f"CREATE TABLE IF NOT EXISTS {METADATA_TABLE} (id TEXT PRIMARY KEY, title TEXT, "
+    "created_at TIMESTAMP DEFAULT NOW(), schema TEXT);\n"
+    f"CREATE TABLE IF NOT EXISTS {ROWS_TABLE} (id SERIAL PRIMARY KEY, "
+    f"dataset_id TEXT REFERENCES {METADATA_TABLE}(id), row_data JSONB);"
+)
+
+SPREADSHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+RELATIONSHIP_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+# Built-in number formats that display dates / times
+DATE_FORMAT_IDS = set(range(14, 23)) | set(range(27, 37)) | set(range(45, 48)) | set(range(50, 59))
+
+
+# ---------------------- HEADERS & SCHEMA ---------------------- #
+
+def unique_headers(cells):
+    """Column names as n8n / SheetJS produce them: __EMPTY for blanks, _1, _2 for duplicates."""
+    headers, seen, empty = [], {}, 0
+    for cell in cells:
+        name = str(cell).strip() if cell is not None else ""
+        if not name:
+            name = "__EMPTY" if empty == 0 else f"__EMPTY_{empty}"
+            empty += 1
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}_{seen[name]}"
+        seen.setdefault(name, 0)
+        headers.append(name)
+    return headers
+
+
+INTEGER_RE = re.compile(r"^[+-]?\d{1,18}$")
+NUMERIC_RE = re.compile(r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$")
+DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+TIMESTAMP_RE = re.compile(r"^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?$")
+
+# Joining two observed types; anything else widens to text
+WIDEN = {
+    frozenset(("integer", "numeric")): "numeric",
+    frozenset(("date", "timestamp")): "timestamp",
+}
+
+
+def value_type(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        return "integer"
+    if isinstance(value, float):
+        return "numeric"
+    text = value.strip()
+    if INTEGER_RE.match(text):
+        return "integer"
+    if NUMERIC_RE.match(text):
+        return "numeric"
+    if text.lower() in ("true", "false"):
+        return "boolean"
+    if DATE_RE.match(text):
+        return "date"
+    if TIMESTAMP_RE.match(text):
+        return "timestamp"
+    return "text"
+
+
+class SchemaInference:
+    """Per-column type widened over every value seen (empty values are ignored)."""
+
+    def __init__(self, headers):
+        self.headers = headers
+        self.types = {}
+
+    def observe(self, row):
+        for key, value in row.items():
+            seen = value_type(value)
+            if seen is None:
+                continue
+            current = self.types.get(key)
+            if current is None or current == seen:
+                self.types[key] = seen
+            else:
+                self.types[key] = WIDEN.get(frozenset((current, seen)), "text")
+
+    def schema(self):
+        return {name: self.types.get(name, "text") for name in self.headers}
+
+
+# ---------------------- READERS ---------------------- #
+
+def read_csv(path):
+    """(headers, iterator of row dicts) for a CSV file, values as strings."""
+    csv.field_size_limit(sys.maxsize)
+    f = open(path, "r", encoding="utf-8-sig", errors="replace", newline="")
+    sample = f.read(SNIFF_BYTES)
+    f.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(f, dialect)
+    header = next(reader, None)
+    if header is None:
+        f.close()
+        return [], iter(())
+    headers = unique_headers(header)
+
+    def rows():
+        with f:
+            for cells in reader:
+                if not any(cell.strip() for cell in cells):
+                    continue
+                yield dict(zip(headers, cells))
+    return headers, rows()
+
+
+def column_index(ref):
+    """0-based column of a cell reference like "BC12"."""
+    index = 0
+    for char in ref:
+        if not char.isalpha():
+            break
+        index = index * 26 + (ord(char.upper()) - 64)
+    return index - 1
+
+
+class XlsxReader:
+    """Stream the first worksheet of an .xlsx: shared strings and styles up front, rows one by one."""
+
+    def __init__(self, path):
+        self.zip = zipfile.ZipFile(path)
+        self.names = set(self.zip.namelist())
+        self.strings = self._shared_strings()
+        self.date_styles, self.epoch = self._date_styles(), self._epoch()
+        self.sheet = self._first_sheet()
+
+    def _shared_strings(self):
+        strings = []
+        if "xl/sharedStrings.xml" not in self.names:
+            return strings
+        with self.zip.open("xl/sharedStrings.xml") as f:
+            for _, elem in ElementTree.iterparse(f):
+                if elem.tag == SPREADSHEET_NS + "si":
+                    # Plain <t>, or rich text runs <r><t>; phonetic hints (<rPh>) are not part of the value
+                    strings.append("".join(
+                        (child.text or "") if child.tag == SPREADSHEET_NS + "t"
+                        else (child.findtext(SPREADSHEET_NS + "t") or "")
+                        for child in elem if child.tag in (SPREADSHEET_NS + "t", SPREADSHEET_NS + "r")))
+                    elem.clear()
+        return strings
+
+    def _date_styles(self):
+        """Indexes of the cell styles whose number format is a date."""
+        if "xl/styles.xml" not in self.names:
+            return set()
+        root = ElementTree.fromstring(self.zip.read("xl/styles.xml"))
+        custom = {}
+        for fmt in root.iter(SPREADSHEET_NS + "numFmt"):
+            code = re.sub(r'"[^"]*"|\[[^\]]*\]|\\.', "", fmt.get("formatCode", "")).lower()
+            custom[int(fmt.get("numFmtId"))] = any(c in code for c in "ymdhs") and "general" not in code
+        styles = set()
+        cell_xfs = root.find(SPREADSHEET_NS + "cellXfs")
+        for index, xf in enumerate(cell_xfs if cell_xfs is not None else []):
+            fmt_id = int(xf.get("numFmtId", 0))
+            if fmt_id in DATE_FORMAT_IDS or custom.get(fmt_id):
+                styles.add(index)
+        return styles
+
+    def _epoch(self):
+        if "xl/workbook.xml" in self.names:
+            pr = ElementTree.fromstring(self.zip.read("xl/workbook.xml")).find(SPREADSHEET_NS + "workbookPr")
+            if pr is not None and pr.get("date1904") in ("1", "true"):
+                return datetime.datetime(1904, 1, 1)
+        return datetime.datetime(1899, 12, 30)
+
+    def _first_sheet(self):
+        try:
+            workbook = ElementTree.fromstring(self.zip.read("xl/workbook.xml"))
+            rels = ElementTree.fromstring(self.zip.read("xl/_rels/workbook.xml.rels"))
+            rel_id = workbook.find(f"{SPREADSHEET_NS}sheets/{SPREADSHEET_NS}sheet").get(RELATIONSHIP_NS + "id")
+            for rel in rels.iter(PACKAGE_REL_NS + "Relationship"):
+                if rel.get("Id") == rel_id:
+                    target = rel.get("Target").lstrip("/")
+                    return target if target.startswith("xl/") else "xl/" + target
+        except (KeyError, AttributeError, ElementTree.ParseError):
+            pass
+        return "xl/worksheets/sheet1.xml"
+
+    def cell_value(self, cell):
+        kind = cell.get("t", "n")
+        if kind == "inlineStr":
+            return "".join(t.text or "" for t in cell.iter(SPREADSHEET_NS + "t"))
+        raw = cell.findtext(SPREADSHEET_NS + "v")
+        if raw is None:
+            return None
+        if kind == "s":
+            return self.strings[int(raw)]
+        if kind == "b":
+            return raw == "1"
+        if kind in ("str", "e"):
+            return raw
+        number = float(raw)
+        if not math.isfinite(number):
+            return raw
+        if cell.get("s") is not None and int(cell.get("s")) in self.date_styles:
+            moment = self.epoch + datetime.timedelta(days=number)
+            if number == int(number):
+                return moment.date().isoformat()
+            return moment.replace(microsecond=0).isoformat()
+        return int(number) if number == int(number) and abs(number) < 2 ** 53 else number
+
+    def iter_cells(self):
+        """Lists of cell values per non-empty row (positions kept, gaps as None)."""
+        with self.zip.open(self.sheet) as f:
+            sheet_data = None
+            for event, elem in ElementTree.iterparse(f, events=("start", "end")):
+                if event == "start":
+                    if elem.tag == SPREADSHEET_NS + "sheetData":
+                        sheet_data = elem
+                    continue
+                if elem.tag != SPREADSHEET_NS + "row":
+                    continue
+                values = []
+                for position, cell in enumerate(elem.iter(SPREADSHEET_NS + "c")):
+                    ref = cell.get("r")
+                    index = column_index(ref) if ref else position
+                    values.extend([None] * (index - len(values)))
+                    values.append(self.cell_value(cell))
+                # Drop the parsed row from the tree so memory stays flat
+                sheet_data.clear() if sheet_data is not None else elem.clear()
+                if any(v not in (None, "") for v in values):
+                    yield values
+        self.zip.close()
+
+
+def read_xlsx(path):
+    """(headers, iterator of row dicts) for the first sheet; empty cells are left out, as SheetJS does."""
+    cells = XlsxReader(path).iter_cells()
+    header = next(cells, None)
+    if header is None:
+        return [], iter(())
+    headers = unique_headers(header)
+
+    def rows():
+        for values in cells:
+            yield {h: v for h, v in zip(headers, values) if v not in (None, "")}
+    return headers, rows()
+
+
+def read_table(path):
+    if os.path.splitext(path)[1].lower() == ".xlsx":
+        return read_xlsx(path)
+    return read_csv(path)
+
+
+# ---------------------- LOAD ---------------------- #
+
+def row_json(row):
+    # jsonb rejects \u0000
+    return json.dumps(row, ensure_ascii=False, separators=(",", ":")).replace("\\u0000", "")
+
+
+def load_file(path, dataset_id, database="postgres", dsn=None, dry_run=False, progress_rows=PROGRESS_ROWS):
+    """Replace one dataset's rows and metadata in a single transaction; returns (rows, seconds, schema)."""
+    headers, rows = read_table(path)
+    inference = SchemaInference(headers)
+    title = os.path.splitext(os.path.basename(path))[0]
+    start = time.monotonic()
+    count = 0
+
+    def lines():
+        nonlocal count
+        for row in rows:
+            inference.observe(row)
+            count += 1
+            if progress_rows and count % progress_rows == 0:
+                print(f"    {count} rows, {count / max(1e-6, time.monotonic() - start):.0f} rows/s")
+            yield dataset_id_literal + "\t" + copy_escape(row_json(row))
+
+    dataset_id_literal = copy_escape(dataset_id)
+    if dry_run:
+        for _ in lines():
+            pass
+        return count, time.monotonic() - start, inference.schema()
+
+    def metadata_sql():
+        schema = json.dumps(inference.schema(), ensure_ascii=False)
+        return (f"UPDATE {METADATA_TABLE} SET schema = {quote_literal(schema)} "
+                f"WHERE id = {quote_literal(dataset_id)}")
+
+    copy_in(
+        f"COPY {ROWS_TABLE} (dataset_id, row_data) FROM STDIN", lines(),
+        before_sql=(
+            # Metadata first: document_rows.dataset_id references it
+            f"INSERT INTO {METADATA_TABLE} (id, title) VALUES ({quote_literal(dataset_id)}, {quote_literal(title)}) "
+            f"ON CONFLICT (id) DO UPDATE SET title = EXCLUDED.title;\n"
+            f"DELETE FROM {ROWS_TABLE} WHERE dataset_id = {quote_literal(dataset_id)}"
+        ),
+        after_sql=metadata_sql, database=database, dsn=dsn,
+    )
+    return count, time.monotonic() - start, inference.schema()
+
+
+def measure_per_row(path, dataset_id, limit, database="postgres", dsn=None):
+    """(rows, seconds) of the workflow's path: one INSERT per row, each its own transaction."""
+    _, rows = read_table(path)
+    statements = [f"DROP TABLE IF EXISTS {BENCH_TABLE};",
+                  f"CREATE TABLE {BENCH_TABLE} (id SERIAL PRIMARY KEY, dataset_id TEXT, row_data JSONB);"]
+    run_sql("\n".join(statements), database=database, dsn=dsn)
+    inserts = []
+    for row in rows:
+        inserts.append(f"INSERT INTO {BENCH_TABLE} (dataset_id, row_data) VALUES "
+                       f"({quote_literal(dataset_id)}, {quote_literal(row_json(row))}::jsonb);")
+        if len(inserts) >= limit:
+            break
+    try:
+        start = time.monotonic()
+        run_sql("\n".join(inserts), database=database, dsn=dsn)
+        return len(inserts), time.monotonic() - start
+    finally:
+        run_sql(f"DROP TABLE IF EXISTS {BENCH_TABLE};", database=database, dsn=dsn)
+
+
+# ---------------------- MAIN ---------------------- #
+
+def input_files(args):
+    """(path, dataset_id) for the given files, or every tabular file under --source."""
+    source = os.path.abspath(args.source)
+    if args.files:
+        for path in args.files:
+            path = os.path.abspath(path)
+            if os.path.splitext(path)[1].lower() not in TABULAR_EXTENSIONS:
+                print(f"Skipping {path}: not a .csv / .xlsx file.", file=sys.stderr)
+                continue
+            # Files outside --source keep their own path as id
+            inside = os.path.commonpath([source, path]) == source
+            yield path, file_id_for(source, args.file_id_prefix, path) if inside else path
+    else:
+        for path in iter_files(source, TABULAR_EXTENSIONS):
+            yield path, file_id_for(source, args.file_id_prefix, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="start_services.py tables",
+        description="Bulk-load CSV / XLSX files into document_rows with COPY, one transaction per file.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("files", nargs="*", help="Files to load (default: every .csv / .xlsx under --source).")
+    parser.add_argument("--source", default=DEFAULT_SOURCE, help="Folder scanned when no file is given.")
+    parser.add_argument("--file-id-prefix", default=DEFAULT_FILE_ID_PREFIX,
+                        help="Path --source has inside the n8n container (stored as dataset_id).")
+    parser.add_argument("--database", default="postgres", help="Database inside the postgres container.")
+    parser.add_argument("--pg-dsn", default=None, help="Use a local psql with this DSN instead of docker exec.")
+    parser.add_argument("--dry-run", action="store_true", help="Parse and infer the schema only.")
+    parser.add_argument("--compare", action="store_true",
+                        help="Also time the per-row INSERT path on the first file (scratch table).")
+    parser.add_argument("--compare-rows", type=int, default=2000, help="Rows timed by --compare.")
+    args = parser.parse_intermixed_args(argv)
+
+    files = list(input_files(args))
+    if not files:
+        print(f"No .csv / .xlsx files found under {args.source}.")
+        return 1
+    try:
+        if not args.dry_run:
+            run_sql(CREATE_TABLES, database=args.database, dsn=args.pg_dsn)
+        total_rows, total_seconds, failed = 0, 0.0, 0
+        for path, dataset_id in files:
+            print(f"{dataset_id}")
+            try:
+                rows, seconds, schema = load_file(path, dataset_id, args.database, args.pg_dsn, args.dry_run)
+            except (OSError, ValueError, zipfile.BadZipFile, ElementTree.ParseError, csv.Error, PsqlError) as e:
+                failed += 1
+                print(f"  FAILED: {e}", file=sys.stderr)
+                continue
+            total_rows += rows
+            total_seconds += seconds
+            columns = ", ".join(f"{k} {v}" for k, v in schema.items())
+            print(f"  {rows} rows in {seconds:.1f}s ({rows / max(seconds, 1e-6):.0f} rows/s)"
+                  + (" [dry-run]" if args.dry_run else "") + f"\n  schema: {columns}")
+
+        copy_rate = total_rows / max(total_seconds, 1e-6)
+        print(f"\n{len(files) - failed} file(s), {total_rows} rows in {total_seconds:.1f}s: {copy_rate:.0f} rows/s")
+        if args.compare and not args.dry_run and total_rows:
+            path, dataset_id = files[0]
+            rows, seconds = measure_per_row(path, dataset_id, args.compare_rows, args.database, args.pg_dsn)
+            per_row_rate = rows / max(seconds, 1e-6)
+            print(f"Per-row INSERT path ({rows} rows, one commit each): {per_row_rate:.0f} rows/s, "
+                  f"~{total_rows / max(per_row_rate, 1e-6):.0f}s for these {total_rows} rows "
+                  f"(COPY {copy_rate / max(per_row_rate, 1e-6):.1f}x faster; n8n's per-item overhead comes on top)")
+    except PsqlError as e:
+        print(f"Postgres: {e}")
+        return 1
+    return 0 if failed == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,718 @@
+#!/usr/bin/env python3
+"""
+volume_backup.py
+Deduplicating, compressed snapshots of the stack's named volumes.
+
+The state of the stack lives in named volumes (ollama_storage, qdrant_storage,
+n8n_storage, open-webui, flowise, langfuse_*, valkey-data); n8n/backup only
+holds workflow JSON. Snapshots go to a content-addressed store:
+
+    <store>/chunks/ab/ab12...zst     one compressed chunk, named by the sha256 of its content
+    <store>/snapshots/<volume>/<id>.json   file tree of one snapshot and the chunks of each file
+
+- files are cut into ~1 MiB chunks at content-defined boundaries, so an
+  insertion only changes the chunks around it; identical chunks are stored
+  once across files, volumes and snapshots
+- a file whose size, mtime and inode match the previous snapshot of the same
+  volume reuses its chunk list without being read (multi-GB Ollama blobs
+  are read once, on the first backup)
+- chunks are hashed and compressed in a thread pool (hashlib, zlib and zstd
+  release the GIL): zstd when available (compression.zstd on Python 3.14+ or
+  the zstandard package), zlib otherwise; incompressible chunks (model
+  weights) are stored as-is
+- restore writes files in parallel and checks every chunk against its sha256;
+  verify does the same for the whole store without restoring
+
+Volumes are read through their mountpoint when this process can (root),
+otherwise through a throwaway python:3.14-alpine container running this same
+script with the volume mounted.
+
+Usage:
+    python3 start_services.py backup create                          # every volume of the stack
+    python3 start_services.py backup create --volumes n8n_storage qdrant_storage --pause
+    python3 start_services.py backup create --path ./shared --name shared
+    python3 start_services.py backup list
+    python3 start_services.py backup verify
+    python3 start_services.py backup restore n8n_storage [--snapshot ID] [--force]
+    python3 start_services.py backup prune --keep 5
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import hashlib
+import json
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import threading
+import time
+import zlib
+
+
+# ---------------------- CONSTANTS ---------------------- #
+
+PROJECT = "localai"
+DEFAULT_STORE = "backups"
+HELPER_IMAGE = "python:3.14-alpine"
+COMPOSE_FILE = "docker-compose.yml"
+
+MIN_CHUNK = 256 << 10
+AVG_CHUNK_BITS = 20  # ~1 MiB
+MAX_CHUNK = 4 << 20
+# Files are read and chunked in segments of this size (one per worker task)
+SEGMENT = 64 << 20
+# A snapshot worker holds a segment and its translated copy (~2 x SEGMENT): capped so a
+# backup on a many-core host does not compete with Ollama and Postgres for memory
+DEFAULT_JOBS = min(8, os.cpu_count() or 2)
+
+
+# ---------------------- CHUNKING ---------------------- #
+
+# Each byte value maps to one pseudo-random bit (0x00 to 0, so runs of zeros
+# never cut). A chunk ends after a run of N one-bits: the boundary depends on
+# the last N bytes only. Both steps run in C (bytes.translate / bytes.find),
+# hundreds of MB/s where a per-byte rolling hash in Python does ~10.
+_BITS = bytes([0] + [hashlib.sha256(b"localai-cdc" + bytes([i])).digest()[0] & 1 for i in range(1, 256)])
+# Normalized chunking: a longer run is required before the average size, a shorter one after
+_STRICT_RUN = b"\x01" * (AVG_CHUNK_BITS - 1)
+_LOOSE_RUN = b"\x01" * (AVG_CHUNK_BITS - 3)
+
+
+def cut_points(data, min_size=MIN_CHUNK, max_size=MAX_CHUNK):
+    """End offsets of the content-defined chunks of data."""
+    bits = data.translate(_BITS)
+    n = len(data)
+    avg = 1 << AVG_CHUNK_BITS
+    start = 0
+    while start < n:
+        end = min(start + max_size, n)
+        if end - start > min_size:
+            lo = start + min_size
+            mid = min(start + avg, end)
+            found = bits.find(_STRICT_RUN, lo - len(_STRICT_RUN), mid)
+            if found >= 0:
+                end = found + len(_STRICT_RUN)
+            else:
+                found = bits.find(_LOOSE_RUN, mid - len(_LOOSE_RUN), end)
+                if found >= 0:
+                    end = found + len(_LOOSE_RUN)
+        yield end
+        start = end
+
+
+# ---------------------- COMPRESSION ---------------------- #
+
+def _zstd_codec():
+    try:
+        from compression import zstd  # Python 3.14+
+        return (lambda data: zstd.compress(data, level=3)), zstd.decompress
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    # Compressor objects are not thread-safe: one per call (cheap next to a 1 MiB chunk)
+    return (lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+            lambda data: zstandard.ZstdDecompressor().decompress(data))
+
+
+# Chunk file extension -> (compress, decompress); the first one is used for new chunks
+CODECS = {}
+_ZSTD = _zstd_codec()
+if _ZSTD:
+    CODECS[".zst"] = _ZSTD
+CODECS[".zz"] = ((lambda data: zlib.compress(data, 3)), zlib.decompress)
+CODECS[".raw"] = (bytes, bytes)
+WRITE_EXT = next(iter(CODECS))
+
+
+def compress(data):
+    """(extension, payload): raw when a 64 KiB sample does not shrink by 3%."""
+    sample = bytes(data[:65536])
+    if len(zlib.compress(sample, 1)) > 0.97 * len(sample):
+        return ".raw", bytes(data)
+    payload = CODECS[WRITE_EXT][0](data)
+    if len(payload) >= len(data):
+        return ".raw", bytes(data)
+    return WRITE_EXT, payload
+
+
+# ---------------------- STORE ---------------------- #
+
+class ChunkStore:
+    """Content-addressed chunk files and snapshot manifests under one directory."""
+
+    def __init__(self, root, readonly=False):
+        self.root = root
+        self.chunks_dir = os.path.join(root, "chunks")
+        self.snapshots_dir = os.path.join(root, "snapshots")
+        if not readonly:
+            os.makedirs(self.chunks_dir, exist_ok=True)
+            os.makedirs(self.snapshots_dir, exist_ok=True)
+        self._known = None
+        self._lock = threading.Lock()
+
+    def known(self):
+        """digest -> chunk path, listed once (put() keeps it current)."""
+        if self._known is None:
+            known = {}
+            if os.path.isdir(self.chunks_dir):
+                for sub in os.scandir(self.chunks_dir):
+                    if sub.is_dir():
+                        for entry in os.scandir(sub.path):
+                            digest, ext = os.path.splitext(entry.name)
+                            if ext in CODECS or ext == ".zst":
+                                known[digest] = entry.path
+            self._known = known
+        return self._known
+
+    def put(self, digest, data):
+        """Store a chunk unless present; returns the bytes written (0 for a duplicate)."""
+        known = self.known()
+        with self._lock:
+            if digest in known:
+                return 0
+            known[digest] = None  # claimed; other threads skip it
+        ext, payload = compress(data)
+        path = os.path.join(self.chunks_dir, digest[:2], digest + ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(payload)
+            os.replace(tmp, path)
+        except BaseException:
+            with self._lock:
+                known.pop(digest, None)
+            raise
+        known[digest] = path
+        return len(payload)
+
+    def get(self, digest):
+        """Chunk content, checked against its digest (ValueError when missing or corrupt)."""
+        path = self.known().get(digest)
+        if not path:
+            raise ValueError(f"chunk {digest[:16]} missing")
+        ext = os.path.splitext(path)[1]
+        if ext not in CODECS:
+            raise ValueError(f"chunk {digest[:16]} is {ext} (install zstandard or use Python 3.14+)")
+        with open(path, "rb") as f:
+            data = CODECS[ext][1](f.read())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"chunk {digest[:16]} corrupt")
+        return data
+
+    def has(self, digest):
+        return bool(self.known().get(digest))
+
+    def stored_bytes(self):
+        return sum(os.path.getsize(p) for p in self.known().values() if p)
+
+    # Snapshots
+
+    def snapshots(self, volume=None):
+        """[(volume, id)] oldest first."""
+        found = []
+        if not os.path.isdir(self.snapshots_dir):
+            return found
+        for name in sorted(os.listdir(self.snapshots_dir)):
+            if volume and name != volume:
+                continue
+            ids = [e[:-5] for e in os.listdir(os.path.join(self.snapshots_dir, name)) if e.endswith(".json")]
+            found.extend((name, snapshot_id) for snapshot_id in sorted(ids))
+        return found
+
+    def load(self, volume, snapshot_id):
+        with open(os.path.join(self.snapshots_dir, volume, snapshot_id + ".json"), "r") as f:
+            return json.load(f)
+
+    def save(self, manifest):
+        path = os.path.join(self.snapshots_dir, manifest["volume"], manifest["id"] + ".json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f, separators=(",", ":"))
+        os.replace(path + ".tmp", path)
+
+    def latest(self, volume):
+        snaps = self.snapshots(volume)
+        return self.load(*snaps[-1]) if snaps else None
+
+
+# ---------------------- SNAPSHOT / RESTORE ---------------------- #
+
+def human(n):
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if abs(n) < 1024 or unit == "TB":
+            return f"{n:.1f} {unit}" if unit != "B" else f"{n} B"
+        n /= 1024.0
+
+
+def chunk_segment(store, path, offset, length):
+    """Read one segment of a file and store its chunks.
+
+    Returns (chunks, bytes read, new chunks, new bytes, bytes written).
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(length)
+    view = memoryview(data)
+    chunks, new_chunks, new_bytes, written = [], 0, 0, 0
+    start = 0
+    for end in cut_points(data):
+        digest = hashlib.sha256(view[start:end]).hexdigest()
+        size = store.put(digest, view[start:end])
+        if size:
+            new_chunks += 1
+            new_bytes += end - start
+            written += size
+        chunks.append([digest, end - start])
+        start = end
+    return chunks, len(data), new_chunks, new_bytes, written
+
+
+def snapshot_dir(root, volume, store, jobs=DEFAULT_JOBS):
+    """Snapshot a directory tree into the store; returns the saved manifest."""
+    start = time.monotonic()
+    previous = {e["path"]: e for e in (store.latest(volume) or {}).get("entries", [])}
+    entries, skipped = [], 0
+    pending = collections.deque()  # (entry, [futures]) in submission order
+    inflight = 0
+    stats = {"files": 0, "bytes": 0, "read_bytes": 0, "reused_files": 0,
+             "new_chunks": 0, "new_bytes": 0, "written_bytes": 0}
+
+    def finish_oldest():
+        entry, futures = pending.popleft()
+        entry["chunks"] = []
+        for future in futures:
+            chunks, read, new_chunks, new_bytes, written = future.result()
+            entry["chunks"].extend(chunks)
+            stats["read_bytes"] += read
+            stats["new_chunks"] += new_chunks
+            stats["new_bytes"] += new_bytes
+            stats["written_bytes"] += written
+        # The file may have changed size while being read
+        entry["size"] = sum(size for _, size in entry["chunks"])
+        return len(futures)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        for current, dirs, files in os.walk(root):
+            dirs.sort()
+            for name in sorted(dirs) + sorted(files):
+                full = os.path.join(current, name)
+                rel = os.path.relpath(full, root)
+                st = os.lstat(full)
+                entry = {"path": rel, "mode": stat.S_IMODE(st.st_mode), "uid": st.st_uid,
+                         "gid": st.st_gid, "mtime_ns": st.st_mtime_ns}
+                if stat.S_ISDIR(st.st_mode):
+                    entry["type"] = "dir"
+                elif stat.S_ISLNK(st.st_mode):
+                    entry["type"] = "symlink"
+                    entry["target"] = os.readlink(full)
+                elif stat.S_ISREG(st.st_mode):
+                    entry.update(type="file", size=st.st_size, ino=st.st_ino)
+                    stats["files"] += 1
+                    stats["bytes"] += st.st_size
+                    old = previous.get(rel)
+                    if (old and old.get("type") == "file" and old["size"] == st.st_size
+                            and old["mtime_ns"] == st.st_mtime_ns and old.get("ino") == st.st_ino
+                            and all(store.has(d) for d, _ in old["chunks"])):
+                        entry["chunks"] = old["chunks"]
+                        stats["reused_files"] += 1
+                    else:
+                        futures = [pool.submit(chunk_segment, store, full, offset, min(SEGMENT, st.st_size - offset))
+                                   for offset in range(0, st.st_size, SEGMENT)]
+                        pending.append((entry, futures))
+                        inflight += len(futures)
+                        # Keep the walk only a little ahead of the workers
+                        while inflight > 2 * jobs and len(pending) > 1:
+                            inflight -= finish_oldest()
+                else:
+                    skipped += 1  # sockets, fifos, devices
+                    continue
+                entries.append(entry)
+        while pending:
+            finish_oldest()
+
+    stats["seconds"] = round(time.monotonic() - start, 2)
+    stats["skipped_special"] = skipped
+    snapshot_id = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    taken = {s[1] for s in store.snapshots(volume)}
+    suffix = 1
+    while snapshot_id in taken:
+        suffix += 1
+        snapshot_id = f"{snapshot_id.split('-')[0]}-{suffix:02d}"
+    manifest = {
+        "volume": volume,
+        "id": snapshot_id,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "chunking": {"min": MIN_CHUNK, "avg_bits": AVG_CHUNK_BITS, "max": MAX_CHUNK},
+        "stats": stats,
+        "entries": entries,
+    }
+    store.save(manifest)
+    return manifest
+
+
+def restore_unit(store, path, offset, chunks):
+    """Write consecutive chunks of one file from offset; returns the bytes written."""
+    written = 0
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        for digest, size in chunks:
+            data = store.get(digest)
+            if len(data) != size:
+                raise ValueError(f"chunk {digest[:16]} has {len(data)} bytes, expected {size}")
+            f.write(data)
+            written += size
+    return written
+
+
+def clear_dir(path):
+    for entry in os.scandir(path):
+        if entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path)
+        else:
+            os.unlink(entry.path)
+
+
+def restore_dir(manifest, store, dest, jobs=DEFAULT_JOBS):
+    """Recreate a snapshot under dest (expected empty); returns (bytes, seconds)."""
+    start = time.monotonic()
+    os.makedirs(dest, exist_ok=True)
+    as_root = hasattr(os, "geteuid") and os.geteuid() == 0
+    entries = manifest["entries"]
+    total = 0
+
+    for entry in entries:
+        if entry["type"] == "dir":
+            os.makedirs(os.path.join(dest, entry["path"]), exist_ok=True)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = []
+        for entry in entries:
+            if entry["type"] != "file":
+                continue
+            path = os.path.join(dest, entry["path"])
+            with open(path, "wb") as f:
+                f.truncate(entry["size"])
+            # Units of ~SEGMENT bytes so a large file is written by several workers
+            offset, unit, unit_size = 0, [], 0
+            for digest, size in entry["chunks"]:
+                unit.append((digest, size))
+                unit_size += size
+                if unit_size >= SEGMENT:
+                    futures.append(pool.submit(restore_unit, store, path, offset, unit))
+                    offset, unit, unit_size = offset + unit_size, [], 0
+            if unit:
+                futures.append(pool.submit(restore_unit, store, path, offset, unit))
+        for future in futures:
+            total += future.result()
+
+    for entry in entries:
+        if entry["type"] == "symlink":
+            os.symlink(entry["target"], os.path.join(dest, entry["path"]))
+    # Ownership and modes, then mtimes: directories last and deepest first
+    for entry in sorted(entries, key=lambda e: (e["type"] == "dir", -e["path"].count(os.sep))):
+        path = os.path.join(dest, entry["path"])
+        if as_root:
+            os.lchown(path, entry["uid"], entry["gid"])
+        if entry["type"] != "symlink":
+            os.chmod(path, entry["mode"])
+            os.utime(path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+    return total, time.monotonic() - start
+
+
+def verify_chunks(store, digests, jobs=DEFAULT_JOBS):
+    """{digest: error} for chunks that are missing or do not match their sha256."""
+    def check(digest):
+        try:
+            store.get(digest)
+            return None
+        except (OSError, ValueError, zlib.error) as e:
+            return str(e)
+        except Exception as e:  # zstd decompression errors
+            return f"chunk {digest[:16]} unreadable: {e}"
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        results = pool.map(check, digests)
+        return {d: err for d, err in zip(digests, results) if err}
+
+
+def print_snapshot_report(manifest):
+    s = manifest["stats"]
+    rate = s["read_bytes"] / s["seconds"] / 1e6 if s["seconds"] else 0
+    print(f"  {manifest['volume']}: snapshot {manifest['id']}  {s['files']} files, {human(s['bytes'])}")
+    print(f"    read {human(s['read_bytes'])} in {s['seconds']:.1f}s ({rate:.0f} MB/s), "
+          f"{s['reused_files']} unchanged file(s) not read")
+    if s["new_bytes"]:
+        print(f"    new: {s['new_chunks']} chunk(s), {human(s['new_bytes'])} -> {human(s['written_bytes'])} "
+              f"stored; dedup ratio {s['bytes'] / s['new_bytes']:.1f}x")
+    else:
+        print("    new: nothing, every chunk was already in the store")
+
+
+# ---------------------- DOCKER ---------------------- #
+
+def docker(args, check=False):
+    return subprocess.run(["docker"] + args, capture_output=True, text=True, check=check)
+
+
+def stack_volumes(compose_file=COMPOSE_FILE):
+    """Volume names declared at the top of docker-compose.yml."""
+    names, inside = [], False
+    with open(compose_file, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            if not line[0].isspace():
+                inside = line.startswith("volumes:")
+            elif inside and line.startswith("  ") and not line[2].isspace() and line.rstrip().endswith(":"):
+                names.append(line.strip()[:-1])
+    return names
+
+
+def docker_volume(name):
+    return f"{PROJECT}_{name}"
+
+
+def volume_mountpoint(name):
+    """Host path of a local volume when this process can use it directly, else None."""
+    out = docker(["volume", "inspect", "-f", "{{.Mountpoint}}", docker_volume(name)])
+    path = out.stdout.strip()
+    if out.returncode == 0 and path and os.access(path, os.R_OK | os.W_OK | os.X_OK):
+        return path
+    return None
+
+
+def containers_using(name):
+    """Ids of the running containers that mount the volume."""
+    return docker(["ps", "-q", "--filter", f"volume={docker_volume(name)}"]).stdout.split()
+
+
+def in_helper(name, script_args, readonly_volume):
+    """Run this script in a throwaway container with the volume at /volume and the store at /store."""
+    store = os.path.abspath(script_args[script_args.index("--store") + 1])
+    script_args = list(script_args)
+    script_args[script_args.index("--store") + 1] = "/store"
+    cmd = ["docker", "run", "--rm",
+           "-v", f"{docker_volume(name)}:/volume" + (":ro" if readonly_volume else ""),
+           "-v", f"{store}:/store",
+           "-v", f"{os.path.abspath(__file__)}:/app/volume_backup.py:ro",
+           HELPER_IMAGE, "python", "/app/volume_backup.py"] + script_args
+    return subprocess.run(cmd).returncode
+
+
+# ---------------------- COMMANDS ---------------------- #
+
+def cmd_create(args):
+    if args.path:
+        store = ChunkStore(args.store)
+        manifest = snapshot_dir(args.path, args.name or os.path.basename(os.path.abspath(args.path)),
+                                store, args.jobs)
+        print_snapshot_report(manifest)
+        return 0
+
+    names = args.volumes or stack_volumes()
+    existing = set(docker(["volume", "ls", "--format", "{{.Name}}"]).stdout.split())
+    failures = 0
+    store = ChunkStore(args.store)
+    for name in names:
+        if docker_volume(name) not in existing:
+            if args.volumes:
+                print(f"  {name}: no volume {docker_volume(name)}")
+                failures += 1
+            continue
+        running = containers_using(name)
+        paused = running if args.pause else []
+        if running and not args.pause:
+            print(f"  {name}: in use by {len(running)} running container(s); "
+                  f"use --pause for a consistent snapshot")
+        if paused:
+            docker(["pause"] + paused)
+        try:
+            mountpoint = volume_mountpoint(name)
+            if mountpoint:
+                manifest = snapshot_dir(mountpoint, name, store, args.jobs)
+                print_snapshot_report(manifest)
+            elif in_helper(name, ["create", "--path", "/volume", "--name", name, "--store", args.store,
+                                  "--jobs", str(args.jobs)], readonly_volume=True) != 0:
+                print(f"  {name}: snapshot failed")
+                failures += 1
+        finally:
+            if paused:
+                docker(["unpause"] + paused)
+    store._known = None
+    print(f"\nStore {args.store}: {human(store.stored_bytes())} in {len(store.known())} chunks")
+    return 1 if failures else 0
+
+
+def find_snapshot(store, name, snapshot_id=None):
+    snaps = [s for s in store.snapshots(name) if snapshot_id in (None, s[1])]
+    if not snaps:
+        raise SystemExit(f"No snapshot {snapshot_id or ''} of {name} in {store.root}")
+    return store.load(*snaps[-1])
+
+
+def cmd_restore(args):
+    store = ChunkStore(args.store, readonly=True)
+    manifest = find_snapshot(store, args.name, args.snapshot)
+    if args.path:
+        if os.path.isdir(args.path) and os.listdir(args.path):
+            if not args.force:
+                print(f"{args.path} is not empty; --force replaces its contents.")
+                return 1
+            clear_dir(args.path)
+        try:
+            total, seconds = restore_dir(manifest, store, args.path, args.jobs)
+        except ValueError as e:
+            print(f"  {args.name}: restore of {manifest['id']} failed: {e} (run `backup verify`)")
+            return 1
+        print(f"  {args.name}: restored snapshot {manifest['id']} ({len(manifest['entries'])} entries, "
+              f"{human(total)}) in {seconds:.1f}s ({total / seconds / 1e6 if seconds else 0:.0f} MB/s), "
+              f"all chunks verified")
+        return 0
+
+    volume = docker_volume(args.name)
+    running = containers_using(args.name)
+    if running:
+        print(f"{volume} is used by {len(running)} running container(s); stop them first "
+              f"(docker compose -p {PROJECT} stop <service>).")
+        return 1
+    if docker(["volume", "inspect", volume]).returncode != 0:
+        # Labelled like compose would, so `up` adopts it without a warning
+        docker(["volume", "create", "--label", f"com.docker.compose.project={PROJECT}",
+                "--label", f"com.docker.compose.volume={args.name}", volume], check=True)
+    mountpoint = volume_mountpoint(args.name)
+    if mountpoint:
+        if os.listdir(mountpoint) and not args.force:
+            print(f"{volume} is not empty; --force replaces its contents.")
+            return 1
+        args.path = mountpoint
+        args.force = True
+        return cmd_restore(args)
+    script_args = ["restore", args.name, "--snapshot", manifest["id"], "--path", "/volume",
+                   "--store", args.store, "--jobs", str(args.jobs)]
+    if args.force:
+        script_args.append("--force")
+    return in_helper(args.name, script_args, readonly_volume=False)
+
+
+def cmd_list(args):
+    store = ChunkStore(args.store, readonly=True)
+    snaps = store.snapshots()
+    if not snaps:
+        print(f"No snapshots in {args.store}.")
+        return 0
+    logical = 0
+    print(f"{'VOLUME':<28} {'SNAPSHOT':<20} {'FILES':>8} {'SIZE':>10} {'NEW':>10} {'SECONDS':>8}")
+    for name, snapshot_id in snaps:
+        s = store.load(name, snapshot_id)["stats"]
+        logical += s["bytes"]
+        print(f"{name:<28} {snapshot_id:<20} {s['files']:>8} {human(s['bytes']):>10} "
+              f"{human(s['written_bytes']):>10} {s['seconds']:>8.1f}")
+    stored = store.stored_bytes()
+    print(f"\n{len(snaps)} snapshot(s), {human(logical)} logical, {human(stored)} stored "
+          f"({logical / stored if stored else 0:.1f}x dedup + compression)")
+    return 0
+
+
+def cmd_verify(args):
+    store = ChunkStore(args.store, readonly=True)
+    snaps = [s for s in store.snapshots() if (not args.volumes or s[0] in args.volumes)
+             and args.snapshot in (None, s[1])]
+    if not snaps:
+        print(f"No snapshots to verify in {args.store}.")
+        return 1
+    start = time.monotonic()
+    by_snapshot = {}
+    digests = {}
+    for name, snapshot_id in snaps:
+        refs = set()
+        for entry in store.load(name, snapshot_id)["entries"]:
+            for digest, size in entry.get("chunks", []):
+                refs.add(digest)
+                digests[digest] = size
+        by_snapshot[(name, snapshot_id)] = refs
+    bad = verify_chunks(store, list(digests), args.jobs)
+    seconds = time.monotonic() - start
+    total = sum(digests.values())
+    print(f"Verified {len(digests)} chunk(s), {human(total)} in {seconds:.1f}s "
+          f"({total / seconds / 1e6 if seconds else 0:.0f} MB/s)")
+    for (name, snapshot_id), refs in by_snapshot.items():
+        broken = refs & set(bad)
+        print(f"  [{'FAIL' if broken else ' OK '}] {name} {snapshot_id}"
+              + (f": {len(broken)} bad chunk(s), e.g. {bad[next(iter(broken))]}" if broken else ""))
+    return 1 if bad else 0
+
+
+def cmd_prune(args):
+    if args.keep < 1:
+        print("--keep must be at least 1.")
+        return 1
+    store = ChunkStore(args.store)
+    removed = 0
+    for name in sorted({s[0] for s in store.snapshots()}):
+        for _, snapshot_id in store.snapshots(name)[:-args.keep]:
+            os.unlink(os.path.join(store.snapshots_dir, name, snapshot_id + ".json"))
+            removed += 1
+    referenced = set()
+    for name, snapshot_id in store.snapshots():
+        for entry in store.load(name, snapshot_id)["entries"]:
+            referenced.update(d for d, _ in entry.get("chunks", []))
+    freed = 0
+    for digest, path in list(store.known().items()):
+        if digest not in referenced and path:
+            freed += os.path.getsize(path)
+            os.unlink(path)
+    print(f"Removed {removed} snapshot(s), freed {human(freed)}.")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="start_services.py backup",
+        description="Deduplicating, compressed snapshots of the stack's volumes.",
+    )
+    sub = parser.add_subparsers(dest="action", required=True)
+
+    def common(p):
+        p.add_argument("--store", default=os.environ.get("LOCALAI_BACKUP_STORE", DEFAULT_STORE),
+                       help="Backup store directory (LOCALAI_BACKUP_STORE).")
+        p.add_argument("--jobs", type=int, default=DEFAULT_JOBS,
+                       help=f"Worker threads (default {DEFAULT_JOBS}; ~128 MiB each while snapshotting).")
+
+    p = sub.add_parser("create", help="Snapshot volumes (default: every volume of docker-compose.yml).")
+    common(p)
+    p.add_argument("--volumes", nargs="+", help="Volume names without the localai_ prefix.")
+    p.add_argument("--pause", action="store_true", help="Pause the containers using a volume while it is read.")
+    p.add_argument("--path", help="Snapshot this directory instead of docker volumes.")
+    p.add_argument("--name", help="Snapshot name for --path (default: directory name).")
+
+    p = sub.add_parser("restore", help="Restore a volume (or --path) from a snapshot.")
+    common(p)
+    p.add_argument("name", help="Volume / snapshot name, e.g. n8n_storage.")
+    p.add_argument("--snapshot", help="Snapshot id (default: latest).")
+    p.add_argument("--path", help="Restore into this directory instead of the docker volume.")
+    p.add_argument("--force", action="store_true", help="Replace the existing contents.")
+
+    p = sub.add_parser("list", help="List snapshots and store usage.")
+    common(p)
+
+    p = sub.add_parser("verify", help="Check every chunk referenced by the snapshots against its sha256.")
+    common(p)
+    p.add_argument("--volumes", nargs="+")
+    p.add_argument("--snapshot")
+
+    p = sub.add_parser("prune", help="Keep the newest snapshots per volume and drop unreferenced chunks.")
+    common(p)
+    p.add_argument("--keep", type=int, default=5, help="Snapshots kept per volume (at least 1).")
+
+    args = parser.parse_args(argv)
+    return {"create": cmd_create, "restore": cmd_restore, "list": cmd_list,
+            "verify": cmd_verify, "prune": cmd_prune}[args.action](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())